@@ -0,0 +1,261 @@
+"""
+账号清除（管理员删除用户）
+
+按依赖顺序分批删除用户的全部数据，每批一个短事务，避免在一个大事务中长时间持有大量行锁:
+1. 停用账号及其房间（is_active=False），失效身份缓存和房间状态，断开该账号已建立的连接，
+   从成员缓存中移除这些房间，再等待已入队的聊天消息写入：
+   清除期间该账号无法再登录、产生新数据，其他用户也无法再加入这些房间或在其中发言
+2. 依次清理 posts（及搜索索引）、website_links、link_categories、sync_room_messages、sync_room_members、sync_rooms:
+   先用集合查询统计每张表要删除的行数，再按 id 分批 SELECT id ... ORDER BY id LIMIT n 后 DELETE ... WHERE id IN (...)
+3. 删除 users 行，失效响应缓存
+
+中途失败时已提交的批次不会回滚，账号保持停用，重新执行会从剩余数据继续。
+数据量大时可在后台运行（DELETE /api/admin/users/{id}?background=true），
+通过 GET /api/admin/user-purges/{job_id} 查询进度。任务记录保存在进程内存中。
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from . import auth_cache, models, response_cache
+from .chat_pipeline import chat_pipeline
+from .config import config
+from .database import SessionLocal
+from .post_search import post_search
+from .room_state import state_engine
+from .socket_auth import memberships
+from .video_stream import video_grants
+
+logger = logging.getLogger(__name__)
+
+MAX_FINISHED_JOBS = 100  # 保留的已结束任务数
+
+
+def _hosted_rooms(user_id: int):
+    return select(models.SyncRoom.id).where(models.SyncRoom.host_user_id == user_id)
+
+
+def _owned_categories(user_id: int):
+    return select(models.LinkCategory.id).where(models.LinkCategory.user_id == user_id)
+
+
+# (表名, 模型, 删除条件) —— 按外键依赖顺序排列
+PURGE_STEPS = [
+    ("posts", models.Post, lambda uid: models.Post.author_id == uid),
+    # 用户的链接，以及其他用户放在该用户分类下的链接（分类删除时级联删除）
+    ("website_links", models.WebsiteLink, lambda uid: or_(
+        models.WebsiteLink.user_id == uid,
+        models.WebsiteLink.category_id.in_(_owned_categories(uid)),
+    )),
+    ("link_categories", models.LinkCategory, lambda uid: models.LinkCategory.user_id == uid),
+    # 用户房间中的全部消息 / 成员，以及用户在其他房间中的消息 / 成员记录
+    ("sync_room_messages", models.SyncRoomMessage, lambda uid: or_(
+        models.SyncRoomMessage.room_id.in_(_hosted_rooms(uid)),
+        models.SyncRoomMessage.user_id == uid,
+    )),
+    ("sync_room_members", models.SyncRoomMember, lambda uid: or_(
+        models.SyncRoomMember.room_id.in_(_hosted_rooms(uid)),
+        models.SyncRoomMember.user_id == uid,
+    )),
+    ("sync_rooms", models.SyncRoom, lambda uid: models.SyncRoom.host_user_id == uid),
+]
+
+
+@dataclass
+class PurgeMetrics:
+    """账号清除统计"""
+    purges_started: int = 0
+    purges_completed: int = 0
+    purges_failed: int = 0
+    rows_deleted: int = 0
+    batches: int = 0
+    last_duration_ms: float = 0.0
+    max_batch_ms: float = 0.0  # 单批事务最长耗时
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class PurgeJob:
+    """一次账号清除"""
+    job_id: str
+    user_id: int
+    username: Optional[str] = None
+    status: str = "pending"  # pending / running / done / failed
+    phase: Optional[str] = None  # 正在清理的表
+    totals: Dict[str, int] = field(default_factory=dict)  # 每张表要删除的行数
+    deleted: Dict[str, int] = field(default_factory=dict)
+    batches: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    @property
+    def progress(self) -> float:
+        total = sum(self.totals.values())
+        if self.status == "done":
+            return 1.0
+        return round(sum(self.deleted.values()) / total, 4) if total else 0.0
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data["progress"] = self.progress
+        return data
+
+
+class AccountPurger:
+    """分批删除用户数据，可同步执行或作为后台任务执行"""
+
+    def __init__(self, session_factory: Callable[[], Session], batch_size: int = 1000):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.metrics = PurgeMetrics()
+        self._jobs: "OrderedDict[str, PurgeJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ---- 任务 ----
+
+    def get(self, job_id: str) -> Optional[PurgeJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _new_job(self, user_id: int) -> PurgeJob:
+        job = PurgeJob(job_id=uuid.uuid4().hex, user_id=user_id)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            finished = [job_id for job_id, j in self._jobs.items() if j.finished]
+            for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self._jobs[job_id]
+        return job
+
+    def _running_job(self, user_id: int) -> Optional[PurgeJob]:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.user_id == user_id and not job.finished:
+                    return job
+        return None
+
+    def start(self, user_id: int) -> PurgeJob:
+        """在后台线程中清除用户，同一用户已有进行中的任务时返回该任务"""
+        job = self._running_job(user_id)
+        if job:
+            return job
+        job = self._new_job(user_id)
+
+        def run():
+            db = self.session_factory()
+            try:
+                self.purge(db, user_id, job)
+            finally:
+                db.close()
+
+        threading.Thread(target=run, name=f"account-purge-{user_id}", daemon=True).start()
+        return job
+
+    # ---- 清除 ----
+
+    def purge(self, db: Session, user_id: int, job: Optional[PurgeJob] = None) -> PurgeJob:
+        """清除用户，完成后 job.status 为 done；用户不存在或出错时为 failed"""
+        job = job or self._new_job(user_id)
+        job.status = "running"
+        job.started_at = time.time()
+        self.metrics.purges_started += 1
+        categories: List[str] = []
+        try:
+            user = db.get(models.User, user_id)
+            if not user:
+                raise LookupError("User not found")
+            job.username = user.username
+
+            # 停用账号和房间，清除期间无法登录、加入房间和写入
+            rooms = list(db.scalars(_hosted_rooms(user_id)))
+            user.is_active = False
+            db.execute(update(models.SyncRoom).where(models.SyncRoom.host_user_id == user_id).values(is_active=False))
+            db.commit()
+            auth_cache.invalidate_user(job.username)
+            memberships.revoke_user(user_id)
+            for room_id in rooms:
+                video_grants.invalidate_room(room_id)
+                state_engine.invalidate(room_id)
+            memberships.revoke_rooms(rooms)
+            # 停用前已入队的消息写入后再删除，避免在删除之后插入
+            chat_pipeline.drain_threadsafe()
+
+            # 统计阶段: 每张表的待删除行数，以及文章涉及的分类（用于失效分类列表缓存）
+            job.phase = "counting"
+            categories = [row[0] for row in db.execute(
+                select(models.Post.category).where(models.Post.author_id == user_id).distinct()
+            )]
+            for table, model, condition in PURGE_STEPS:
+                job.totals[table] = db.scalar(select(func.count(model.id)).where(condition(user_id))) or 0
+                job.deleted[table] = 0
+            db.rollback()
+
+            for table, model, condition in PURGE_STEPS:
+                job.phase = table
+                self._delete_in_batches(db, job, table, model, condition(user_id))
+
+            job.phase = "users"
+            db.execute(delete(models.User).where(models.User.id == user_id))
+            db.commit()
+            job.status = "done"
+            self.metrics.purges_completed += 1
+        except Exception as e:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+            self.metrics.purges_failed += 1
+            if not isinstance(e, LookupError):
+                logger.error(f"清除用户 {user_id} 失败（已删除 {job.deleted}）: {e}")
+        finally:
+            job.finished_at = time.time()
+            self.metrics.last_duration_ms = round((job.finished_at - job.started_at) * 1000, 3)
+            if job.username:
+                auth_cache.invalidate_user(job.username)
+            if job.deleted.get("posts") or job.status == "done":
+                # 文章接口的响应中嵌有作者信息，作者和文章被删除后相关列表整体移动
+                response_cache.invalidate_author(user_id, categories, removed=True)
+        return job
+
+    def _delete_in_batches(self, db: Session, job: PurgeJob, table: str, model, condition):
+        while True:
+            start = time.perf_counter()
+            ids = list(db.scalars(select(model.id).where(condition).order_by(model.id).limit(self.batch_size)))
+            if not ids:
+                db.rollback()
+                return
+            if model is models.Post:
+                post_search.remove_posts(db, ids)
+            deleted = db.execute(
+                delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            if model is models.SyncRoom:
+                for room_id in ids:
+                    video_grants.invalidate_room(room_id)
+                    state_engine.invalidate(room_id)
+                memberships.revoke_rooms(ids)
+
+            elapsed = (time.perf_counter() - start) * 1000
+            job.deleted[table] += deleted
+            job.batches += 1
+            self.metrics.rows_deleted += deleted
+            self.metrics.batches += 1
+            self.metrics.max_batch_ms = max(self.metrics.max_batch_ms, round(elapsed, 3))
+            logger.debug(f"清除用户 {job.user_id}: {table} {job.deleted[table]}/{job.totals[table]}")
+
+
+account_purger = AccountPurger(SessionLocal, batch_size=config.ACCOUNT_PURGE_BATCH_SIZE)
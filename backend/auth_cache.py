@@ -0,0 +1,108 @@
+"""
+认证缓存
+
+- token 缓存: JWT -> 用户名，有效期到 token 过期为止，避免重复验签
+- 身份缓存: 用户名 -> Principal(id, role, is_active)，避免每个请求都查 users 表
+
+用户被修改/改密/删除时由 crud 调用 invalidate_user 立即失效。
+多 worker 部署时失效只作用于当前进程，其他进程最多延迟 AUTH_CACHE_TTL 秒
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional
+
+from . import security
+from .config import config
+
+
+@dataclass(frozen=True)
+class Principal:
+    """已认证用户的最小身份信息"""
+    id: int
+    username: str
+    role: str
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(id=user.id, username=user.username, role=user.role, is_active=user.is_active)
+
+
+class TTLCache:
+    """线程安全的 LRU + TTL 缓存"""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, 过期时间 monotonic)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] <= time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is None or ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0,
+        }
+
+
+token_cache = TTLCache(maxsize=config.AUTH_CACHE_SIZE)
+principal_cache = TTLCache(maxsize=config.AUTH_CACHE_SIZE, ttl=config.AUTH_CACHE_TTL)
+
+
+def resolve_token_subject(token: str) -> str:
+    """解析 token 的用户名（sub），同一 token 在过期前只验签一次"""
+    username = token_cache.get(token)
+    if username is not None:
+        return username
+
+    claims = security.decode_access_token_claims(token)
+    username = claims["sub"]
+    exp = claims.get("exp")
+    if exp is not None:
+        token_cache.set(token, username, ttl=exp - time.time())
+    return username
+
+
+def invalidate_user(username: str):
+    """用户信息变化后立即失效其身份缓存"""
+    principal_cache.pop(username)
+
+
+def stats() -> dict:
+    return {"tokens": token_cache.stats(), "principals": principal_cache.stats()}
@@ -1,9 +1,11 @@
 """
 后台定时任务 - 自动清理空房间
 
-每隔一段时间自动清理无人的房间
+每隔一段时间自动清理无人的房间、过期未完成的视频上传会话，
+以及不再被任何房间引用的上传视频（video_store 闲置回收和配额淘汰）
 """
 import asyncio
+import time
 import sys
 import os
 from datetime import datetime
@@ -13,6 +15,9 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from backend.database import SessionLocal
 from backend import sync_room_crud
+from backend.socket_auth import memberships
+from backend.video_upload import upload_manager
+from backend.video_store import video_store
 import logging
 
 logging.basicConfig(
@@ -35,15 +40,28 @@ async def cleanup_task(interval_minutes: int = 5, empty_timeout_minutes: int = 1
             db = SessionLocal()
             
             # 执行清理
-            deleted_count = sync_room_crud.cleanup_empty_rooms(db, empty_timeout_minutes)
+            report = sync_room_crud.cleanup_empty_rooms(db, empty_timeout_minutes)
+            memberships.revoke_rooms(report.room_ids)
             
-            if deleted_count > 0:
-                logger.info(f"✅ 清理了 {deleted_count} 个空房间")
+            if report.rooms > 0:
+                logger.info(f"✅ 清理了 {report.rooms} 个空房间（{report.members} 个成员记录, "
+                            f"{report.messages} 条消息, {report.batches} 批）耗时: {report.timings_ms}")
             else:
                 logger.debug(f"⏭️  没有需要清理的空房间")
             
+            # 房间清理后再统计引用，最后一个房间关闭的视频进入闲置回收
+            counted_at = time.time()
+            refcounts = sync_room_crud.get_video_refcounts(db)
             db.close()
             
+            # 清理过期未完成的视频上传会话
+            expired_uploads = await asyncio.to_thread(upload_manager.cleanup_stale)
+            if expired_uploads > 0:
+                logger.info(f"✅ 清理了 {expired_uploads} 个过期的上传会话")
+            
+            # 回收未被引用的视频文件
+            await asyncio.to_thread(video_store.collect, refcounts, counted_at=counted_at)
+            
         except Exception as e:
             logger.error(f"❌ 清理任务出错: {str(e)}")
         
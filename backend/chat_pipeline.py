@@ -0,0 +1,252 @@
+"""
+聊天消息写回管道
+
+send_message 先广播、后持久化：消息进入有界的 asyncio 队列，
+后台任务按数量或时间凑批，一次性批量 INSERT 到 sync_room_messages。
+
+批量写入失败时重试一次；仍失败则逐条写入，只丢弃被数据库拒绝的消息
+（例如房间已被清理 / 删除导致的外键错误），不因一条坏数据丢掉整批已广播的消息
+"""
+import asyncio
+import itertools
+import logging
+import os
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from . import models
+from .config import config
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class ChatBacklogFull(Exception):
+    """待写入消息积压已满（背压）"""
+    pass
+
+
+@dataclass
+class ChatPipelineMetrics:
+    """写回管道统计"""
+    enqueued: int = 0
+    persisted: int = 0
+    failed: int = 0  # 数据库不可用等原因未能写入的消息
+    dropped: int = 0  # 被数据库拒绝（约束错误）而丢弃的消息
+    batch_retries: int = 0  # 批量写入失败后的重试次数
+    row_fallbacks: int = 0  # 重试仍失败、改为逐条写入的批次数
+    rejected: int = 0  # 因积压已满被拒绝的消息
+    flushes: int = 0
+    last_flush_size: int = 0
+    max_flush_size: int = 0
+    last_lag_ms: float = 0.0  # 批次中最早一条消息从入队到落库的耗时
+    max_lag_ms: float = 0.0
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data["avg_flush_size"] = round(self.persisted / self.flushes, 2) if self.flushes else 0
+        return data
+
+
+class ChatPipeline:
+    """有界队列 + 批量写入的聊天消息管道"""
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 0.5,
+                 max_backlog: int = 5000, enqueue_timeout: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backlog = max_backlog
+        self.enqueue_timeout = enqueue_timeout
+        self.metrics = ChatPipelineMetrics()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+        # 临时 ID：进程内唯一，落库前用于前端去重
+        self._id_prefix = f"p{os.getpid()}"
+        self._seq = itertools.count(1)
+
+    @property
+    def backlog(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        """在当前事件循环中启动写入任务"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_backlog)
+        self._loop = asyncio.get_running_loop()
+        self._stopping = False
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, room_id: int, user_id: int, message: str) -> dict:
+        """提交一条消息，返回带临时 ID 的消息记录
+
+        积压已满时最多等待 enqueue_timeout 秒，仍无空位则抛出 ChatBacklogFull
+        """
+        if self._queue is None or self._stopping:
+            raise ChatBacklogFull("聊天管道未运行")
+
+        record = {
+            "provisional_id": f"{self._id_prefix}-{next(self._seq)}",
+            "room_id": room_id,
+            "user_id": user_id,
+            "message": message,
+            "created_at": datetime.utcnow(),
+            "enqueued_at": time.monotonic(),
+        }
+        try:
+            await asyncio.wait_for(self._queue.put(record), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.metrics.rejected += 1
+            raise ChatBacklogFull("消息积压过多，请稍后再试")
+
+        self.metrics.enqueued += 1
+        return record
+
+    async def _next_batch(self) -> List[dict]:
+        """凑一批消息：达到 batch_size 或等待超过 flush_interval 即返回"""
+        batch: List[dict] = []
+        try:
+            batch.append(await asyncio.wait_for(self._queue.get(), timeout=self.flush_interval))
+        except asyncio.TimeoutError:
+            return batch
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    @staticmethod
+    def _row(item: dict) -> dict:
+        return {
+            "room_id": item["room_id"],
+            "user_id": item["user_id"],
+            "message": item["message"],
+            "created_at": item["created_at"],
+        }
+
+    def _write_batch(self, batch: List[dict]):
+        """批量 INSERT（在线程中执行）"""
+        db = SessionLocal()
+        try:
+            db.execute(insert(models.SyncRoomMessage), [self._row(item) for item in batch])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _write_rows(self, batch: List[dict]) -> Tuple[int, int, int]:
+        """逐条 INSERT（在线程中执行），返回 (写入, 被拒绝, 失败) 条数"""
+        written = dropped = failed = 0
+        db = SessionLocal()
+        try:
+            for item in batch:
+                try:
+                    db.execute(insert(models.SyncRoomMessage), [self._row(item)])
+                    db.commit()
+                    written += 1
+                except IntegrityError as e:
+                    db.rollback()
+                    dropped += 1
+                    logger.warning(f"聊天消息被数据库拒绝(房间:{item['room_id']}, 用户:{item['user_id']}): {e.orig}")
+                except Exception as e:
+                    db.rollback()
+                    failed += 1
+                    logger.error(f"聊天消息写入失败(房间:{item['room_id']}): {str(e)}")
+        finally:
+            db.close()
+        return written, dropped, failed
+
+    async def _write_with_fallback(self, batch: List[dict]) -> int:
+        """批量写入，失败时重试一次，仍失败则逐条写入，返回写入条数"""
+        m = self.metrics
+        for attempt in range(2):
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+                return len(batch)
+            except Exception as e:
+                logger.warning(f"聊天消息批量写入失败({len(batch)}条, 第{attempt + 1}次): {str(e)}")
+                if attempt == 0:
+                    m.batch_retries += 1
+                    await asyncio.sleep(min(self.flush_interval, 0.1))
+
+        m.row_fallbacks += 1
+        written, dropped, failed = await asyncio.to_thread(self._write_rows, batch)
+        m.dropped += dropped
+        m.failed += failed
+        return written
+
+    async def _flush(self, batch: List[dict]):
+        if not batch:
+            return
+        try:
+            written = await self._write_with_fallback(batch)
+        except Exception as e:
+            self.metrics.failed += len(batch)
+            logger.error(f"聊天消息批量写入失败({len(batch)}条): {str(e)}")
+        else:
+            lag_ms = (time.monotonic() - batch[0]["enqueued_at"]) * 1000
+            m = self.metrics
+            m.persisted += written
+            m.flushes += 1
+            m.last_flush_size = written
+            m.max_flush_size = max(m.max_flush_size, written)
+            m.last_lag_ms = round(lag_ms, 2)
+            m.max_lag_ms = max(m.max_lag_ms, m.last_lag_ms)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _run(self):
+        logger.info(f"聊天写回任务启动 - 批量:{self.batch_size}条, 间隔:{self.flush_interval}秒, 积压上限:{self.max_backlog}")
+        while not (self._stopping and self._queue.empty()):
+            await self._flush(await self._next_batch())
+
+    async def drain(self):
+        """等待已入队的消息全部处理完（写入或确认失败）"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    def drain_threadsafe(self, timeout: float = 10.0):
+        """在线程中等待已入队的消息处理完（账号清除删除消息前调用），管道未运行时直接返回"""
+        loop = self._loop
+        if self._task is None or loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            # 在事件循环线程中阻塞等待会死锁
+            logger.warning("drain_threadsafe 在事件循环线程中调用，未等待聊天消息写入")
+            return
+        asyncio.run_coroutine_threadsafe(self.drain(), loop).result(timeout)
+
+    async def shutdown(self):
+        """停止接收新消息，并把队列中的消息全部写入"""
+        self._stopping = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+        logger.info(f"聊天写回任务已停止: {self.metrics.as_dict()}")
+
+
+chat_pipeline = ChatPipeline(
+    batch_size=config.CHAT_BATCH_SIZE,
+    flush_interval=config.CHAT_FLUSH_INTERVAL,
+    max_backlog=config.CHAT_MAX_BACKLOG,
+)
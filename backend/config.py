@@ -57,6 +57,15 @@ class PlatformConfig:
     DB_USER = os.getenv("DB_USER", "root")
     DB_PASSWORD = os.getenv("DB_PASSWORD", "")
     DB_NAME = os.getenv("DB_NAME", "blue_local_db")
+
+    # Database connection pools (sync engine: REST handlers in the threadpool; async engine: Socket.IO handlers)
+    # Use scripts/tests/test_db_pool_sizing.py to pick DB_POOL_SIZE for a given worker count
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a connection before failing
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, reconnect connections older than this
+    ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "10"))
+    ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "10"))
     
     # Server configuration
     if ENV == "docker":
@@ -88,8 +97,32 @@ class PlatformConfig:
     ALGORITHM = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
     
+    # Authenticated user cache (decoded tokens + principal lookups)
+    AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+    AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))  # seconds
+    
+    # Password hashing (bcrypt in a dedicated process pool)
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))  # 0 = run in threadpool
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))  # queued + running; beyond this -> 503
+    
     # File upload settings
-    MAX_UPLOAD_SIZE = 100 * 1024 * 1024  # 100MB (增加文件大小限制)
+    MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(100 * 1024 * 1024)))  # 100MB (增加文件大小限制)
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))  # resumable upload chunk size
+    UPLOAD_SESSION_TTL = float(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))  # seconds, unfinished sessions are removed after this
+    
+    # Content-addressed video store (UPLOAD_DIR/videos/<sha256><ext>, shared by rooms)
+    VIDEO_STORE_QUOTA_BYTES = int(os.getenv("VIDEO_STORE_QUOTA_BYTES", str(20 * 1024 ** 3)))  # 0 = unlimited
+    VIDEO_STORE_IDLE_TTL = float(os.getenv("VIDEO_STORE_IDLE_TTL", "3600"))  # seconds an unreferenced video is kept for reuse
+    
+    # Local-mode sampled fingerprint (clients must use the same values, sent to them in room info)
+    FINGERPRINT_SAMPLES = int(os.getenv("FINGERPRINT_SAMPLES", "16"))
+    FINGERPRINT_CHUNK_SIZE = int(os.getenv("FINGERPRINT_CHUNK_SIZE", str(64 * 1024)))
+    
+    # Uploaded room video serving (Range requests)
+    VIDEO_GRANT_TTL = float(os.getenv("VIDEO_GRANT_TTL", "60"))  # seconds a (token, room) access check is cached
+    # nginx internal location mapped to UPLOAD_DIR, e.g. /_protected_uploads/ ; empty = stream from the app
+    VIDEO_ACCEL_REDIRECT = os.getenv("VIDEO_ACCEL_REDIRECT", "")
     ALLOWED_EXTENSIONS = {
         # 图片格式
         ".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tiff", ".svg",
@@ -98,6 +131,50 @@ class PlatformConfig:
         ".3gp", ".mpg", ".mpeg", ".ts", ".mts", ".m2ts", ".vob"
     }
     
+    # Post search: auto = MySQL FULLTEXT (ngram) / SQLite FTS5, like = legacy LIKE scan
+    POST_SEARCH_BACKEND = os.getenv("POST_SEARCH_BACKEND", "auto")
+    
+    # Post view counter (buffered, flushed as views = views + n)
+    VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", "5"))  # seconds
+    VIEW_DEDUP_WINDOW = float(os.getenv("VIEW_DEDUP_WINDOW", "0"))  # seconds, 0 = count every view
+    
+    # Public post response cache (pre-serialized JSON, LRU by byte budget, tag invalidation)
+    RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))  # seconds, 0 = no cache
+    
+    # Sync room state (in-memory, write-behind)
+    ROOM_STATE_FLUSH_INTERVAL = float(os.getenv("ROOM_STATE_FLUSH_INTERVAL", "5"))  # seconds
+    
+    # Sync room playback clock: broadcast time_sync only when drift exceeds threshold
+    SYNC_DRIFT_THRESHOLD = float(os.getenv("SYNC_DRIFT_THRESHOLD", "0.5"))  # seconds
+    SYNC_HEARTBEAT_INTERVAL = float(os.getenv("SYNC_HEARTBEAT_INTERVAL", "15"))  # seconds
+    
+    # Sync room event log: recent playback events / chat messages kept per room for delta resume on reconnect
+    ROOM_EVENT_BUFFER = int(os.getenv("ROOM_EVENT_BUFFER", "200"))  # events per room
+    ROOM_EVENT_MAX_ROOMS = int(os.getenv("ROOM_EVENT_MAX_ROOMS", "1000"))  # least recently used rooms are dropped
+    
+    # Sync room chat (write-behind batching)
+    CHAT_BATCH_SIZE = int(os.getenv("CHAT_BATCH_SIZE", "100"))
+    CHAT_FLUSH_INTERVAL = float(os.getenv("CHAT_FLUSH_INTERVAL", "0.5"))  # seconds
+    CHAT_MAX_BACKLOG = int(os.getenv("CHAT_MAX_BACKLOG", "5000"))
+    
+    # Empty room cleanup: rooms are deleted in chunks, one transaction per chunk
+    ROOM_CLEANUP_BATCH_SIZE = int(os.getenv("ROOM_CLEANUP_BATCH_SIZE", "500"))
+    
+    # Account purge (admin user deletion): rows per table are deleted in chunks, one transaction per chunk
+    ACCOUNT_PURGE_BATCH_SIZE = int(os.getenv("ACCOUNT_PURGE_BATCH_SIZE", "1000"))
+    
+    # Socket.IO per-connection rate limits: "event=tokens_per_second/burst", comma separated; unlisted events are unlimited
+    SOCKET_RATE_LIMITS = os.getenv(
+        "SOCKET_RATE_LIMITS",
+        "join_room=1/5,leave_room_event=1/5,playback_control=5/10,time_update=2/4,"
+        "send_message=2/5,request_sync=2/5,verify_video=0.5/3",
+    )
+    
+    # Socket.IO message queue for multi-worker deployments
+    # e.g. redis://localhost:6379/0 ; empty = single worker
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", "")
+    
     # Logging
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO" if ENV == "production" else "DEBUG")
     
@@ -0,0 +1,146 @@
+"""
+同步观影房间的连接登记表
+
+记录 房间 -> 用户 -> sid 的对应关系。单进程时保存在内存中；
+多 worker 部署时保存在 Redis 中，所有 worker 共享同一份登记表
+"""
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+
+class Departure(NamedTuple):
+    """一次连接移除的结果"""
+    room_id: int
+    user_id: int
+    user_gone: bool  # 该用户在房间内已没有任何连接（所有标签页都已关闭）
+    room_empty: bool  # 房间内已没有任何连接
+
+
+class LocalConnectionRegistry:
+    """进程内连接登记表
+
+    正向索引 房间 -> 用户 -> sid 集合（同一用户可以打开多个标签页），
+    反向索引 sid -> {(房间, 用户)}，断开连接时无需遍历所有房间
+    """
+
+    def __init__(self):
+        # {room_id: {user_id: {sid, ...}}}
+        self._rooms: Dict[int, Dict[int, Set[str]]] = {}
+        # {sid: {(room_id, user_id), ...}}
+        self._sids: Dict[str, Set[Tuple[int, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._sids)
+
+    async def add(self, room_id: int, user_id: int, sid: str):
+        """登记连接"""
+        self._rooms.setdefault(room_id, {}).setdefault(user_id, set()).add(sid)
+        self._sids.setdefault(sid, set()).add((room_id, user_id))
+
+    def _discard(self, room_id: int, user_id: int, sid: str) -> Optional[Departure]:
+        users = self._rooms.get(room_id)
+        sids = users.get(user_id) if users else None
+        if not sids or sid not in sids:
+            return None
+
+        sids.discard(sid)
+        user_gone = not sids
+        if user_gone:
+            del users[user_id]
+        room_empty = not users
+        if room_empty:
+            del self._rooms[room_id]
+
+        entries = self._sids.get(sid)
+        if entries is not None:
+            entries.discard((room_id, user_id))
+            if not entries:
+                del self._sids[sid]
+        return Departure(room_id, user_id, user_gone, room_empty)
+
+    async def remove(self, room_id: int, user_id: int, sid: str) -> Optional[Departure]:
+        """移除某个 sid 在房间中的连接，连接不存在时返回 None"""
+        return self._discard(room_id, user_id, sid)
+
+    async def remove_sid(self, sid: str) -> List[Departure]:
+        """移除某个 sid 的所有连接（只访问该 sid 自己的登记项）"""
+        departures = []
+        for room_id, user_id in list(self._sids.get(sid, ())):
+            departure = self._discard(room_id, user_id, sid)
+            if departure is not None:
+                departures.append(departure)
+        return departures
+
+    async def room_connections(self, room_id: int) -> Dict[int, Set[str]]:
+        """获取房间内的连接 {user_id: {sid, ...}}"""
+        return {user_id: set(sids) for user_id, sids in self._rooms.get(room_id, {}).items()}
+
+
+class RedisConnectionRegistry:
+    """基于 Redis 的连接登记表，供多个 worker 共享
+
+    sync:room:{room_id}            SET  在线的 user_id
+    sync:room:{room_id}:{user_id}  SET  该用户的 sid（多个标签页）
+    sync:sid:{sid}                 SET  "room_id:user_id"
+    """
+
+    def __init__(self, url: str, prefix: str = "sync"):
+        from redis import asyncio as aioredis
+
+        self.redis = aioredis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def _room_key(self, room_id: int) -> str:
+        return f"{self.prefix}:room:{room_id}"
+
+    def _user_key(self, room_id: int, user_id: int) -> str:
+        return f"{self.prefix}:room:{room_id}:{user_id}"
+
+    def _sid_key(self, sid: str) -> str:
+        return f"{self.prefix}:sid:{sid}"
+
+    async def add(self, room_id: int, user_id: int, sid: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(self._room_key(room_id), str(user_id))
+            pipe.sadd(self._user_key(room_id, user_id), sid)
+            pipe.sadd(self._sid_key(sid), f"{room_id}:{user_id}")
+            await pipe.execute()
+
+    async def remove(self, room_id: int, user_id: int, sid: str) -> Optional[Departure]:
+        user_key = self._user_key(room_id, user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.srem(user_key, sid)
+            pipe.srem(self._sid_key(sid), f"{room_id}:{user_id}")
+            pipe.scard(user_key)
+            removed, _, remaining_sids = await pipe.execute()
+        if not removed:
+            return None
+
+        user_gone = remaining_sids == 0
+        if user_gone:
+            await self.redis.srem(self._room_key(room_id), str(user_id))
+        room_empty = await self.redis.scard(self._room_key(room_id)) == 0
+        return Departure(room_id, user_id, user_gone, room_empty)
+
+    async def remove_sid(self, sid: str) -> List[Departure]:
+        departures = []
+        for entry in await self.redis.smembers(self._sid_key(sid)):
+            room_id, user_id = (int(part) for part in entry.split(":"))
+            departure = await self.remove(room_id, user_id, sid)
+            if departure is not None:
+                departures.append(departure)
+        await self.redis.delete(self._sid_key(sid))
+        return departures
+
+    async def room_connections(self, room_id: int) -> Dict[int, Set[str]]:
+        result = {}
+        for user_id in await self.redis.smembers(self._room_key(room_id)):
+            result[int(user_id)] = await self.redis.smembers(self._user_key(room_id, int(user_id)))
+        return result
+
+
+def create_connection_registry(url: Optional[str]):
+    """消息队列为 Redis 时使用共享登记表，否则使用进程内登记表"""
+    if url and urlparse(url).scheme in ("redis", "rediss"):
+        return RedisConnectionRegistry(url)
+    return LocalConnectionRegistry()
@@ -1,6 +1,11 @@
+from sqlalchemy import func
 from sqlalchemy.orm import Session, joinedload
 from typing import Optional
-from . import models, schemas, security
+from . import models, schemas, security, auth_cache, response_cache
+from .post_search import post_search, make_snippet, query_terms
+from .pagination import keyset_page
+from .account_purge import account_purger
+from .socket_auth import memberships
 
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
@@ -11,8 +16,10 @@ def get_user_by_email(db: Session, email: str):
 def get_user_by_id(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = security.get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    """创建用户，接口中应传入由 password_hasher 预先计算的哈希"""
+    if hashed_password is None:
+        hashed_password = security.get_password_hash(user.password)
     
     # 检查是否是第一个用户,如果是则设为管理员
     user_count = db.query(models.User).count()
@@ -29,9 +36,11 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
-def get_all_users(db: Session, skip: int = 0, limit: int = 100):
-    """获取所有用户(管理员功能)"""
-    return db.query(models.User).offset(skip).limit(limit).all()
+def get_all_users(db: Session, skip: int = 0, limit: int = 100,
+                  before: Optional[str] = None, after: Optional[str] = None):
+    """获取所有用户(管理员功能)，按注册时间倒序，支持 before/after 游标"""
+    return keyset_page(db.query(models.User), models.User.created_at, models.User.id, limit,
+                       skip=skip, before=before, after=after)
 
 def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
     """更新用户信息(管理员功能)"""
@@ -40,6 +49,7 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
         return None
     
     update_data = user_update.dict(exclude_unset=True)
+    old_username = db_user.username
     
     # 如果要更新密码,需要加密
     if "password" in update_data:
@@ -50,6 +60,14 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
     
     db.commit()
     db.refresh(db_user)
+    # 用户名也可能被修改，旧 token 的 sub 仍是旧用户名
+    auth_cache.invalidate_user(old_username)
+    auth_cache.invalidate_user(db_user.username)
+    # 已建立的 Socket.IO 连接不再经过认证，禁用时直接断开
+    if not db_user.is_active:
+        memberships.revoke_user(user_id)
+    # 文章接口的响应中嵌有作者信息
+    response_cache.invalidate_author(user_id)
     return db_user
 
 def update_user_password(db: Session, user_id: int, old_password: str, new_password: str):
@@ -63,56 +81,38 @@ def update_user_password(db: Session, user_id: int, old_password: str, new_passw
         return False
     
     # 更新密码
-    db_user.hashed_password = security.get_password_hash(new_password)
+    return set_password_hash(db, user_id, security.get_password_hash(new_password))
+
+def set_password_hash(db: Session, user_id: int, hashed_password: str):
+    """保存已计算好的密码哈希"""
+    db_user = get_user_by_id(db, user_id)
+    if not db_user:
+        return None
+    
+    db_user.hashed_password = hashed_password
     db.commit()
     db.refresh(db_user)
+    auth_cache.invalidate_user(db_user.username)
     return db_user
 
 def delete_user(db: Session, user_id: int):
-    """删除用户(管理员功能) - 级联删除所有关联数据"""
-    db_user = get_user_by_id(db, user_id)
-    if not db_user:
-        return False
-    
-    try:
-        # 1. 删除用户的文章
-        db.query(models.Post).filter(models.Post.author_id == user_id).delete()
-        
-        # 2. 删除用户的链接
-        db.query(models.WebsiteLink).filter(models.WebsiteLink.user_id == user_id).delete()
-        
-        # 3. 删除用户的链接分类（会级联删除该分类下的所有链接）
-        db.query(models.LinkCategory).filter(models.LinkCategory.user_id == user_id).delete()
-        
-        # 4. 删除用户的同步房间消息
-        user_rooms = db.query(models.SyncRoom).filter(models.SyncRoom.host_user_id == user_id).all()
-        for room in user_rooms:
-            db.query(models.SyncRoomMessage).filter(models.SyncRoomMessage.room_id == room.id).delete()
-            db.query(models.SyncRoomMember).filter(models.SyncRoomMember.room_id == room.id).delete()
-        
-        # 5. 删除用户的同步房间
-        db.query(models.SyncRoom).filter(models.SyncRoom.host_user_id == user_id).delete()
-        
-        # 6. 删除用户作为成员的房间关系
-        db.query(models.SyncRoomMember).filter(models.SyncRoomMember.user_id == user_id).delete()
-        
-        # 7. 删除用户发送的房间消息
-        db.query(models.SyncRoomMessage).filter(models.SyncRoomMessage.user_id == user_id).delete()
-        
-        # 8. 最后删除用户
-        db.delete(db_user)
-        db.commit()
-        return True
-    except Exception as e:
-        db.rollback()
-        print(f"删除用户失败: {str(e)}")
-        return False
+    """删除用户(管理员功能) - 分批删除所有关联数据，见 account_purge.py"""
+    return account_purger.purge(db, user_id).status == "done"
 
 # --- 文章 CRUD ---
 
 def get_posts(db: Session, skip: int = 0, limit: int = 100, author_id: Optional[int] = None, 
-              search: Optional[str] = None, category: Optional[str] = None):
-    """获取文章列表,支持按作者筛选、搜索和分类过滤,包含作者信息"""
+              search: Optional[str] = None, category: Optional[str] = None,
+              before: Optional[str] = None, after: Optional[str] = None):
+    """获取文章列表,支持按作者筛选、搜索和分类过滤,包含作者信息
+
+    不带搜索词时可用 before/after 游标分页；全文搜索结果按相关度排序，只支持 skip/limit
+    """
+    if search:
+        hits = post_search.search(db, search, skip=skip, limit=limit, author_id=author_id, category=category)
+        if hits is not None:
+            return _load_search_hits(db, hits, search)
+    
     query = db.query(models.Post).options(joinedload(models.Post.author))
     
     if author_id:
@@ -128,7 +128,28 @@ def get_posts(db: Session, skip: int = 0, limit: int = 100, author_id: Optional[
     if category:
         query = query.filter(models.Post.category == category)
     
-    return query.order_by(models.Post.created_at.desc()).offset(skip).limit(limit).all()
+    return keyset_page(query, models.Post.created_at, models.Post.id, limit,
+                       skip=skip, before=before, after=after)
+
+def _load_search_hits(db: Session, hits, search: str):
+    """按相关度顺序加载命中的文章，并附加 score 和高亮摘要"""
+    if not hits:
+        return []
+    posts = db.query(models.Post).options(joinedload(models.Post.author)).filter(
+        models.Post.id.in_([hit.post_id for hit in hits])
+    ).all()
+    by_id = {post.id: post for post in posts}
+    
+    terms = query_terms(search)
+    results = []
+    for hit in hits:
+        post = by_id.get(hit.post_id)
+        if post is None:
+            continue
+        post.score = hit.score
+        post.snippet = make_snippet(post.content or post.title, terms)
+        results.append(post)
+    return results
 
 def get_post_by_id(db: Session, post_id: int):
     """根据 ID 获取文章,包含作者信息"""
@@ -143,8 +164,11 @@ def create_post(db: Session, post: schemas.PostCreate, author_id: int):
         author_id=author_id
     )
     db.add(db_post)
+    db.flush()
+    post_search.index_post(db, db_post)
     db.commit()
     db.refresh(db_post)
+    response_cache.invalidate_post(db_post.id, author_id, [db_post.category])
     return db_post
 
 def update_post(db: Session, post_id: int, post_update: schemas.PostUpdate):
@@ -154,30 +178,38 @@ def update_post(db: Session, post_id: int, post_update: schemas.PostUpdate):
         return None
     
     update_data = post_update.dict(exclude_unset=True)
+    old_category = db_post.category
     for field, value in update_data.items():
         setattr(db_post, field, value)
     
+    if "title" in update_data or "content" in update_data:
+        post_search.index_post(db, db_post)
     db.commit()
     db.refresh(db_post)
+    # 改分类时文章从旧分类列表移到新分类列表，两边的分页都会移动
+    moved = db_post.category != old_category
+    response_cache.invalidate_post(post_id, db_post.author_id, {old_category, db_post.category}, moved=moved)
     return db_post
 
 def delete_post(db: Session, post_id: int):
     """删除文章"""
     db_post = get_post_by_id(db, post_id)
     if db_post:
+        author_id, category = db_post.author_id, db_post.category
+        post_search.remove_post(db, post_id)
         db.delete(db_post)
         db.commit()
+        response_cache.invalidate_post(post_id, author_id, [category])
         return True
     return False
 
-def increment_post_views(db: Session, post_id: int):
-    """增加文章浏览次数"""
-    db_post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    if db_post:
-        db_post.views += 1
-        db.commit()
-        return True
-    return False
+def increment_post_views(db: Session, post_id: int, count: int = 1):
+    """原子增加文章浏览次数（接口中的浏览计数由 view_counter 缓冲后批量写回）"""
+    updated = db.query(models.Post).filter(models.Post.id == post_id).update(
+        {models.Post.views: func.coalesce(models.Post.views, 0) + count}, synchronize_session=False
+    )
+    db.commit()
+    return updated > 0
 
 # Link Category CRUD
 def get_categories_by_user(db: Session, user_id: int):
@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -11,6 +13,7 @@ load_dotenv(dotenv_path=env_path)
 
 # 导入配置
 from .config import PlatformConfig
+from .db_pool import TimedAsyncQueuePool, TimedQueuePool, instrument
 
 config = PlatformConfig()
 
@@ -20,12 +23,44 @@ SQLALCHEMY_DATABASE_URL = os.getenv(
     f"mysql+pymysql://{config.DB_USER}:{config.DB_PASSWORD}@{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}"
 )
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
+    poolclass=TimedQueuePool,
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_recycle=config.DB_POOL_RECYCLE,
     pool_pre_ping=True,  # 防止连接断开
-    pool_recycle=1800,   # 30分钟回收一次连接
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步驱动（供 Socket.IO 事件处理等运行在事件循环中的代码使用，查询期间不阻塞事件循环）
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str) -> str:
+    """把同步连接 URL 换成对应的异步驱动，如 mysql+pymysql:// -> mysql+aiomysql://"""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)).render_as_string(hide_password=False)
+
+async_engine = create_async_engine(
+    async_database_url(SQLALCHEMY_DATABASE_URL),
+    poolclass=TimedAsyncQueuePool,  # aiosqlite 默认 NullPool，每个会话新建连接和线程
+    pool_size=config.ASYNC_DB_POOL_SIZE,
+    max_overflow=config.ASYNC_DB_MAX_OVERFLOW,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_recycle=config.DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+# expire_on_commit=False: 提交后仍可读取已加载的属性，避免在事件循环中隐式触发同步 IO
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# 连接池统计（/api/admin/metrics 中的 db_pool）
+pool_metrics = {
+    "sync": instrument(engine),
+    "async": instrument(async_engine),
+}
+
 Base = declarative_base()
\ No newline at end of file
@@ -0,0 +1,165 @@
+"""
+数据库连接池监控
+
+database.py 中的同步引擎（线程池中的 REST 接口使用）和异步引擎（Socket.IO 事件使用）都用这里的连接池类，
+每次取连接时记录:
+- wait_ms: 从请求连接到拿到连接的耗时（含排队等待、新建连接、pre_ping），连接池不够用时首先体现在这里
+- checked_out: 拿到连接时池中已借出的连接数
+- overflow: 拿到连接时超出 pool_size 的连接数（到达 max_overflow 后新请求只能排队）
+以及建立 / 失效 / 取连接超时的次数，通过 /api/admin/metrics 查看
+"""
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+WAIT_BUCKETS_MS = (0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 30000)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class Histogram:
+    """固定分桶的直方图（桶为 <= 上界的计数，另有一个溢出桶）"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """估算分位数（返回所在桶的上界，落在溢出桶时返回最大值）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self._counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def as_dict(self) -> dict:
+        labels = [f"<={bound:g}" for bound in self.buckets] + [f">{self.buckets[-1]:g}"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 3),
+            "buckets": {label: n for label, n in zip(labels, self._counts) if n},
+        }
+
+
+class PoolMetrics:
+    """单个连接池的统计"""
+
+    def __init__(self):
+        self.pool = None
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidated = 0
+        self.timeouts = 0  # 等待超过 pool_timeout 的请求
+        self.wait_ms = Histogram(WAIT_BUCKETS_MS)
+        self.checked_out = Histogram(COUNT_BUCKETS)
+        self.overflow = Histogram(COUNT_BUCKETS)
+
+    def as_dict(self) -> dict:
+        pool = self.pool
+        return {
+            "pool_size": pool.size() if pool is not None else None,
+            "checked_out_now": pool.checkedout() if pool is not None else None,
+            "overflow_now": max(0, pool.overflow()) if pool is not None else None,
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "invalidated": self.invalidated,
+            "timeouts": self.timeouts,
+            "wait_ms": self.wait_ms.as_dict(),
+            "checked_out": self.checked_out.as_dict(),
+            "overflow": self.overflow.as_dict(),
+        }
+
+
+class _TimedConnect:
+    """记录取连接耗时的连接池（连接池事件只在拿到连接后触发，看不到排队时间）"""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.timeouts += 1
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.wait_ms.observe((time.perf_counter() - start) * 1000)
+
+    def recreate(self):
+        # engine.dispose() 会用 recreate() 换一个新连接池，统计延续到新池
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        if self.metrics is not None:
+            self.metrics.pool = pool
+        return pool
+
+
+class TimedQueuePool(_TimedConnect, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedConnect, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument(engine) -> PoolMetrics:
+    """给引擎的连接池挂上统计（同步 Engine 或 AsyncEngine）"""
+    engine = getattr(engine, "sync_engine", engine)
+    pool = engine.pool
+    metrics = PoolMetrics()
+    metrics.pool = pool
+    pool.metrics = metrics
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checkouts += 1
+        current = metrics.pool
+        metrics.checked_out.observe(current.checkedout())
+        metrics.overflow.observe(max(0, current.overflow()))
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        metrics.checkins += 1
+
+    @event.listens_for(pool, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidated += 1
+
+    return metrics
+
+
+def stats(metrics: Dict[str, PoolMetrics]) -> dict:
+    return {name: m.as_dict() for name, m in metrics.items()}
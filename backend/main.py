@@ -1,12 +1,30 @@
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from datetime import timedelta
+import os
 
-from . import crud, models, schemas, security
-from .database import SessionLocal, engine
-from .websocket_server import socket_app  # 导入 WebSocket 应用
+from . import crud, models, schemas, security, auth_cache, db_pool, video_fingerprint, wire_format
+from .auth_cache import Principal
+from .database import AsyncSessionLocal, SessionLocal, engine, pool_metrics
+from .websocket_server import socket_app, emit_time_heartbeat, emit_member_verified  # 导入 WebSocket 应用
+from .room_state import state_engine
+from .room_events import room_events
+from .rate_limiter import rate_limiter
+from .socket_auth import memberships
+from .chat_pipeline import chat_pipeline
+from .sync_scheduler import sync_scheduler
+from .password_hasher import HasherOverloaded, password_hasher
+from .pagination import InvalidCursor
+from .view_counter import view_counter
+from .response_cache import post_cache, dump_json, list_tags, detail_tags
+from .video_upload import UploadError, upload_manager
+from .video_store import video_store
+from .account_purge import account_purger
+from .video_stream import VideoGrant, build_grant, video_grants, video_metrics, video_response
 
 # 创建数据库表
 models.Base.metadata.create_all(bind=engine)
@@ -36,7 +54,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    expose_headers=["*", "X-Next-Cursor", "X-Prev-Cursor", "ETag"],
 )
 
 # --- 依赖项 ---
@@ -47,25 +65,29 @@ def get_db():
     finally:
         db.close()
 
-def get_current_user(token: str = Depends(security.oauth2_scheme), db: Session = Depends(get_db)):
-    """从 token 获取当前用户"""
-    username = security.decode_access_token(token)
-    user = crud.get_user_by_username(db, username=username)
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+def get_current_user(token: str = Depends(security.oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    """从 token 获取当前用户身份（优先读取认证缓存）"""
+    username = auth_cache.resolve_token_subject(token)
+    principal = auth_cache.principal_cache.get(username)
+    if principal is None:
+        user = crud.get_user_by_username(db, username=username)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        principal = Principal.from_user(user)
+        auth_cache.principal_cache.set(username, principal)
     # 检查账号是否被禁用
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Account has been disabled",
         )
-    return user
+    return principal
 
-def get_current_admin(current_user: models.User = Depends(get_current_user)):
+def get_current_admin(current_user: Principal = Depends(get_current_user)):
     """验证当前用户是否为管理员"""
     if current_user.role != "admin":
         raise HTTPException(
@@ -74,17 +96,57 @@ def get_current_admin(current_user: models.User = Depends(get_current_user)):
         )
     return current_user
 
+@app.exception_handler(HasherOverloaded)
+async def hasher_overloaded_handler(request: Request, exc: HasherOverloaded):
+    """密码哈希排队已满，提示客户端稍后重试"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server busy, please retry later"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": "Invalid cursor"})
+
+@app.exception_handler(UploadError)
+async def upload_error_handler(request: Request, exc: UploadError):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+
+def cursor_headers(page) -> dict:
+    headers = {}
+    if getattr(page, "next_cursor", None):
+        headers["X-Next-Cursor"] = page.next_cursor
+    if getattr(page, "prev_cursor", None):
+        headers["X-Prev-Cursor"] = page.prev_cursor
+    return headers
+
+def set_cursor_headers(response: Response, page):
+    """分页游标通过响应头返回，响应体保持原有格式"""
+    response.headers.update(cursor_headers(page))
+
 # --- API 路由 ---
 
 @app.post("/api/auth/login", response_model=schemas.Token)
-def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
-    user = crud.get_user_by_username(db, username=form_data.username)
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
+    # 数据库查询在线程池中执行，不阻塞与 Socket.IO 共用的事件循环
+    user = await run_in_threadpool(crud.get_user_by_username, db, username=form_data.username)
+    # 等待哈希前先归还数据库连接，否则排队中的登录会占满连接池
+    db.close()
+    if not user or not await password_hasher.verify(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # cost 配置变化后，登录时按新 cost 重算哈希；繁忙时跳过，下次登录再算
+    if password_hasher.needs_rehash(user.hashed_password):
+        try:
+            hashed_password = await password_hasher.hash(form_data.password)
+            await run_in_threadpool(crud.set_password_hash, db, user.id, hashed_password)
+            password_hasher.metrics.rehashed += 1
+        except HasherOverloaded:
+            pass
     access_token_expires = timedelta(minutes=security.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
@@ -92,52 +154,63 @@ def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2Passw
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/api/users/register", response_model=schemas.User)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_username(db, username=user.username)
+async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(crud.get_user_by_username, db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    db_user_email = crud.get_user_by_email(db, email=user.email)
+    db_user_email = await run_in_threadpool(crud.get_user_by_email, db, email=user.email)
     if db_user_email:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    db.close()
+    hashed_password = await password_hasher.hash(user.password)
+    return await run_in_threadpool(crud.create_user, db=db, user=user, hashed_password=hashed_password)
 
 @app.get("/api/users/me", response_model=schemas.User)
-def read_current_user(current_user: models.User = Depends(get_current_user)):
+def read_current_user(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     """获取当前登录用户的信息"""
-    return current_user
+    user = crud.get_user_by_id(db, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
 
 @app.put("/api/users/me/password")
-def update_my_password(
+async def update_my_password(
     password_update: schemas.UserPasswordUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """修改当前用户密码"""
-    result = crud.update_user_password(
-        db, current_user.id, password_update.old_password, password_update.new_password
-    )
-    if result is False:
-        raise HTTPException(status_code=400, detail="Incorrect old password")
-    if result is None:
+    user = await run_in_threadpool(crud.get_user_by_id, db, current_user.id)
+    if user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    db.close()
+    if not await password_hasher.verify(password_update.old_password, user.hashed_password):
+        raise HTTPException(status_code=400, detail="Incorrect old password")
+    hashed_password = await password_hasher.hash(password_update.new_password)
+    await run_in_threadpool(crud.set_password_hash, db, current_user.id, hashed_password)
     return {"message": "Password updated successfully"}
 
 # --- 管理员 API ---
 
 @app.get("/api/admin/users", response_model=list[schemas.UserSimple])
 def get_all_users(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    current_admin: models.User = Depends(get_current_admin),
+    before: str = None,
+    after: str = None,
+    current_admin: Principal = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """获取所有用户列表(仅管理员)"""
-    return crud.get_all_users(db, skip=skip, limit=limit)
+    """获取所有用户列表(仅管理员)，支持 before/after 游标分页"""
+    users = crud.get_all_users(db, skip=skip, limit=limit, before=before, after=after)
+    set_cursor_headers(response, users)
+    return users
 
 @app.get("/api/admin/users/{user_id}", response_model=schemas.User)
 def get_user_detail(
     user_id: int,
-    current_admin: models.User = Depends(get_current_admin),
+    current_admin: Principal = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     """获取用户详细信息(仅管理员)"""
@@ -150,7 +223,7 @@ def get_user_detail(
 def update_user(
     user_id: int,
     user_update: schemas.UserUpdate,
-    current_admin: models.User = Depends(get_current_admin),
+    current_admin: Principal = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     """更新用户信息(仅管理员)"""
@@ -166,53 +239,103 @@ def update_user(
 @app.delete("/api/admin/users/{user_id}")
 def delete_user(
     user_id: int,
-    current_admin: models.User = Depends(get_current_admin),
+    response: Response,
+    background: bool = False,
+    current_admin: Principal = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """删除用户(仅管理员)"""
+    """删除用户(仅管理员)
+
+    background=true 时在后台分批删除，立即返回 202 和任务信息，通过 /api/admin/user-purges/{job_id} 查询进度
+    """
     # 防止管理员删除自己
     if user_id == current_admin.id:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
     
+    if background:
+        if not crud.get_user_by_id(db, user_id):
+            raise HTTPException(status_code=404, detail="User not found")
+        job = account_purger.start(user_id)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "User deletion started", "job": job.as_dict()}
+    
     success = crud.delete_user(db, user_id)
     if not success:
         raise HTTPException(status_code=404, detail="User not found")
     return {"message": "User deleted successfully"}
 
+@app.get("/api/admin/user-purges/{job_id}")
+def get_user_purge(job_id: str, current_admin: Principal = Depends(get_current_admin)):
+    """查询后台删除用户任务的进度"""
+    job = account_purger.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    return job.as_dict()
+
 # --- 文章 API ---
 
 @app.get("/api/posts", response_model=list[schemas.PostWithAuthor])
 def read_posts(
+    request: Request,
     skip: int = 0, 
     limit: int = 100, 
     author_id: int = None,
     search: str = None,
     category: str = None,
+    before: str = None,
+    after: str = None,
     db: Session = Depends(get_db)
 ):
-    """获取文章列表，支持分页、按作者筛选、搜索和分类过滤"""
-    posts = crud.get_posts(db, skip=skip, limit=limit, author_id=author_id, 
-                          search=search, category=category)
-    return posts
+    """获取文章列表，支持分页（skip/limit 或 before/after 游标）、按作者筛选、搜索和分类过滤
+
+    响应经 post_cache 缓存，支持 ETag / If-None-Match
+    """
+    if search and (before or after):
+        raise HTTPException(status_code=400, detail="Cursor pagination is not supported with search")
+    key = post_cache.key(request)
+    entry = post_cache.get(key)
+    if entry is None:
+        generation = post_cache.generation
+        posts = crud.get_posts(db, skip=skip, limit=limit, author_id=author_id, 
+                              search=search, category=category, before=before, after=after)
+        entry = post_cache.put(
+            key, dump_json(list[schemas.PostWithAuthor], posts),
+            list_tags(posts, author_id=author_id, category=category, search=search),
+            headers=cursor_headers(posts), generation=generation,
+        )
+    return post_cache.respond(entry, request.headers.get("if-none-match"))
 
 @app.get("/api/posts/{post_id}", response_model=schemas.PostWithAuthor)
-def read_post(post_id: int, db: Session = Depends(get_db)):
-    """获取单篇文章详情并增加浏览次数"""
-    post = crud.get_post_by_id(db, post_id)
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+def read_post(post_id: int, request: Request, db: Session = Depends(get_db)):
+    """获取单篇文章详情并增加浏览次数
+
+    除浏览次数外的内容经 post_cache 缓存，支持 ETag / If-None-Match（304 也计一次浏览）
+    """
+    key = post_cache.key(request)
+    entry = post_cache.get(key)
+    if entry is None:
+        generation = post_cache.generation
+        post = crud.get_post_by_id(db, post_id)
+        if not post:
+            raise HTTPException(status_code=404, detail="Post not found")
+        entry = post_cache.put(
+            key, dump_json(schemas.PostWithAuthor, post, exclude={"views"}), detail_tags(post),
+            meta={"views": post.views or 0}, generation=generation,
+        )
     
-    # 增加浏览次数
-    crud.increment_post_views(db, post_id)
+    # 浏览次数先计入内存缓冲，由后台任务批量写回
+    client = (request.client.host if request.client else None, request.headers.get("user-agent"))
+    view_counter.record(post_id, client)
     
-    # 重新获取更新后的文章（包含新的浏览次数）
-    post = crud.get_post_by_id(db, post_id)
-    return post
+    # 返回数据库中的值加上尚未写回的次数，拼接在缓存的响应体末尾
+    views = entry.meta["views"] + view_counter.pending(post_id)
+    body = entry.body[:-1] + b',"views":%d}' % views
+    return post_cache.respond(entry, request.headers.get("if-none-match"), body=body)
 
 @app.post("/api/posts", response_model=schemas.Post, status_code=status.HTTP_201_CREATED)
 def create_post(
     post: schemas.PostCreate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """创建文章（仅管理员）"""
@@ -226,7 +349,7 @@ def create_post(
 def update_post(
     post_id: int,
     post_update: schemas.PostUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """更新文章（仅作者或管理员）"""
@@ -244,7 +367,7 @@ def update_post(
 @app.delete("/api/posts/{post_id}")
 def delete_post(
     post_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """删除文章（仅作者或管理员）"""
@@ -267,7 +390,7 @@ def read_root():
 
 @app.get("/api/categories")
 def get_categories(
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取当前用户的所有分类"""
@@ -276,7 +399,7 @@ def get_categories(
 @app.post("/api/categories", status_code=status.HTTP_201_CREATED)
 def create_category(
     category: schemas.LinkCategoryCreate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """创建分类"""
@@ -286,7 +409,7 @@ def create_category(
 def update_category(
     category_id: int,
     category_update: schemas.LinkCategoryUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """更新分类"""
@@ -298,7 +421,7 @@ def update_category(
 @app.delete("/api/categories/{category_id}")
 def delete_category(
     category_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """删除分类"""
@@ -312,7 +435,7 @@ def delete_category(
 @app.get("/api/links")
 def get_links(
     category_id: int = None,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取当前用户的链接,可选按分类筛选"""
@@ -321,7 +444,7 @@ def get_links(
 @app.post("/api/links", status_code=status.HTTP_201_CREATED)
 def create_link(
     link: schemas.WebsiteLinkCreate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """创建链接"""
@@ -336,7 +459,7 @@ def create_link(
 def update_link(
     link_id: int,
     link_update: schemas.WebsiteLinkUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """更新链接"""
@@ -354,7 +477,7 @@ def update_link(
 @app.delete("/api/links/{link_id}")
 def delete_link(
     link_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """删除链接"""
@@ -365,16 +488,31 @@ def delete_link(
 
 
 # ==================== 同步观影 API ====================
-from . import sync_room_crud
-from typing import List
+from . import sync_room_crud, sync_room_crud_async
+from typing import List, Optional
+
+def check_video_reference(mode: str, reference):
+    """校验房主提交的本地模式参考值（文件大小 / 抽样指纹 / 完整哈希），并统一为小写"""
+    if mode != "local":
+        if any(getattr(reference, name) is not None for name in ("video_size", "video_fingerprint", "video_hash")):
+            raise HTTPException(status_code=400, detail="Video fingerprint can only be set for local mode rooms")
+        return
+    for name in ("video_fingerprint", "video_hash"):
+        value = getattr(reference, name)
+        if value is not None:
+            normalized = video_fingerprint.normalize(value)
+            if normalized is None:
+                raise HTTPException(status_code=400, detail=f"{name} must be a SHA-256 hex digest")
+            setattr(reference, name, normalized)
 
 @app.post("/api/sync-rooms", response_model=schemas.SyncRoomInfo)
 def create_sync_room(
     room: schemas.SyncRoomCreate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """创建同步观影房间"""
+    check_video_reference(room.mode, room)
     db_room = sync_room_crud.create_room(db, room, current_user.id)
     
     # 获取成员数量
@@ -388,7 +526,7 @@ def create_sync_room(
 @app.get("/api/sync-rooms/code/{room_code}", response_model=schemas.SyncRoomInfo)
 def get_room_by_code(
     room_code: str,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """通过房间代码获取房间信息"""
@@ -407,7 +545,7 @@ def get_room_by_code(
 @app.get("/api/sync-rooms/{room_id}", response_model=schemas.SyncRoomInfo)
 def get_room(
     room_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取房间详细信息"""
@@ -429,19 +567,23 @@ def get_room(
 
 @app.get("/api/sync-rooms", response_model=List[schemas.SyncRoomInfo])
 def get_user_rooms(
-    current_user: models.User = Depends(get_current_user),
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
     skip: int = 0,
-    limit: int = 20
+    limit: int = 20,
+    before: str = None,
+    after: str = None
 ):
     """获取用户参与的房间列表"""
-    rooms = sync_room_crud.get_user_rooms(db, current_user.id, skip, limit)
+    rooms = sync_room_crud.get_user_rooms(db, current_user.id, skip, limit, before=before, after=after)
+    set_cursor_headers(response, rooms)
     return rooms
 
 @app.post("/api/sync-rooms/{room_id}/join")
 def join_sync_room(
     room_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """加入房间"""
@@ -449,18 +591,22 @@ def join_sync_room(
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    member = sync_room_crud.join_room(db, room_id, current_user.id)
+    member = sync_room_crud.join_room(db, room_id, current_user.id,
+                                      verified=not video_fingerprint.requires_verification(room))
+    # 已建立的 Socket.IO 连接无需重连即可在该房间发送事件
+    memberships.grant(current_user.id, room_id)
     
     return {
         "message": "Joined room successfully",
         "room_id": room_id,
-        "member_id": member.id
+        "member_id": member.id,
+        "is_verified": member.is_verified
     }
 
 @app.post("/api/sync-rooms/code/{room_code}/join")
 def join_sync_room_by_code(
     room_code: str,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """通过房间代码加入房间"""
@@ -468,19 +614,22 @@ def join_sync_room_by_code(
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    member = sync_room_crud.join_room(db, room.id, current_user.id)
+    member = sync_room_crud.join_room(db, room.id, current_user.id,
+                                      verified=not video_fingerprint.requires_verification(room))
+    memberships.grant(current_user.id, room.id)
     
     return {
         "message": "Joined room successfully",
         "room_id": room.id,
         "room_code": room.room_code,
-        "member_id": member.id
+        "member_id": member.id,
+        "is_verified": member.is_verified
     }
 
 @app.post("/api/sync-rooms/{room_id}/leave")
 def leave_sync_room(
     room_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """离开房间"""
@@ -488,12 +637,15 @@ def leave_sync_room(
     if not success:
         raise HTTPException(status_code=404, detail="Not in this room")
     
+    # 房主离开会修改控制模式，丢弃内存中的房间状态
+    state_engine.invalidate(room_id)
+    
     return {"message": "Left room successfully"}
 
 @app.delete("/api/sync-rooms/{room_id}")
 def close_sync_room(
     room_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """关闭房间(仅房主，且房间必须为空)"""
@@ -504,16 +656,18 @@ def close_sync_room(
     if room.host_user_id != current_user.id:
         raise HTTPException(status_code=403, detail="只有房主可以关闭房间")
     
+    state_engine.invalidate(room_id)
     success, message = sync_room_crud.close_room(db, room_id)
     if not success:
         raise HTTPException(status_code=400, detail=message)
+    memberships.revoke_rooms([room_id])
     
     return {"message": message}
 
 @app.get("/api/sync-rooms/{room_id}/members", response_model=List[schemas.SyncRoomMemberInfo])
 def get_room_members(
     room_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取房间成员列表"""
@@ -532,12 +686,15 @@ def get_room_members(
 @app.get("/api/sync-rooms/{room_id}/messages", response_model=List[schemas.SyncRoomMessage])
 def get_room_messages(
     room_id: int,
-    current_user: models.User = Depends(get_current_user),
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
     skip: int = 0,
-    limit: int = 50
+    limit: int = 50,
+    before: str = None,
+    after: str = None
 ):
-    """获取房间聊天记录"""
+    """获取房间聊天记录，向上翻看历史时传入 before=X-Next-Cursor"""
     room = sync_room_crud.get_room_by_id(db, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
@@ -546,14 +703,15 @@ def get_room_messages(
     if not sync_room_crud.is_room_member(db, room_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not a room member")
     
-    messages = sync_room_crud.get_room_messages(db, room_id, skip, limit)
+    messages = sync_room_crud.get_room_messages(db, room_id, skip, limit, before=before, after=after)
+    set_cursor_headers(response, messages)
     return messages
 
 @app.put("/api/sync-rooms/{room_id}", response_model=schemas.SyncRoomInfo)
 def update_sync_room(
     room_id: int,
     room_update: schemas.SyncRoomUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """更新房间信息(仅房主)"""
@@ -563,7 +721,10 @@ def update_sync_room(
     
     if room.host_user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Only host can update the room")
+    check_video_reference(room.mode, room_update)
     
+    # 先写回内存中的播放状态，避免覆盖本次更新
+    state_engine.invalidate(room_id)
     updated_room = sync_room_crud.update_room(db, room_id, room_update)
     
     # 获取在线成员数量
@@ -575,27 +736,244 @@ def update_sync_room(
     return room_dict
 
 
+@app.post("/api/sync-rooms/{room_id}/verify-video")
+async def verify_room_video(
+    room_id: int,
+    body: schemas.VideoVerifyRequest,
+    current_user: Principal = Depends(get_current_user)
+):
+    """本地模式成员校验自己的视频文件
+
+    优先比较文件大小 + 抽样指纹（只需读取约 1MB）；房间只有完整哈希时返回 fallback_required，
+    客户端计算整个文件的 SHA-256 后以 sha256 字段重新提交
+    """
+    # 与 Socket.IO 事件 verify_video 相同，使用异步会话，不阻塞事件循环
+    async with AsyncSessionLocal() as db:
+        room = await sync_room_crud_async.get_room_by_id(db, room_id)
+        if not room:
+            raise HTTPException(status_code=404, detail="Room not found")
+        if room.mode != "local":
+            raise HTTPException(status_code=400, detail="Room is not in local mode")
+        
+        result = await sync_room_crud_async.verify_member_video(
+            db, room, current_user.id, body.size, body.fingerprint, body.sha256
+        )
+    if result is None:
+        raise HTTPException(status_code=403, detail="Not a room member")
+    
+    if not result["fallback_required"]:
+        await emit_member_verified(room_id, current_user.id, result["verified"])
+    return result
+
+
+# ==================== 视频分片上传（上传模式房间） ====================
+
+def get_upload_room(room_id: int, current_user: Principal, db: Session) -> models.SyncRoom:
+    """校验房间存在、为上传模式且当前用户是房主"""
+    room = sync_room_crud.get_room_by_id(db, room_id)
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if room.host_user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Only host can upload videos")
+    if room.mode != "upload":
+        raise HTTPException(status_code=400, detail="Room is not in upload mode")
+    return room
+
+@app.get("/api/videos/{video_hash}")
+def check_video_exists(
+    video_hash: str,
+    size: Optional[int] = None,
+    current_user: Principal = Depends(get_current_user)
+):
+    """上传前预检：服务器是否已有该 SHA-256 的视频"""
+    blob = video_store.lookup(video_hash, size)
+    return {"exists": blob is not None, "size": blob.size if blob else None}
+
+@app.post("/api/sync-rooms/{room_id}/uploads", status_code=status.HTTP_201_CREATED)
+def create_video_upload(
+    room_id: int,
+    upload: schemas.VideoUploadCreate,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """创建分片上传会话(仅房主)
+
+    附带 sha256 且服务器已有相同视频时直接设置为房间视频，返回 deduplicated=true，无需上传
+    """
+    get_upload_room(room_id, current_user, db)
+    if upload.sha256:
+        blob = video_store.claim(upload.sha256, upload.size)
+        if blob is not None:
+            state_engine.invalidate(room_id)
+            try:
+                room = sync_room_crud.set_room_video(db, room_id, video_store.source(blob), blob.video_hash)
+            finally:
+                video_store.unpin(blob.video_hash)
+            response.status_code = status.HTTP_200_OK
+            return {
+                "deduplicated": True,
+                "room_id": room_id,
+                "video_source": room.video_source,
+                "video_hash": room.video_hash,
+                "size": blob.size,
+            }
+    referenced = set(sync_room_crud.get_video_refcounts(db))
+    session = upload_manager.create(room_id, current_user.id, upload.filename, upload.size, referenced)
+    return session.status()
+
+@app.get("/api/sync-rooms/{room_id}/uploads/{upload_id}")
+def get_video_upload(
+    room_id: int,
+    upload_id: str,
+    current_user: Principal = Depends(get_current_user)
+):
+    """查询上传进度，断点续传从 offset 或 missing 中的分片继续"""
+    session = upload_manager.get(upload_id, room_id, current_user.id)
+    return upload_manager.refresh(session).status()
+
+@app.put("/api/sync-rooms/{room_id}/uploads/{upload_id}")
+async def put_video_chunk(
+    room_id: int,
+    upload_id: str,
+    offset: int,
+    request: Request,
+    current_user: Principal = Depends(get_current_user)
+):
+    """上传 offset 处的一个分片（请求体为原始字节，可并行上传多个分片）"""
+    session = upload_manager.get(upload_id, room_id, current_user.id)
+    content_length = request.headers.get("content-length")
+    return await upload_manager.write_chunk(
+        session, offset, request.stream(),
+        content_length=int(content_length) if content_length else None,
+    )
+
+@app.post("/api/sync-rooms/{room_id}/uploads/{upload_id}/complete")
+async def complete_video_upload(
+    room_id: int,
+    upload_id: str,
+    body: schemas.VideoUploadComplete = None,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """合并分片并设置为房间视频，video_hash 为上传过程中增量计算的 SHA-256"""
+    # 数据库访问在线程池中执行，不阻塞事件循环
+    await run_in_threadpool(get_upload_room, room_id, current_user, db)
+    session = upload_manager.get(upload_id, room_id, current_user.id)
+    # 合并期间不占用数据库连接
+    db.close()
+    video_source, video_hash = await upload_manager.complete(session, body.sha256 if body else None)
+    
+    await state_engine.invalidate_async(room_id)
+    try:
+        room = await run_in_threadpool(sync_room_crud.set_room_video, db, room_id, video_source, video_hash)
+    finally:
+        # 房间已引用该视频（或关联失败），不再需要固定
+        video_store.unpin(video_hash)
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    return {
+        "room_id": room_id,
+        "video_source": room.video_source,
+        "video_hash": room.video_hash,
+        "size": session.size,
+    }
+
+@app.delete("/api/sync-rooms/{room_id}/uploads/{upload_id}")
+async def abort_video_upload(
+    room_id: int,
+    upload_id: str,
+    current_user: Principal = Depends(get_current_user)
+):
+    """取消上传并删除已收到的分片"""
+    session = upload_manager.get(upload_id, room_id, current_user.id)
+    await upload_manager.abort(session)
+    return {"message": "Upload aborted"}
+
+
+# ==================== 上传视频播放（Range） ====================
+
+def get_video_grant(
+    room_id: int,
+    request: Request,
+    token: str = None,
+    db: Session = Depends(get_db)
+) -> VideoGrant:
+    """校验当前 token 可读取房间视频（结果按 token 缓存，拖动进度不查库）
+
+    <video> 标签无法设置请求头，token 可通过查询参数传入
+    """
+    if token is None:
+        scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    grant = video_grants.get(token, room_id)
+    if grant is not None:
+        video_metrics.grant_hits += 1
+        return grant
+    video_metrics.grant_misses += 1
+    
+    version = video_grants.version(room_id)  # 读库前记下，期间房间被失效则该授权随即作废
+    current_user = get_current_user(token, db)
+    room = sync_room_crud.get_room_by_id(db, room_id)
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if room.host_user_id != current_user.id and not sync_room_crud.is_room_member(db, room_id, current_user.id):
+        raise HTTPException(status_code=403, detail="Not a room member")
+    if room.mode != "upload" or not room.video_source:
+        raise HTTPException(status_code=404, detail="Room has no uploaded video")
+    
+    grant = build_grant(room_id, current_user.id, room.video_source, room.video_hash, version)
+    if grant is None:
+        raise HTTPException(status_code=404, detail="Video file not found")
+    video_grants.set(token, grant)
+    return grant
+
+@app.api_route("/api/sync-rooms/{room_id}/video", methods=["GET", "HEAD"])
+def stream_room_video(request: Request, grant: VideoGrant = Depends(get_video_grant)):
+    """播放房间上传的视频，支持 Range / If-Range（仅房间成员）"""
+    if not os.path.exists(grant.path):
+        video_grants.invalidate_room(grant.room_id)
+        raise HTTPException(status_code=404, detail="Video file not found")
+    return video_response(grant, request.headers, request.method, video_metrics)
+
+
 # =====================================================
 # 管理员同步观影管理接口
 # =====================================================
 @app.get("/api/admin/sync-rooms")
 def admin_get_all_rooms(
-    current_user: models.User = Depends(get_current_user),
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    before: str = None,
+    after: str = None
 ):
     """管理员获取所有房间列表"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    rooms = sync_room_crud.get_all_rooms_admin(db, skip, limit)
-    return {"rooms": rooms, "total": len(rooms)}
+    rooms = sync_room_crud.get_all_rooms_admin(db, skip, limit, before=before, after=after)
+    set_cursor_headers(response, rooms)
+    return {
+        "rooms": rooms,
+        "total": len(rooms),
+        "next_cursor": rooms.next_cursor,
+        "prev_cursor": rooms.prev_cursor,
+    }
 
 @app.get("/api/admin/sync-rooms/{room_id}")
 def admin_get_room_detail(
     room_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """管理员获取房间详情"""
@@ -633,7 +1011,7 @@ def admin_get_room_detail(
 def admin_update_room(
     room_id: int,
     room_update: schemas.SyncRoomUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """管理员编辑房间（不限制房主）"""
@@ -644,6 +1022,7 @@ def admin_update_room(
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
+    state_engine.invalidate(room_id)
     updated_room = sync_room_crud.update_room(db, room_id, room_update)
     
     return {
@@ -659,23 +1038,25 @@ def admin_update_room(
 @app.delete("/api/admin/sync-rooms/{room_id}")
 def admin_delete_room(
     room_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """管理员删除房间"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
+    state_engine.invalidate(room_id)
     success = sync_room_crud.delete_room_admin(db, room_id)
     if not success:
         raise HTTPException(status_code=404, detail="Room not found")
+    memberships.revoke_rooms([room_id])
     
     return {"message": "Room deleted successfully"}
 
 @app.get("/api/admin/sync-rooms/{room_id}/messages", response_model=List[schemas.SyncRoomMessage])
 def admin_get_room_messages(
     room_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 50
@@ -693,16 +1074,41 @@ def admin_get_room_messages(
 
 @app.post("/api/admin/sync-rooms/cleanup")
 def admin_cleanup_empty_rooms(
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
-    minutes: int = 10
+    minutes: int = 10,
+    dry_run: bool = False
 ):
-    """管理员手动清理空房间"""
+    """管理员手动清理空房间，dry_run=true 时只返回将被清理的房间"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    deleted_count = sync_room_crud.cleanup_empty_rooms(db, minutes)
-    return {"message": f"Cleaned up {deleted_count} empty rooms"}
+    report = sync_room_crud.cleanup_empty_rooms(db, minutes, dry_run=dry_run)
+    if not dry_run:
+        memberships.revoke_rooms(report.room_ids)
+    action = "Would clean up" if dry_run else "Cleaned up"
+    return {"message": f"{action} {report.rooms} empty rooms", **report.as_dict()}
+
+@app.get("/api/admin/metrics")
+def admin_get_metrics(current_admin: Principal = Depends(get_current_admin)):
+    """管理员查看运行指标"""
+    return {
+        "chat_pipeline": {**chat_pipeline.metrics.as_dict(), "backlog": chat_pipeline.backlog},
+        "sync_scheduler": sync_scheduler.metrics.as_dict(),
+        "auth_cache": auth_cache.stats(),
+        "password_hasher": password_hasher.metrics.as_dict(),
+        "view_counter": view_counter.metrics.as_dict(),
+        "response_cache": post_cache.metrics.as_dict(),
+        "video_upload": upload_manager.metrics.as_dict(),
+        "video_store": video_store.metrics.as_dict(),
+        "video_stream": {**video_metrics.as_dict(), "grants": video_grants.stats()},
+        "db_pool": db_pool.stats(pool_metrics),
+        "account_purge": account_purger.metrics.as_dict(),
+        "room_events": room_events.stats(),
+        "wire_format": wire_format.metrics.as_dict(),
+        "socket_rate_limit": rate_limiter.stats(),
+        "socket_memberships": {"users": len(memberships)},
+    }
 
 
 # =====================================================
@@ -722,3 +1128,39 @@ async def startup_event():
     # 启动空房间清理任务
     asyncio.create_task(background_tasks.cleanup_task(interval_minutes=5, empty_timeout_minutes=10))
     print("✅ 同步观影空房间清理任务已启动")
+    
+    # 启动房间播放状态写回任务
+    state_engine.start()
+    memberships.start()
+    print("✅ 房间状态写回任务已启动")
+    
+    # 启动聊天消息批量写入任务
+    chat_pipeline.start()
+    print("✅ 聊天消息写回任务已启动")
+    
+    # 启动播放进度心跳任务
+    sync_scheduler.start(emit_time_heartbeat)
+    print("✅ 进度心跳任务已启动")
+    
+    # 启动浏览次数写回任务
+    view_counter.start()
+    print("✅ 浏览次数写回任务已启动")
+    
+    # 启动密码哈希进程池
+    password_hasher.start()
+    print("✅ 密码哈希进程池已启动")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时执行"""
+    await sync_scheduler.shutdown()
+    password_hasher.shutdown()
+    
+    # 写回队列中尚未保存的聊天消息
+    await chat_pipeline.shutdown()
+    
+    # 写回缓冲中的浏览次数
+    await view_counter.shutdown()
+    
+    # 写回内存中尚未持久化的房间状态
+    await state_engine.shutdown()
@@ -0,0 +1,92 @@
+"""
+数据库迁移脚本 - 为热点查询添加组合索引和成员唯一约束
+已有数据库执行 create_all 不会给旧表补索引，运行此脚本补齐 models.py 中声明的:
+- sync_room_members(room_id, user_id) 唯一索引（创建前合并重复的成员记录）
+- sync_room_members(room_id, is_online)
+- posts(category, created_at, id)
+- website_links(user_id, category_id, created_at)
+以及 scripts/database/add_pagination_indexes.py 中的游标分页索引（已存在的跳过）
+
+建完后可运行 scripts/database/index_advisor.py 检查是否还有全表扫描的查询
+"""
+import sys
+import os
+
+# 添加父目录到路径以允许导入 backend 包
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parent_path)
+
+from sqlalchemy import func, inspect
+from sqlalchemy.orm import Session
+
+from backend.database import engine
+from backend import models
+
+INDEXED_MODELS = [
+    models.User, models.Post, models.WebsiteLink,
+    models.SyncRoom, models.SyncRoomMember, models.SyncRoomMessage,
+]
+
+
+def merge_duplicate_members():
+    """合并同一房间同一用户的多条成员记录: 保留最早的一条，任一条在线则在线"""
+    Member = models.SyncRoomMember
+    with Session(engine) as db:
+        duplicates = db.query(Member.room_id, Member.user_id).group_by(
+            Member.room_id, Member.user_id
+        ).having(func.count(Member.id) > 1).all()
+
+        for room_id, user_id in duplicates:
+            rows = db.query(Member).filter(
+                Member.room_id == room_id, Member.user_id == user_id
+            ).order_by(Member.id).all()
+            keep, extra = rows[0], rows[1:]
+            keep.is_online = any(row.is_online for row in rows)
+            keep.last_active_at = max((row.last_active_at for row in rows if row.last_active_at), default=None)
+            for row in extra:
+                db.delete(row)
+        db.commit()
+    return len(duplicates)
+
+
+def create_query_indexes():
+    """创建缺失的组合索引"""
+    print("正在检查重复的房间成员记录...")
+    try:
+        merged = merge_duplicate_members()
+        print(f"✅ 合并了 {merged} 组重复成员记录" if merged else "✅ 没有重复的成员记录")
+
+        inspector = inspect(engine)
+        for model in INDEXED_MODELS:
+            table = model.__table__
+            if not inspector.has_table(table.name):
+                print(f"⚠️ 表 {table.name} 不存在，跳过")
+                continue
+
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if len(index.columns) < 2:
+                    continue
+                if index.name in existing:
+                    print(f"- {table.name}.{index.name} 已存在")
+                    continue
+                print(f"正在创建 {table.name}.{index.name} ...")
+                index.create(bind=engine)
+                print(f"✅ 成功创建 {table.name}.{index.name}")
+    except Exception as e:
+        print(f"❌ 创建索引时出错: {e}")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("热点查询组合索引 - 数据库迁移")
+    print("=" * 50)
+
+    success = create_query_indexes()
+
+    if success:
+        print("\n✅ 迁移完成!")
+    else:
+        print("\n❌ 迁移失败,请检查错误信息。")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -17,6 +17,10 @@ class User(Base):
 
     posts = relationship("Post", back_populates="author")
 
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),  # 游标分页
+    )
+
 class Post(Base):
     __tablename__ = "posts"
 
@@ -30,6 +34,13 @@ class Post(Base):
 
     author = relationship("User", back_populates="posts")
 
+    __table_args__ = (
+        # 游标分页: 全部文章 / 按作者筛选
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_author_created_at_id", "author_id", "created_at", "id"),
+        Index("ix_posts_category_created_at_id", "category", "created_at", "id"),  # 按分类筛选
+    )
+
 class LinkCategory(Base):
     __tablename__ = "link_categories"
 
@@ -56,6 +67,11 @@ class WebsiteLink(Base):
     category = relationship("LinkCategory", back_populates="links")
     user = relationship("User")
 
+    __table_args__ = (
+        # 用户的链接列表（可按分类筛选），按创建时间倒序
+        Index("ix_website_links_user_category_created_at", "user_id", "category_id", "created_at"),
+    )
+
 # 同步观影房间表
 class SyncRoom(Base):
     __tablename__ = "sync_rooms"
@@ -68,6 +84,8 @@ class SyncRoom(Base):
     mode = Column(String(20), default="link", nullable=False)  # link=外链, upload=上传, local=本地
     video_source = Column(Text, nullable=True)  # 视频链接或文件路径
     video_hash = Column(String(64), nullable=True)  # 文件哈希值(模式二使用)
+    video_size = Column(BigInteger, nullable=True)  # 文件大小(本地模式校验使用)
+    video_fingerprint = Column(String(64), nullable=True)  # 抽样指纹(本地模式校验使用，见 video_fingerprint.py)
     current_time = Column(Integer, default=0)  # 当前播放时间(秒)
     is_playing = Column(Boolean, default=False)  # 播放状态
     is_active = Column(Boolean, default=True)  # 房间是否活跃
@@ -78,6 +96,10 @@ class SyncRoom(Base):
     members = relationship("SyncRoomMember", back_populates="room", cascade="all, delete-orphan")
     messages = relationship("SyncRoomMessage", back_populates="room", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_sync_rooms_active_created_at_id", "is_active", "created_at", "id"),  # 游标分页
+    )
+
 # 房间成员表
 class SyncRoomMember(Base):
     __tablename__ = "sync_room_members"
@@ -94,6 +116,12 @@ class SyncRoomMember(Base):
     room = relationship("SyncRoom", back_populates="members")
     user = relationship("User")
 
+    __table_args__ = (
+        # 每个用户在房间中只有一条成员记录（并发加入时由数据库保证），同时用于成员查找
+        Index("uq_sync_room_members_room_user", "room_id", "user_id", unique=True),
+        Index("ix_sync_room_members_room_online", "room_id", "is_online"),  # 在线成员列表 / 在线人数
+    )
+
 # 房间聊天消息表
 class SyncRoomMessage(Base):
     __tablename__ = "sync_room_messages"
@@ -105,4 +133,8 @@ class SyncRoomMessage(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     room = relationship("SyncRoom", back_populates="messages")
-    user = relationship("User")
\ No newline at end of file
+    user = relationship("User")
+
+    __table_args__ = (
+        Index("ix_sync_room_messages_room_created_at_id", "room_id", "created_at", "id"),  # 聊天记录翻页
+    )
\ No newline at end of file
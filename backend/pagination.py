@@ -0,0 +1,87 @@
+"""
+游标分页（keyset pagination）
+
+按 (created_at, id) 倒序翻页，翻到深处也只需沿索引定位，不像 OFFSET 需要逐行跳过。
+游标是不透明的字符串，由最后一条记录的 (created_at, id) 编码而来:
+- before=<游标>  更早的一页（向下翻 / 向上翻聊天记录）
+- after=<游标>   更新的一页
+不传游标时仍使用 skip/limit（兼容旧客户端）
+"""
+import base64
+from datetime import datetime
+from typing import Callable, Iterable, Optional, Tuple
+
+from sqlalchemy import or_
+
+
+class InvalidCursor(ValueError):
+    """游标无法解析"""
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+
+
+class CursorPage(list):
+    """一页结果，附带前后页游标（本身仍是 list，旧调用方不受影响）"""
+    next_cursor: Optional[str] = None  # 更早一页，用作 before
+    prev_cursor: Optional[str] = None  # 更新一页，用作 after
+
+    def with_items(self, items: Iterable) -> "CursorPage":
+        """替换内容并保留游标"""
+        page = CursorPage(items)
+        page.next_cursor = self.next_cursor
+        page.prev_cursor = self.prev_cursor
+        return page
+
+
+def keyset_page(query, created_col, id_col, limit: int, skip: int = 0,
+                before: Optional[str] = None, after: Optional[str] = None,
+                key: Callable = lambda row: row) -> CursorPage:
+    """执行分页查询，结果按 (created_at, id) 倒序
+
+    Args:
+        query: 未排序的查询
+        created_col / id_col: 排序列
+        key: 从结果行取出带 created_at、id 属性的对象（多列查询时使用）
+    """
+    if after:
+        created_at, row_id = decode_cursor(after)
+        query = query.filter(
+            created_col >= created_at,
+            or_(created_col > created_at, id_col > row_id),
+        ).order_by(created_col.asc(), id_col.asc())
+        rows = list(reversed(query.limit(limit).all()))
+        has_newer, has_older = len(rows) == limit, True
+    else:
+        if before:
+            created_at, row_id = decode_cursor(before)
+            # 先用 created_at 的范围条件让索引定位，再排除同一时间戳内已翻过的行
+            query = query.filter(
+                created_col <= created_at,
+                or_(created_col < created_at, id_col < row_id),
+            )
+        query = query.order_by(created_col.desc(), id_col.desc())
+        if not before:
+            query = query.offset(skip)
+        rows = query.limit(limit).all()
+        has_newer, has_older = bool(before or skip), len(rows) == limit
+
+    page = CursorPage(rows)
+    if rows:
+        newest, oldest = key(rows[0]), key(rows[-1])
+        if has_older and oldest.created_at is not None:
+            page.next_cursor = encode_cursor(oldest.created_at, oldest.id)
+        if has_newer and newest.created_at is not None:
+            page.prev_cursor = encode_cursor(newest.created_at, newest.id)
+    return page
@@ -0,0 +1,151 @@
+"""
+密码哈希执行器
+
+bcrypt 每次计算约 250ms 纯 CPU（cost=12），放在接口线程池里会占满所有
+同步接口的工作线程。这里把哈希和校验交给独立的进程池：
+- 进程数默认等于 CPU 核数，互不抢占 GIL
+- 排队中的任务超过上限时直接拒绝（接口返回 503），不无限堆积
+- cost 可配置，登录时发现存量哈希 cost 与配置不同会透明重算
+
+子进程只导入本模块（bcrypt + config），不加载 FastAPI 应用
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import bcrypt
+
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+
+def _password_bytes(password: str) -> bytes:
+    # bcrypt 只使用前 72 字节
+    return password.encode('utf-8')[:72]
+
+
+def hash_password(password: str, rounds: int) -> str:
+    """生成密码哈希（在子进程中执行）"""
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def check_password(password: str, hashed_password: str) -> bool:
+    """校验密码（在子进程中执行）"""
+    hashed_bytes = hashed_password.encode('utf-8') if isinstance(hashed_password, str) else hashed_password
+    return bcrypt.checkpw(_password_bytes(password), hashed_bytes)
+
+
+def hash_rounds(hashed_password: str) -> Optional[int]:
+    """读取哈希中的 cost，格式 $2b$12$..."""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class HasherOverloaded(Exception):
+    """排队中的哈希任务已达上限"""
+
+
+@dataclass
+class PasswordHasherMetrics:
+    """哈希执行器统计"""
+    completed: int = 0
+    failed: int = 0  # 执行器抛出异常的任务（进程池损坏、哈希格式错误等），不计入耗时
+    rejected: int = 0  # 因排队已满被拒绝的请求
+    rehashed: int = 0  # 登录时按新 cost 重算的哈希
+    in_flight: int = 0
+    max_in_flight: int = 0
+    total_ms: float = 0.0  # 提交到完成的累计耗时（含排队）
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data["avg_ms"] = round(self.total_ms / self.completed, 2) if self.completed else 0
+        data["total_ms"] = round(self.total_ms, 2)
+        return data
+
+
+class PasswordHasher:
+    """进程池哈希执行器
+
+    Args:
+        rounds: bcrypt cost
+        workers: 子进程数，0 表示在默认线程池中执行（测试或单核环境）
+        max_pending: 同时排队+执行的任务上限
+    """
+
+    def __init__(self, rounds: int = 12, workers: Optional[int] = None, max_pending: int = 64):
+        self.rounds = rounds
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending
+        self.metrics = PasswordHasherMetrics()
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            # 使用 spawn，避免在已有线程的服务进程中 fork
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info(f"密码哈希进程池启动 - 进程数:{self.workers}, 排队上限:{self.max_pending}, cost:{self.rounds}")
+        return self._executor
+
+    def start(self):
+        """启动时预先拉起子进程，避免首个登录请求承担进程启动耗时"""
+        executor = self._get_executor()
+        if executor is not None:
+            for _ in range(self.workers):
+                executor.submit(hash_rounds, "")
+
+    async def _run(self, func, *args):
+        if self.metrics.in_flight >= self.max_pending:
+            self.metrics.rejected += 1
+            raise HasherOverloaded()
+
+        self.metrics.in_flight += 1
+        self.metrics.max_in_flight = max(self.metrics.max_in_flight, self.metrics.in_flight)
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), func, *args)
+        except BaseException:
+            self.metrics.failed += 1
+            raise
+        finally:
+            self.metrics.in_flight -= 1
+        self.metrics.completed += 1
+        self.metrics.total_ms += (time.perf_counter() - start) * 1000
+        return result
+
+    async def hash(self, password: str) -> str:
+        """按配置的 cost 生成密码哈希"""
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """校验密码"""
+        return await self._run(check_password, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """存量哈希的 cost 与配置不同"""
+        return hash_rounds(hashed_password) != self.rounds
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    rounds=config.BCRYPT_ROUNDS,
+    workers=config.PASSWORD_HASH_WORKERS,
+    max_pending=config.PASSWORD_HASH_MAX_PENDING,
+)
@@ -0,0 +1,263 @@
+"""
+文章全文搜索
+
+替代 title/content 上的 LIKE '%词%' 全表扫描:
+- MySQL: posts(title, content) 上的 FULLTEXT 索引（ngram parser），由 InnoDB 自动维护，
+  索引由 scripts/database/add_posts_fulltext_index.py 创建
+- SQLite: FTS5 虚拟表 posts_search，文本预先按 ngram 规则切分后写入，
+  由 crud 的 create_post / update_post / delete_post 在同一事务内增量更新
+
+切分规则与 MySQL ngram_token_size=2 保持一致：中文按二元组切分，英文数字按单词。
+查询词包含单个汉字或单个字母时无法用二元组索引命中，回退到 LIKE
+"""
+import html
+import logging
+import re
+import threading
+from typing import Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from .config import config
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZE = 2
+TITLE_WEIGHT = 5.0  # 标题命中的权重
+SNIPPET_WIDTH = 120
+
+_CJK = r"㐀-䶿一-鿿豈-﫿"
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[0-9A-Za-z]+")
+_CJK_RE = re.compile(rf"[{_CJK}]")
+
+
+class SearchHit(NamedTuple):
+    post_id: int
+    score: float
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """切分文本：中文连续片段切为二元组，英文数字按单词（小写）"""
+    tokens = []
+    for run in _TOKEN_RE.findall(value or ""):
+        if _CJK_RE.match(run):
+            if len(run) <= NGRAM_SIZE:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + NGRAM_SIZE] for i in range(len(run) - NGRAM_SIZE + 1))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+def query_terms(search: str) -> List[str]:
+    """按空白拆分查询词，去掉没有可索引字符的词"""
+    return [term for term in search.split() if _TOKEN_RE.search(term)]
+
+
+def _indexable(terms: List[str]) -> bool:
+    """每个词切分后都不短于 ngram 长度才能走索引"""
+    return bool(terms) and all(
+        len(run) >= NGRAM_SIZE for term in terms for run in _TOKEN_RE.findall(term)
+    )
+
+
+def make_snippet(value: Optional[str], terms: Iterable[str], width: int = SNIPPET_WIDTH) -> str:
+    """截取首个命中位置附近的文本，命中词用 <mark> 标出（其余文本已做 HTML 转义）"""
+    value = value or ""
+    pattern = re.compile("|".join(re.escape(term) for term in sorted(set(terms), key=len, reverse=True)), re.I)
+    match = pattern.search(value)
+    start = max(0, match.start() - width // 3) if match else 0
+    window = value[start:start + width]
+
+    parts = []
+    last = 0
+    for m in pattern.finditer(window):
+        parts.append(html.escape(window[last:m.start()]))
+        parts.append(f"<mark>{html.escape(m.group())}</mark>")
+        last = m.end()
+    parts.append(html.escape(window[last:]))
+
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if start + width < len(value) else ""
+    return prefix + "".join(parts) + suffix
+
+
+class MySQLFulltextSearch:
+    """MySQL FULLTEXT (ngram) 搜索，索引由 InnoDB 维护，增量更新无需额外操作"""
+
+    def __init__(self):
+        self.available: Optional[bool] = None
+
+    def ensure_ready(self, db: Session) -> bool:
+        if self.available is None:
+            count = db.execute(text(
+                "SELECT COUNT(*) FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'posts' AND INDEX_TYPE = 'FULLTEXT'"
+            )).scalar()
+            self.available = bool(count)
+            if not self.available:
+                logger.warning("posts 表缺少 FULLTEXT 索引，搜索回退到 LIKE；"
+                               "请运行 scripts/database/add_posts_fulltext_index.py")
+        return self.available
+
+    def search(self, db: Session, terms: List[str], skip: int, limit: int,
+               author_id: Optional[int] = None, category: Optional[str] = None) -> List[SearchHit]:
+        # 每个词作为短语且必须出现；相关度按自然语言模式计算
+        boolean_query = " ".join('+"{}"'.format(term.replace('"', "")) for term in terms)
+        filters = ""
+        params = {"nl": " ".join(terms), "bq": boolean_query, "skip": skip, "limit": limit}
+        if author_id:
+            filters += " AND author_id = :author_id"
+            params["author_id"] = author_id
+        if category:
+            filters += " AND category = :category"
+            params["category"] = category
+
+        rows = db.execute(text(
+            "SELECT id, MATCH(title, content) AGAINST (:nl IN NATURAL LANGUAGE MODE) AS score "
+            "FROM posts "
+            "WHERE MATCH(title, content) AGAINST (:bq IN BOOLEAN MODE)" + filters +
+            " ORDER BY score DESC, created_at DESC LIMIT :limit OFFSET :skip"
+        ), params)
+        return [SearchHit(row.id, float(row.score)) for row in rows]
+
+    def index_post(self, db: Session, post):
+        pass
+
+    def remove_post(self, db: Session, post_id: int):
+        pass
+
+    def remove_posts(self, db: Session, post_ids: List[int]):
+        pass
+
+
+class SQLiteFTSSearch:
+    """SQLite FTS5 搜索，rowid 即文章 id，写入预先切分好的文本"""
+
+    def __init__(self):
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def ensure_ready(self, db: Session) -> bool:
+        """首次使用时建表，并在条目数与 posts 不一致时重建索引"""
+        if self._ready:
+            return True
+        with self._lock:
+            if self._ready:
+                return True
+            db.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS posts_search "
+                "USING fts5(title, content, tokenize='unicode61')"
+            ))
+            indexed = db.execute(text("SELECT COUNT(*) FROM posts_search")).scalar()
+            total = db.execute(text("SELECT COUNT(*) FROM posts")).scalar()
+            if indexed != total:
+                logger.info(f"重建文章搜索索引: {indexed} -> {total} 条")
+                self.rebuild(db)
+            db.commit()
+            self._ready = True
+        return True
+
+    def rebuild(self, db: Session, batch_size: int = 1000):
+        db.execute(text("DELETE FROM posts_search"))
+        last_id = 0
+        while True:
+            rows = db.execute(text(
+                "SELECT id, title, content FROM posts WHERE id > :last ORDER BY id LIMIT :size"
+            ), {"last": last_id, "size": batch_size}).all()
+            if not rows:
+                break
+            db.execute(
+                text("INSERT INTO posts_search(rowid, title, content) VALUES (:id, :title, :content)"),
+                [self._document(row.id, row.title, row.content) for row in rows],
+            )
+            last_id = rows[-1].id
+
+    @staticmethod
+    def _document(post_id: int, title: Optional[str], content: Optional[str]) -> dict:
+        return {"id": post_id, "title": " ".join(tokenize(title)), "content": " ".join(tokenize(content))}
+
+    def search(self, db: Session, terms: List[str], skip: int, limit: int,
+               author_id: Optional[int] = None, category: Optional[str] = None) -> List[SearchHit]:
+        # 每个词切分后作为短语（保证原文连续出现），词之间 AND；最后一个单词允许前缀匹配
+        match = " AND ".join('"{}"*'.format(" ".join(tokenize(term))) for term in terms)
+        filters = ""
+        params = {"match": match, "skip": skip, "limit": limit}
+        if author_id:
+            filters += " AND posts.author_id = :author_id"
+            params["author_id"] = author_id
+        if category:
+            filters += " AND posts.category = :category"
+            params["category"] = category
+
+        rows = db.execute(text(
+            f"SELECT posts.id AS id, -bm25(posts_search, {TITLE_WEIGHT}, 1.0) AS score "
+            "FROM posts_search JOIN posts ON posts.id = posts_search.rowid "
+            "WHERE posts_search MATCH :match" + filters +
+            " ORDER BY score DESC, posts.created_at DESC LIMIT :limit OFFSET :skip"
+        ), params)
+        return [SearchHit(row.id, round(float(row.score), 4)) for row in rows]
+
+    def index_post(self, db: Session, post):
+        """在调用方事务内写入（或替换）文章的索引"""
+        if not self.ensure_ready(db):
+            return
+        self.remove_post(db, post.id)
+        db.execute(
+            text("INSERT INTO posts_search(rowid, title, content) VALUES (:id, :title, :content)"),
+            self._document(post.id, post.title, post.content),
+        )
+
+    def remove_post(self, db: Session, post_id: int):
+        if self.ensure_ready(db):
+            db.execute(text("DELETE FROM posts_search WHERE rowid = :id"), {"id": post_id})
+
+    def remove_posts(self, db: Session, post_ids: List[int]):
+        if post_ids and self.ensure_ready(db):
+            db.execute(
+                text("DELETE FROM posts_search WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True)),
+                {"ids": list(post_ids)},
+            )
+
+
+class PostSearch:
+    """根据数据库类型选择搜索后端；无可用后端时 search 返回 None，由调用方使用 LIKE"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def search(self, db: Session, search: str, skip: int = 0, limit: int = 100,
+               author_id: Optional[int] = None, category: Optional[str] = None) -> Optional[List[SearchHit]]:
+        terms = query_terms(search)
+        if self.backend is None or not _indexable(terms) or not self.backend.ensure_ready(db):
+            return None
+        return self.backend.search(db, terms, skip, limit, author_id=author_id, category=category)
+
+    def index_post(self, db: Session, post):
+        if self.backend is not None:
+            self.backend.index_post(db, post)
+
+    def remove_post(self, db: Session, post_id: int):
+        if self.backend is not None:
+            self.backend.remove_post(db, post_id)
+
+    def remove_posts(self, db: Session, post_ids: List[int]):
+        if self.backend is not None:
+            self.backend.remove_posts(db, post_ids)
+
+
+def create_post_search(dialect: str, mode: str = "auto") -> PostSearch:
+    """mode: auto（按数据库类型选择）或 like（始终使用 LIKE）"""
+    if mode == "like":
+        return PostSearch(None)
+    if dialect == "mysql":
+        return PostSearch(MySQLFulltextSearch())
+    if dialect == "sqlite":
+        return PostSearch(SQLiteFTSSearch())
+    return PostSearch(None)
+
+
+post_search = create_post_search(engine.dialect.name, config.POST_SEARCH_BACKEND)
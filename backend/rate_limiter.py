@@ -0,0 +1,137 @@
+"""
+Socket.IO 事件限流
+
+每个连接（sid）的每种事件各有一个令牌桶: 以 rate 个/秒补充，最多积攒 burst 个。
+事件到达时先取令牌，取不到就在处理函数之前丢弃或合并，不会打开数据库会话:
+- 合并（COALESCED_EVENTS）: 只保留最后一次的数据，令牌补充后执行一次。
+  播放控制、进度上报、同步请求都以最新一次为准，拖动进度条产生的连续 seek 最终只落地最后一个位置
+- 丢弃: 其余事件（聊天消息等）直接丢弃，并向客户端发送 throttled 通知；
+  持续超限期间只通知一次，令牌补满后再次超限才重新通知
+
+限额通过 SOCKET_RATE_LIMITS 配置，格式为 "事件=每秒令牌数/桶容量"，用逗号分隔；未列出的事件不限流。
+令牌桶保存在当前进程中，断开连接时清除。
+"""
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Optional, Tuple
+
+from .config import config
+
+COALESCED_EVENTS = ("playback_control", "time_update", "request_sync")
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """解析 "send_message=2/5,time_update=2/4" 为 {事件: (rate, burst)}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        event, _, value = item.partition("=")
+        rate, _, burst = value.partition("/")
+        limits[event.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+
+@dataclass
+class RateLimitMetrics:
+    """限流统计"""
+    allowed: int = 0
+    dropped: int = 0
+    coalesced: int = 0  # 被后来的数据覆盖、没有执行的事件
+    deferred: int = 0  # 令牌补充后补执行的合并事件
+    notices: int = 0
+    dropped_by_event: Dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated", "notified")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        self.notified = False  # 本段限流期间是否已通知客户端
+
+    def take(self, now: float) -> float:
+        """取一个令牌，成功返回 0，否则返回需要等待的秒数"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class EventRateLimiter:
+    """按 sid + 事件的令牌桶"""
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]]):
+        self.limits = limits
+        self.metrics = RateLimitMetrics()
+        self._buckets: Dict[str, Dict[str, TokenBucket]] = {}  # sid -> 事件 -> 令牌桶
+        self._pending: Dict[Tuple[str, str], Any] = {}  # (sid, 事件) -> 等待执行的最新数据
+
+    def acquire(self, sid: str, event: str, now: Optional[float] = None) -> float:
+        """取令牌: 允许执行返回 0，否则返回需要等待的秒数"""
+        limit = self.limits.get(event)
+        if limit is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        buckets = self._buckets.setdefault(sid, {})
+        bucket = buckets.get(event)
+        if bucket is None:
+            bucket = buckets[event] = TokenBucket(*limit, now)
+        retry_after = bucket.take(now)
+        if retry_after:
+            return retry_after
+        if bucket.tokens >= bucket.burst - 1:
+            # 令牌已补满（客户端停止了刷屏），下一段限流重新通知
+            bucket.notified = False
+        self.metrics.allowed += 1
+        return 0.0
+
+    def drop(self, sid: str, event: str) -> bool:
+        """记录一次丢弃，返回是否需要通知客户端"""
+        self.metrics.dropped += 1
+        self.metrics.dropped_by_event[event] = self.metrics.dropped_by_event.get(event, 0) + 1
+        bucket = self._buckets.get(sid, {}).get(event)
+        if bucket is None or bucket.notified:
+            return False
+        bucket.notified = True
+        self.metrics.notices += 1
+        return True
+
+    def defer(self, sid: str, event: str, data: Any) -> bool:
+        """保存被限流的合并事件（覆盖之前等待的数据），返回是否需要安排补执行"""
+        key = (sid, event)
+        first = key not in self._pending
+        if not first:
+            self.metrics.coalesced += 1
+        self._pending[key] = data
+        return first
+
+    def take_pending(self, sid: str, event: str) -> Any:
+        """取出等待执行的数据，连接已断开时为 None"""
+        data = self._pending.pop((sid, event), None)
+        if data is not None:
+            self.metrics.deferred += 1
+        return data
+
+    def forget(self, sid: str):
+        """连接断开时清除令牌桶和等待执行的数据"""
+        events = self._buckets.pop(sid, {})
+        for event in events:
+            self._pending.pop((sid, event), None)
+
+    def stats(self) -> dict:
+        return {
+            **self.metrics.as_dict(),
+            "tracked_sids": len(self._buckets),
+            "pending": len(self._pending),
+            "limits": {event: f"{rate:g}/{burst:g}" for event, (rate, burst) in self.limits.items()},
+        }
+
+
+rate_limiter = EventRateLimiter(parse_limits(config.SOCKET_RATE_LIMITS))
@@ -0,0 +1,281 @@
+"""
+公开文章接口的响应缓存
+
+GET /api/posts 与 GET /api/posts/{id} 的响应按「路径 + 全部查询参数」缓存为序列化好的 JSON 字节，
+命中时直接返回，不查库也不再走 pydantic 序列化。按 LRU 淘汰，总大小不超过 RESPONSE_CACHE_MAX_BYTES。
+
+每条缓存带若干标签，文章增删改、删除用户时由 crud 按标签精确失效:
+- post:<id>            文章详情，以及包含该文章的列表页
+- author:<id>          嵌有该作者信息的详情和列表页（作者资料变更时失效）
+- posts:author:<id>    按作者筛选的列表
+- posts:category:<名>  按分类筛选的列表
+- posts:all            未按作者/分类筛选的列表
+- posts:search         搜索结果
+- views:<id>           文章详情中的浏览次数（浏览计数写回后失效）
+
+响应带 ETag，浏览器携带 If-None-Match 再次请求时内容未变则返回 304。
+详情中的浏览次数不参与 ETag，命中时拼接到缓存的字节后面，所以仍是实时值。
+多 worker 部署时失效只作用于当前进程，其他进程最多延迟 RESPONSE_CACHE_TTL 秒
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Optional
+
+from fastapi import Response
+
+from .config import config
+
+POSTS_ALL = "posts:all"
+POSTS_SEARCH = "posts:search"
+
+
+def post_tag(post_id: int) -> str:
+    return f"post:{post_id}"
+
+
+def author_tag(author_id: int) -> str:
+    return f"author:{author_id}"
+
+
+def author_list_tag(author_id: int) -> str:
+    return f"posts:author:{author_id}"
+
+
+def category_list_tag(category: str) -> str:
+    return f"posts:category:{category}"
+
+
+def views_tag(post_id: int) -> str:
+    return f"views:{post_id}"
+
+
+@lru_cache(maxsize=None)
+def _adapter(model_type):
+    from pydantic import TypeAdapter
+    return TypeAdapter(model_type)
+
+
+def dump_json(model_type, obj, exclude: Optional[set] = None) -> bytes:
+    """按响应模型序列化 ORM 对象（与 response_model 的输出一致）"""
+    return _adapter(model_type).dump_json(obj, exclude=exclude)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 使用弱比较（忽略 W/ 前缀）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == target for tag in if_none_match.split(","))
+
+
+@dataclass
+class ResponseCacheMetrics:
+    """响应缓存统计"""
+    hits: int = 0
+    misses: int = 0
+    not_modified: int = 0  # 返回 304 的次数
+    stores: int = 0
+    evictions: int = 0  # 超出字节预算被淘汰
+    invalidated: int = 0  # 被标签失效的条目数
+    stale_puts: int = 0  # 读库期间发生失效而放弃写入
+    entries: int = 0
+    bytes: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    tags: FrozenSet[str]
+    expires: float
+    headers: Dict[str, str] = field(default_factory=dict)
+    meta: Dict[str, Any] = field(default_factory=dict)  # 不进入响应体的附加数据（如详情的浏览次数）
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + 256  # 估算键、标签等额外开销
+
+
+class ResponseCache:
+    """线程安全的 LRU 响应缓存（按字节预算淘汰，按标签失效）
+
+    Args:
+        max_bytes: 缓存总字节预算
+        ttl: 条目有效期(秒)，兜底多进程间的失效延迟，0 表示不缓存
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.metrics = ResponseCacheMetrics()
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._tags: Dict[str, set] = {}  # tag -> keys
+        self._generation = 0  # 每次失效 +1，用于丢弃读库期间已过时的写入
+        self._lock = threading.Lock()  # 读接口是同步接口，在线程池中并发调用
+
+    @staticmethod
+    def key(request) -> str:
+        """缓存键: 路径 + 排序后的全部查询参数"""
+        params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        return f"{request.url.path}?{params}"
+
+    @property
+    def generation(self) -> int:
+        """读库前记下，写入时传给 put"""
+        return self._generation
+
+    def _remove(self, key: str) -> CachedResponse:
+        entry = self._entries.pop(key)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        self.metrics.bytes -= entry.size
+        return entry
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                    self.metrics.entries = len(self._entries)
+                self.metrics.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.metrics.hits += 1
+            return entry
+
+    def put(self, key: str, body: bytes, tags: Iterable[str], headers: Optional[Dict[str, str]] = None,
+            meta: Optional[Dict[str, Any]] = None, generation: Optional[int] = None) -> CachedResponse:
+        """写入缓存并返回条目；读库后已发生失效、超出预算或不缓存时只返回条目不保存"""
+        entry = CachedResponse(
+            body=body,
+            etag=f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"',
+            tags=frozenset(tags),
+            expires=time.monotonic() + self.ttl,
+            headers=headers or {},
+            meta=meta or {},
+        )
+        if self.ttl <= 0 or entry.size > self.max_bytes:
+            return entry
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self.metrics.stale_puts += 1
+                return entry
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            for tag in entry.tags:
+                self._tags.setdefault(tag, set()).add(key)
+            self.metrics.bytes += entry.size
+            self.metrics.stores += 1
+            while self.metrics.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.metrics.evictions += 1
+            self.metrics.entries = len(self._entries)
+        return entry
+
+    def invalidate(self, *tags: str) -> int:
+        """失效带有任一标签的条目，返回失效数量"""
+        removed = 0
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    removed += 1
+            self.metrics.invalidated += removed
+            self.metrics.entries = len(self._entries)
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+            self.metrics.bytes = 0
+            self.metrics.entries = 0
+
+    def respond(self, entry: CachedResponse, if_none_match: Optional[str], body: Optional[bytes] = None) -> Response:
+        """构造响应；If-None-Match 与 ETag 一致时返回 304
+
+        Args:
+            body: 实际响应体（默认为缓存的字节，详情会在其后拼接浏览次数）
+        """
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache", **entry.headers}
+        if etag_matches(if_none_match, entry.etag):
+            self.metrics.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body if body is None else body, media_type="application/json", headers=headers)
+
+
+def list_tags(posts, author_id: Optional[int] = None, category: Optional[str] = None,
+              search: Optional[str] = None) -> set:
+    """列表页的标签: 包含的文章 + 筛选范围"""
+    tags = set()
+    for post in posts:
+        tags.add(post_tag(post.id))
+        tags.add(author_tag(post.author_id))
+    if author_id is not None:
+        tags.add(author_list_tag(author_id))
+    if category:
+        tags.add(category_list_tag(category))
+    if author_id is None and not category:
+        tags.add(POSTS_ALL)
+    if search:
+        tags.add(POSTS_SEARCH)
+    return tags
+
+
+def detail_tags(post) -> set:
+    return {post_tag(post.id), author_tag(post.author_id), views_tag(post.id)}
+
+
+def invalidate_post(post_id: int, author_id: Optional[int] = None, categories: Iterable[str] = (),
+                    moved: bool = True) -> int:
+    """文章变更后失效相关缓存
+
+    Args:
+        categories: 受影响的分类（改分类时传入新旧两个）
+        moved: 文章是否进出了列表（新建/删除/改分类），此时相应列表的分页整体移动，需要全部失效
+    """
+    tags = [post_tag(post_id), POSTS_SEARCH]
+    if moved:
+        tags.append(POSTS_ALL)
+        if author_id is not None:
+            tags.append(author_list_tag(author_id))
+        tags.extend(category_list_tag(category) for category in categories if category)
+    return post_cache.invalidate(*tags)
+
+
+def invalidate_author(author_id: int, categories: Iterable[str] = (), removed: bool = False) -> int:
+    """作者资料变更后失效相关缓存
+
+    Args:
+        categories: 该作者文章的分类（删除作者时传入）
+        removed: 作者及其文章已被删除，相应列表的分页整体移动
+    """
+    tags = [author_tag(author_id)]
+    if removed:
+        tags += [author_list_tag(author_id), POSTS_ALL, POSTS_SEARCH]
+        tags.extend(category_list_tag(category) for category in categories if category)
+    return post_cache.invalidate(*tags)
+
+
+post_cache = ResponseCache(
+    max_bytes=config.RESPONSE_CACHE_MAX_BYTES,
+    ttl=config.RESPONSE_CACHE_TTL,
+)
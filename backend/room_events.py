@@ -0,0 +1,121 @@
+"""
+房间事件日志（断线续传）
+
+每个房间在内存中保留最近的播放事件（playback_sync）和聊天消息（new_message），
+容量有限（环形缓冲），每条事件带房间内递增的序号 seq，广播时一并下发。
+
+客户端记录最后收到的 epoch + seq，加入房间或重连时在 join_room / request_sync 中带上:
+- epoch 相同且 seq 仍在缓冲范围内: 只补发之后的事件
+- 首次加入（未带 seq）: 下发整个缓冲，作为最近的上下文（无需再查一次聊天记录）
+- epoch 不同（服务重启、日志被淘汰）或 seq 已滚出缓冲: reset=True 并下发整个缓冲，
+  客户端以 join_success / playback_sync 中的房间状态为准，需要更早的聊天记录时再调用接口查询
+
+日志只保存在当前进程中；按最近使用保留 max_rooms 个房间（关闭的房间不再被访问，随之被淘汰）
+"""
+import threading
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, asdict
+from typing import Deque, Optional
+
+from .config import config
+
+
+@dataclass
+class RoomEventMetrics:
+    """事件日志统计"""
+    appended: int = 0
+    resumes: int = 0  # 带 seq 的增量补发
+    full_replays: int = 0  # 首次加入下发整个缓冲
+    resets: int = 0  # epoch 不符或 seq 已滚出缓冲
+    events_replayed: int = 0
+    rooms_evicted: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class RoomLog:
+    """单个房间的事件缓冲"""
+    epoch: str
+    events: Deque[dict]
+    seq: int = 0  # 最近一条事件的序号
+
+    @property
+    def first_seq(self) -> int:
+        return self.events[0]["seq"] if self.events else self.seq + 1
+
+
+class RoomEventLog:
+    """各房间最近事件的有界缓冲"""
+
+    def __init__(self, capacity: int = 200, max_rooms: int = 1000):
+        self.capacity = capacity
+        self.max_rooms = max_rooms
+        self.metrics = RoomEventMetrics()
+        self._rooms: "OrderedDict[int, RoomLog]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _log(self, room_id: int) -> RoomLog:
+        log = self._rooms.get(room_id)
+        if log is None:
+            log = RoomLog(epoch=uuid.uuid4().hex[:12], events=deque(maxlen=self.capacity))
+            self._rooms[room_id] = log
+            while len(self._rooms) > self.max_rooms:
+                self._rooms.popitem(last=False)
+                self.metrics.rooms_evicted += 1
+        else:
+            self._rooms.move_to_end(room_id)
+        return log
+
+    def append(self, room_id: int, event: str, data: dict) -> dict:
+        """记录一条事件，返回加上 seq / epoch 的数据（原样广播给房间）
+
+        缓冲中只保存原始数据，补发时 seq 在外层，epoch 在返回结果中只出现一次
+        """
+        with self._lock:
+            log = self._log(room_id)
+            log.seq += 1
+            log.events.append({"seq": log.seq, "event": event, "data": data})
+            payload = {**data, "seq": log.seq, "epoch": log.epoch}
+            self.metrics.appended += 1
+        return payload
+
+    def since(self, room_id: int, last_seq: Optional[int] = None, epoch: Optional[str] = None) -> dict:
+        """返回 last_seq 之后的事件
+
+        Returns:
+            {"epoch", "seq": 当前最新序号, "reset": 是否无法增量补发, "events": [{"seq", "event", "data"}, ...]}
+        """
+        with self._lock:
+            log = self._log(room_id)
+            events = list(log.events)
+            resumable = (
+                last_seq is not None and epoch == log.epoch
+                and log.first_seq - 1 <= last_seq <= log.seq
+            )
+            if resumable:
+                # 缓冲中的序号连续
+                events = events[last_seq - log.first_seq + 1:]
+                self.metrics.resumes += 1
+            elif last_seq is None:
+                self.metrics.full_replays += 1
+            else:
+                self.metrics.resets += 1
+            self.metrics.events_replayed += len(events)
+            return {
+                "epoch": log.epoch,
+                "seq": log.seq,
+                "reset": last_seq is not None and not resumable,
+                "events": events,
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            rooms = len(self._rooms)
+            buffered = sum(len(log.events) for log in self._rooms.values())
+        return {**self.metrics.as_dict(), "rooms": rooms, "buffered_events": buffered}
+
+
+room_events = RoomEventLog(capacity=config.ROOM_EVENT_BUFFER, max_rooms=config.ROOM_EVENT_MAX_ROOMS)
@@ -0,0 +1,325 @@
+"""
+同步观影房间的内存状态引擎
+
+每个活跃房间在内存中保存一份权威的播放状态（RoomState），
+Socket.IO 事件直接读写内存，由后台写回任务定期把
+current_time / is_playing / updated_at 持久化到 sync_rooms 表
+
+多 worker 部署时（SOCKETIO_MESSAGE_QUEUE）每个 worker 各有一份内存状态:
+修改状态的 worker 通过消息队列把最新状态发给其他 worker（见 socket_manager.RoomStateReplication），
+其他 worker 覆盖自己的副本；REST 接口使状态失效时其他 worker 同样丢弃副本，下次访问从数据库重新加载
+"""
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import config
+from .database import AsyncSessionLocal, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RoomState:
+    """单个房间的播放状态"""
+    room_id: int
+    host_user_id: int
+    control_mode: str = "host_only"
+    is_playing: bool = False
+    position: float = 0.0  # 锚点时刻的播放位置(秒)
+    rate: float = 1.0
+    version: int = 0  # 单调递增的状态版本号
+    anchor: float = field(default_factory=time.monotonic)  # 位置锚点(monotonic)
+    updated_at: datetime = field(default_factory=datetime.utcnow)
+    dirty: bool = False  # 是否有未写回数据库的修改
+    released: bool = False  # 房间已无连接，写回后可释放
+
+    def current_position(self, now: Optional[float] = None) -> float:
+        """根据锚点推算当前播放位置"""
+        if not self.is_playing:
+            return self.position
+        now = time.monotonic() if now is None else now
+        return self.position + self.rate * (now - self.anchor)
+
+    def can_control(self, user_id: int) -> bool:
+        """检查用户是否有播放控制权"""
+        return self.control_mode != "host_only" or user_id == self.host_user_id
+
+    def _touch(self):
+        self.version += 1
+        self.updated_at = datetime.utcnow()
+        self.dirty = True
+        self.released = False
+
+    def set_position(self, position: float, now: Optional[float] = None):
+        """重设播放位置锚点"""
+        self.position = float(position)
+        self.anchor = time.monotonic() if now is None else now
+        self._touch()
+
+    def apply_action(self, action: str, position: Optional[float] = None, rate: Optional[float] = None):
+        """应用播放控制动作: play / pause / seek / rate"""
+        now = time.monotonic()
+        # 先把当前进度固化到锚点，再修改播放状态
+        self.position = position if position is not None else self.current_position(now)
+        self.position = float(self.position)
+        self.anchor = now
+
+        if action == "play":
+            self.is_playing = True
+        elif action == "pause":
+            self.is_playing = False
+        if rate is not None and action in ("rate", "play", "seek"):
+            self.rate = float(rate)
+        self._touch()
+
+    def replica(self) -> dict:
+        """发给其他 worker 的完整状态（位置按发送时刻推算，接收方按墙钟时间差补偿）"""
+        return {
+            "host_user_id": self.host_user_id,
+            "control_mode": self.control_mode,
+            "is_playing": self.is_playing,
+            "position": self.current_position(),
+            "rate": self.rate,
+            "version": self.version,
+            "sent_at": time.time(),
+        }
+
+    def snapshot(self) -> dict:
+        """导出写回数据库所需的字段"""
+        return {
+            "room_id": self.room_id,
+            "current_time": int(self.current_position()),
+            "is_playing": self.is_playing,
+            "updated_at": self.updated_at,
+        }
+
+
+class RoomStateEngine:
+    """管理所有活跃房间的内存状态，并负责写回数据库"""
+
+    def __init__(self, flush_interval: float = 5.0):
+        self.flush_interval = flush_interval
+        self._rooms: Dict[int, RoomState] = {}
+        self._lock = threading.Lock()  # REST 线程池与事件循环都会访问
+        self._flush_task: Optional[asyncio.Task] = None
+        # 多 worker 时通知其他 worker 的函数 (room_id, 状态或 None 表示失效)，单 worker 时为 None
+        self._publisher: Optional[Callable[[int, Optional[dict]], Awaitable]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def get(self, room_id: int) -> Optional[RoomState]:
+        """只从内存获取房间状态"""
+        return self._rooms.get(room_id)
+
+    def track(self, room: models.SyncRoom) -> RoomState:
+        """用数据库中的房间行初始化内存状态（已存在则直接返回内存状态）"""
+        with self._lock:
+            state = self._rooms.get(room.id)
+            if state is None:
+                state = RoomState(
+                    room_id=room.id,
+                    host_user_id=room.host_user_id,
+                    control_mode=room.control_mode,
+                    is_playing=bool(room.is_playing),
+                    position=float(room.current_time or 0),
+                    updated_at=room.updated_at or datetime.utcnow(),
+                )
+                self._rooms[room.id] = state
+            state.released = False
+            return state
+
+    def get_or_load(self, room_id: int, db: Optional[Session] = None) -> Optional[RoomState]:
+        """获取房间状态，不在内存中时从数据库加载一次"""
+        state = self._rooms.get(room_id)
+        if state is not None:
+            state.released = False
+            return state
+
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            room = db.query(models.SyncRoom).filter(
+                models.SyncRoom.id == room_id,
+                models.SyncRoom.is_active == True
+            ).first()
+            return self.track(room) if room else None
+        finally:
+            if own_session:
+                db.close()
+
+    async def get_or_load_async(self, room_id: int, db: Optional[AsyncSession] = None) -> Optional[RoomState]:
+        """get_or_load 的异步版本（Socket.IO 事件中使用，加载时不阻塞事件循环）"""
+        state = self._rooms.get(room_id)
+        if state is not None:
+            state.released = False
+            return state
+
+        if db is None:
+            async with AsyncSessionLocal() as db:
+                return await self.get_or_load_async(room_id, db)
+        room = await db.scalar(select(models.SyncRoom).where(
+            models.SyncRoom.id == room_id,
+            models.SyncRoom.is_active == True
+        ))
+        return self.track(room) if room else None
+
+    def active_states(self) -> List[RoomState]:
+        """当前内存中的所有房间状态"""
+        return list(self._rooms.values())
+
+    def release(self, room_id: int):
+        """房间已无连接，下次写回后释放内存状态"""
+        state = self._rooms.get(room_id)
+        if state is not None:
+            state.released = True
+
+    def invalidate(self, room_id: int):
+        """先写回未持久化的修改，再丢弃内存状态（REST 接口修改房间后调用）"""
+        with self._lock:
+            state = self._rooms.pop(room_id, None)
+        if state is not None and state.dirty:
+            self._write([state.snapshot()])
+        self._publish_threadsafe(room_id, None)
+
+    async def invalidate_async(self, room_id: int):
+        """invalidate 的异步版本，写回在线程池中执行"""
+        with self._lock:
+            state = self._rooms.pop(room_id, None)
+        if state is not None and state.dirty:
+            await asyncio.to_thread(self._write, [state.snapshot()])
+        await self._send(room_id, None)
+
+    # ---- 多 worker 同步 ----
+
+    def set_publisher(self, publisher: Callable[[int, Optional[dict]], Awaitable]):
+        """设置通知其他 worker 的函数（websocket_server 在配置了消息队列时调用）"""
+        self._publisher = publisher
+
+    async def publish(self, room_id: int):
+        """本进程修改播放状态后，把最新状态发给其他 worker"""
+        state = self._rooms.get(room_id)
+        if state is not None:
+            await self._send(room_id, state.replica())
+
+    async def _send(self, room_id: int, replica: Optional[dict]):
+        if self._publisher is None:
+            return
+        try:
+            await self._publisher(room_id, replica)
+        except Exception as e:
+            logger.error(f"房间状态同步到其他 worker 失败(房间:{room_id}): {str(e)}")
+
+    def _publish_threadsafe(self, room_id: int, replica: Optional[dict]):
+        """REST 线程池中调用: 把通知交给事件循环发送，不等待结果"""
+        if self._publisher is None or self._loop is None or self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._send(room_id, replica), self._loop)
+
+    def apply_replica(self, room_id: int, replica: Optional[dict]):
+        """应用其他 worker 发来的状态；None 表示房间已修改，丢弃副本
+
+        本进程没有该房间时也保存一份（标记为已释放，无人访问则下一轮写回时清理），
+        期间在本进程加入的成员拿到的是最新状态，而不是写回前的数据库数据
+        """
+        with self._lock:
+            if replica is None:
+                self._rooms.pop(room_id, None)
+                return
+            state = self._rooms.get(room_id)
+            if state is None:
+                state = RoomState(room_id=room_id, host_user_id=replica["host_user_id"], released=True)
+                self._rooms[room_id] = state
+            elapsed = max(0.0, time.time() - replica["sent_at"])
+            state.host_user_id = replica["host_user_id"]
+            state.control_mode = replica["control_mode"]
+            state.is_playing = replica["is_playing"]
+            state.position = float(replica["position"])
+            state.anchor = time.monotonic() - elapsed
+            state.rate = replica["rate"]
+            state.version = max(state.version, replica["version"])
+            state.updated_at = datetime.utcnow()
+
+    def _collect_dirty(self) -> List[RoomState]:
+        """收集待写回的状态并清理已释放的房间
+
+        有未写回修改的已释放房间先保留，写回成功后的下一轮再清理，
+        写回失败时重新标记为 dirty 即可在下一轮重试
+        """
+        pending = []
+        with self._lock:
+            for room_id, state in list(self._rooms.items()):
+                if state.dirty:
+                    pending.append(state)
+                    state.dirty = False
+                elif state.released:
+                    del self._rooms[room_id]
+        return pending
+
+    def _write(self, pending: List[dict]) -> bool:
+        """批量写回数据库（房间可能已被删除，不校验影响行数），返回是否成功"""
+        if not pending:
+            return True
+        stmt = update(models.SyncRoom.__table__).where(
+            models.SyncRoom.__table__.c.id == bindparam("room_id")
+        ).values(
+            current_time=bindparam("current_time"),
+            is_playing=bindparam("is_playing"),
+            updated_at=bindparam("updated_at"),
+        )
+        db = SessionLocal()
+        try:
+            db.connection().execute(stmt, pending)
+            db.commit()
+            return True
+        except Exception as e:
+            db.rollback()
+            logger.error(f"房间状态写回失败: {str(e)}")
+            return False
+        finally:
+            db.close()
+
+    async def flush(self) -> int:
+        """写回所有脏状态，返回写回的房间数量（失败时为 0，状态保留到下一轮重试）"""
+        states = self._collect_dirty()
+        if not states:
+            return 0
+        if not await asyncio.to_thread(self._write, [state.snapshot() for state in states]):
+            for state in states:
+                state.dirty = True
+            return 0
+        return len(states)
+
+    async def run_flusher(self):
+        """定时写回任务"""
+        logger.info(f"房间状态写回任务启动 - 间隔:{self.flush_interval}秒")
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"房间状态写回任务出错: {str(e)}")
+
+    def start(self):
+        """在当前事件循环中启动写回任务"""
+        self._loop = asyncio.get_running_loop()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.run_flusher())
+
+    async def shutdown(self):
+        """停止写回任务并写回剩余状态"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+state_engine = RoomStateEngine(flush_interval=config.ROOM_STATE_FLUSH_INTERVAL)
@@ -31,6 +31,8 @@ class Post(PostBase):
 class PostWithAuthor(Post):
     """带作者信息的文章模型"""
     author: Optional['UserSimple'] = None
+    score: Optional[float] = None  # 搜索相关度，仅搜索结果有值
+    snippet: Optional[str] = None  # 高亮摘要（<mark> 标出命中词），仅搜索结果有值
 
     class Config:
         from_attributes = True
@@ -136,6 +138,10 @@ class SyncRoomCreate(BaseModel):
     control_mode: str = "host_only"  # host_only 或 all_members
     mode: str = "link"  # link, upload, local
     video_source: Optional[str] = None
+    # 本地模式: 房主文件的大小、抽样指纹和（可选）完整 SHA-256，成员据此校验
+    video_size: Optional[int] = None
+    video_fingerprint: Optional[str] = None
+    video_hash: Optional[str] = None
 
 class SyncRoomUpdate(BaseModel):
     """更新房间信息"""
@@ -143,6 +149,9 @@ class SyncRoomUpdate(BaseModel):
     video_source: Optional[str] = None
     current_time: Optional[float] = None
     is_playing: Optional[bool] = None
+    video_size: Optional[int] = None  # 仅本地模式
+    video_fingerprint: Optional[str] = None
+    video_hash: Optional[str] = None
 
 class SyncRoomMemberInfo(BaseModel):
     """房间成员信息"""
@@ -182,6 +191,12 @@ class SyncRoomInfo(BaseModel):
             return to_beijing_time(v)
         return v
 
+class VideoVerifyRequest(BaseModel):
+    """本地模式成员提交自己视频文件的信息（指纹或完整 SHA-256）"""
+    size: int
+    fingerprint: Optional[str] = None
+    sha256: Optional[str] = None
+
 class SyncRoomMessageCreate(BaseModel):
     """发送消息请求"""
     message: str
@@ -198,6 +213,16 @@ class SyncRoomMessage(BaseModel):
     class Config:
         from_attributes = True
 
+class VideoUploadCreate(BaseModel):
+    """创建视频分片上传会话"""
+    filename: str
+    size: int  # 文件总字节数
+    sha256: Optional[str] = None  # 已知内容哈希时服务器已有相同视频则跳过上传
+
+class VideoUploadComplete(BaseModel):
+    """完成上传，可附带客户端计算的 SHA-256 用于校验"""
+    sha256: Optional[str] = None
+
 # WebSocket 事件消息
 class WSPlaybackControl(BaseModel):
     """播放控制消息"""
@@ -1,4 +1,3 @@
-import bcrypt
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
@@ -8,6 +7,9 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from .config import config
+from .password_hasher import check_password, hash_password
+
 # 加载环境变量 (明确指定 .env 文件路径)
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path)
@@ -24,19 +26,12 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """验证密码"""
-    # 将字符串转换为字节,限制在 72 字节以内
-    password_bytes = plain_password.encode('utf-8')[:72]
-    hashed_bytes = hashed_password.encode('utf-8') if isinstance(hashed_password, str) else hashed_password
-    return bcrypt.checkpw(password_bytes, hashed_bytes)
+    """验证密码（同步，接口中请使用 password_hasher.verify）"""
+    return check_password(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """生成密码哈希"""
-    # 将字符串转换为字节,限制在 72 字节以内
-    password_bytes = password.encode('utf-8')[:72]
-    salt = bcrypt.gensalt(rounds=12)
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode('utf-8')
+    """生成密码哈希（同步，接口中请使用 password_hasher.hash）"""
+    return hash_password(password, config.BCRYPT_ROUNDS)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -48,21 +43,24 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def decode_access_token(token: str):
-    """解码 JWT token 并返回用户名"""
+def decode_access_token_claims(token: str) -> dict:
+    """解码 JWT token 并返回全部声明(包含 sub 和 exp)"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return username
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if payload.get("sub") is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+def decode_access_token(token: str):
+    """解码 JWT token 并返回用户名"""
+    return decode_access_token_claims(token)["sub"]
@@ -0,0 +1,151 @@
+"""
+Socket.IO 连接认证
+
+connect 时验证一次 JWT（auth 中的 token，或 URL 上的 ?token=，或 Authorization 头），
+解析出的身份和该用户所属房间的集合保存在 sio session 中，之后的事件直接读取，
+不再信任数据中的 user_id，也不再为每个事件查询 users / sync_room_members。
+
+房间集合按用户共享（同一用户的多个标签页引用同一个集合），REST 接口加入房间、
+关闭 / 删除房间时直接更新。多 worker 部署时只更新当前进程:
+在其他 worker 上加入的房间，join_room 未命中集合时会查询一次数据库补上；
+在其他 worker 上关闭 / 删除的房间，删除时房间状态的失效通知会发到各 worker，
+send_message / request_sync 重新加载状态时查不到房间而拒绝。
+
+用户被禁用 / 删除时 revoke_user 清空其房间集合并断开其全部连接，
+多 worker 部署时通过消息队列通知其他 worker 同样处理（见 socket_manager）。
+"""
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+
+from . import auth_cache, sync_room_crud_async
+from .auth_cache import Principal
+from .database import AsyncSessionLocal
+
+
+class AuthenticationFailed(Exception):
+    """连接认证失败"""
+
+
+def extract_token(environ: Optional[dict], auth: Optional[dict]) -> Optional[str]:
+    """依次从 auth、URL 参数、Authorization 头中读取 token"""
+    if isinstance(auth, dict) and auth.get("token"):
+        return auth["token"]
+    environ = environ or {}
+    token = parse_qs(environ.get("QUERY_STRING", "")).get("token")
+    if token:
+        return token[-1]
+    header = environ.get("HTTP_AUTHORIZATION", "")
+    if header.lower().startswith("bearer "):
+        return header[7:].strip()
+    return None
+
+
+async def authenticate(environ: Optional[dict], auth: Optional[dict]) -> Principal:
+    """验证 token 并返回身份（优先读取认证缓存），失败时抛出 AuthenticationFailed"""
+    token = extract_token(environ, auth)
+    if not token:
+        raise AuthenticationFailed("Not authenticated")
+    try:
+        username = auth_cache.resolve_token_subject(token)
+    except HTTPException as e:
+        raise AuthenticationFailed(e.detail)
+
+    principal = auth_cache.principal_cache.get(username)
+    if principal is None:
+        async with AsyncSessionLocal() as db:
+            user = await sync_room_crud_async.get_user_by_username(db, username)
+        if user is None:
+            raise AuthenticationFailed("User not found")
+        principal = Principal.from_user(user)
+        auth_cache.principal_cache.set(username, principal)
+    if not principal.is_active:
+        raise AuthenticationFailed("Account has been disabled")
+    return principal
+
+
+class MembershipCache:
+    """已连接用户所属的房间集合，用户的最后一个连接断开时清除"""
+
+    def __init__(self):
+        self._rooms: Dict[int, Set[int]] = {}  # user_id -> 房间 id 集合
+        self._connections: Dict[int, Set[str]] = {}  # user_id -> 本进程上的连接 sid
+        self._lock = threading.Lock()  # REST 接口在线程池中调用
+        # 断开连接的函数 revoker(user_id, sids, broadcast)，由 websocket_server 设置
+        self._revoker: Optional[Callable[[int, List[str], bool], Awaitable]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def start(self):
+        """在事件循环中调用，记录循环供线程池中的 revoke_user 使用"""
+        self._loop = asyncio.get_running_loop()
+
+    def set_revoker(self, revoker: Callable[[int, List[str], bool], Awaitable]):
+        """设置断开连接的函数: revoker(user_id, 本进程上的 sid 列表, 是否通知其他 worker)"""
+        self._revoker = revoker
+
+    async def attach(self, user_id: int, sid: str) -> Set[int]:
+        """连接建立时取得用户的房间集合，已有其他连接时共用同一个集合"""
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            rooms = self._rooms.get(user_id)
+            if rooms is not None:
+                self._connections[user_id].add(sid)
+                return rooms
+        async with AsyncSessionLocal() as db:
+            room_ids = await sync_room_crud_async.get_user_room_ids(db, user_id)
+        with self._lock:
+            # 查询期间同一用户的另一个连接可能已经建立了集合
+            rooms = self._rooms.setdefault(user_id, set(room_ids))
+            self._connections.setdefault(user_id, set()).add(sid)
+            return rooms
+
+    def detach(self, user_id: int, sid: str):
+        with self._lock:
+            sids = self._connections.get(user_id)
+            if sids is None:
+                return
+            sids.discard(sid)
+            if not sids:
+                self._connections.pop(user_id, None)
+                self._rooms.pop(user_id, None)
+
+    def grant(self, user_id: int, room_id: int):
+        """用户加入房间（REST 接口）"""
+        with self._lock:
+            rooms = self._rooms.get(user_id)
+            if rooms is not None:
+                rooms.add(room_id)
+
+    def revoke_rooms(self, room_ids: Iterable[int]):
+        """房间被关闭 / 删除"""
+        room_ids = set(room_ids)
+        with self._lock:
+            for rooms in self._rooms.values():
+                rooms -= room_ids
+
+    def revoke_user(self, user_id: int, broadcast: bool = True):
+        """用户被禁用 / 删除: 清空房间集合并断开该用户的全部连接（可在线程池中调用）
+
+        已建立的连接引用同一个集合，就地清空后立即无法再以成员身份发送事件；
+        断开连接在事件循环中执行，不等待结果
+
+        Args:
+            broadcast: 是否通知其他 worker（处理其他 worker 发来的通知时为 False）
+        """
+        with self._lock:
+            rooms = self._rooms.pop(user_id, None)
+            if rooms is not None:
+                rooms.clear()
+            sids = list(self._connections.pop(user_id, ()))
+        if self._revoker is None or self._loop is None or self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._revoker(user_id, sids, broadcast), self._loop)
+
+
+memberships = MembershipCache()
@@ -0,0 +1,227 @@
+"""
+Socket.IO 跨进程消息分发
+
+根据 SOCKETIO_MESSAGE_QUEUE 选择 client manager，使多个 uvicorn worker
+之间的 room 广播（member_joined / playback_sync / new_message 等）互通:
+
+    (空)            单进程，默认 AsyncManager
+    redis://...     socketio.AsyncRedisManager（生产环境）
+    memory://       进程内 broker，用于同一进程内多个 AsyncServer 的测试
+    unix:///path    Unix socket broker，用于无 Redis 环境下的多进程测试
+
+Unix socket broker 启动方式:
+    python -m backend.socket_manager /tmp/blue-album-sio.sock
+
+多 worker 的 client manager 还通过同一消息队列在 worker 之间同步房间播放状态、
+通知被禁用 / 删除的用户断开连接（RoomStateReplication），不发给任何客户端
+"""
+import asyncio
+import logging
+import pickle
+import struct
+import sys
+from typing import Callable, Dict, Optional, Set
+from urllib.parse import urlparse
+
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNEL = "blue-album-sync"
+
+_FRAME_HEADER = struct.Struct("!I")
+
+# worker 之间同步房间状态的事件，发往没有客户端加入的房间，未升级的 worker 收到也不会转发给客户端
+ROOM_STATE_EVENT = "__room_state"
+USER_REVOKED_EVENT = "__user_revoked"
+ROOM_STATE_ROOM = "__workers"
+
+
+class RoomStateReplication:
+    """client manager 混入类: 在 worker 之间同步房间播放状态（见 room_state.RoomStateEngine.apply_replica），
+    以及被撤销的用户（见 socket_auth.MembershipCache.revoke_user）"""
+
+    room_state_handler: Optional[Callable[[int, Optional[dict]], None]] = None
+    user_revoked_handler: Optional[Callable[[int], None]] = None
+
+    async def publish_room_state(self, room_id: int, replica: Optional[dict]):
+        """把房间状态（None 表示失效）发给其他 worker"""
+        await self._publish_to_workers(ROOM_STATE_EVENT, {"room_id": room_id, "state": replica})
+
+    async def publish_user_revoked(self, user_id: int):
+        """通知其他 worker 断开该用户的连接"""
+        await self._publish_to_workers(USER_REVOKED_EVENT, {"user_id": user_id})
+
+    async def _publish_to_workers(self, event: str, data: dict):
+        await self._publish({
+            "method": "emit", "event": event, "data": data,
+            "namespace": "/", "room": ROOM_STATE_ROOM, "skip_sid": None, "callback": None,
+            "host_id": self.host_id,
+        })
+
+    async def _handle_emit(self, message):
+        event = message.get("event")
+        if event == ROOM_STATE_EVENT:
+            if self.room_state_handler is not None:
+                self.room_state_handler(message["data"]["room_id"], message["data"]["state"])
+        elif event == USER_REVOKED_EVENT:
+            if self.user_revoked_handler is not None:
+                self.user_revoked_handler(message["data"]["user_id"])
+        else:
+            await super()._handle_emit(message)
+
+
+class AsyncRedisStateManager(RoomStateReplication, socketio.AsyncRedisManager):
+    """同步房间状态的 AsyncRedisManager"""
+
+
+class LocalBroker:
+    """进程内 pub/sub broker：同一频道的每个订阅者都会收到一份消息"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(channel, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue):
+        self._subscribers.get(channel, set()).discard(queue)
+
+    def publish(self, channel: str, payload: bytes):
+        for queue in self._subscribers.get(channel, ()):
+            queue.put_nowait(payload)
+
+
+local_broker = LocalBroker()
+
+
+class AsyncLocalManager(RoomStateReplication, AsyncPubSubManager):
+    """基于进程内 broker 的 client manager（测试用）
+
+    消息同样经过 pickle 序列化，行为与 Redis 后端保持一致
+    """
+    name = "asynclocal"
+
+    def __init__(self, channel: str = DEFAULT_CHANNEL, broker: LocalBroker = local_broker,
+                 write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.broker = broker
+        self._queue: Optional[asyncio.Queue] = None
+
+    async def _publish(self, data):
+        self.broker.publish(self.channel, pickle.dumps(data))
+
+    async def _listen(self):
+        if self._queue is None:
+            self._queue = self.broker.subscribe(self.channel)
+        while True:
+            yield await self._queue.get()
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    header = await reader.readexactly(_FRAME_HEADER.size)
+    (length,) = _FRAME_HEADER.unpack(header)
+    return await reader.readexactly(length)
+
+
+def _write_frame(writer: asyncio.StreamWriter, payload: bytes):
+    writer.write(_FRAME_HEADER.pack(len(payload)) + payload)
+
+
+class UnixSocketBroker:
+    """Unix socket 消息转发服务：把每个客户端发来的帧转发给其他所有客户端"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while True:
+                payload = await _read_frame(reader)
+                for other in list(self._writers):
+                    if other is not writer:
+                        _write_frame(other, payload)
+                # 慢订阅者会拖慢发送方，由 drain 提供背压
+                await asyncio.gather(*(w.drain() for w in list(self._writers) if w is not writer),
+                                     return_exceptions=True)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def start(self):
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        logger.info(f"Unix socket broker 已启动: {self.path}")
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+class AsyncUnixSocketManager(RoomStateReplication, AsyncPubSubManager):
+    """通过 UnixSocketBroker 在多个进程间转发消息的 client manager"""
+    name = "asyncunix"
+
+    def __init__(self, path: str, channel: str = DEFAULT_CHANNEL,
+                 write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    async def _connect(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+
+    async def _publish(self, data):
+        await self._connect()
+        _write_frame(self._writer, pickle.dumps((self.channel, data)))
+        await self._writer.drain()
+
+    async def _listen(self):
+        await self._connect()
+        while True:
+            channel, data = pickle.loads(await _read_frame(self._reader))
+            if channel == self.channel:
+                yield data
+
+
+def create_client_manager(url: Optional[str], channel: str = DEFAULT_CHANNEL):
+    """根据消息队列 URL 创建 client manager，URL 为空时返回 None（单进程模式）"""
+    if not url:
+        return None
+
+    parsed = urlparse(url)
+    if parsed.scheme in ("redis", "rediss"):
+        return AsyncRedisStateManager(url, channel=channel)
+    if parsed.scheme == "memory":
+        return AsyncLocalManager(channel=channel)
+    if parsed.scheme == "unix":
+        return AsyncUnixSocketManager(parsed.path, channel=channel)
+    raise ValueError(f"不支持的 Socket.IO 消息队列: {url}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    socket_path = sys.argv[1] if len(sys.argv) > 1 else "/tmp/blue-album-sio.sock"
+    try:
+        asyncio.run(UnixSocketBroker(socket_path).serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -2,10 +2,18 @@
 同步观影房间的数据库操作
 """
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.exc import IntegrityError
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
 from . import models, schemas
+from .config import config
+from .pagination import keyset_page
+from .video_stream import video_grants
+from . import video_fingerprint
 import random
 import string
+import time
 from datetime import datetime, timezone, timedelta
 
 def to_beijing_time(dt: datetime) -> datetime:
@@ -34,6 +42,9 @@ def create_room(db: Session, room: schemas.SyncRoomCreate, user_id: int) -> mode
         control_mode=room.control_mode,
         mode=room.mode,
         video_source=room.video_source,
+        video_size=room.video_size,
+        video_fingerprint=room.video_fingerprint,
+        video_hash=room.video_hash,
     )
     db.add(db_room)
     db.commit()
@@ -58,35 +69,47 @@ def get_room_by_id(db: Session, room_id: int) -> models.SyncRoom:
         models.SyncRoom.is_active == True
     ).first()
 
-def get_user_rooms(db: Session, user_id: int, skip: int = 0, limit: int = 20):
-    """获取用户参与的房间列表"""
-    rooms = db.query(models.SyncRoom).join(
-        models.SyncRoomMember
+def _room_member_counts():
+    """成员统计聚合列：总成员数 / 在线成员数（条件聚合，配合 outer join 使用）"""
+    total_members = func.count(models.SyncRoomMember.id)
+    online_members = func.coalesce(
+        func.sum(case((models.SyncRoomMember.is_online == True, 1), else_=0)), 0
+    )
+    return total_members.label('total_members'), online_members.label('online_members')
+
+def get_user_rooms(db: Session, user_id: int, skip: int = 0, limit: int = 20,
+                   before: Optional[str] = None, after: Optional[str] = None):
+    """获取用户参与的房间列表
+
+    成员数通过一次分组查询得到，避免逐个房间 count；
+    传入 before/after 游标时按 (created_at, id) 游标分页
+    """
+    total_members, online_members = _room_member_counts()
+    joined_room_ids = db.query(models.SyncRoomMember.room_id).filter(
+        models.SyncRoomMember.user_id == user_id
+    )
+    
+    query = db.query(
+        models.SyncRoom, total_members, online_members
+    ).outerjoin(
+        models.SyncRoomMember, models.SyncRoomMember.room_id == models.SyncRoom.id
     ).filter(
-        models.SyncRoomMember.user_id == user_id,
+        models.SyncRoom.id.in_(joined_room_ids),
         models.SyncRoom.is_active == True
-    ).order_by(models.SyncRoom.created_at.desc()).offset(skip).limit(limit).all()
+    ).group_by(
+        models.SyncRoom.id
+    )
+    rows = keyset_page(query, models.SyncRoom.created_at, models.SyncRoom.id, limit,
+                       skip=skip, before=before, after=after, key=lambda row: row[0])
     
-    # 添加在线成员数量
     result = []
-    for room in rooms:
-        # 总成员数
-        total_count = db.query(models.SyncRoomMember).filter(
-            models.SyncRoomMember.room_id == room.id
-        ).count()
-        
-        # 在线成员数
-        online_count = db.query(models.SyncRoomMember).filter(
-            models.SyncRoomMember.room_id == room.id,
-            models.SyncRoomMember.is_online == True
-        ).count()
-        
+    for room, total_count, online_count in rows:
         room_dict = room.__dict__.copy()
-        room_dict['member_count'] = online_count  # 显示在线成员数
-        room_dict['total_members'] = total_count
+        room_dict['member_count'] = int(online_count)  # 显示在线成员数
+        room_dict['total_members'] = int(total_count)
         result.append(room_dict)
     
-    return result
+    return rows.with_items(result)
 
 def update_room(db: Session, room_id: int, room_update: schemas.SyncRoomUpdate) -> models.SyncRoom:
     """更新房间信息"""
@@ -101,8 +124,56 @@ def update_room(db: Session, room_id: int, room_update: schemas.SyncRoomUpdate)
     db_room.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(db_room)
+    if "video_source" in update_data:
+        video_grants.invalidate_room(room_id)
+    if db_room.mode == "local" and update_data.keys() & {"video_source", "video_size", "video_fingerprint", "video_hash"}:
+        reset_verification(db, room_id, db_room.host_user_id)
+    return db_room
+
+def reset_verification(db: Session, room_id: int, host_user_id: int):
+    """本地模式房间更换视频后，除房主外的成员需要重新校验"""
+    db.query(models.SyncRoomMember).filter(
+        models.SyncRoomMember.room_id == room_id,
+        models.SyncRoomMember.user_id != host_user_id
+    ).update({"is_verified": False}, synchronize_session=False)
+    db.commit()
+
+def set_member_verified(db: Session, room_id: int, user_id: int, verified: bool) -> Optional[models.SyncRoomMember]:
+    """记录成员的视频校验结果，非成员返回 None"""
+    member = db.query(models.SyncRoomMember).filter(
+        models.SyncRoomMember.room_id == room_id,
+        models.SyncRoomMember.user_id == user_id
+    ).first()
+    if member and member.is_verified != verified:
+        member.is_verified = verified
+        db.commit()
+    return member
+
+def set_room_video(db: Session, room_id: int, video_source: str, video_hash: str) -> models.SyncRoom:
+    """设置房间视频（上传完成后调用），播放进度归零"""
+    db_room = get_room_by_id(db, room_id)
+    if not db_room:
+        return None
+    
+    db_room.video_source = video_source
+    db_room.video_hash = video_hash
+    db_room.current_time = 0
+    db_room.is_playing = False
+    db_room.updated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(db_room)
+    video_grants.invalidate_room(room_id)
     return db_room
 
+def get_video_refcounts(db: Session) -> dict:
+    """每个上传视频被多少个活跃房间引用（视频存储的引用计数）"""
+    rows = db.query(models.SyncRoom.video_hash, func.count(models.SyncRoom.id)).filter(
+        models.SyncRoom.mode == "upload",
+        models.SyncRoom.is_active == True,
+        models.SyncRoom.video_hash.isnot(None)
+    ).group_by(models.SyncRoom.video_hash).all()
+    return {video_hash: count for video_hash, count in rows}
+
 def close_room(db: Session, room_id: int) -> tuple[bool, str]:
     """关闭房间"""
     db_room = get_room_by_id(db, room_id)
@@ -116,11 +187,46 @@ def close_room(db: Session, room_id: int) -> tuple[bool, str]:
     
     db_room.is_active = False
     db.commit()
+    video_grants.invalidate_room(room_id)
     return True, "房间已关闭"
 
+def verify_member_video(db: Session, room: models.SyncRoom, user_id: int, size: int,
+                        fingerprint: str = None, sha256: str = None) -> Optional[dict]:
+    """本地模式成员提交文件大小 + 指纹（或完整 SHA-256）校验视频，非成员返回 None
+
+    fallback_required 为 True 时房间只有完整哈希，客户端需计算整个文件的 SHA-256 后重新提交
+    """
+    verified, method = video_fingerprint.compare(room, size, fingerprint, sha256)
+    if verified is None:
+        member = db.query(models.SyncRoomMember).filter(
+            models.SyncRoomMember.room_id == room.id,
+            models.SyncRoomMember.user_id == user_id
+        ).first()
+    else:
+        member = set_member_verified(db, room.id, user_id, verified)
+    return verification_result(room, user_id, member, verified, method)
+
+def verification_result(room: models.SyncRoom, user_id: int, member: Optional[models.SyncRoomMember],
+                        verified: Optional[bool], method: Optional[str]) -> Optional[dict]:
+    if not member:
+        return None
+    return {
+        "room_id": room.id,
+        "user_id": user_id,
+        "verified": member.is_verified if verified is None else verified,
+        "method": method,
+        "fallback_required": verified is None,
+        "fingerprint": video_fingerprint.spec(),
+    }
+
 # 房间成员管理
-def join_room(db: Session, room_id: int, user_id: int, nickname: str = None) -> models.SyncRoomMember:
-    """加入房间"""
+def join_room(db: Session, room_id: int, user_id: int, nickname: str = None,
+              verified: bool = True) -> models.SyncRoomMember:
+    """加入房间
+
+    Args:
+        verified: 新成员的初始校验状态，本地模式需要校验视频时为 False
+    """
     # 检查是否已加入
     existing = db.query(models.SyncRoomMember).filter(
         models.SyncRoomMember.room_id == room_id,
@@ -133,10 +239,19 @@ def join_room(db: Session, room_id: int, user_id: int, nickname: str = None) ->
     member = models.SyncRoomMember(
         room_id=room_id,
         user_id=user_id,
-        nickname=nickname
+        nickname=nickname,
+        is_verified=verified
     )
     db.add(member)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # 同一用户的另一个请求先插入了成员记录（唯一约束 room_id + user_id）
+        db.rollback()
+        return db.query(models.SyncRoomMember).filter(
+            models.SyncRoomMember.room_id == room_id,
+            models.SyncRoomMember.user_id == user_id
+        ).first()
     db.refresh(member)
     return member
 
@@ -190,22 +305,20 @@ def get_room_members(db: Session, room_id: int, online_only: bool = True):
     if online_only:
         query = query.filter(models.SyncRoomMember.is_online == True)
     
-    members = query.all()
-    
-    result = []
-    for member in members:
-        result.append({
-            'id': member.id,
-            'user_id': member.user_id,
-            'username': member.user.username,
-            'nickname': member.nickname or member.user.username,
-            'is_verified': member.is_verified,
-            'is_online': member.is_online,
-            'last_active_at': member.last_active_at.isoformat() if member.last_active_at else None,
-            'joined_at': member.joined_at.isoformat() if member.joined_at else None
-        })
-    
-    return result
+    return [member_info(member) for member in query.all()]
+
+def member_info(member: models.SyncRoomMember) -> dict:
+    """成员信息（需已加载 member.user）"""
+    return {
+        'id': member.id,
+        'user_id': member.user_id,
+        'username': member.user.username,
+        'nickname': member.nickname or member.user.username,
+        'is_verified': member.is_verified,
+        'is_online': member.is_online,
+        'last_active_at': member.last_active_at.isoformat() if member.last_active_at else None,
+        'joined_at': member.joined_at.isoformat() if member.joined_at else None
+    }
 
 def is_room_member(db: Session, room_id: int, user_id: int) -> bool:
     """检查用户是否是房间成员"""
@@ -227,13 +340,19 @@ def create_message(db: Session, room_id: int, user_id: int, message: str) -> mod
     db.refresh(db_message)
     return db_message
 
-def get_room_messages(db: Session, room_id: int, skip: int = 0, limit: int = 50):
-    """获取房间聊天记录"""
-    messages = db.query(models.SyncRoomMessage).options(
+def get_room_messages(db: Session, room_id: int, skip: int = 0, limit: int = 50,
+                      before: Optional[str] = None, after: Optional[str] = None):
+    """获取房间聊天记录（正序返回）
+
+    向上翻看历史时传入 before=上一页的 next_cursor，沿 (room_id, created_at, id) 索引定位
+    """
+    query = db.query(models.SyncRoomMessage).options(
         joinedload(models.SyncRoomMessage.user)
     ).filter(
         models.SyncRoomMessage.room_id == room_id
-    ).order_by(models.SyncRoomMessage.created_at.desc()).offset(skip).limit(limit).all()
+    )
+    messages = keyset_page(query, models.SyncRoomMessage.created_at, models.SyncRoomMessage.id, limit,
+                           skip=skip, before=before, after=after)
     
     result = []
     for msg in messages:
@@ -246,46 +365,48 @@ def get_room_messages(db: Session, room_id: int, skip: int = 0, limit: int = 50)
             'created_at': to_beijing_time(msg.created_at).isoformat() if msg.created_at else None
         })
     
-    return list(reversed(result))  # 返回正序
+    return messages.with_items(reversed(result))  # 返回正序
 
 # 管理员功能
-def get_all_rooms_admin(db: Session, skip: int = 0, limit: int = 100):
-    """管理员获取所有房间列表（包含成员数量和在线人数）"""
-    rooms = db.query(models.SyncRoom).filter(
+def get_all_rooms_admin(db: Session, skip: int = 0, limit: int = 100,
+                        before: Optional[str] = None, after: Optional[str] = None):
+    """管理员获取所有房间列表（包含成员数量和在线人数）
+
+    房主用户名与成员统计在同一条分组查询中取出
+    """
+    total_members, online_members = _room_member_counts()
+    
+    query = db.query(
+        models.SyncRoom, models.User.username, total_members, online_members
+    ).outerjoin(
+        models.User, models.User.id == models.SyncRoom.host_user_id
+    ).outerjoin(
+        models.SyncRoomMember, models.SyncRoomMember.room_id == models.SyncRoom.id
+    ).filter(
         models.SyncRoom.is_active == True
-    ).order_by(models.SyncRoom.created_at.desc()).offset(skip).limit(limit).all()
+    ).group_by(
+        models.SyncRoom.id, models.User.id
+    )
+    rows = keyset_page(query, models.SyncRoom.created_at, models.SyncRoom.id, limit,
+                       skip=skip, before=before, after=after, key=lambda row: row[0])
     
     result = []
-    for room in rooms:
-        # 总成员数
-        total_members = db.query(models.SyncRoomMember).filter(
-            models.SyncRoomMember.room_id == room.id
-        ).count()
-        
-        # 在线成员数
-        online_members = db.query(models.SyncRoomMember).filter(
-            models.SyncRoomMember.room_id == room.id,
-            models.SyncRoomMember.is_online == True
-        ).count()
-        
-        # 获取房主信息
-        host = db.query(models.User).filter(models.User.id == room.host_user_id).first()
-        
+    for room, host_username, total_count, online_count in rows:
         result.append({
             'id': room.id,
             'room_code': room.room_code,
             'room_name': room.room_name,
-            'host_username': host.username if host else 'Unknown',
+            'host_username': host_username or 'Unknown',
             'control_mode': room.control_mode,
             'mode': room.mode,
-            'total_members': total_members,
-            'online_members': online_members,
+            'total_members': int(total_count),
+            'online_members': int(online_count),
             'is_playing': room.is_playing,
             'created_at': to_beijing_time(room.created_at).isoformat() if room.created_at else None,
             'updated_at': room.updated_at.isoformat() if room.updated_at else None
         })
     
-    return result
+    return rows.with_items(result)
 
 def delete_room_admin(db: Session, room_id: int) -> bool:
     """管理员删除房间"""
@@ -296,42 +417,115 @@ def delete_room_admin(db: Session, room_id: int) -> bool:
     # 删除房间（级联删除成员和消息）
     db.delete(room)
     db.commit()
+    video_grants.invalidate_room(room_id)
     return True
 
 # 自动清理功能
-def cleanup_empty_rooms(db: Session, minutes: int = 10) -> int:
+@dataclass
+class CleanupReport:
+    """空房间清理结果，timings_ms 为各阶段耗时"""
+    dry_run: bool = False
+    rooms: int = 0
+    members: int = 0
+    messages: int = 0
+    batches: int = 0
+    room_ids: List[int] = field(default_factory=list)
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+
+    def add_timing(self, phase: str, start: float):
+        self.timings_ms[phase] = round(self.timings_ms.get(phase, 0.0) + (time.perf_counter() - start) * 1000, 3)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+def _empty_rooms_query(cutoff_time: datetime):
+    """超过 cutoff_time 未更新且没有在线成员的活跃房间 id（NOT EXISTS 反连接）"""
+    online_member = select(models.SyncRoomMember.id).where(
+        models.SyncRoomMember.room_id == models.SyncRoom.id,
+        models.SyncRoomMember.is_online == True
+    ).exists()
+    return select(models.SyncRoom.id).where(
+        models.SyncRoom.is_active == True,
+        models.SyncRoom.updated_at < cutoff_time,
+        ~online_member
+    )
+
+def _count_by_room(db: Session, model, room_ids: List[int]) -> int:
+    return db.scalar(select(func.count(model.id)).where(model.room_id.in_(room_ids))) or 0
+
+def cleanup_empty_rooms(db: Session, minutes: int = 10, dry_run: bool = False,
+                        batch_size: int = None) -> CleanupReport:
     """清理超过指定时间无人的房间
+
+    一次反连接查询选出候选房间，再按批批量删除消息、成员和房间，每批一个事务；
+    删除前在批次事务内重新检查条件，选出候选后又有成员上线的房间不会被删除
     
     Args:
         minutes: 无人房间超时时间（分钟）
+        dry_run: 只统计将被删除的房间、成员和消息数，不删除
+        batch_size: 每批房间数，默认 ROOM_CLEANUP_BATCH_SIZE
         
     Returns:
-        删除的房间数量
+        CleanupReport（rooms 为删除的房间数量）
     """
-    from datetime import timedelta
-    
+    batch_size = batch_size or config.ROOM_CLEANUP_BATCH_SIZE
     cutoff_time = datetime.utcnow() - timedelta(minutes=minutes)
-    
-    # 查找所有活跃房间
-    rooms = db.query(models.SyncRoom).filter(
-        models.SyncRoom.is_active == True
-    ).all()
-    
-    deleted_count = 0
-    
-    for room in rooms:
-        # 检查房间是否有在线成员
-        online_members = db.query(models.SyncRoomMember).filter(
-            models.SyncRoomMember.room_id == room.id,
-            models.SyncRoomMember.is_online == True
-        ).count()
-        
-        # 如果没有在线成员且更新时间超过阈值
-        if online_members == 0 and room.updated_at < cutoff_time:
-            db.delete(room)
-            deleted_count += 1
-    
-    if deleted_count > 0:
-        db.commit()
-    
-    return deleted_count
+    candidates = _empty_rooms_query(cutoff_time)
+    report = CleanupReport(dry_run=dry_run)
+
+    start = time.perf_counter()
+    room_ids = list(db.scalars(candidates))
+    db.rollback()  # 结束只读事务，批次中的重新检查读取最新数据（MySQL 可重复读下事务内是快照）
+    report.add_timing("select", start)
+
+    for i in range(0, len(room_ids), batch_size):
+        chunk = room_ids[i:i + batch_size]
+        report.batches += 1
+
+        if dry_run:
+            start = time.perf_counter()
+            report.messages += _count_by_room(db, models.SyncRoomMessage, chunk)
+            report.members += _count_by_room(db, models.SyncRoomMember, chunk)
+            report.rooms += len(chunk)
+            report.room_ids.extend(chunk)
+            report.add_timing("count", start)
+            continue
+
+        try:
+            start = time.perf_counter()
+            chunk = list(db.scalars(candidates.where(models.SyncRoom.id.in_(chunk))))
+            report.add_timing("recheck", start)
+            if not chunk:
+                db.rollback()
+                continue
+
+            start = time.perf_counter()
+            messages = db.execute(delete(models.SyncRoomMessage).where(
+                models.SyncRoomMessage.room_id.in_(chunk)
+            ).execution_options(synchronize_session=False)).rowcount
+            report.add_timing("messages", start)
+
+            start = time.perf_counter()
+            members = db.execute(delete(models.SyncRoomMember).where(
+                models.SyncRoomMember.room_id.in_(chunk)
+            ).execution_options(synchronize_session=False)).rowcount
+            report.add_timing("members", start)
+
+            start = time.perf_counter()
+            rooms = db.execute(delete(models.SyncRoom).where(
+                models.SyncRoom.id.in_(chunk)
+            ).execution_options(synchronize_session=False)).rowcount
+            db.commit()
+            report.add_timing("rooms", start)
+        except Exception:
+            db.rollback()
+            raise
+
+        report.messages += messages
+        report.members += members
+        report.rooms += rooms
+        report.room_ids.extend(chunk)
+        for room_id in chunk:
+            video_grants.invalidate_room(room_id)
+
+    return report
@@ -0,0 +1,98 @@
+"""
+同步观影数据库操作的异步版本（AsyncSession）
+
+供 websocket_server 中的 Socket.IO 事件处理使用：查询通过异步驱动（aiomysql）执行，
+等待数据库时事件循环可以继续处理其他连接。语义与 sync_room_crud 中的同名函数一致
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from . import models, video_fingerprint
+from .sync_room_crud import member_info, verification_result
+
+
+async def get_room_by_id(db: AsyncSession, room_id: int) -> Optional[models.SyncRoom]:
+    """通过ID获取房间"""
+    return await db.scalar(select(models.SyncRoom).where(
+        models.SyncRoom.id == room_id,
+        models.SyncRoom.is_active == True
+    ))
+
+
+async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    return await db.get(models.User, user_id)
+
+
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[models.User]:
+    return await db.scalar(select(models.User).where(models.User.username == username))
+
+
+async def get_user_room_ids(db: AsyncSession, user_id: int) -> List[int]:
+    """用户所属的全部房间 id（Socket.IO 连接时缓存到 session）"""
+    return list(await db.scalars(select(models.SyncRoomMember.room_id).where(
+        models.SyncRoomMember.user_id == user_id
+    )))
+
+
+async def get_member(db: AsyncSession, room_id: int, user_id: int) -> Optional[models.SyncRoomMember]:
+    return await db.scalar(select(models.SyncRoomMember).where(
+        models.SyncRoomMember.room_id == room_id,
+        models.SyncRoomMember.user_id == user_id
+    ).limit(1))
+
+
+async def is_room_member(db: AsyncSession, room_id: int, user_id: int) -> bool:
+    """检查用户是否是房间成员"""
+    return await db.scalar(select(models.SyncRoomMember.id).where(
+        models.SyncRoomMember.room_id == room_id,
+        models.SyncRoomMember.user_id == user_id
+    ).limit(1)) is not None
+
+
+async def get_room_members(db: AsyncSession, room_id: int, online_only: bool = True) -> List[dict]:
+    """获取房间成员列表"""
+    query = select(models.SyncRoomMember).options(
+        joinedload(models.SyncRoomMember.user)
+    ).where(
+        models.SyncRoomMember.room_id == room_id
+    )
+    # 默认只返回在线成员
+    if online_only:
+        query = query.where(models.SyncRoomMember.is_online == True)
+    return [member_info(member) for member in await db.scalars(query)]
+
+
+async def leave_room(db: AsyncSession, room_id: int, user_id: int) -> bool:
+    """离开房间 - 设置为离线状态而非删除"""
+    member = await get_member(db, room_id, user_id)
+    if not member:
+        return False
+
+    # 标记为离线，但保留成员记录
+    member.is_online = False
+    member.last_active_at = datetime.utcnow()
+
+    # 房主离开，转为全员控制模式
+    await db.execute(update(models.SyncRoom).where(
+        models.SyncRoom.id == room_id,
+        models.SyncRoom.is_active == True,
+        models.SyncRoom.host_user_id == user_id,
+        models.SyncRoom.control_mode == "host_only"
+    ).values(control_mode="all_members", updated_at=datetime.utcnow()))
+    await db.commit()
+    return True
+
+
+async def verify_member_video(db: AsyncSession, room: models.SyncRoom, user_id: int, size: int,
+                              fingerprint: str = None, sha256: str = None) -> Optional[dict]:
+    """本地模式成员校验视频，见 sync_room_crud.verify_member_video"""
+    verified, method = video_fingerprint.compare(room, size, fingerprint, sha256)
+    member = await get_member(db, room.id, user_id)
+    if member and verified is not None and member.is_verified != verified:
+        member.is_verified = verified
+        await db.commit()
+    return verification_result(room, user_id, member, verified, method)
@@ -0,0 +1,117 @@
+"""
+播放进度同步调度
+
+服务端用 RoomState 的锚点模型（anchor + rate × 经过时间）推算房间播放进度，
+它代表成员最近一次收到的进度。房主的 time_update 只用来测量偏差:
+偏差超过阈值才广播 time_sync 校正，否则合并丢弃；
+播放中的房间另外按较低频率发送心跳，纠正成员本地的累计误差
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from .config import config
+from .room_state import RoomState, state_engine
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SyncSchedulerMetrics:
+    """同步调度统计"""
+    updates_received: int = 0
+    coalesced: int = 0  # 偏差在阈值内、未广播的房主时间更新
+    corrections: int = 0  # 偏差超过阈值触发的校正广播
+    heartbeats: int = 0
+    max_drift: float = 0.0  # 观测到的最大偏差(秒)
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data["broadcast_ratio"] = (
+            round((self.corrections + self.heartbeats) / self.updates_received, 4)
+            if self.updates_received else 0
+        )
+        return data
+
+
+class SyncScheduler:
+    """按偏差阈值和心跳间隔决定何时广播 time_sync"""
+
+    def __init__(self, drift_threshold: float = 0.5, heartbeat_interval: float = 15.0):
+        self.drift_threshold = drift_threshold
+        self.heartbeat_interval = heartbeat_interval
+        self.metrics = SyncSchedulerMetrics()
+        self._last_sync: Dict[int, float] = {}  # room_id -> 最近一次广播进度的时间(monotonic)
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_synced(self, room_id: int, now: Optional[float] = None):
+        """记录房间刚广播过进度（校正、心跳或播放控制）"""
+        self._last_sync[room_id] = time.monotonic() if now is None else now
+
+    def forget(self, room_id: int):
+        self._last_sync.pop(room_id, None)
+
+    def on_host_time(self, state: RoomState, reported: float, now: Optional[float] = None) -> Optional[float]:
+        """处理房主上报的播放时间
+
+        Returns:
+            需要广播校正时返回偏差(秒)，否则返回 None
+        """
+        now = time.monotonic() if now is None else now
+        drift = float(reported) - state.current_position(now)
+        self.metrics.updates_received += 1
+        self.metrics.max_drift = max(self.metrics.max_drift, abs(drift))
+
+        if abs(drift) <= self.drift_threshold:
+            self.metrics.coalesced += 1
+            return None
+
+        # 以房主进度为准重设锚点
+        state.set_position(reported, now)
+        self.mark_synced(state.room_id, now)
+        self.metrics.corrections += 1
+        return drift
+
+    def due_heartbeats(self, states: Iterable[RoomState], now: Optional[float] = None) -> List[RoomState]:
+        """返回需要发送心跳的播放中房间，并记录为已同步"""
+        now = time.monotonic() if now is None else now
+        due = []
+        for state in states:
+            # 已无连接的房间（包括其他 worker 同步来的副本）不发送心跳
+            if not state.is_playing or state.released:
+                continue
+            last = self._last_sync.get(state.room_id)
+            if last is None or now - last >= self.heartbeat_interval:
+                self.mark_synced(state.room_id, now)
+                due.append(state)
+        self.metrics.heartbeats += len(due)
+        return due
+
+    async def run_heartbeats(self, emit: Callable[[RoomState], Awaitable[None]]):
+        """心跳任务：检查间隔为心跳间隔的一半"""
+        logger.info(f"进度心跳任务启动 - 偏差阈值:{self.drift_threshold}秒, 心跳间隔:{self.heartbeat_interval}秒")
+        while True:
+            await asyncio.sleep(self.heartbeat_interval / 2)
+            try:
+                for state in self.due_heartbeats(state_engine.active_states()):
+                    await emit(state)
+            except Exception as e:
+                logger.error(f"进度心跳任务出错: {str(e)}")
+
+    def start(self, emit: Callable[[RoomState], Awaitable[None]]):
+        """在当前事件循环中启动心跳任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_heartbeats(emit))
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+sync_scheduler = SyncScheduler(
+    drift_threshold=config.SYNC_DRIFT_THRESHOLD,
+    heartbeat_interval=config.SYNC_HEARTBEAT_INTERVAL,
+)
@@ -0,0 +1,100 @@
+"""
+本地模式房间的视频抽样指纹
+
+本地模式下成员播放各自的视频文件，加入房间时要确认和房主的是同一个文件。
+对几 GB 的文件计算完整 SHA-256 太慢，这里改为抽样指纹:
+
+    在文件中按固定规则取 FINGERPRINT_SAMPLES 个 FINGERPRINT_CHUNK_SIZE 字节的分块
+    （第一块从 0 开始，最后一块在文件末尾，其余等间距分布），
+    fingerprint = SHA-256("fp1:<分块数>:<分块大小>:<文件大小>:" + 各分块依次拼接)
+
+只读取约 1MB 数据，与文件大小无关。文件不大于 分块数 × 分块大小 时直接读取整个文件。
+抽样参数写入了哈希前缀，两端参数不一致只会导致比对失败，再走完整 SHA-256 回退。
+
+房主创建/更新房间时提交 video_size、video_fingerprint（可选再提交完整的 video_hash），
+成员通过 POST /api/sync-rooms/{room_id}/verify-video 或 Socket.IO 事件 verify_video 提交自己文件的
+size + fingerprint（或 sha256）完成校验，结果写入 SyncRoomMember.is_verified
+"""
+import hashlib
+import os
+import re
+from typing import Iterable, List, Optional, Tuple
+
+from .config import config
+
+FINGERPRINT_VERSION = "fp1"
+_HEX64 = re.compile(r"^[0-9a-f]{64}$")
+
+
+def spec(samples: int = None, chunk_size: int = None) -> dict:
+    """抽样参数，随房间信息下发给客户端"""
+    return {
+        "version": FINGERPRINT_VERSION,
+        "samples": samples or config.FINGERPRINT_SAMPLES,
+        "chunk_size": chunk_size or config.FINGERPRINT_CHUNK_SIZE,
+    }
+
+
+def sample_offsets(size: int, samples: int = None, chunk_size: int = None) -> List[Tuple[int, int]]:
+    """返回要读取的 (起点, 长度) 列表"""
+    samples = samples or config.FINGERPRINT_SAMPLES
+    chunk_size = chunk_size or config.FINGERPRINT_CHUNK_SIZE
+    if size <= samples * chunk_size:
+        return [(offset, min(chunk_size, size - offset)) for offset in range(0, size, chunk_size)]
+    if samples == 1:
+        return [(0, chunk_size)]
+    step = (size - chunk_size) / (samples - 1)
+    return [(int(i * step), chunk_size) for i in range(samples)]
+
+
+def fingerprint_chunks(size: int, chunks: Iterable[bytes], samples: int = None, chunk_size: int = None) -> str:
+    """由按 sample_offsets 顺序读出的分块计算指纹"""
+    params = spec(samples, chunk_size)
+    hasher = hashlib.sha256(
+        f"{params['version']}:{params['samples']}:{params['chunk_size']}:{size}:".encode()
+    )
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def fingerprint_file(path: str, samples: int = None, chunk_size: int = None) -> Tuple[int, str]:
+    """计算文件的 (大小, 指纹)"""
+    with open(path, "rb", buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        chunks = (os.pread(f.fileno(), length, offset)
+                  for offset, length in sample_offsets(size, samples, chunk_size))
+        return size, fingerprint_chunks(size, chunks, samples, chunk_size)
+
+
+def normalize(value: Optional[str]) -> Optional[str]:
+    """统一为小写十六进制，格式不对时返回 None"""
+    if not value:
+        return None
+    value = value.strip().lower()
+    return value if _HEX64.match(value) else None
+
+
+def requires_verification(room) -> bool:
+    """本地模式且房主提供了参考值时，成员需要校验视频"""
+    return room.mode == "local" and bool(room.video_fingerprint or room.video_hash)
+
+
+def compare(room, size: Optional[int], fingerprint: Optional[str] = None,
+            sha256: Optional[str] = None) -> Tuple[Optional[bool], Optional[str]]:
+    """把成员提交的文件信息与房间的参考值比较
+
+    Returns:
+        (结果, 方式)。结果为 None 表示无法判断（房间只有完整哈希而成员只提交了指纹），
+        客户端应计算完整 SHA-256 后重新提交；方式为 size / fingerprint / sha256，房间未设置参考值时为 None
+    """
+    fingerprint, sha256 = normalize(fingerprint), normalize(sha256)
+    if room.video_size is not None and size is not None and size != room.video_size:
+        return False, "size"
+    if fingerprint and room.video_fingerprint:
+        return fingerprint == room.video_fingerprint, "fingerprint"
+    if sha256 and room.video_hash:
+        return sha256 == room.video_hash, "sha256"
+    if room.video_fingerprint or room.video_hash:
+        return None, None
+    return True, None
@@ -0,0 +1,286 @@
+"""
+按内容寻址的视频存储（去重）
+
+上传的视频以 SHA-256 命名保存在 UPLOAD_DIR/videos/<sha256><扩展名>，同一内容只存一份:
+- 上传前可用哈希预检，已存在时直接关联到房间，跳过上传
+- 引用计数 = 引用该哈希的活跃上传模式房间数，以数据库为准（sync_room_crud.get_video_refcounts），不会与房间数据漂移
+- 最后一个房间不再引用后，blob 闲置超过 idle_ttl 秒由 background_tasks 回收
+- 总占用超过配额时，按最近使用时间（文件 mtime）淘汰未被引用的 blob；被引用的 blob 不会被淘汰
+- 创建上传会话时按文件大小预留配额（reserve），合并入库或会话结束时释放（release），
+  并发上传的预留之和计入配额，不会一起超出
+- 刚入库或预检命中的 blob 在写入房间之前没有房间引用，先固定（pin），房间提交后 unpin，期间不会被回收或淘汰
+
+预留和固定保存在当前进程中（进程重启后未完成的上传不再占用预留）
+
+最近使用时间记录在文件 mtime 上（预检命中、关联房间、回收时仍被引用），进程重启后 LRU 顺序不丢失
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+
+class StoreFull(Exception):
+    """配额内放不下新的视频（被引用的 blob 已占满配额）"""
+
+
+@dataclass
+class VideoStoreMetrics:
+    """视频存储统计"""
+    blobs: int = 0
+    usage_bytes: int = 0
+    referenced_blobs: int = 0
+    dedup_hits: int = 0  # 预检命中，跳过上传
+    dedup_bytes_saved: int = 0
+    ingested: int = 0
+    ingest_duplicates: int = 0  # 上传完成时发现已有相同内容
+    collected: int = 0  # 闲置超时回收
+    evicted: int = 0  # 超出配额淘汰
+    freed_bytes: int = 0
+    reserved_bytes: int = 0  # 进行中的上传预留的字节数
+    pinned_blobs: int = 0  # 已入库、尚未写入房间的 blob 数
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class Blob:
+    video_hash: str
+    name: str  # videos/ 下的文件名
+    size: int
+    last_used: float
+
+
+class VideoStore:
+    """内容寻址的视频 blob 存储
+
+    Args:
+        root: UPLOAD_DIR，blob 放在 root/videos/ 下
+        quota_bytes: 总占用上限(字节)，0 表示不限
+        idle_ttl: 未被引用的 blob 闲置多久后回收(秒)
+    """
+
+    def __init__(self, root: Path, quota_bytes: int = 0, idle_ttl: float = 3600):
+        self.root = Path(root)
+        self.directory = self.root / "videos"
+        self.quota_bytes = quota_bytes
+        self.idle_ttl = idle_ttl
+        self.metrics = VideoStoreMetrics()
+        self._blobs: Optional[Dict[str, Blob]] = None  # 首次使用时扫描目录
+        self._reservations: Dict[str, int] = {}  # 上传会话 id -> 预留字节数
+        self._pins: Dict[str, int] = {}  # video_hash -> 尚未写入房间的关联数
+        self._lock = threading.RLock()  # 上传完成在线程池、回收在后台线程中执行
+
+    # ---- 索引 ----
+
+    def _index(self) -> Dict[str, Blob]:
+        if self._blobs is None:
+            blobs = {}
+            if self.directory.exists():
+                for entry in os.scandir(self.directory):
+                    video_hash = entry.name.split(".", 1)[0]
+                    if entry.is_file() and len(video_hash) == 64 and not entry.name.startswith("."):
+                        stat = entry.stat()
+                        blobs[video_hash] = Blob(video_hash, entry.name, stat.st_size, stat.st_mtime)
+            self._blobs = blobs
+            self._update_usage()
+        return self._blobs
+
+    def _update_usage(self):
+        self.metrics.blobs = len(self._blobs)
+        self.metrics.usage_bytes = sum(blob.size for blob in self._blobs.values())
+
+    def _touch(self, blob: Blob):
+        blob.last_used = time.time()
+        try:
+            os.utime(self.directory / blob.name, (blob.last_used, blob.last_used))
+        except OSError:
+            pass
+
+    def source(self, blob: Blob) -> str:
+        """相对 UPLOAD_DIR 的路径，写入 SyncRoom.video_source"""
+        return f"videos/{blob.name}"
+
+    def temp_path(self, name: str) -> Path:
+        """与 blob 同一目录的临时文件（合并后可原子改名）"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return self.directory / f".{name}.tmp"
+
+    # ---- 去重 ----
+
+    def lookup(self, video_hash: str, size: Optional[int] = None) -> Optional[Blob]:
+        """预检: 已有该内容时返回 blob 并刷新最近使用时间"""
+        video_hash = video_hash.lower()
+        with self._lock:
+            blob = self._index().get(video_hash)
+            if blob is None or (size is not None and blob.size != size):
+                return None
+            if not (self.directory / blob.name).exists():
+                del self._blobs[video_hash]
+                self._update_usage()
+                return None
+            self._touch(blob)
+            return blob
+
+    def claim(self, video_hash: str, size: Optional[int] = None) -> Optional[Blob]:
+        """预检命中并将直接关联到房间（计入去重统计），命中的 blob 已固定，写入房间后调用 unpin"""
+        with self._lock:
+            blob = self.lookup(video_hash, size)
+            if blob is not None:
+                self._pin(blob.video_hash)
+        if blob is not None:
+            self.metrics.dedup_hits += 1
+            self.metrics.dedup_bytes_saved += blob.size
+        return blob
+
+    def ingest(self, temp_path: Path, video_hash: str, extension: str, reservation: Optional[str] = None) -> Blob:
+        """把合并好的临时文件放入存储；已有相同内容时丢弃临时文件
+
+        reservation 对应的预留同时释放（转为实际占用）；返回的 blob 已固定，写入房间后调用 unpin
+        """
+        with self._lock:
+            self.release(reservation)
+            blob = self.lookup(video_hash)
+            if blob is not None:
+                os.unlink(temp_path)
+                self.metrics.ingest_duplicates += 1
+            else:
+                name = f"{video_hash}{extension}"
+                os.replace(temp_path, self.directory / name)
+                blob = Blob(video_hash, name, os.path.getsize(self.directory / name), time.time())
+                self._index()[video_hash] = blob
+                self._update_usage()
+                self.metrics.ingested += 1
+            self._pin(blob.video_hash)
+            return blob
+
+    def _pin(self, video_hash: str):
+        self._pins[video_hash] = self._pins.get(video_hash, 0) + 1
+        self.metrics.pinned_blobs = len(self._pins)
+
+    def unpin(self, video_hash: str):
+        """blob 已写入房间（或关联失败），此后由房间引用计数保护
+
+        同时刷新最近使用时间: 在此之前统计的引用计数还不包含该房间，collect 据此不回收它
+        """
+        with self._lock:
+            remaining = self._pins.get(video_hash, 0) - 1
+            if remaining > 0:
+                self._pins[video_hash] = remaining
+            else:
+                self._pins.pop(video_hash, None)
+            self.metrics.pinned_blobs = len(self._pins)
+            blob = self._index().get(video_hash)
+            if blob is not None:
+                self._touch(blob)
+
+    # ---- 配额与回收 ----
+
+    def _remove(self, blob: Blob):
+        try:
+            os.unlink(self.directory / blob.name)
+        except FileNotFoundError:
+            pass
+        del self._blobs[blob.video_hash]
+        self.metrics.freed_bytes += blob.size
+
+    def _unreferenced_lru(self, referenced: Iterable[str]) -> List[Blob]:
+        """可回收的 blob（未被房间引用也未固定），最久未使用的在前"""
+        protected = set(referenced) | set(self._pins)
+        return sorted(
+            (blob for blob in self._index().values() if blob.video_hash not in protected),
+            key=lambda blob: blob.last_used,
+        )
+
+    @property
+    def _reserved(self) -> int:
+        return sum(self._reservations.values())
+
+    def reserve(self, key: str, size: int, referenced: Iterable[str]) -> int:
+        """为即将上传的 size 字节预留配额（必要时淘汰 blob 腾出空间），返回淘汰的 blob 数
+
+        Args:
+            key: 上传会话 id，入库（ingest）或会话结束（release）时释放
+        Raises:
+            StoreFull: 淘汰所有可回收的 blob 后仍放不下
+        """
+        if not self.quota_bytes:
+            return 0
+        with self._lock:
+            index = self._index()
+            protected = set(referenced) | set(self._pins)
+            kept = sum(blob.size for blob in index.values() if blob.video_hash in protected)
+            if kept + self._reserved + size > self.quota_bytes:
+                raise StoreFull(size)
+            evicted = 0
+            for blob in self._unreferenced_lru(referenced):
+                if self.metrics.usage_bytes + self._reserved + size <= self.quota_bytes:
+                    break
+                self._remove(blob)
+                self._update_usage()
+                evicted += 1
+            self._reservations[key] = size
+            self.metrics.reserved_bytes = self._reserved
+            self.metrics.evicted += evicted
+            return evicted
+
+    def release(self, key: Optional[str]):
+        """释放上传会话的预留（会话完成、取消或过期）"""
+        with self._lock:
+            if self._reservations.pop(key, None) is not None:
+                self.metrics.reserved_bytes = self._reserved
+
+    def collect(self, refcounts: Dict[str, int], now: Optional[float] = None,
+                counted_at: Optional[float] = None) -> Tuple[int, int]:
+        """回收闲置超时的未引用 blob，并把占用压回配额内
+
+        Args:
+            refcounts: video_hash -> 引用该视频的房间数
+            counted_at: 统计 refcounts 的时刻，此后使用过的 blob 可能刚写入房间，视为被引用
+        Returns:
+            (闲置回收数, 配额淘汰数)
+        """
+        now = time.time() if now is None else now
+        referenced = {video_hash for video_hash, count in refcounts.items() if count > 0}
+        with self._lock:
+            self._blobs = None  # 重新扫描，纳入其他进程写入或人工删除的文件
+            index = self._index()
+            if counted_at is not None:
+                referenced |= {blob.video_hash for blob in index.values() if blob.last_used >= counted_at}
+            for video_hash in referenced:
+                if video_hash in index:
+                    self._touch(index[video_hash])  # 仍被引用的 blob 始终是“最近使用”的
+
+            collected = evicted = 0
+            usage = self.metrics.usage_bytes + self._reserved
+            for blob in self._unreferenced_lru(referenced):
+                if now - blob.last_used >= self.idle_ttl:
+                    collected += 1
+                elif self.quota_bytes and usage > self.quota_bytes:
+                    evicted += 1
+                else:
+                    continue
+                self._remove(blob)
+                usage -= blob.size
+            self._update_usage()
+            self.metrics.referenced_blobs = len(referenced & set(index))
+            self.metrics.collected += collected
+            self.metrics.evicted += evicted
+        if collected or evicted:
+            logger.info(f"视频存储回收 {collected} 个闲置、淘汰 {evicted} 个超额的 blob")
+        return collected, evicted
+
+
+video_store = VideoStore(
+    root=config.UPLOAD_DIR,
+    quota_bytes=config.VIDEO_STORE_QUOTA_BYTES,
+    idle_ttl=config.VIDEO_STORE_IDLE_TTL,
+)
@@ -0,0 +1,293 @@
+"""
+上传模式房间的视频播放（HTTP Range）
+
+GET/HEAD /api/sync-rooms/{room_id}/video 供 <video> 标签拖动进度时按字节区间读取:
+- Range: 单区间返回 206，多区间返回 multipart/byteranges，无法满足返回 416
+- If-Range / If-None-Match: 以 ETag（上传文件为内容的 SHA-256）判断文件是否变化
+- 服务器支持 ASGI zerocopysend 扩展时由内核 sendfile 发送，否则在线程池中按块 pread
+- 配置 VIDEO_ACCEL_REDIRECT 时只做鉴权，由 nginx 的 internal location 以 sendfile 发送
+  （Range / If-Range 由 nginx 处理），例如:
+      location /_protected_uploads/ { internal; alias /path/to/uploads/; }
+
+鉴权: <video> 无法带 Authorization 头，也接受 ?token= 参数。
+(token, room_id) 的校验结果（成员身份、文件路径、大小、ETag）缓存 VIDEO_GRANT_TTL 秒，
+拖动进度产生的大量请求不查数据库。房间视频变更或房间关闭时由 sync_room_crud 调用 invalidate_room 立即失效
+"""
+import mimetypes
+import os
+import threading
+import uuid
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+import anyio
+from fastapi import Response
+
+from .auth_cache import TTLCache
+from .config import config
+
+STREAM_CHUNK = 256 * 1024  # 不支持 zerocopysend 时每次读取的字节数
+MAX_RANGES = 16  # 超过时忽略 Range 返回整个文件
+
+
+@dataclass
+class VideoStreamMetrics:
+    """视频播放统计"""
+    requests: int = 0
+    full: int = 0  # 200
+    partial: int = 0  # 206 单区间
+    multipart: int = 0  # 206 多区间
+    not_modified: int = 0
+    unsatisfiable: int = 0
+    zerocopy: int = 0  # 通过 zerocopysend 发送的响应
+    accel_redirect: int = 0  # 交给 nginx 发送的响应
+    bytes_sent: int = 0  # 应用自己发送的字节数
+    grant_hits: int = 0
+    grant_misses: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class VideoGrant:
+    """一次鉴权的结果: 某 token 可以读取某房间的视频"""
+    room_id: int
+    user_id: int
+    path: str
+    source: str  # 相对 UPLOAD_DIR 的路径（X-Accel-Redirect 使用）
+    size: int
+    etag: str
+    last_modified: datetime
+    media_type: str
+    version: int  # 房间版本，房间失效后旧授权作废
+
+
+class VideoGrantCache:
+    """(token, room_id) -> VideoGrant，带房间版本号以便按房间失效"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def version(self, room_id: int) -> int:
+        return self._versions.get(room_id, 0)
+
+    def get(self, token: str, room_id: int) -> Optional[VideoGrant]:
+        grant = self._cache.get((token, room_id))
+        if grant is not None and grant.version != self.version(room_id):
+            self._cache.pop((token, room_id))
+            return None
+        return grant
+
+    def set(self, token: str, grant: VideoGrant):
+        self._cache.set((token, grant.room_id), grant)
+
+    def invalidate_room(self, room_id: int):
+        with self._lock:
+            self._versions[room_id] = self.version(room_id) + 1
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+def build_grant(room_id: int, user_id: int, source: str, video_hash: Optional[str], version: int) -> Optional[VideoGrant]:
+    """定位房间视频文件，文件不在 UPLOAD_DIR 内或不存在时返回 None"""
+    root = os.path.realpath(config.UPLOAD_DIR)
+    path = os.path.realpath(os.path.join(root, source))
+    if os.path.commonpath([root, path]) != root:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if video_hash and os.path.basename(path).startswith(video_hash):
+        etag = f'"{video_hash}"'  # 内容寻址的文件，哈希即强校验值
+    else:
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    return VideoGrant(
+        room_id=room_id, user_id=user_id, path=path, source=os.path.relpath(path, root).replace(os.sep, "/"),
+        size=stat.st_size, etag=etag,
+        last_modified=datetime.fromtimestamp(int(stat.st_mtime), tz=timezone.utc),
+        media_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+        version=version,
+    )
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    """解析 Range 头，返回按顺序合并后的闭区间列表
+
+    Returns:
+        None 表示忽略 Range（无此头、语法错误或区间过多），空列表表示无法满足(416)
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    ranges = []
+    for spec in header[6:].split(","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        start, sep, end = spec.partition("-")
+        if not sep:
+            return None
+        try:
+            if start == "":
+                suffix = int(end)  # bytes=-500 最后 500 字节
+                if suffix <= 0:
+                    continue
+                first, last = max(0, size - suffix), size - 1
+            else:
+                first = int(start)
+                last = int(end) if end else size - 1
+                if end and last < first:
+                    return None
+                last = min(last, size - 1)
+        except ValueError:
+            return None
+        if first < 0:
+            return None
+        if first < size:
+            ranges.append((first, last))
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    merged: List[Tuple[int, int]] = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def if_range_matches(header: Optional[str], grant: VideoGrant) -> bool:
+    """If-Range 为强 ETag 或 Last-Modified 日期，不匹配时应返回整个文件"""
+    if not header:
+        return True
+    header = header.strip()
+    if header.startswith('"'):
+        return header == grant.etag
+    try:
+        return parsedate_to_datetime(header) >= grant.last_modified
+    except (TypeError, ValueError):
+        return False
+
+
+def _read_at(file, length: int, offset: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(file.fileno(), length, offset)
+    file.seek(offset)
+    return file.read(length)
+
+
+class RangeFileResponse(Response):
+    """按区间发送文件的响应（整个文件也视为一个区间）"""
+
+    def __init__(self, grant: VideoGrant, status_code: int, ranges: List[Tuple[int, int]],
+                 headers: Dict[str, str], send_body: bool, metrics: VideoStreamMetrics):
+        self.grant = grant
+        self.send_body = send_body
+        self.metrics = metrics
+        self.parts: List[Tuple[bytes, int, int]] = []  # (分段头, 起点, 长度)
+        self.trailer = b""
+        headers = dict(headers)
+
+        if len(ranges) > 1:
+            boundary = uuid.uuid4().hex
+            for i, (first, last) in enumerate(ranges):
+                # 除第一个分段外，分段头前是上一段结尾的 CRLF
+                part_header = (b"\r\n" if i else b"") + (
+                    f"--{boundary}\r\nContent-Type: {grant.media_type}\r\n"
+                    f"Content-Range: bytes {first}-{last}/{grant.size}\r\n\r\n"
+                ).encode()
+                self.parts.append((part_header, first, last - first + 1))
+            self.trailer = f"\r\n--{boundary}--\r\n".encode()
+            media_type = f"multipart/byteranges; boundary={boundary}"
+        else:
+            first, last = ranges[0]
+            self.parts.append((b"", first, last - first + 1))
+            if status_code == 206:
+                headers["Content-Range"] = f"bytes {first}-{last}/{grant.size}"
+            media_type = grant.media_type
+
+        # Response.init_headers 不会覆盖已给出的 Content-Length
+        content_length = sum(len(h) + n for h, _, n in self.parts) + len(self.trailer)
+        headers["Content-Length"] = str(content_length)
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        if zerocopy:
+            self.metrics.zerocopy += 1
+        file = await anyio.to_thread.run_sync(open, self.grant.path, "rb", 0)
+        try:
+            for part_header, first, length in self.parts:
+                if part_header:
+                    await send({"type": "http.response.body", "body": part_header, "more_body": True})
+                if zerocopy:
+                    await send({"type": "http.response.zerocopysend", "file": file,
+                                "offset": first, "count": length, "more_body": True})
+                else:
+                    offset, end = first, first + length
+                    while offset < end:
+                        data = await anyio.to_thread.run_sync(_read_at, file, min(STREAM_CHUNK, end - offset), offset)
+                        if not data:
+                            raise OSError("file truncated while streaming")
+                        await send({"type": "http.response.body", "body": data, "more_body": True})
+                        offset += len(data)
+                self.metrics.bytes_sent += length
+            await send({"type": "http.response.body", "body": self.trailer, "more_body": False})
+        finally:
+            await anyio.to_thread.run_sync(file.close)
+
+
+def video_response(grant: VideoGrant, request_headers, method: str, metrics: VideoStreamMetrics) -> Response:
+    """根据 Range / If-Range / If-None-Match 生成响应"""
+    metrics.requests += 1
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": grant.etag,
+        "Last-Modified": format_datetime(grant.last_modified, usegmt=True),
+        "Cache-Control": "private, max-age=3600",
+    }
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match and grant.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        metrics.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    if config.VIDEO_ACCEL_REDIRECT:
+        metrics.accel_redirect += 1
+        return Response(headers={
+            **headers,
+            "X-Accel-Redirect": config.VIDEO_ACCEL_REDIRECT.rstrip("/") + "/" + grant.source,
+            "Content-Type": grant.media_type,
+        })
+
+    ranges = None
+    if if_range_matches(request_headers.get("if-range"), grant):
+        ranges = parse_range(request_headers.get("range"), grant.size)
+    if ranges == []:
+        metrics.unsatisfiable += 1
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{grant.size}"})
+
+    send_body = method != "HEAD"
+    if ranges is None:
+        metrics.full += 1
+        return RangeFileResponse(grant, 200, [(0, grant.size - 1)], headers, send_body, metrics)
+    if len(ranges) == 1:
+        metrics.partial += 1
+    else:
+        metrics.multipart += 1
+    return RangeFileResponse(grant, 206, ranges, headers, send_body, metrics)
+
+
+video_grants = VideoGrantCache(maxsize=config.AUTH_CACHE_SIZE, ttl=config.VIDEO_GRANT_TTL)
+video_metrics = VideoStreamMetrics()
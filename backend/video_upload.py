@@ -0,0 +1,444 @@
+"""
+上传模式房间的视频分片上传（可断点续传）
+
+流程:
+1. POST   /api/sync-rooms/{room_id}/uploads                     创建上传会话，返回 upload_id 和分片大小
+2. PUT    /api/sync-rooms/{room_id}/uploads/{upload_id}?offset=N 上传 offset 处的一个分片，可多个分片并行上传
+3. GET    /api/sync-rooms/{room_id}/uploads/{upload_id}          查询进度（offset 为已连续收到的字节数，missing 为缺少的分片）
+4. POST   /api/sync-rooms/{room_id}/uploads/{upload_id}/complete 合并分片，写入房间的 video_source / video_hash
+
+- 分片边读边写入磁盘（每个请求最多缓冲 WRITE_BUFFER 字节），写完后改名为 <序号>.part，中断的分片不会被当成已收到
+- SHA-256 在上传过程中增量计算: 按顺序到达的分片边写边计入哈希；乱序到达的分片在前面的空缺补齐后
+  从页缓存读回计入。完成时无需再读一遍整个文件
+- 合并使用 copy_file_range / sendfile 在内核中拷贝，不经过用户态缓冲
+- 合并结果放入按内容寻址的 video_store（见 video_store.py），相同内容只保存一份；
+  创建会话时按配额预留空间，放不下时返回 507；完成后的视频在写入房间前固定，调用方写入后 unpin
+- 会话元数据保存在磁盘上，进程重启后仍可续传（内存中的哈希进度丢失，完成时从磁盘补算）
+- 多 worker 部署时上传目录需为各 worker 共享的同一目录: 分片可能由不同 worker 写入，
+  查询进度和完成时重新扫描磁盘上的 *.part 文件
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from .config import config
+from .video_store import StoreFull, VideoStore, video_store
+
+logger = logging.getLogger(__name__)
+
+WRITE_BUFFER = 1024 * 1024  # 每个分片请求在内存中最多缓冲的字节数
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(Exception):
+    """上传请求无效，由接口层转换为对应的 HTTP 状态码"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class UploadMetrics:
+    """分片上传统计"""
+    sessions_created: int = 0
+    sessions_completed: int = 0
+    sessions_aborted: int = 0
+    sessions_expired: int = 0
+    chunks_received: int = 0
+    bytes_received: int = 0
+    bytes_hashed_inline: int = 0  # 边写边计入哈希的字节数
+    bytes_hashed_catchup: int = 0  # 乱序/并行分片补齐后从页缓存读回计入哈希的字节数
+    bytes_hashed_on_complete: int = 0  # 完成时才计入哈希的字节数（正常为 0，重启后续传时补算）
+    last_assemble_ms: float = 0.0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class UploadSession:
+    """一次上传会话"""
+    upload_id: str
+    room_id: int
+    user_id: int
+    filename: str
+    size: int
+    chunk_size: int
+    created_at: float
+    directory: Path
+    received: Set[int] = field(default_factory=set)
+    writing: Set[int] = field(default_factory=set)  # 正在写入的分片，拒绝重复并发上传
+    completing: bool = False
+    hashed_chunks: int = 0  # 已按顺序计入哈希的分片数
+    hasher: "hashlib._Hash" = field(default_factory=hashlib.sha256, repr=False)
+    hash_lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    @property
+    def total_chunks(self) -> int:
+        return max(1, -(-self.size // self.chunk_size))
+
+    @property
+    def extension(self) -> str:
+        return os.path.splitext(self.filename)[1].lower()
+
+    def chunk_length(self, index: int) -> int:
+        if index == self.total_chunks - 1:
+            return self.size - index * self.chunk_size
+        return self.chunk_size
+
+    def chunk_path(self, index: int) -> Path:
+        return self.directory / f"{index:06d}.part"
+
+    @property
+    def offset(self) -> int:
+        """已连续收到的字节数（续传起点）"""
+        index = 0
+        while index in self.received:
+            index += 1
+        return min(self.size, index * self.chunk_size)
+
+    def missing(self) -> List[int]:
+        return [index for index in range(self.total_chunks) if index not in self.received]
+
+    def status(self) -> dict:
+        return {
+            "upload_id": self.upload_id,
+            "room_id": self.room_id,
+            "filename": self.filename,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "total_chunks": self.total_chunks,
+            "received_chunks": len(self.received),
+            "offset": self.offset,
+            "missing": self.missing(),
+        }
+
+    def meta(self) -> dict:
+        return {
+            "upload_id": self.upload_id,
+            "room_id": self.room_id,
+            "user_id": self.user_id,
+            "filename": self.filename,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "created_at": self.created_at,
+        }
+
+
+def _scan_received(directory: Path) -> Set[int]:
+    """磁盘上已完整写入的分片序号"""
+    return {int(path.stem) for path in directory.glob("*.part") if path.stem.isdigit()}
+
+
+def _write(file, hasher, data: bytes):
+    file.write(data)
+    if hasher is not None:
+        hasher.update(data)
+
+
+def _hash_file(hasher, path: Path):
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(WRITE_BUFFER)
+            if not data:
+                break
+            hasher.update(data)
+
+
+def _copy_into(src_fd: int, dst_fd: int, length: int):
+    """内核态拷贝 src 的全部内容追加到 dst"""
+    copied = 0
+    copy_file_range = getattr(os, "copy_file_range", None)
+    while copied < length:
+        if copy_file_range is not None:
+            try:
+                n = copy_file_range(src_fd, dst_fd, length - copied)
+            except OSError:
+                copy_file_range = None  # 跨文件系统等情况不支持，改用 sendfile
+                continue
+        else:
+            n = os.sendfile(dst_fd, src_fd, None, length - copied)
+        if n == 0:
+            raise OSError("unexpected end of chunk file")
+        copied += n
+
+
+def _assemble(parts: List[Path], destination: Path):
+    """按顺序拼接分片"""
+    with open(destination, "wb", buffering=0) as dst:
+        for part in parts:
+            with open(part, "rb", buffering=0) as src:
+                length = os.fstat(src.fileno()).st_size
+                base = dst.tell()
+                try:
+                    _copy_into(src.fileno(), dst.fileno(), length)
+                except (AttributeError, OSError):
+                    # 平台不支持零拷贝（如 Windows），丢弃已拷贝的部分后退回普通拷贝
+                    dst.truncate(base)
+                    dst.seek(base)
+                    src.seek(0)
+                    shutil.copyfileobj(src, dst, WRITE_BUFFER)
+        os.fsync(dst.fileno())
+
+
+class VideoUploadManager:
+    """管理分片上传会话
+
+    Args:
+        root: 上传根目录，会话放在 sessions/ 下
+        chunk_size: 分片大小(字节)
+        max_size: 单个文件大小上限(字节)
+        session_ttl: 未完成会话的保留时间(秒)
+        store: 合并后视频的存储，默认为 root 下不限配额的 VideoStore
+    """
+
+    def __init__(self, root: Path, chunk_size: int, max_size: int, session_ttl: float,
+                 store: Optional[VideoStore] = None):
+        self.root = Path(root)
+        self.sessions_dir = self.root / "sessions"
+        self.store = store if store is not None else VideoStore(self.root)
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.session_ttl = session_ttl
+        self.metrics = UploadMetrics()
+        self._sessions: Dict[str, UploadSession] = {}
+
+    # ---- 会话 ----
+
+    def create(self, room_id: int, user_id: int, filename: str, size: int,
+               referenced: Optional[Set[str]] = None) -> UploadSession:
+        """创建上传会话
+
+        Args:
+            referenced: 仍被房间引用的 video_hash，配额不足时这些视频不会被淘汰
+        """
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in config.ALLOWED_EXTENSIONS:
+            raise UploadError(400, f"File type {extension or '(none)'} is not allowed")
+        if size <= 0:
+            raise UploadError(400, "File is empty")
+        if size > self.max_size:
+            raise UploadError(413, f"File exceeds the {self.max_size} byte limit")
+        upload_id = uuid.uuid4().hex
+        try:
+            self.store.reserve(upload_id, size, referenced or ())
+        except StoreFull:
+            raise UploadError(507, "Video storage quota exceeded")
+
+        session = UploadSession(
+            upload_id=upload_id, room_id=room_id, user_id=user_id,
+            filename=os.path.basename(filename), size=size, chunk_size=self.chunk_size,
+            created_at=time.time(), directory=self.sessions_dir / upload_id,
+        )
+        session.directory.mkdir(parents=True, exist_ok=True)
+        (session.directory / "meta.json").write_text(json.dumps(session.meta()), encoding="utf-8")
+        self._sessions[upload_id] = session
+        self.metrics.sessions_created += 1
+        return session
+
+    def _load(self, upload_id: str) -> Optional[UploadSession]:
+        """从磁盘恢复会话（进程重启后续传）"""
+        directory = self.sessions_dir / upload_id
+        try:
+            meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        session = UploadSession(directory=directory, **meta)
+        session.received = _scan_received(directory)
+        return session
+
+    def get(self, upload_id: str, room_id: int, user_id: int) -> UploadSession:
+        if not _UPLOAD_ID.match(upload_id):
+            raise UploadError(404, "Upload not found")
+        session = self._sessions.get(upload_id)
+        if session is None:
+            session = self._load(upload_id)
+            if session is not None:
+                # 查询进度的接口在线程池中调用，并发恢复同一会话时只保留先登记的一个
+                session = self._sessions.setdefault(upload_id, session)
+        if session is None or session.room_id != room_id or session.user_id != user_id:
+            raise UploadError(404, "Upload not found")
+        return session
+
+    def refresh(self, session: UploadSession) -> UploadSession:
+        """合并其他 worker 写入的分片；会话已被其他 worker 完成或取消时返回 404"""
+        if not (session.directory / "meta.json").exists():
+            self._sessions.pop(session.upload_id, None)
+            raise UploadError(404, "Upload not found")
+        session.received |= _scan_received(session.directory)
+        return session
+
+    # ---- 分片 ----
+
+    async def write_chunk(self, session: UploadSession, offset: int, stream: AsyncIterator[bytes],
+                          content_length: Optional[int] = None) -> dict:
+        """把请求体流式写入 offset 处的分片，返回会话进度"""
+        if offset < 0 or offset % session.chunk_size or offset >= session.size:
+            raise UploadError(400, f"Offset must be a multiple of {session.chunk_size} below {session.size}")
+        index = offset // session.chunk_size
+        expected = session.chunk_length(index)
+        if content_length is not None and content_length != expected:
+            raise UploadError(400, f"Chunk at offset {offset} must be {expected} bytes")
+        if index in session.received:
+            return session.status()  # 重传已收到的分片，幂等
+        if index in session.writing:
+            raise UploadError(409, f"Chunk at offset {offset} is already being uploaded")
+
+        session.writing.add(index)
+        # 正好是下一个待计入哈希的分片且哈希空闲时，边写边算
+        inline = index == session.hashed_chunks and not session.hash_lock.locked()
+        if inline:
+            await session.hash_lock.acquire()
+            hasher = session.hasher.copy()  # 写入失败时不污染已有的哈希进度
+        else:
+            hasher = None
+        temp_path = session.directory / f"{index:06d}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            written = await self._stream_to_file(stream, temp_path, hasher, expected)
+            if written != expected:
+                raise UploadError(400, f"Chunk at offset {offset} is incomplete ({written}/{expected} bytes)")
+            os.replace(temp_path, session.chunk_path(index))
+            session.received.add(index)
+            self.metrics.chunks_received += 1
+            self.metrics.bytes_received += written
+            if inline:
+                session.hasher = hasher
+                session.hashed_chunks += 1
+                self.metrics.bytes_hashed_inline += written
+        finally:
+            session.writing.discard(index)
+            if inline:
+                session.hash_lock.release()
+            if temp_path.exists():
+                temp_path.unlink()
+
+        self.metrics.bytes_hashed_catchup += await self._advance_hash(session, wait=False)
+        return session.status()
+
+    async def _stream_to_file(self, stream: AsyncIterator[bytes], path: Path, hasher, limit: int) -> int:
+        file = await asyncio.to_thread(open, path, "wb")
+        written = 0
+        buffer = bytearray()
+        try:
+            async for data in stream:
+                written += len(data)
+                if written > limit:
+                    raise UploadError(413, f"Chunk exceeds {limit} bytes")
+                buffer += data
+                if len(buffer) >= WRITE_BUFFER:
+                    await asyncio.to_thread(_write, file, hasher, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(_write, file, hasher, bytes(buffer))
+        finally:
+            await asyncio.to_thread(file.close)
+        return written
+
+    async def _advance_hash(self, session: UploadSession, wait: bool) -> int:
+        """把已连续收到、尚未计入哈希的分片计入哈希，返回本次计入的字节数
+
+        Args:
+            wait: 哈希正被占用时是否等待（分片上传后不等待，由占用者继续推进）
+        """
+        if not wait and session.hash_lock.locked():
+            return 0
+        hashed = 0
+        async with session.hash_lock:
+            while session.hashed_chunks in session.received:
+                index = session.hashed_chunks
+                await asyncio.to_thread(_hash_file, session.hasher, session.chunk_path(index))
+                session.hashed_chunks += 1
+                hashed += session.chunk_length(index)
+        return hashed
+
+    # ---- 完成 / 取消 ----
+
+    async def complete(self, session: UploadSession, expected_sha256: Optional[str] = None) -> Tuple[str, str]:
+        """合并分片，返回 (相对 UPLOAD_DIR 的视频路径, SHA-256)
+
+        视频在存储中已固定，调用方写入房间后调用 store.unpin(SHA-256)
+        """
+        if session.completing:
+            raise UploadError(409, "Upload is already being completed")
+        session.completing = True
+        try:
+            await asyncio.to_thread(self.refresh, session)
+            if session.writing or len(session.received) < session.total_chunks:
+                raise UploadError(409, f"Upload is incomplete, missing chunks: {session.missing()}")
+            return await self._complete(session, expected_sha256)
+        finally:
+            session.completing = False
+
+    async def _complete(self, session: UploadSession, expected_sha256: Optional[str]) -> Tuple[str, str]:
+        self.metrics.bytes_hashed_on_complete += await self._advance_hash(session, wait=True)
+        digest = session.hasher.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != digest:
+            await self.abort(session)
+            raise UploadError(400, "SHA-256 mismatch, upload discarded")
+
+        temp_path = self.store.temp_path(session.upload_id)
+        parts = [session.chunk_path(index) for index in range(session.total_chunks)]
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(_assemble, parts, temp_path)
+            # 同一内容已上传过则直接复用
+            blob = await asyncio.to_thread(self.store.ingest, temp_path, digest, session.extension, session.upload_id)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+        self.metrics.last_assemble_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        self._discard(session)
+        self.metrics.sessions_completed += 1
+        return self.store.source(blob), digest
+
+    def _discard(self, session: UploadSession):
+        self._sessions.pop(session.upload_id, None)
+        self.store.release(session.upload_id)
+        shutil.rmtree(session.directory, ignore_errors=True)
+
+    async def abort(self, session: UploadSession):
+        await asyncio.to_thread(self._discard, session)
+        self.metrics.sessions_aborted += 1
+
+    def cleanup_stale(self) -> int:
+        """删除超过 session_ttl 仍未完成的会话，返回删除数量"""
+        if not self.sessions_dir.exists():
+            return 0
+        deadline = time.time() - self.session_ttl
+        removed = 0
+        for directory in self.sessions_dir.iterdir():
+            session = self._sessions.get(directory.name)
+            if session is not None and session.writing:
+                continue
+            try:
+                created_at = session.created_at if session else (directory / "meta.json").stat().st_mtime
+            except OSError:
+                created_at = 0
+            if created_at < deadline:
+                self._sessions.pop(directory.name, None)
+                self.store.release(directory.name)
+                shutil.rmtree(directory, ignore_errors=True)
+                removed += 1
+        self.metrics.sessions_expired += removed
+        return removed
+
+
+upload_manager = VideoUploadManager(
+    root=config.UPLOAD_DIR,
+    chunk_size=config.UPLOAD_CHUNK_SIZE,
+    max_size=config.MAX_UPLOAD_SIZE,
+    session_ttl=config.UPLOAD_SESSION_TTL,
+    store=video_store,
+)
@@ -0,0 +1,179 @@
+"""
+文章浏览次数缓冲计数
+
+每次浏览只在内存中给对应文章 +1，后台任务定期用
+UPDATE posts SET views = views + n 批量写回，热门文章不再因逐次读改写而争抢行锁。
+写回是增量的，多个 worker 各自缓冲也不会丢失计数。
+
+可选按客户端去重：同一客户端在时间窗口内重复浏览同一篇文章只计一次
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Dict, Hashable, Optional
+
+from sqlalchemy import bindparam, func, update
+
+from . import models
+from .config import config
+from .database import SessionLocal
+from .response_cache import post_cache, views_tag
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ViewCounterMetrics:
+    """浏览计数统计"""
+    recorded: int = 0  # 计入的浏览次数
+    deduplicated: int = 0  # 去重窗口内被忽略的重复浏览
+    flushed: int = 0  # 已写回数据库的浏览次数
+    flushes: int = 0
+    failed: int = 0  # 写回失败（已放回缓冲，下次重试）
+    last_flush_posts: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class ViewCounter:
+    """按文章缓冲浏览次数，定期原子累加写回
+
+    Args:
+        flush_interval: 写回间隔(秒)
+        dedup_window: 去重窗口(秒)，0 表示不去重
+        dedup_max_entries: 去重记录上限，超出时淘汰最早的记录
+    """
+
+    def __init__(self, flush_interval: float = 5.0, dedup_window: float = 0,
+                 dedup_max_entries: int = 100_000):
+        self.flush_interval = flush_interval
+        self.dedup_window = dedup_window
+        self.dedup_max_entries = dedup_max_entries
+        self.metrics = ViewCounterMetrics()
+        self._pending: Dict[int, int] = {}
+        self._flushing: Dict[int, int] = {}  # 正在写回的计数，写回完成前仍计入 pending()
+        self._seen: "OrderedDict[tuple, float]" = OrderedDict()  # (post_id, client) -> 过期时间
+        self._lock = threading.Lock()  # read_post 是同步接口，在线程池中并发调用
+        self._flush_lock = threading.Lock()  # 同一时间只有一次写回
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _is_duplicate(self, post_id: int, client: Hashable, now: float) -> bool:
+        # 窗口固定，按插入顺序即按过期时间排序，从头部清理
+        while self._seen:
+            _, expires = next(iter(self._seen.items()))
+            if expires > now and len(self._seen) < self.dedup_max_entries:
+                break
+            self._seen.popitem(last=False)
+
+        key = (post_id, client)
+        if key in self._seen:
+            return True
+        self._seen[key] = now + self.dedup_window
+        return False
+
+    def record(self, post_id: int, client: Optional[Hashable] = None) -> bool:
+        """记录一次浏览，返回是否计入（去重窗口内的重复浏览返回 False）"""
+        with self._lock:
+            if self.dedup_window > 0 and client is not None:
+                if self._is_duplicate(post_id, client, time.monotonic()):
+                    self.metrics.deduplicated += 1
+                    return False
+            self._pending[post_id] = self._pending.get(post_id, 0) + 1
+            self.metrics.recorded += 1
+            return True
+
+    def pending(self, post_id: int) -> int:
+        """尚未写回数据库的浏览次数"""
+        with self._lock:
+            return self._pending.get(post_id, 0) + self._flushing.get(post_id, 0)
+
+    def _take(self) -> Dict[int, int]:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+        return batch
+
+    def _finish(self, batch: Dict[int, int], written: bool):
+        """写回结束；失败时把计数放回缓冲"""
+        with self._lock:
+            self._flushing = {}
+            if not written:
+                for post_id, count in batch.items():
+                    self._pending[post_id] = self._pending.get(post_id, 0) + count
+
+    def _write(self, batch: Dict[int, int]) -> bool:
+        """批量原子累加（文章可能已被删除，不校验影响行数）"""
+        table = models.Post.__table__
+        stmt = update(table).where(
+            table.c.id == bindparam("post_id")
+        ).values(
+            views=func.coalesce(table.c.views, 0) + bindparam("count")
+        )
+        db = SessionLocal()
+        try:
+            db.connection().execute(stmt, [
+                {"post_id": post_id, "count": count} for post_id, count in batch.items()
+            ])
+            db.commit()
+            return True
+        except Exception as e:
+            db.rollback()
+            logger.error(f"浏览次数写回失败: {str(e)}")
+            return False
+        finally:
+            db.close()
+
+    def flush_sync(self) -> int:
+        """写回所有缓冲的计数，返回写回的浏览次数"""
+        with self._flush_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+            written = self._write(batch)
+            self._finish(batch, written)
+            if written:
+                # 缓存的文章详情以写回前的数据库值为基数，需要重新读取
+                post_cache.invalidate(*(views_tag(post_id) for post_id in batch))
+        if not written:
+            self.metrics.failed += 1
+            return 0
+        total = sum(batch.values())
+        self.metrics.flushes += 1
+        self.metrics.flushed += total
+        self.metrics.last_flush_posts = len(batch)
+        return total
+
+    async def flush(self) -> int:
+        return await asyncio.to_thread(self.flush_sync)
+
+    async def run_flusher(self):
+        """定时写回任务"""
+        logger.info(f"浏览次数写回任务启动 - 间隔:{self.flush_interval}秒, 去重窗口:{self.dedup_window}秒")
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"浏览次数写回任务出错: {str(e)}")
+
+    def start(self):
+        """在当前事件循环中启动写回任务"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.run_flusher())
+
+    async def shutdown(self):
+        """停止写回任务并写回剩余计数"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+view_counter = ViewCounter(
+    flush_interval=config.VIEW_FLUSH_INTERVAL,
+    dedup_window=config.VIEW_DEDUP_WINDOW,
+)
@@ -2,107 +2,205 @@
 WebSocket 服务器 - 处理实时同步和聊天
 使用 python-socketio + FastAPI
 """
+import asyncio
+import functools
 import socketio
 from fastapi import Depends
 from sqlalchemy.orm import Session
-from typing import Dict, Set
 import logging
 from datetime import datetime
 
-from . import sync_room_crud, models
-from .database import SessionLocal
+from . import socket_auth, sync_room_crud_async, video_fingerprint, wire_format
+from .database import AsyncSessionLocal
+from .room_state import RoomState, state_engine
+from .room_events import room_events
+from .rate_limiter import COALESCED_EVENTS, rate_limiter
+from .socket_auth import memberships
+from .sync_scheduler import sync_scheduler
+from .chat_pipeline import chat_pipeline, ChatBacklogFull
+from .config import config
+from .socket_manager import RoomStateReplication, create_client_manager
+from .connection_registry import create_connection_registry
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # 创建 Socket.IO 服务器
+# 配置了 SOCKETIO_MESSAGE_QUEUE 时通过消息队列在多个 worker 间转发广播
 sio = socketio.AsyncServer(
     async_mode='asgi',
+    client_manager=create_client_manager(config.SOCKETIO_MESSAGE_QUEUE),
     cors_allowed_origins='*',  # 开发环境允许所有来源
     logger=True,
     engineio_logger=True
 )
 
-# 存储房间和用户的连接映射
-# room_connections: {room_id: {user_id: sid, ...}}
-room_connections: Dict[int, Dict[int, str]] = {}
+# 存储房间和用户的连接映射（多 worker 时保存在 Redis 中）
+connection_registry = create_connection_registry(config.SOCKETIO_MESSAGE_QUEUE)
+
+async def revoke_connections(user_id: int, sids: list, broadcast: bool):
+    """断开被禁用 / 删除的用户在本进程上的连接，需要时通知其他 worker（见 socket_auth.revoke_user）"""
+    for sid in sids:
+        await sio.disconnect(sid)
+    if sids:
+        logger.info(f"User {user_id} revoked, disconnected {len(sids)} connection(s)")
+    if broadcast and isinstance(sio.manager, RoomStateReplication):
+        await sio.manager.publish_user_revoked(user_id)
+
+memberships.set_revoker(revoke_connections)
+
+# 多 worker 时通过消息队列同步房间播放状态（见 room_state）和被撤销的用户
+if isinstance(sio.manager, RoomStateReplication):
+    sio.manager.room_state_handler = state_engine.apply_replica
+    state_engine.set_publisher(sio.manager.publish_room_state)
+    sio.manager.user_revoked_handler = functools.partial(memberships.revoke_user, broadcast=False)
 
 def get_db():
-    """获取数据库会话 - 注意:调用者负责关闭连接"""
-    return SessionLocal()
+    """获取异步数据库会话 - 注意:调用者负责 await db.close()
+
+    事件处理运行在事件循环中，使用异步驱动，等待数据库时不阻塞其他连接
+    """
+    return AsyncSessionLocal()
+
+async def identity(sid: str) -> tuple:
+    """connect 时认证的 (身份, 所属房间 id 集合)，事件数据中的 user_id 不再使用"""
+    session = await sio.get_session(sid)
+    return session['user'], session['rooms']
+
+def resume_position(data) -> tuple:
+    """客户端带来的 (last_seq, epoch)，首次加入时为 (None, None)"""
+    last_seq = data.get('last_seq')
+    return (int(last_seq) if last_seq is not None else None), data.get('epoch')
+
+# 合并事件的补执行任务（保留引用，避免任务被回收）
+_deferred_tasks = set()
+
+def throttled(handler):
+    """按 sid + 事件限流（见 rate_limiter），在处理函数及其数据库访问之前执行"""
+    event = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(sid, data):
+        retry_after = rate_limiter.acquire(sid, event)
+        if not retry_after:
+            return await handler(sid, data)
+        if event in COALESCED_EVENTS:
+            # 只保留最新一次，令牌补充后执行
+            if rate_limiter.defer(sid, event, data):
+                task = asyncio.create_task(run_deferred(wrapper, sid, event, retry_after))
+                _deferred_tasks.add(task)
+                task.add_done_callback(_deferred_tasks.discard)
+        elif rate_limiter.drop(sid, event):
+            await sio.emit('throttled', {'event': event, 'retry_after': round(retry_after, 3)}, room=sid)
+
+    return wrapper
+
+async def run_deferred(wrapper, sid: str, event: str, delay: float):
+    await asyncio.sleep(delay)
+    data = rate_limiter.take_pending(sid, event)
+    if data is not None:
+        await wrapper(sid, data)
+
+async def emit_frame(event: str, room_id: int, data: dict, skip_sid: str = None):
+    """广播高频播放帧: JSON 客户端收到对象，选择紧凑编码的客户端收到数组（见 wire_format）"""
+    await sio.emit(event, data, room=wire_format.frame_room(room_id, False), skip_sid=skip_sid)
+    await sio.emit(event, wire_format.pack(event, data), room=wire_format.frame_room(room_id, True), skip_sid=skip_sid)
+    wire_format.metrics.frames += 1
 
 @sio.event
-async def connect(sid, environ):
-    """客户端连接事件"""
-    logger.info(f"Client connected: {sid}")
-    await sio.emit('connected', {'status': 'success'}, room=sid)
+async def connect(sid, environ, auth=None):
+    """客户端连接事件: 验证 token（见 socket_auth），auth 中还可选择播放帧的紧凑编码"""
+    try:
+        user = await socket_auth.authenticate(environ, auth)
+    except socket_auth.AuthenticationFailed as e:
+        logger.info(f"Client rejected: {sid} ({e})")
+        raise socketio.exceptions.ConnectionRefusedError(str(e))
+    
+    compact = wire_format.wants_compact(environ, auth)
+    rooms = await memberships.attach(user.id, sid)
+    await sio.save_session(sid, {'user': user, 'rooms': rooms, 'compact': compact})
+    if compact:
+        wire_format.metrics.compact_clients += 1
+    else:
+        wire_format.metrics.json_clients += 1
+    logger.info(f"Client connected: {sid} as {user.username}" + (" (compact)" if compact else ""))
+    await sio.emit('connected', {'status': 'success', 'user_id': user.id, 'compact': compact}, room=sid)
 
 @sio.event
 async def disconnect(sid):
     """客户端断开连接事件"""
     logger.info(f"Client disconnected: {sid}")
+    rate_limiter.forget(sid)
+    user, _ = await identity(sid)
+    memberships.detach(user.id, sid)
     
-    # 从所有房间中移除该连接
-    for room_id, connections in list(room_connections.items()):
-        for user_id, connection_sid in list(connections.items()):
-            if connection_sid == sid:
-                del connections[user_id]
-                
-                # 通知房间其他成员
-                await sio.emit('member_left', {
-                    'user_id': user_id,
-                    'room_id': room_id
-                }, room=f'room_{room_id}', skip_sid=sid)
-                
-                # 如果房间空了,清理房间
-                if not connections:
-                    del room_connections[room_id]
-                
-                break
+    # 通过反向索引移除该 sid 的所有连接
+    for departure in await connection_registry.remove_sid(sid):
+        # 用户的最后一个标签页断开时才通知房间其他成员
+        if departure.user_gone:
+            await sio.emit('member_left', {
+                'user_id': departure.user_id,
+                'room_id': departure.room_id
+            }, room=f'room_{departure.room_id}', skip_sid=sid)
+        
+        # 如果房间空了,释放房间状态
+        if departure.room_empty:
+            state_engine.release(departure.room_id)
+            sync_scheduler.forget(departure.room_id)
 
 @sio.event
+@throttled
 async def join_room(sid, data):
     """加入房间"""
     db = None
     try:
         room_id = data.get('room_id')
-        user_id = data.get('user_id')
-        username = data.get('username', 'Anonymous')
         stealth = data.get('stealth', False)  # 检查是否为隐身模式
+        last_seq, epoch = resume_position(data)  # 重连时客户端最后收到的事件
         
-        if not room_id or not user_id:
+        if not room_id:
             await sio.emit('error', {'message': '缺少必要参数'}, room=sid)
             return
         
+        user, rooms = await identity(sid)
+        user_id, username = user.id, user.username
         db = get_db()
         
         # 验证房间存在
-        room = sync_room_crud.get_room_by_id(db, room_id)
+        room = await sync_room_crud_async.get_room_by_id(db, room_id)
         if not room:
             await sio.emit('error', {'message': '房间不存在'}, room=sid)
             return
         
-        # 验证用户是房间成员（隐身模式管理员除外）
-        from .crud import get_user_by_id
-        user = get_user_by_id(db, user_id)
-        is_admin_stealth = stealth and user and user.role == 'admin'
+        # 验证用户是房间成员（隐身模式管理员除外）；
+        # 不在缓存中时查询一次（可能是在其他 worker 上通过接口加入的）
+        is_admin_stealth = stealth and user.role == 'admin'
         
-        if not is_admin_stealth and not sync_room_crud.is_room_member(db, room_id, user_id):
-            await sio.emit('error', {'message': '您不是该房间成员'}, room=sid)
-            return
+        if not is_admin_stealth and room_id not in rooms:
+            if not await sync_room_crud_async.is_room_member(db, room_id, user_id):
+                await sio.emit('error', {'message': '您不是该房间成员'}, room=sid)
+                return
+            memberships.grant(user_id, room_id)
         
-        # 加入 Socket.IO 房间
+        # 加入 Socket.IO 房间，以及按连接时协商的编码接收播放帧的房间
         await sio.enter_room(sid, f'room_{room_id}')
+        session = await sio.get_session(sid)
+        await sio.enter_room(sid, wire_format.frame_room(room_id, session['compact']))
         
         # 记录连接（隐身模式管理员不记录为正式成员）
         if not is_admin_stealth:
-            if room_id not in room_connections:
-                room_connections[room_id] = {}
-            room_connections[room_id][user_id] = sid
+            await connection_registry.add(room_id, user_id, sid)
         
         # 获取房间成员列表
-        members = sync_room_crud.get_room_members(db, room_id)
+        members = await sync_room_crud_async.get_room_members(db, room_id)
+        
+        # 播放状态以内存中的房间状态为准
+        state = state_engine.track(room)
+        
+        # 查询结束，广播前归还连接
+        await db.close()
+        db = None
         
         # 通知该用户加入成功
         await sio.emit('join_success', {
@@ -115,10 +213,14 @@ async def join_room(sid, data):
                 'control_mode': room.control_mode,
                 'mode': room.mode,
                 'video_source': room.video_source,
-                'current_time': room.current_time,
-                'is_playing': room.is_playing
+                'current_time': state.current_position(),
+                'is_playing': state.is_playing
             },
-            'members': members
+            'members': members,
+            # 本地模式需要校验视频时下发抽样参数，客户端计算指纹后发送 verify_video
+            'fingerprint': video_fingerprint.spec() if video_fingerprint.requires_verification(room) else None,
+            # 最近的播放事件和聊天消息（重连时只含 last_seq 之后的）
+            'events': room_events.since(room_id, last_seq, epoch)
         }, room=sid)
         
         # 如果不是隐身模式，通知房间其他成员有新成员加入
@@ -136,37 +238,37 @@ async def join_room(sid, data):
         await sio.emit('error', {'message': f'加入房间失败: {str(e)}'}, room=sid)
     finally:
         if db:
-            db.close()
+            await db.close()
 
 @sio.event
+@throttled
 async def leave_room_event(sid, data):
     """离开房间"""
     db = None
     try:
         room_id = data.get('room_id')
-        user_id = data.get('user_id')
         
-        if not room_id or not user_id:
+        if not room_id:
             return
         
+        user, _ = await identity(sid)
+        user_id = user.id
         db = get_db()
         
-        # 调用数据库函数更新成员状态
-        sync_room_crud.leave_room(db, room_id, user_id)
+        # 调用数据库函数更新成员状态（房主离开可能修改控制模式，需要重新加载房间状态）
+        await sync_room_crud_async.leave_room(db, room_id, user_id)
+        await state_engine.invalidate_async(room_id)
         
         # 离开 Socket.IO 房间
         await sio.leave_room(sid, f'room_{room_id}')
+        for compact in (False, True):
+            await sio.leave_room(sid, wire_format.frame_room(room_id, compact))
         
-        # 移除连接记录
-        was_connected = room_id in room_connections and user_id in room_connections[room_id]
-        if was_connected:
-            del room_connections[room_id][user_id]
-            
-            if not room_connections[room_id]:
-                del room_connections[room_id]
+        # 移除该标签页的连接记录
+        departure = await connection_registry.remove(room_id, user_id, sid)
         
         # 如果是正式成员，通知其他成员（隐身模式管理员不通知）
-        if was_connected:
+        if departure is not None:
             await sio.emit('member_left', {
                 'user_id': user_id,
                 'room_id': room_id
@@ -178,77 +280,66 @@ async def leave_room_event(sid, data):
         logger.error(f"Error in leave_room_event: {str(e)}")
     finally:
         if db:
-            db.close()
+            await db.close()
 
 @sio.event
+@throttled
 async def playback_control(sid, data):
     """播放控制事件"""
-    db = None
     try:
         room_id = data.get('room_id')
-        user_id = data.get('user_id')
         action = data.get('action')  # play, pause, seek, rate
         time = data.get('time')
         rate = data.get('rate', 1.0)
         
-        if not room_id or not user_id or not action:
+        if not room_id or not action:
             await sio.emit('error', {'message': '缺少必要参数'}, room=sid)
             return
         
-        db = get_db()
-        room = sync_room_crud.get_room_by_id(db, room_id)
+        user, _ = await identity(sid)
+        user_id = user.id
+        state = await state_engine.get_or_load_async(room_id)
         
-        if not room:
+        if not state:
             await sio.emit('error', {'message': '房间不存在'}, room=sid)
             return
         
         # 检查控制权限
-        if room.control_mode == 'host_only' and user_id != room.host_user_id:
+        if not state.can_control(user_id):
             await sio.emit('error', {'message': '只有房主可以控制播放'}, room=sid)
             return
         
-        # 更新房间状态 - 修复：直接更新room对象而不是调用update_room
-        if action == 'play':
-            room.is_playing = True
-        elif action == 'pause':
-            room.is_playing = False
-        elif action == 'seek' and time is not None:
-            room.current_time = time
-        
-        # 提交更改
-        room.updated_at = datetime.utcnow()
-        db.commit()
+        # 更新内存中的房间状态，由写回任务定期持久化
+        state.apply_action(action, time, rate)
+        sync_scheduler.mark_synced(room_id)
+        await state_engine.publish(room_id)
         
         # 广播给房间所有成员(包括发送者,确保同步)
         # 修复：seek时也要携带当前的播放状态，确保成员视频状态一致
-        await sio.emit('playback_sync', {
+        await emit_frame('playback_sync', room_id, room_events.append(room_id, 'playback_sync', {
             'action': action,
             'time': time,
             'rate': rate,
-            'is_playing': room.is_playing,  # 添加播放状态
-            'user_id': user_id
-        }, room=f'room_{room_id}')
+            'is_playing': state.is_playing,  # 添加播放状态
+            'user_id': user_id,
+            'version': state.version
+        }))
         
         logger.info(f"Playback control in room {room_id}: {action} by user {user_id}")
         
     except Exception as e:
         logger.error(f"Error in playback_control: {str(e)}")
         await sio.emit('error', {'message': f'控制失败: {str(e)}'}, room=sid)
-    finally:
-        if db:
-            db.close()
 
 @sio.event
+@throttled
 async def send_message(sid, data):
     """发送聊天消息"""
-    db = None
     try:
         room_id = data.get('room_id')
-        user_id = data.get('user_id')
-        username = data.get('username', 'Anonymous')
         message = data.get('message', '').strip()
         
-        if not room_id or not user_id or not message:
+        if not room_id or not message:
             await sio.emit('error', {'message': '消息不能为空'}, room=sid)
             return
         
@@ -256,100 +347,113 @@ async def send_message(sid, data):
             await sio.emit('error', {'message': '消息过长'}, room=sid)
             return
         
-        db = get_db()
-        
-        # 验证房间成员
-        if not sync_room_crud.is_room_member(db, room_id, user_id):
+        # 验证房间成员（连接时缓存的房间集合）
+        user, rooms = await identity(sid)
+        user_id, username = user.id, user.username
+        if room_id not in rooms:
             await sio.emit('error', {'message': '您不是该房间成员'}, room=sid)
             return
         
-        # 保存消息到数据库
-        db_message = sync_room_crud.create_message(db, room_id, user_id, message)
+        # 验证房间仍然存在: 其他 worker 上删除的房间不在本进程的成员缓存中更新，
+        # 但删除时房间状态已失效（见 room_state），重新加载时查不到
+        if not await state_engine.get_or_load_async(room_id):
+            await sio.emit('error', {'message': '房间不存在'}, room=sid)
+            return
         
-        # 广播消息给房间所有成员(包括发送者)
-        await sio.emit('new_message', {
-            'id': db_message.id,
+        # 消息进入写回队列，由后台任务批量保存到数据库
+        try:
+            record = await chat_pipeline.submit(room_id, user_id, message)
+        except ChatBacklogFull as e:
+            await sio.emit('error', {'message': f'发送消息失败: {str(e)}'}, room=sid)
+            return
+        
+        # 立即广播消息给房间所有成员(包括发送者)，id 为临时 ID
+        await sio.emit('new_message', room_events.append(room_id, 'new_message', {
+            'id': record['provisional_id'],
+            'provisional': True,
             'room_id': room_id,
             'user_id': user_id,
             'username': username,
             'message': message,
-            'created_at': db_message.created_at.isoformat()
-        }, room=f'room_{room_id}')
+            'created_at': record['created_at'].isoformat()
+        }), room=f'room_{room_id}')
         
         logger.info(f"Message sent in room {room_id} by user {user_id}")
         
     except Exception as e:
         logger.error(f"Error in send_message: {str(e)}")
         await sio.emit('error', {'message': f'发送消息失败: {str(e)}'}, room=sid)
-    finally:
-        if db:
-            db.close()
 
 @sio.event
+@throttled
 async def time_update(sid, data):
     """时间更新(房主定期发送当前播放时间)"""
-    db = None
     try:
         room_id = data.get('room_id')
-        user_id = data.get('user_id')
         time = data.get('time')
         
-        if not room_id or not user_id or time is None:
+        if not room_id or time is None:
             return
         
-        db = get_db()
-        room = sync_room_crud.get_room_by_id(db, room_id)
+        user, _ = await identity(sid)
+        user_id = user.id
+        state = await state_engine.get_or_load_async(room_id)
         
-        if not room:
+        if not state:
             return
         
         # 只有房主或有权限的用户才能发送时间更新
-        if room.control_mode == 'host_only' and user_id != room.host_user_id:
+        if not state.can_control(user_id):
+            return
+        
+        # 偏差在阈值内时合并丢弃，超过阈值才广播校正
+        if sync_scheduler.on_host_time(state, time) is None:
             return
+        await state_engine.publish(room_id)
         
-        # 广播时间同步(不保存到数据库,避免频繁写入)
-        await sio.emit('time_sync', {
+        await emit_frame('time_sync', room_id, {
             'time': time,
             'user_id': user_id
-        }, room=f'room_{room_id}', skip_sid=sid)
+        }, skip_sid=sid)
         
     except Exception as e:
         logger.error(f"Error in time_update: {str(e)}")
-    finally:
-        if db:
-            db.close()
 
 @sio.event
+@throttled
 async def request_sync(sid, data):
     """处理成员请求同步事件"""
-    db = None
     try:
         room_id = data.get('room_id')
-        user_id = data.get('user_id')
+        last_seq, epoch = resume_position(data)
         
-        if not room_id or not user_id:
+        if not room_id:
             await sio.emit('error', {'message': '缺少必要参数'}, room=sid)
             return
         
-        db = get_db()
+        # 验证用户是房间成员
+        user, rooms = await identity(sid)
+        user_id = user.id
+        if room_id not in rooms:
+            await sio.emit('error', {'message': '您不是该房间成员'}, room=sid)
+            return
         
         # 验证房间存在
-        room = sync_room_crud.get_room_by_id(db, room_id)
-        if not room:
+        state = await state_engine.get_or_load_async(room_id)
+        if not state:
             await sio.emit('error', {'message': '房间不存在'}, room=sid)
             return
         
-        # 验证用户是房间成员
-        if not sync_room_crud.is_room_member(db, room_id, user_id):
-            await sio.emit('error', {'message': '您不是该房间成员'}, room=sid)
-            return
-        
         # 发送当前播放状态给请求者
         await sio.emit('playback_sync', {
             'action': 'sync',
-            'time': room.current_time,
-            'is_playing': room.is_playing,
-            'user_id': room.host_user_id  # 标记为房主状态同步
+            'time': state.current_position(),
+            'is_playing': state.is_playing,
+            'rate': state.rate,
+            'user_id': state.host_user_id,  # 标记为房主状态同步
+            'version': state.version,
+            # 带 last_seq 时补发错过的事件
+            'events': room_events.since(room_id, last_seq, epoch) if last_seq is not None else None
         }, room=sid)
         
         logger.info(f"Sync requested for user {user_id} in room {room_id}")
@@ -357,9 +461,63 @@ async def request_sync(sid, data):
     except Exception as e:
         logger.error(f"Error in request_sync: {str(e)}")
         await sio.emit('error', {'message': f'同步请求失败: {str(e)}'}, room=sid)
+
+@sio.event
+@throttled
+async def verify_video(sid, data):
+    """本地模式成员提交视频文件大小 + 抽样指纹（或完整 SHA-256）校验"""
+    db = None
+    try:
+        room_id = data.get('room_id')
+        size = data.get('size')
+        
+        if not room_id or size is None:
+            await sio.emit('error', {'message': '缺少必要参数'}, room=sid)
+            return
+        
+        user, _ = await identity(sid)
+        user_id = user.id
+        db = get_db()
+        room = await sync_room_crud_async.get_room_by_id(db, room_id)
+        if not room or room.mode != 'local':
+            await sio.emit('error', {'message': '房间不存在或不是本地模式'}, room=sid)
+            return
+        
+        result = await sync_room_crud_async.verify_member_video(
+            db, room, user_id, int(size), data.get('fingerprint'), data.get('sha256')
+        )
+        if result is None:
+            await sio.emit('error', {'message': '您不是该房间成员'}, room=sid)
+            return
+        await db.close()
+        db = None
+        
+        await sio.emit('video_verified', result, room=sid)
+        if not result['fallback_required']:
+            await emit_member_verified(room_id, user_id, result['verified'], skip_sid=sid)
+        
+    except Exception as e:
+        logger.error(f"Error in verify_video: {str(e)}")
+        await sio.emit('error', {'message': f'视频校验失败: {str(e)}'}, room=sid)
     finally:
         if db:
-            db.close()
+            await db.close()
+
+async def emit_member_verified(room_id: int, user_id: int, verified: bool, skip_sid: str = None):
+    """通知房间成员某人的视频校验结果（REST 接口校验后也会调用）"""
+    await sio.emit('member_verified', {
+        'room_id': room_id,
+        'user_id': user_id,
+        'is_verified': verified
+    }, room=f'room_{room_id}', skip_sid=skip_sid)
+
+async def emit_time_heartbeat(state: RoomState):
+    """发送进度心跳（由同步调度任务定期调用）"""
+    await emit_frame('time_sync', state.room_id, {
+        'time': state.current_position(),
+        'user_id': state.host_user_id,
+        'heartbeat': True
+    })
 
 # 创建 ASGI 应用
 # 关键修复：当mount到/ws时，socketio_path应该是'/'，这样完整路径才是 /ws/socket.io/
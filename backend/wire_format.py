@@ -0,0 +1,86 @@
+"""
+高频播放帧的紧凑编码
+
+playback_sync 和 time_sync 会以较高频率广播给房间内每个成员。客户端可以在连接时选择紧凑编码
+（auth 中传入 {"compact": true}，或在连接 URL 上加 ?compact=1），此后这两种广播帧以数组下发，
+省去字符串键，动作用整数编码，时间保留到毫秒:
+
+    playback_sync: [动作, time, rate, is_playing(0/1), user_id, version, seq]
+    time_sync:     [time, user_id, heartbeat(0/1)]
+
+动作编码见 PLAYBACK_ACTIONS。未知动作原样保留字符串。紧凑帧不带 epoch，
+客户端沿用 join_success 中 events.epoch 的值（续传时 epoch 不符只会触发 reset，不会错补事件）。
+
+只有房间广播帧使用紧凑编码；request_sync 的回复（带补发事件）、聊天和控制类事件仍为 JSON 对象，
+客户端可以用 Array.isArray 区分。
+
+实现方式: 每个连接加入房间时，按协商结果额外加入 room_{id}:json 或 room_{id}:compact，
+广播帧分别发到这两个房间，每种编码各只序列化一次。
+"""
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+PLAYBACK_ACTIONS = {"play": 1, "pause": 2, "seek": 3, "rate": 4, "sync": 5}
+
+# 使用紧凑编码的事件
+COMPACT_EVENTS = ("playback_sync", "time_sync")
+
+
+@dataclass
+class WireMetrics:
+    """广播帧编码统计"""
+    compact_clients: int = 0  # 连接时选择紧凑编码的客户端数
+    json_clients: int = 0
+    frames: int = 0  # 广播的播放帧数（每种编码各发一次计为一帧）
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+metrics = WireMetrics()
+
+
+def wants_compact(environ: Optional[dict], auth: Optional[dict]) -> bool:
+    """连接时客户端是否选择紧凑编码"""
+    if isinstance(auth, dict) and "compact" in auth:
+        return bool(auth["compact"])
+    query = parse_qs((environ or {}).get("QUERY_STRING", ""))
+    return query.get("compact", ["0"])[-1].lower() in ("1", "true")
+
+
+def frame_room(room_id: int, compact: bool) -> str:
+    """接收播放帧的房间，按编码区分"""
+    return f"room_{room_id}:{'compact' if compact else 'json'}"
+
+
+def _ms(value) -> Optional[float]:
+    return round(float(value), 3) if value is not None else None
+
+
+def pack_playback_sync(data: dict) -> List:
+    action = data.get("action")
+    return [
+        PLAYBACK_ACTIONS.get(action, action),
+        _ms(data.get("time")),
+        data.get("rate"),
+        1 if data.get("is_playing") else 0,
+        data.get("user_id"),
+        data.get("version"),
+        data.get("seq"),
+    ]
+
+
+def pack_time_sync(data: dict) -> List:
+    return [_ms(data.get("time")), data.get("user_id"), 1 if data.get("heartbeat") else 0]
+
+
+PACKERS: Dict[str, Callable[[dict], List]] = {
+    "playback_sync": pack_playback_sync,
+    "time_sync": pack_time_sync,
+}
+
+
+def pack(event: str, data: dict) -> List:
+    """把广播帧转换为紧凑数组"""
+    return PACKERS[event](data)
@@ -0,0 +1,52 @@
+"""
+添加游标分页所需的组合索引
+
+已有数据库执行 create_all 不会给旧表补索引，运行此脚本补齐:
+- users(created_at, id)
+- posts(created_at, id) / posts(author_id, created_at, id)
+- sync_rooms(is_active, created_at, id)
+- sync_room_messages(room_id, created_at, id)
+
+    python scripts/database/add_pagination_indexes.py
+"""
+import sys
+import os
+
+# 添加父目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import inspect
+from backend.database import engine
+from backend import models
+
+INDEXED_MODELS = [models.User, models.Post, models.SyncRoom, models.SyncRoomMessage]
+
+
+def add_pagination_indexes():
+    """创建缺失的组合索引（已存在的跳过）"""
+    inspector = inspect(engine)
+    for model in INDEXED_MODELS:
+        table = model.__table__
+        if not inspector.has_table(table.name):
+            print(f"⚠️ 表 {table.name} 不存在，跳过")
+            continue
+
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if len(index.columns) < 2:
+                continue
+            if index.name in existing:
+                print(f"✅ {table.name}.{index.name} 已存在")
+                continue
+            print(f"正在创建 {table.name}.{index.name} ...")
+            index.create(bind=engine)
+            print(f"✅ 成功创建 {table.name}.{index.name}")
+
+
+if __name__ == "__main__":
+    print("开始添加游标分页索引...")
+    try:
+        add_pagination_indexes()
+    except Exception as e:
+        print(f"❌ 数据库错误: {e}")
+    print("完成!")
@@ -0,0 +1,67 @@
+"""
+为 posts 表添加全文索引
+
+MySQL: 在 (title, content) 上创建 FULLTEXT 索引，使用 ngram parser 支持中文
+SQLite: 创建 FTS5 虚拟表 posts_search 并回填现有文章
+
+    python scripts/database/add_posts_fulltext_index.py
+"""
+import sys
+import os
+
+# 添加父目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import text
+from backend.database import engine, SessionLocal
+from backend.post_search import SQLiteFTSSearch
+
+INDEX_NAME = "ft_posts_title_content"
+
+
+def add_mysql_fulltext_index():
+    """创建 MySQL FULLTEXT (ngram) 索引"""
+    with engine.connect() as conn:
+        exists = conn.execute(text("""
+            SELECT COUNT(*)
+            FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = 'posts'
+            AND INDEX_NAME = :name
+        """), {"name": INDEX_NAME}).scalar()
+
+        if exists:
+            print(f"✅ 索引 {INDEX_NAME} 已存在，无需添加")
+            return
+
+        print(f"正在创建 FULLTEXT 索引 {INDEX_NAME} (大表可能需要几分钟)...")
+        conn.execute(text(
+            f"ALTER TABLE posts ADD FULLTEXT INDEX {INDEX_NAME} (title, content) WITH PARSER ngram"
+        ))
+        conn.commit()
+        print(f"✅ 成功创建 FULLTEXT 索引 {INDEX_NAME}")
+
+
+def add_sqlite_fts_table():
+    """创建 SQLite FTS5 表并回填"""
+    db = SessionLocal()
+    try:
+        SQLiteFTSSearch().ensure_ready(db)
+        count = db.execute(text("SELECT COUNT(*) FROM posts_search")).scalar()
+        print(f"✅ posts_search 已就绪，共 {count} 篇文章")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print("开始添加文章全文索引...")
+    try:
+        if engine.dialect.name == "mysql":
+            add_mysql_fulltext_index()
+        elif engine.dialect.name == "sqlite":
+            add_sqlite_fts_table()
+        else:
+            print(f"❌ 不支持的数据库类型: {engine.dialect.name}")
+    except Exception as e:
+        print(f"❌ 数据库错误: {e}")
+    print("完成!")
@@ -0,0 +1,68 @@
+"""
+添加本地模式视频校验字段
+
+为 sync_rooms 表添加:
+- video_size: 房主视频文件大小
+- video_fingerprint: 房主视频的抽样指纹（见 backend/video_fingerprint.py）
+"""
+import sys
+import os
+
+# 添加父目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from sqlalchemy import create_engine, text
+from backend.database import SQLALCHEMY_DATABASE_URL
+
+def add_video_fingerprint_columns():
+    """添加视频校验相关字段"""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+    try:
+        with engine.connect() as conn:
+            # 检查字段是否已存在
+            result = conn.execute(text("""
+                SELECT COLUMN_NAME
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_NAME = 'sync_rooms'
+                AND COLUMN_NAME IN ('video_size', 'video_fingerprint')
+            """))
+            existing_columns = [row[0] for row in result]
+
+            # 添加 video_size 字段
+            if 'video_size' not in existing_columns:
+                print("添加 video_size 字段...")
+                conn.execute(text("""
+                    ALTER TABLE sync_rooms
+                    ADD COLUMN video_size BIGINT NULL
+                """))
+                conn.commit()
+                print("✅ video_size 字段添加成功")
+            else:
+                print("⏭️  video_size 字段已存在")
+
+            # 添加 video_fingerprint 字段
+            if 'video_fingerprint' not in existing_columns:
+                print("添加 video_fingerprint 字段...")
+                conn.execute(text("""
+                    ALTER TABLE sync_rooms
+                    ADD COLUMN video_fingerprint VARCHAR(64) NULL
+                """))
+                conn.commit()
+                print("✅ video_fingerprint 字段添加成功")
+            else:
+                print("⏭️  video_fingerprint 字段已存在")
+
+        print("\n🎉 数据库迁移完成!")
+
+    except Exception as e:
+        print(f"❌ 迁移失败: {str(e)}")
+        raise
+    finally:
+        engine.dispose()
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("开始添加本地模式视频校验字段")
+    print("=" * 60)
+    add_video_fingerprint_columns()
@@ -0,0 +1,321 @@
+"""
+账号清除基准测试
+
+为一个高产用户生成 100,000 篇文章、50 个链接分类下 5,000 个链接、200 个房间（每个 10 个成员、500 条消息），
+另有 1,000 条该用户在其他房间的消息。对比:
+- 旧实现: 逐个房间删除消息和成员，所有删除在一个大事务中
+- 新实现: account_purge 分批删除，每批一个短事务
+清除期间另一个线程持续向其他房间写入消息，统计写入的最长等待（SQLite 写锁是库级的，最能体现长事务的影响）。
+
+同时验证: 该用户的数据全部删除、搜索索引同步清理、其他用户的数据保留；
+后台任务接口返回 202，轮询进度直到完成；清除后该用户的 token 失效；
+清除期间该用户和其房间的成员持续发言: 开始清除后的消息被拒绝，已入队的消息在删除前写入，
+该用户的连接被断开，不留下指向已删除用户 / 房间的消息（MySQL 上会使删除因外键失败）。
+
+使用临时 SQLite 数据库运行:
+    python scripts/tests/test_account_purge.py
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+TEMP_DIR = tempfile.mkdtemp()
+DB_FILE = os.path.join(TEMP_DIR, "bench_purge.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+import httpx
+from engineio.async_socket import AsyncSocket
+from sqlalchemy import create_engine, func, insert, or_, select, text
+from sqlalchemy.orm import sessionmaker
+
+from backend import models, security, websocket_server
+from backend.account_purge import AccountPurger, PURGE_STEPS, account_purger
+from backend.chat_pipeline import chat_pipeline
+from backend.database import SessionLocal, engine
+from backend.main import app
+from backend.post_search import post_search
+from backend.rate_limiter import rate_limiter
+from backend.websocket_server import sio
+
+POSTS = 100000
+CATEGORIES = 50
+LINKS = 5000
+ROOMS = 200
+MEMBERS_PER_ROOM = 10
+MESSAGES_PER_ROOM = 500
+FOREIGN_MESSAGES = 1000
+WRITE_INTERVAL = 0.005
+
+
+def seed():
+    """用户 1 为管理员，用户 2 为要删除的用户，其余为其他用户；房间 ROOMS+1 属于其他用户"""
+    models.Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    hashed = security.get_password_hash("secret")
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": i, "username": f"purge{i}", "email": f"purge{i}@example.com", "hashed_password": hashed,
+             "role": "admin" if i == 1 else "user"}
+            for i in range(1, MEMBERS_PER_ROOM + 2)
+        ])
+        conn.execute(insert(models.Post), [
+            {"id": i + 1, "title": f"文章 {i}", "content": f"高产用户的第 {i} 篇文章", "category": f"分类{i % 5}",
+             "author_id": 2, "created_at": now}
+            for i in range(POSTS)
+        ] + [{"id": POSTS + 1, "title": "其他用户的文章", "content": "保留", "category": "分类0", "author_id": 3, "created_at": now}])
+        conn.execute(insert(models.LinkCategory), [
+            {"id": i + 1, "name": f"收藏 {i}", "user_id": 2} for i in range(CATEGORIES)
+        ] + [{"id": CATEGORIES + 1, "name": "其他用户的收藏", "user_id": 3}])
+        conn.execute(insert(models.WebsiteLink), [
+            {"title": f"链接 {i}", "url": f"https://example.com/{i}", "category_id": i % CATEGORIES + 1, "user_id": 2}
+            for i in range(LINKS)
+        ] + [{"title": "其他用户的链接", "url": "https://example.org", "category_id": CATEGORIES + 1, "user_id": 3}])
+        conn.execute(insert(models.SyncRoom), [
+            {"id": r + 1, "room_code": f"P{r:05d}", "room_name": f"房间 {r}", "host_user_id": 2 if r < ROOMS else 3}
+            for r in range(ROOMS + 1)
+        ])
+        conn.execute(insert(models.SyncRoomMember), [
+            {"room_id": r + 1, "user_id": u + 2} for r in range(ROOMS + 1) for u in range(MEMBERS_PER_ROOM)
+        ])
+        conn.execute(insert(models.SyncRoomMessage), [
+            {"room_id": r + 1, "user_id": 2 + m % MEMBERS_PER_ROOM, "message": f"消息 {m}", "created_at": now}
+            for r in range(ROOMS) for m in range(MESSAGES_PER_ROOM)
+        ] + [
+            {"room_id": ROOMS + 1, "user_id": 2 + m % 2, "message": f"其他房间的消息 {m}", "created_at": now}
+            for m in range(FOREIGN_MESSAGES * 2)
+        ])
+    db = SessionLocal()
+    post_search.backend.ensure_ready(db)  # 建立全文索引
+    db.close()
+
+
+def legacy_delete_user(db, user_id):
+    """旧实现（改造前的 crud.delete_user，不含缓存失效）"""
+    post_ids = [post_id for (post_id,) in db.query(models.Post.id).filter(models.Post.author_id == user_id)]
+    post_search.remove_posts(db, post_ids)
+    db.query(models.Post).filter(models.Post.author_id == user_id).delete()
+    db.query(models.WebsiteLink).filter(models.WebsiteLink.user_id == user_id).delete()
+    db.query(models.LinkCategory).filter(models.LinkCategory.user_id == user_id).delete()
+    user_rooms = db.query(models.SyncRoom).filter(models.SyncRoom.host_user_id == user_id).all()
+    for room in user_rooms:
+        db.query(models.SyncRoomMessage).filter(models.SyncRoomMessage.room_id == room.id).delete()
+        db.query(models.SyncRoomMember).filter(models.SyncRoomMember.room_id == room.id).delete()
+    db.query(models.SyncRoom).filter(models.SyncRoom.host_user_id == user_id).delete()
+    db.query(models.SyncRoomMember).filter(models.SyncRoomMember.user_id == user_id).delete()
+    db.query(models.SyncRoomMessage).filter(models.SyncRoomMessage.user_id == user_id).delete()
+    db.query(models.User).filter(models.User.id == user_id).delete()
+    db.commit()
+
+
+def remaining(bench_engine, user_id=2):
+    db = sessionmaker(bind=bench_engine)()
+    rows = {table: db.scalar(select(func.count(model.id)).where(condition(user_id)))
+            for table, model, condition in PURGE_STEPS}
+    rows["users"] = db.scalar(select(func.count(models.User.id)).where(models.User.id == user_id))
+    others = (db.scalar(select(func.count(models.Post.id))),
+              db.scalar(select(func.count(models.SyncRoomMessage.id))))
+    db.close()
+    return rows, others
+
+
+def with_concurrent_writer(bench_engine, work):
+    """执行 work 期间另一个线程每 5ms 写入一条消息，返回 (work 耗时, 写入最长等待)"""
+    stop = threading.Event()
+    waits = []
+
+    def writer():
+        with bench_engine.connect() as conn:
+            while not stop.is_set():
+                start = time.perf_counter()
+                conn.execute(insert(models.SyncRoomMessage).values(
+                    room_id=ROOMS + 1, user_id=3, message="并发写入", created_at=datetime.utcnow()))
+                conn.commit()
+                waits.append(time.perf_counter() - start)
+                time.sleep(WRITE_INTERVAL)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(0.05)
+    start = time.perf_counter()
+    result = work()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    thread.join()
+    return result, elapsed, max(waits) * 1000, len(waits)
+
+
+def benchmark():
+    legacy_file = os.path.join(TEMP_DIR, "bench_purge_legacy.db")
+    shutil.copy(DB_FILE, legacy_file)
+
+    legacy_engine = create_engine(f"sqlite:///{legacy_file}", connect_args={"timeout": 60})
+    db = sessionmaker(bind=legacy_engine)()
+    _, legacy_elapsed, legacy_wait, legacy_writes = with_concurrent_writer(
+        legacy_engine, lambda: legacy_delete_user(db, 2))
+    db.close()
+    legacy_rows, _ = remaining(legacy_engine)
+    assert not any(legacy_rows.values()), legacy_rows
+    legacy_engine.dispose()
+
+    purge_file = os.path.join(TEMP_DIR, "bench_purge_new.db")
+    shutil.copy(DB_FILE, purge_file)
+    purge_engine = create_engine(f"sqlite:///{purge_file}", connect_args={"timeout": 60})
+    purger = AccountPurger(sessionmaker(bind=purge_engine), batch_size=1000)
+    db = sessionmaker(bind=purge_engine)()
+    job, elapsed, wait, writes = with_concurrent_writer(purge_engine, lambda: purger.purge(db, 2))
+    db.close()
+    assert job.status == "done", job.error
+    rows, (posts, messages) = remaining(purge_engine)
+    assert not any(rows.values()), rows
+    assert posts == 1 and messages >= FOREIGN_MESSAGES
+    assert job.deleted == job.totals and job.progress == 1.0
+    purge_engine.dispose()
+
+    print(f"待删除: {job.totals}")
+    print(f"旧实现: 总耗时 {legacy_elapsed:6.2f}s | 一个事务 | 并发写入最长等待 {legacy_wait:8.1f}ms ({legacy_writes} 次写入)")
+    print(f"新实现: 总耗时 {elapsed:6.2f}s | {job.batches} 批, 单批最长 {purger.metrics.max_batch_ms:.1f}ms"
+          f" | 并发写入最长等待 {wait:8.1f}ms ({writes} 次写入)")
+
+
+async def check_background_job():
+    """后台任务接口: 202 + 轮询进度；清除后 token 失效，搜索索引同步清理"""
+    admin = {"Authorization": f"Bearer {security.create_access_token(data={'sub': 'purge1'})}"}
+    victim = {"Authorization": f"Bearer {security.create_access_token(data={'sub': 'purge2'})}"}
+    account_purger.batch_size = 2000
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        assert (await client.get("/api/users/me", headers=victim)).status_code == 200
+
+        resp = await client.delete("/api/admin/users/2?background=true", headers=admin)
+        assert resp.status_code == 202, resp.text
+        job_id = resp.json()["job"]["job_id"]
+
+        progress = []
+        while True:
+            job = (await client.get(f"/api/admin/user-purges/{job_id}", headers=admin)).json()
+            progress.append((job["phase"], job["progress"]))
+            if job["status"] in ("done", "failed"):
+                break
+            await asyncio.sleep(0.02)
+        assert job["status"] == "done", job
+        phases = list(dict.fromkeys(phase for phase, _ in progress if phase))
+        print(f"后台任务: {len(progress)} 次轮询, 经过阶段 {phases}, "
+              f"{job['batches']} 批, 耗时 {job['finished_at'] - job['started_at']:.2f}s")
+
+        assert (await client.get("/api/users/me", headers=victim)).status_code == 401
+        assert (await client.delete("/api/admin/users/2", headers=admin)).status_code == 404
+        assert (await client.get("/api/admin/user-purges/missing", headers=admin)).status_code == 404
+        metrics = (await client.get("/api/admin/metrics", headers=admin)).json()["account_purge"]
+        assert metrics["purges_completed"] == 1
+
+    db = SessionLocal()
+    indexed = db.execute(text("SELECT COUNT(*) FROM posts_search")).scalar()
+    assert indexed == db.scalar(select(func.count(models.Post.id))) == 1, indexed
+    db.close()
+    print("✅ 用户数据全部删除，其他用户数据保留，搜索索引已同步清理，token 失效")
+
+
+async def connect(eio_sid, username):
+    """走 Socket.IO 握手建立连接（数据包不经过真实传输）"""
+    sio.eio.sockets[eio_sid] = AsyncSocket(sio.eio, eio_sid)
+    sio.environ[eio_sid] = {"QUERY_STRING": ""}
+    await sio._handle_connect(eio_sid, "/", {"token": security.create_access_token(data={"sub": username})})
+    return sio.manager.sid_from_eio_sid(eio_sid, "/")
+
+
+async def check_chat_during_purge():
+    """清除期间房主和房间成员持续发言"""
+    host_id, room_id = MEMBERS_PER_ROOM + 2, ROOMS + 2
+    db = SessionLocal()
+    db.add(models.User(id=host_id, username="chatty", email="chatty@example.com", hashed_password="x"))
+    db.add(models.SyncRoom(id=room_id, room_code="CHATTY", room_name="清除期间发言", host_user_id=host_id))
+    db.add_all([models.SyncRoomMember(room_id=room_id, user_id=host_id),
+                models.SyncRoomMember(room_id=room_id, user_id=3)])
+    db.commit()
+    db.close()
+
+    rate_limiter.limits = {}
+    sio.manager.initialize()
+    chat_pipeline.start()
+    errors = []
+
+    async def send(eio_sid, pkt):
+        encoded = pkt.encode()
+        if encoded.startswith('42["error"'):
+            errors.append(encoded)
+
+    async def send_raw(eio_sid, data):
+        pass
+
+    sio._send_eio_packet = send
+    sio.eio.send = send_raw
+    sids = [await connect("chatty-host", "chatty"), await connect("chatty-member", "purge3")]
+    for sid in sids:
+        await websocket_server.join_room(sid, {"room_id": room_id})
+    assert not errors, errors
+
+    done = asyncio.Event()
+    sent = [0, 0]
+
+    async def chat(i):
+        while not done.is_set() and sio.manager.is_connected(sids[i], "/"):
+            await websocket_server.send_message(sids[i], {"room_id": room_id, "message": f"消息 {sent[i]}"})
+            sent[i] += 1
+            await asyncio.sleep(0.001)
+
+    chatters = [asyncio.create_task(chat(i)) for i in range(2)]
+    await asyncio.sleep(0.2)
+    admin = {"Authorization": f"Bearer {security.create_access_token(data={'sub': 'purge1'})}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        resp = await client.delete(f"/api/admin/users/{host_id}?background=true", headers=admin)
+        assert resp.status_code == 202, resp.text
+        job_id = resp.json()["job"]["job_id"]
+        while True:
+            job = (await client.get(f"/api/admin/user-purges/{job_id}", headers=admin)).json()
+            if job["status"] in ("done", "failed"):
+                break
+            await asyncio.sleep(0.02)
+    await asyncio.sleep(0.05)
+    done.set()
+    await asyncio.gather(*chatters)
+    await chat_pipeline.drain()
+    assert job["status"] == "done", job
+
+    db = SessionLocal()
+    orphans = db.scalar(select(func.count(models.SyncRoomMessage.id)).where(or_(
+        models.SyncRoomMessage.room_id == room_id, models.SyncRoomMessage.user_id == host_id)))
+    members = db.scalar(select(func.count(models.SyncRoomMember.id)).where(models.SyncRoomMember.room_id == room_id))
+    db.close()
+    assert orphans == 0 and members == 0, (orphans, members)
+    assert not sio.manager.is_connected(sids[0], "/")  # 被清除用户的连接已断开
+    assert errors  # 停用后的消息被拒绝
+    print(f"✅ 清除期间持续发言: 共 {sum(sent)} 条, 开始清除后拒绝 {len(errors)} 条, 没有留下孤立的消息和成员")
+    await chat_pipeline.shutdown()
+
+
+async def check_async():
+    await check_background_job()
+    await check_chat_during_purge()
+
+
+def main():
+    seed()
+    print("=" * 72)
+    print(f"账号清除基准测试 ({POSTS:,} 篇文章, {LINKS:,} 个链接, {ROOMS} 个房间 × {MESSAGES_PER_ROOM} 条消息)")
+    print("=" * 72)
+    benchmark()
+    asyncio.run(check_async())
+
+
+if __name__ == "__main__":
+    main()
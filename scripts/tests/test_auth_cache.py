@@ -0,0 +1,85 @@
+"""
+认证缓存测试
+
+使用临时 SQLite 数据库，统计连续 1,000 次已认证请求（GET /api/links）
+中 users 表查询次数，并验证禁用账号、修改角色、删除用户后缓存立即失效。
+
+    python scripts/tests/test_auth_cache.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+DB_FILE = os.path.join(tempfile.mkdtemp(), "auth_cache.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from backend import auth_cache, crud, models, schemas
+from backend.database import SessionLocal, engine
+from backend.main import app
+
+REQUESTS = 1000
+
+
+def main():
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = crud.create_user(db, schemas.UserCreate(username="cache_user", email="cache@example.com", password="secret123"))
+
+    user_queries = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, *args):
+        nonlocal user_queries
+        if "FROM users" in statement:
+            user_queries += 1
+
+    client = TestClient(app)
+
+    def login(username):
+        resp = client.post("/api/auth/login", data={"username": username, "password": "secret123"})
+        return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+    headers = login("cache_user")
+
+    print("=" * 60)
+    print(f"认证缓存测试 ({REQUESTS:,} 次已认证请求)")
+    print("=" * 60)
+
+    user_queries = 0
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        assert client.get("/api/links", headers=headers).status_code == 200
+    elapsed = time.perf_counter() - start
+    print(f"users 表查询: {user_queries} 次 | 平均 {elapsed / REQUESTS * 1000:.2f}ms/请求")
+    print(f"缓存统计: {auth_cache.stats()}")
+    assert user_queries <= 1
+
+    # 禁用账号后立即生效
+    crud.update_user(db, user.id, schemas.UserUpdate(is_active=False))
+    assert client.get("/api/links", headers=headers).status_code == 403
+    print("✅ 禁用账号立即生效")
+
+    # 恢复并提升为管理员，角色变化立即生效
+    assert client.get("/api/admin/metrics", headers=headers).status_code == 403
+    crud.update_user(db, user.id, schemas.UserUpdate(is_active=True, role="admin"))
+    assert client.get("/api/admin/metrics", headers=headers).status_code == 200
+    print("✅ 角色变化立即生效")
+
+    # 删除用户后旧 token 失效
+    assert crud.delete_user(db, user.id)
+    assert client.get("/api/links", headers=headers).status_code == 401
+    print("✅ 删除用户后旧 token 失效")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+连接登记表断开性能测试
+
+登记 50,000 个连接（5,000 个房间 × 10 个用户），然后模拟部署后的
+重连风暴：逐个断开所有 sid，统计单次断开耗时。
+同时对比旧实现（遍历所有房间和成员查找 sid）在同等规模下的耗时。
+
+    python scripts/tests/test_connection_registry.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from backend.connection_registry import LocalConnectionRegistry
+
+ROOMS = 5000
+USERS_PER_ROOM = 10
+LEGACY_SAMPLE = 500  # 旧实现太慢，只抽样断开这么多个 sid
+
+
+def build_connections():
+    return [
+        (room_id, room_id * USERS_PER_ROOM + u, f"sid-{room_id}-{u}")
+        for room_id in range(ROOMS)
+        for u in range(USERS_PER_ROOM)
+    ]
+
+
+def legacy_disconnect(room_connections, sid):
+    """旧实现：遍历所有房间的所有成员"""
+    for room_id, connections in list(room_connections.items()):
+        for user_id, connection_sid in list(connections.items()):
+            if connection_sid == sid:
+                del connections[user_id]
+                if not connections:
+                    del room_connections[room_id]
+                break
+
+
+async def main():
+    connections = build_connections()
+    total = len(connections)
+
+    print("=" * 60)
+    print(f"连接登记表断开性能测试 ({total:,} 个连接)")
+    print("=" * 60)
+
+    # 新实现：反向索引
+    registry = LocalConnectionRegistry()
+    for room_id, user_id, sid in connections:
+        await registry.add(room_id, user_id, sid)
+
+    start = time.perf_counter()
+    for _, _, sid in connections:
+        departures = await registry.remove_sid(sid)
+        assert len(departures) == 1
+    elapsed = time.perf_counter() - start
+    assert len(registry) == 0
+    per_op_new = elapsed / total * 1e6
+    print(f"反向索引: 断开全部 {total:,} 个连接 {elapsed * 1000:8.1f}ms | 平均 {per_op_new:7.2f}µs/次")
+
+    # 旧实现：全量扫描（抽样）
+    legacy = {}
+    for room_id, user_id, sid in connections:
+        legacy.setdefault(room_id, {})[user_id] = sid
+    sample = connections[-LEGACY_SAMPLE:]  # 最坏情况：位于字典末尾的房间
+
+    start = time.perf_counter()
+    for _, _, sid in sample:
+        legacy_disconnect(legacy, sid)
+    elapsed = time.perf_counter() - start
+    per_op_old = elapsed / len(sample) * 1e6
+    print(f"全量扫描: 抽样断开 {len(sample):,} 个连接 {elapsed * 1000:8.1f}ms | 平均 {per_op_old:7.2f}µs/次")
+
+    print(f"\n✅ 单次断开提速约 {per_op_old / per_op_new:,.0f} 倍")
+
+    # 多标签页：同一用户两个 sid，第一个断开时用户仍在线
+    registry = LocalConnectionRegistry()
+    await registry.add(1, 100, "tab-a")
+    await registry.add(1, 100, "tab-b")
+    (first,) = await registry.remove_sid("tab-a")
+    (second,) = await registry.remove_sid("tab-b")
+    assert not first.user_gone and second.user_gone and second.room_empty
+    print("✅ 多标签页连接互不覆盖")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,170 @@
+"""
+数据库连接池大小测试
+
+模拟 N 个 worker 线程（对应 FastAPI 线程池中并发执行的同步接口）持续处理请求:
+每个请求从连接池取连接，执行一组典型查询（鉴权查用户、房间成员列表、房间详情），
+在事务内额外停留 --hold-ms（模拟较慢的网络往返 / 复杂查询），归还连接后再处理 --think-ms（序列化、模板等不占连接的工作）。
+
+对每个候选 pool_size 统计吞吐、请求延迟 p99、取连接等待 p99（由 backend/db_pool.py 的连接池统计得到），
+推荐吞吐不低于最佳值 95% 的最小 pool_size，结果可直接填入 DB_POOL_SIZE。
+
+默认使用临时 SQLite 数据库；传入 --database-url 可对真实 MySQL 测试（需先建好表和数据）:
+    python scripts/tests/test_db_pool_sizing.py --workers 40
+    python scripts/tests/test_db_pool_sizing.py --workers 40 --sizes 5,10,20,40 --database-url mysql+pymysql://...
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+TEMP_DIR = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(TEMP_DIR, 'bench_pool.db')}")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from backend import crud, models, sync_room_crud
+from backend.db_pool import TimedQueuePool, instrument
+
+ROOMS = 200
+MEMBERS_PER_ROOM = 10
+
+
+def seed(engine):
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    if db.scalar(select(func.count(models.SyncRoom.id))):
+        db.close()
+        return
+    users = [models.User(username=f"pool{i}", email=f"pool{i}@example.com", hashed_password="x")
+             for i in range(ROOMS * MEMBERS_PER_ROOM)]
+    db.add_all(users)
+    db.flush()
+    rooms = [models.SyncRoom(room_code=f"POOL{i:03d}", room_name=f"连接池测试{i}", host_user_id=users[i * MEMBERS_PER_ROOM].id)
+             for i in range(ROOMS)]
+    db.add_all(rooms)
+    db.flush()
+    for i, room in enumerate(rooms):
+        for user in users[i * MEMBERS_PER_ROOM:(i + 1) * MEMBERS_PER_ROOM]:
+            db.add(models.SyncRoomMember(room_id=room.id, user_id=user.id))
+    db.commit()
+    db.close()
+
+
+def handle_request(Session, room_ids, user_ids, hold):
+    db = Session()
+    try:
+        crud.get_user_by_id(db, random.choice(user_ids))
+        room_id = random.choice(room_ids)
+        sync_room_crud.get_room_by_id(db, room_id)
+        sync_room_crud.get_room_members(db, room_id)
+        if hold:
+            time.sleep(hold)
+    finally:
+        db.close()
+
+
+def run(url, pool_size, args):
+    engine = create_engine(url, poolclass=TimedQueuePool, pool_size=pool_size, max_overflow=0,
+                           pool_timeout=args.timeout, pool_pre_ping=True)
+    metrics = instrument(engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with engine.connect() as conn:
+        room_ids = [row[0] for row in conn.execute(text("SELECT id FROM sync_rooms"))]
+        user_ids = [row[0] for row in conn.execute(text("SELECT id FROM users"))]
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    hold, think = args.hold_ms / 1000, args.think_ms / 1000
+
+    def worker():
+        nonlocal errors
+        local = []
+        failed = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                handle_request(Session, room_ids, user_ids, hold)
+                local.append(time.perf_counter() - start)
+            except Exception:
+                failed += 1
+            if think:
+                time.sleep(think)
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(args.workers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+
+    latencies.sort()
+    return {
+        "pool_size": pool_size,
+        "throughput": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000 if latencies else 0,
+        "p99": latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000 if latencies else 0,
+        "wait_p99": metrics.wait_ms.quantile(0.99) or 0,
+        "max_checked_out": metrics.checked_out.max,
+        "errors": errors + metrics.timeouts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="为给定 worker 数寻找合适的连接池大小")
+    parser.add_argument("--workers", type=int, default=40, help="并发 worker 线程数（FastAPI 线程池默认 40）")
+    parser.add_argument("--sizes", default=None, help="候选 pool_size，逗号分隔（默认 1 到 workers 之间按倍数取值）")
+    parser.add_argument("--duration", type=float, default=3.0, help="每个 pool_size 的测试时长（秒）")
+    parser.add_argument("--hold-ms", type=float, default=2.0, help="每个请求在事务内额外停留的时间")
+    parser.add_argument("--think-ms", type=float, default=5.0, help="每个请求归还连接后不占连接的处理时间")
+    parser.add_argument("--timeout", type=float, default=30.0, help="pool_timeout")
+    parser.add_argument("--database-url", default=None, help="测试的数据库（默认临时 SQLite）")
+    args = parser.parse_args()
+
+    url = args.database_url or os.environ["DATABASE_URL"]
+    if args.sizes:
+        sizes = [int(s) for s in args.sizes.split(",")]
+    else:
+        sizes = sorted({s for s in (1, 2, 4, 8, 16, 32, 64, 128) if s < args.workers} | {args.workers})
+
+    seed(create_engine(url))
+
+    print("=" * 72)
+    print(f"连接池大小测试 ({args.workers} 个 worker, 事务内停留 {args.hold_ms}ms, 处理 {args.think_ms}ms)")
+    print("=" * 72)
+    results = []
+    for size in sizes:
+        r = run(url, size, args)
+        results.append(r)
+        print(f"pool_size {size:4d} | {r['throughput']:8.0f} req/s | 延迟 p50 {r['p50']:7.1f}ms p99 {r['p99']:7.1f}ms"
+              f" | 等待连接 p99 {r['wait_p99']:7g}ms | 最多借出 {r['max_checked_out']:3.0f} | 失败 {r['errors']}")
+
+    best = max(r["throughput"] for r in results)
+    recommended = min((r for r in results if r["throughput"] >= best * 0.95 and not r["errors"]),
+                      key=lambda r: r["pool_size"], default=None)
+    if recommended:
+        print(f"\n推荐 DB_POOL_SIZE={recommended['pool_size']}"
+              f"（吞吐 {recommended['throughput']:.0f} req/s，最佳 {best:.0f} req/s 的"
+              f" {recommended['throughput'] / best:.0%}）")
+    else:
+        print("\n所有候选 pool_size 都有失败请求，请增大 --timeout 或检查数据库")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+游标分页基准测试
+
+在临时 SQLite 数据库的一个房间中生成 200,000 条聊天记录，对比不同翻页深度下
+OFFSET 分页与 (created_at, id) 游标分页的单页耗时，并验证:
+- 沿 before 游标翻完所有页，记录不重不漏
+- after 游标返回更新的一页
+- 不带游标时 skip/limit 仍可用
+
+    python scripts/tests/test_keyset_pagination.py [消息数]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench_pagination.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from sqlalchemy import insert
+
+from backend import models, sync_room_crud
+from backend.database import SessionLocal, engine
+
+PAGE = 50
+ROUNDS = 5
+
+
+def seed(db):
+    user = models.User(username="chatter", email="chatter@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    room = models.SyncRoom(room_code="PAGE01", room_name="翻页测试", host_user_id=user.id)
+    db.add(room)
+    db.flush()
+
+    start = datetime(2024, 1, 1)
+    batch = []
+    for i in range(MESSAGES):
+        # 每 3 条共用一个时间戳，验证 id 作为次序键
+        batch.append({"room_id": room.id, "user_id": user.id, "message": f"消息 {i}",
+                      "created_at": start + timedelta(seconds=i // 3)})
+        if len(batch) == 10000:
+            db.execute(insert(models.SyncRoomMessage), batch)
+            batch = []
+    if batch:
+        db.execute(insert(models.SyncRoomMessage), batch)
+    db.commit()
+    return room.id
+
+
+def timed(func):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = func()
+    return (time.perf_counter() - start) / ROUNDS * 1000, result
+
+
+def main():
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    room_id = seed(db)
+
+    print("=" * 60)
+    print(f"游标分页基准测试 ({MESSAGES:,} 条消息, 每页 {PAGE} 条)")
+    print("=" * 60)
+
+    # 预先沿游标走一遍，记下每个深度对应的游标
+    cursors = {0: None}
+    depths = [0, MESSAGES // 10, MESSAGES // 2, MESSAGES - PAGE]
+    seen = []
+    page = sync_room_crud.get_room_messages(db, room_id, limit=PAGE)
+    while page:
+        seen.extend(message["id"] for message in page)
+        if len(seen) in depths:
+            cursors[len(seen)] = page.next_cursor
+        if not page.next_cursor:
+            break
+        page = sync_room_crud.get_room_messages(db, room_id, limit=PAGE, before=page.next_cursor)
+    assert len(seen) == len(set(seen)) == MESSAGES
+    print(f"✅ 沿 before 游标翻完 {len(seen):,} 条，不重不漏\n")
+
+    print(f"{'深度':>10}{'OFFSET':>12}{'游标':>12}{'提速':>10}")
+    for depth in depths:
+        offset_ms, by_offset = timed(lambda: sync_room_crud.get_room_messages(db, room_id, skip=depth, limit=PAGE))
+        cursor_ms, by_cursor = timed(lambda: sync_room_crud.get_room_messages(
+            db, room_id, limit=PAGE, before=cursors.get(depth)))
+        assert [m["id"] for m in by_offset] == [m["id"] for m in by_cursor]
+        print(f"{depth:>10,}{offset_ms:>10.1f}ms{cursor_ms:>10.1f}ms{offset_ms / cursor_ms:>9.1f}x")
+
+    # after 游标返回更新的一页
+    older = sync_room_crud.get_room_messages(db, room_id, limit=PAGE, before=cursors[MESSAGES // 2])
+    newer = sync_room_crud.get_room_messages(db, room_id, limit=PAGE, after=older.prev_cursor)
+    assert newer[0]["id"] == older[-1]["id"] + 1
+    print("\n✅ after 游标返回更新的一页")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+登录风暴基准测试
+
+同时发起大量登录请求，并在风暴期间每 20ms 请求一次普通同步接口 GET /，
+对比三种方式:
+    旧实现  - 同步接口内直接 bcrypt（占用接口线程池）
+    进程池  - password_hasher 进程池（默认进程数 = CPU 核数）
+    限流    - 进程池 + 很小的排队上限，超出部分直接返回 503
+
+使用临时 SQLite 数据库运行，无需 MySQL:
+    python scripts/tests/test_login_storm.py [并发登录数] [bcrypt cost]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+LOGINS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+ROUNDS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench_login.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ["BCRYPT_ROUNDS"] = str(ROUNDS)
+
+import httpx
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.orm import Session
+
+from backend import crud, main, models, security
+from backend.database import SessionLocal, engine
+from backend.password_hasher import PasswordHasher, hash_password, hash_rounds
+
+USERS = 20
+PASSWORD = "secret123"
+PROBE_INTERVAL = 0.02
+
+
+@main.app.post("/bench/legacy-login")
+def legacy_login(db: Session = Depends(main.get_db), form_data: OAuth2PasswordRequestForm = Depends()):
+    """旧实现：在同步接口中直接校验"""
+    user = crud.get_user_by_username(db, username=form_data.username)
+    if not user or not security.verify_password(form_data.password, user.hashed_password):
+        raise HTTPException(status_code=401)
+    return {"ok": True}
+
+
+def seed():
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    hashed = hash_password(PASSWORD, ROUNDS)
+    db.add_all([
+        models.User(username=f"storm{i}", email=f"storm{i}@example.com", hashed_password=hashed)
+        for i in range(USERS)
+    ])
+    # 旧 cost 的用户，用于验证登录时重算
+    db.add(models.User(username="legacy_cost", email="legacy@example.com",
+                       hashed_password=hash_password(PASSWORD, 4)))
+    db.commit()
+    db.close()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def storm(client, path):
+    login_latencies = []
+    probe_latencies = []
+    statuses = {}
+    done = asyncio.Event()
+
+    async def login(i):
+        start = time.perf_counter()
+        resp = await client.post(path, data={"username": f"storm{i % USERS}", "password": PASSWORD})
+        login_latencies.append(time.perf_counter() - start)
+        statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get("/")
+            probe_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(PROBE_INTERVAL)
+
+    probe_task = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(LOGINS)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe_task
+
+    return {
+        "elapsed": elapsed,
+        "ok_per_sec": statuses.get(200, 0) / elapsed,
+        "login_p95": percentile(login_latencies, 0.95) * 1000,
+        "probe_p50": percentile(probe_latencies, 0.5) * 1000,
+        "probe_p95": percentile(probe_latencies, 0.95) * 1000,
+        "statuses": statuses,
+    }
+
+
+def report(name, result):
+    statuses = ", ".join(f"{code}×{count}" for code, count in sorted(result["statuses"].items()))
+    print(f"{name:<10}{result['elapsed']:>8.2f}s{result['ok_per_sec']:>10.1f}{result['login_p95']:>11.0f}ms"
+          f"{result['probe_p50']:>10.1f}ms{result['probe_p95']:>10.1f}ms   {statuses}")
+
+
+async def run():
+    seed()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print("=" * 86)
+        print(f"登录风暴基准测试 ({LOGINS} 个并发登录, cost={ROUNDS}, CPU 核数={os.cpu_count()})")
+        print("=" * 86)
+        print(f"{'方式':<10}{'总耗时':>9}{'成功/秒':>10}{'登录P95':>13}{'GET / P50':>12}{'GET / P95':>12}   状态码")
+
+        report("旧实现", await storm(client, "/bench/legacy-login"))
+
+        main.password_hasher = PasswordHasher(rounds=ROUNDS, max_pending=LOGINS)
+        main.password_hasher.start()
+        await main.password_hasher.verify(PASSWORD, hash_password(PASSWORD, 4))  # 等待子进程就绪
+        report("进程池", await storm(client, "/api/auth/login"))
+        main.password_hasher.shutdown()
+
+        main.password_hasher = PasswordHasher(rounds=ROUNDS, max_pending=(os.cpu_count() or 1) * 4)
+        result = await storm(client, "/api/auth/login")
+        report("限流", result)
+        assert result["statuses"].get(503, 0) > 0
+
+        # 登录时按配置的 cost 重算旧哈希
+        resp = await client.post("/api/auth/login", data={"username": "legacy_cost", "password": PASSWORD})
+        assert resp.status_code == 200
+        db = SessionLocal()
+        assert hash_rounds(crud.get_user_by_username(db, "legacy_cost").hashed_password) == ROUNDS
+        db.close()
+        main.password_hasher.shutdown()
+        print(f"\n✅ 旧 cost 哈希已在登录时重算为 cost={ROUNDS}")
+
+        # 执行失败（哈希格式错误）只计入 failed，不计入完成数和平均耗时
+        hasher = PasswordHasher(rounds=4, workers=0)
+        await hasher.verify(PASSWORD, hash_password(PASSWORD, 4))
+        try:
+            await hasher.verify(PASSWORD, "not-a-bcrypt-hash")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("invalid hash was accepted")
+        stats = hasher.metrics.as_dict()
+        assert stats["completed"] == 1 and stats["failed"] == 1 and stats["in_flight"] == 0, stats
+        print("✅ 执行失败计入 failed，不影响完成数和平均耗时")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,141 @@
+"""
+文章搜索基准测试
+
+在临时 SQLite 数据库中生成 100,000 篇中文文章，对比:
+    LIKE   - 旧实现 title/content LIKE '%词%'（全表扫描）
+    FTS5   - post_search 的 SQLite 全文索引（二元组切分 + bm25 排序）
+并验证 create_post / update_post / delete_post 的增量索引、相关度排序和高亮摘要。
+
+MySQL 环境下同一接口走 FULLTEXT (ngram) 索引，需要先运行
+scripts/database/add_posts_fulltext_index.py
+
+    python scripts/tests/test_post_search.py [文章数]
+"""
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+POSTS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench_search.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from sqlalchemy import insert
+
+from backend import crud, models, post_search as search_module, schemas
+from backend.database import SessionLocal, engine
+from backend.post_search import create_post_search
+
+VOCABULARY = 20_000
+ROUNDS = 5
+
+
+def build_vocabulary(rng):
+    """随机组合常用区汉字得到词表，词频按 Zipf 分布"""
+    chars = [chr(code) for code in rng.sample(range(0x4E00, 0x9FA5), 800)]
+    words = list(dict.fromkeys("".join(rng.choice(chars) for _ in range(rng.choice((2, 2, 3)))) for _ in range(VOCABULARY)))
+    words[50:50] = ["FastAPI", "Python", "Docker"]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    return words, cum_weights
+
+
+def random_text(rng, vocabulary, phrases):
+    words, cum_weights = vocabulary
+    return "，".join(
+        "".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(2, 5))) for _ in range(phrases)
+    ) + "。"
+
+
+def seed(db, rng, vocabulary):
+    author = models.User(username="author", email="author@example.com", hashed_password="x", role="admin")
+    db.add(author)
+    db.flush()
+    batch = []
+    for i in range(POSTS):
+        batch.append({
+            "title": random_text(rng, vocabulary, 2)[:60],
+            "content": random_text(rng, vocabulary, rng.randint(20, 60)),
+            "category": rng.choice(["技术", "生活", "影视"]),
+            "author_id": author.id,
+        })
+        if len(batch) == 5000:
+            db.execute(insert(models.Post), batch)
+            batch = []
+    if batch:
+        db.execute(insert(models.Post), batch)
+    db.commit()
+    return author.id
+
+
+def timed_search(db, query):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        posts = crud.get_posts(db, skip=0, limit=10, search=query)
+    return (time.perf_counter() - start) / ROUNDS * 1000, posts
+
+
+def main():
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+
+    print("=" * 72)
+    print(f"文章搜索基准测试 ({POSTS:,} 篇文章)")
+    print("=" * 72)
+
+    rng = random.Random(42)
+    vocabulary = build_vocabulary(rng)
+    words = vocabulary[0]
+    # 常见词、中频词、低频词、多词组合、英文词
+    queries = [words[5], words[300], words[8000], f"{words[40]} {words[200]}", "FastAPI"]
+
+    start = time.perf_counter()
+    author_id = seed(db, rng, vocabulary)
+    print(f"生成数据: {time.perf_counter() - start:.1f}s")
+
+    fts = create_post_search("sqlite")
+    start = time.perf_counter()
+    fts.backend.ensure_ready(db)
+    print(f"建立 FTS5 索引: {time.perf_counter() - start:.1f}s\n")
+
+    print(f"{'查询':<16}{'LIKE':>12}{'FTS5':>12}{'提速':>10}   首页结果")
+    like = create_post_search("sqlite", mode="like")
+    for query in queries:
+        crud.post_search = like
+        like_ms, _ = timed_search(db, query)
+        crud.post_search = fts
+        fts_ms, posts = timed_search(db, query)
+        print(f"{query:<16}{like_ms:>10.1f}ms{fts_ms:>10.1f}ms{like_ms / fts_ms:>9.1f}x   命中 {len(posts)} 条")
+
+    # 增量索引：新建、修改、删除立即反映到搜索结果
+    search_module.post_search = crud.post_search = fts
+    post = crud.create_post(db, schemas.PostCreate(title="独一无二的标题词", content="正文提到了量子纠缠"), author_id)
+    assert [p.id for p in crud.get_posts(db, search="量子纠缠")] == [post.id]
+
+    crud.update_post(db, post.id, schemas.PostUpdate(content="正文改为讨论黑洞辐射"))
+    assert crud.get_posts(db, search="量子纠缠") == []
+    hit = crud.get_posts(db, search="黑洞")[0]
+    assert hit.id == post.id and "<mark>黑洞</mark>" in hit.snippet
+    print(f"\n摘要示例: {hit.snippet}")
+
+    # 标题命中的排在正文命中之前
+    crud.create_post(db, schemas.PostCreate(title="日常", content="顺便聊聊黑洞"), author_id)
+    titled = crud.create_post(db, schemas.PostCreate(title="黑洞入门", content="基础知识"), author_id)
+    assert crud.get_posts(db, search="黑洞")[0].id == titled.id
+
+    crud.delete_post(db, post.id)
+    assert post.id not in [p.id for p in crud.get_posts(db, search="黑洞")]
+    print("✅ 增量索引、相关度排序和高亮摘要正常")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+文章接口响应缓存测试
+
+在临时 SQLite 数据库中生成 5,000 篇文章，通过 TestClient 对比:
+    不缓存 - 每次查库并经 pydantic 序列化
+    缓存   - 命中时直接返回序列化好的 JSON 字节
+并验证:
+- ETag / If-None-Match 返回 304
+- 文章详情命中缓存时浏览次数仍是实时值
+- 新建/修改/删除文章、删除作者后相关缓存立即失效，无关缓存保留
+- 超出字节预算时按 LRU 淘汰
+
+    python scripts/tests/test_response_cache.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench_response_cache.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from starlette.datastructures import QueryParams
+
+from backend import crud, models, schemas
+from backend.database import SessionLocal
+from backend.main import app
+from backend.response_cache import ResponseCache, post_cache
+from backend.view_counter import view_counter
+
+POSTS = 5_000
+REQUESTS = 300
+CATEGORIES = ["技术", "生活", "随笔", "未分类"]
+
+
+def seed(db):
+    authors = []
+    for i in range(2):
+        user = models.User(username=f"author{i}", email=f"author{i}@example.com", hashed_password="x", role="admin")
+        db.add(user)
+        db.flush()
+        authors.append(user.id)
+    db.execute(insert(models.Post), [
+        {"title": f"文章 {i}", "content": "正文内容 " * 50, "category": CATEGORIES[i % len(CATEGORIES)],
+         "author_id": authors[i % 2], "views": 0}
+        for i in range(POSTS)
+    ])
+    db.commit()
+    return authors
+
+
+def bench(client, url, cached):
+    original_ttl = post_cache.ttl
+    post_cache.ttl = original_ttl if cached else 0
+    post_cache.clear()
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        assert client.get(url).status_code == 200
+    post_cache.ttl = original_ttl
+    return (time.perf_counter() - start) / REQUESTS * 1000
+
+
+def cached_keys():
+    return set(post_cache._entries)
+
+
+def key_for(url):
+    path, _, query = url.partition("?")
+    params = "&".join(f"{k}={v}" for k, v in sorted(QueryParams(query).multi_items()))
+    return f"{path}?{params}"
+
+
+def main():
+    db = SessionLocal()
+    authors = seed(db)
+    client = TestClient(app)
+
+    print("=" * 60)
+    print(f"文章响应缓存测试 ({POSTS:,} 篇文章, 每项 {REQUESTS} 次请求)")
+    print("=" * 60)
+
+    for label, url in [("列表 limit=100", "/api/posts?limit=100"),
+                       ("分类筛选", "/api/posts?category=技术&limit=50"),
+                       ("文章详情", "/api/posts/42")]:
+        plain_ms = bench(client, url, cached=False)
+        cached_ms = bench(client, url, cached=True)
+        print(f"{label:<14} 不缓存 {plain_ms:6.2f}ms | 缓存 {cached_ms:6.2f}ms | {plain_ms / cached_ms:5.1f}x")
+    print(f"命中率: {post_cache.metrics.hits / (post_cache.metrics.hits + post_cache.metrics.misses):.1%}")
+
+    # 缓存内容与直接序列化一致
+    post_cache.clear()
+    first = client.get("/api/posts?limit=20")
+    second = client.get("/api/posts?limit=20")
+    assert first.content == second.content and first.headers["etag"] == second.headers["etag"]
+    assert first.json()[0]["author"]["username"] in ("author0", "author1")
+
+    # ETag / If-None-Match
+    etag = first.headers["etag"]
+    not_modified = client.get("/api/posts?limit=20", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304 and not not_modified.content
+    assert client.get("/api/posts?limit=20", headers={"If-None-Match": '"other"'}).status_code == 200
+    print("\n✅ If-None-Match 命中返回 304")
+
+    # 详情命中缓存时浏览次数仍实时，ETag 不随浏览次数变化
+    views = [client.get("/api/posts/7").json()["views"] for _ in range(5)]
+    assert views == [1, 2, 3, 4, 5], views
+    detail = client.get("/api/posts/7")
+    assert client.get("/api/posts/7", headers={"If-None-Match": detail.headers["etag"]}).status_code == 304
+    view_counter.flush_sync()
+    assert client.get("/api/posts/7").json()["views"] == 8
+    print("✅ 缓存的详情浏览次数实时，写回后仍连续")
+
+    # 标签失效
+    urls = {
+        "all": "/api/posts?limit=10",
+        "author0": f"/api/posts?author_id={authors[0]}&limit=10",
+        "author1": f"/api/posts?author_id={authors[1]}&limit=10",
+        "tech": "/api/posts?category=技术&limit=10",
+        "life": "/api/posts?category=生活&limit=10",
+        "detail": "/api/posts/9",
+    }
+
+    def warm():
+        post_cache.clear()
+        for url in urls.values():
+            client.get(url)
+        return cached_keys()
+
+    def survivors():
+        keys = cached_keys()
+        return {name for name, url in urls.items() if key_for(url) in keys}
+
+    warm()
+    new_post = crud.create_post(db, schemas.PostCreate(title="新文章", content="...", category="技术"), authors[1])
+    assert survivors() == {"author0", "life", "detail"}, survivors()
+    assert client.get(urls["all"]).json()[0]["id"] == new_post.id
+
+    warm()
+    crud.update_post(db, 9, schemas.PostUpdate(title="改过的标题"))
+    # 第 9 篇不在各列表的第一页，只有详情失效
+    assert survivors() == {"all", "author0", "author1", "tech", "life"}, survivors()
+    assert client.get(urls["detail"]).json()["title"] == "改过的标题"
+
+    warm()
+    crud.delete_post(db, new_post.id)
+    assert survivors() == {"author0", "life", "detail"}, survivors()
+    assert client.get(urls["all"]).json()[0]["id"] != new_post.id
+
+    warm()
+    crud.delete_user(db, authors[0])
+    assert client.get(urls["author0"]).json() == []
+    assert client.get("/api/posts/9").status_code == 404
+    print("✅ 新建/修改/删除文章、删除作者后相关缓存立即失效，无关缓存保留")
+
+    # 字节预算
+    cache = ResponseCache(max_bytes=10_000, ttl=60)
+    for i in range(100):
+        cache.put(f"k{i}", b"x" * 1000, {f"post:{i}"})
+        cache.get("k0")  # 持续访问的条目不被淘汰
+    assert cache.metrics.bytes <= 10_000 and cache.get("k0") is not None and cache.get("k1") is None
+    print(f"✅ 字节预算内 LRU 淘汰（保留 {cache.metrics.entries} 条, 淘汰 {cache.metrics.evictions} 条）")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
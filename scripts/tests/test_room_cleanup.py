@@ -0,0 +1,176 @@
+"""
+空房间清理基准测试
+
+生成 20,000 个活跃房间（每个 5 个成员、20 条消息），其中一半超时无人，对比:
+- 旧实现: 加载全部活跃房间，逐个 count 在线成员，ORM 级联逐行删除成员和消息
+- 新实现: 一次反连接选出候选房间，按批批量 DELETE
+统计 SQL 条数、总耗时和新实现的各阶段耗时。
+
+同时验证: dry_run 不删除且统计与实际一致；有在线成员或最近更新的房间保留；
+选出候选后又有成员上线的房间不会被删除。
+
+使用临时 SQLite 数据库运行:
+    python scripts/tests/test_room_cleanup.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+TEMP_DIR = tempfile.mkdtemp()
+DB_FILE = os.path.join(TEMP_DIR, "bench_cleanup.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from sqlalchemy import create_engine, event, func, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend import models, sync_room_crud
+from backend.database import engine
+
+ROOMS = 20000
+MEMBERS_PER_ROOM = 5
+MESSAGES_PER_ROOM = 20
+
+
+def seed():
+    """偶数号房间超时且成员全部离线；奇数号房间中一半有在线成员，一半最近更新过"""
+    models.Base.metadata.create_all(bind=engine)
+    stale = datetime.utcnow() - timedelta(hours=1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": i + 1, "username": f"clean{i}", "email": f"clean{i}@example.com", "hashed_password": "x"}
+            for i in range(MEMBERS_PER_ROOM)
+        ])
+        conn.execute(insert(models.SyncRoom), [
+            {"id": r + 1, "room_code": f"C{r:05d}", "room_name": f"清理测试{r}", "host_user_id": 1,
+             "is_active": True, "created_at": stale,
+             "updated_at": datetime.utcnow() if r % 4 == 3 else stale}
+            for r in range(ROOMS)
+        ])
+        conn.execute(insert(models.SyncRoomMember), [
+            {"room_id": r + 1, "user_id": u + 1, "is_online": r % 4 == 1 and u == 0}
+            for r in range(ROOMS) for u in range(MEMBERS_PER_ROOM)
+        ])
+        conn.execute(insert(models.SyncRoomMessage), [
+            {"room_id": r + 1, "user_id": 1, "message": f"消息 {m}", "created_at": stale}
+            for r in range(ROOMS) for m in range(MESSAGES_PER_ROOM)
+        ])
+
+
+def legacy_cleanup(db, minutes=10):
+    """旧实现（改造前的 cleanup_empty_rooms）"""
+    cutoff_time = datetime.utcnow() - timedelta(minutes=minutes)
+    rooms = db.query(models.SyncRoom).filter(models.SyncRoom.is_active == True).all()
+    deleted_count = 0
+    for room in rooms:
+        online_members = db.query(models.SyncRoomMember).filter(
+            models.SyncRoomMember.room_id == room.id,
+            models.SyncRoomMember.is_online == True
+        ).count()
+        if online_members == 0 and room.updated_at < cutoff_time:
+            db.delete(room)
+            deleted_count += 1
+    if deleted_count > 0:
+        db.commit()
+    return deleted_count
+
+
+def counts(db):
+    return (db.query(func.count(models.SyncRoom.id)).scalar(),
+            db.query(func.count(models.SyncRoomMember.id)).scalar(),
+            db.query(func.count(models.SyncRoomMessage.id)).scalar())
+
+
+def measure(url, cleanup):
+    bench_engine = create_engine(url)
+    statements = 0
+
+    @event.listens_for(bench_engine, "before_cursor_execute")
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    db = sessionmaker(bind=bench_engine)()
+    start = time.perf_counter()
+    result = cleanup(db)
+    elapsed = time.perf_counter() - start
+    remaining = counts(db)
+    db.close()
+    bench_engine.dispose()
+    return result, elapsed, statements, remaining
+
+
+def check_recheck(url):
+    """选出候选后有成员上线: 该房间在批次事务中被重新检查后跳过"""
+    check_engine = create_engine(url)
+    db = sessionmaker(bind=check_engine)()
+    candidates = sync_room_crud.cleanup_empty_rooms(db, dry_run=True).room_ids
+    racing = candidates[len(candidates) // 2]
+
+    # 候选查询结束后 cleanup_empty_rooms 会 rollback 结束只读事务，在此时让一个候选房间的成员上线
+    rollback = db.rollback
+
+    def rollback_then_rejoin():
+        rollback()
+        db.rollback = rollback
+        with check_engine.begin() as conn:
+            conn.execute(models.SyncRoomMember.__table__.update().where(
+                models.SyncRoomMember.room_id == racing).values(is_online=True))
+
+    db.rollback = rollback_then_rejoin
+    report = sync_room_crud.cleanup_empty_rooms(db, batch_size=100)
+    assert racing not in report.room_ids and report.rooms == len(candidates) - 1
+    assert db.get(models.SyncRoom, racing) is not None
+    db.close()
+    check_engine.dispose()
+
+
+def main():
+    seed()
+    legacy_file = os.path.join(TEMP_DIR, "bench_cleanup_legacy.db")
+    shutil.copy(DB_FILE, legacy_file)
+    url = f"sqlite:///{DB_FILE}"
+    expected_rooms = ROOMS // 2
+
+    print("=" * 72)
+    print(f"空房间清理基准测试 ({ROOMS:,} 个房间，{expected_rooms:,} 个待清理)")
+    print("=" * 72)
+
+    dry, dry_elapsed, dry_statements, before = measure(url, lambda db: sync_room_crud.cleanup_empty_rooms(db, dry_run=True))
+    assert before == (ROOMS, ROOMS * MEMBERS_PER_ROOM, ROOMS * MESSAGES_PER_ROOM), before
+    assert dry.rooms == expected_rooms
+    print(f"dry_run: {dry.rooms} 个房间 / {dry.members} 个成员 / {dry.messages} 条消息，"
+          f"{dry_statements} 条 SQL，{dry_elapsed * 1000:.0f}ms，未删除任何数据")
+
+    report, elapsed, statements, after = measure(url, lambda db: sync_room_crud.cleanup_empty_rooms(db))
+    assert (report.rooms, report.members, report.messages) == (dry.rooms, dry.members, dry.messages)
+    assert after == (ROOMS - expected_rooms,
+                     (ROOMS - expected_rooms) * MEMBERS_PER_ROOM,
+                     (ROOMS - expected_rooms) * MESSAGES_PER_ROOM), after
+    assert all(room_id % 2 == 1 for room_id in report.room_ids)  # 偶数下标 = 奇数 id
+
+    deleted, legacy_elapsed, legacy_statements, legacy_after = measure(f"sqlite:///{legacy_file}", legacy_cleanup)
+    assert deleted == expected_rooms and legacy_after == after, legacy_after
+
+    print(f"旧实现: {legacy_statements:6d} 条 SQL, {legacy_elapsed:7.2f}s")
+    print(f"新实现: {statements:6d} 条 SQL, {elapsed:7.2f}s ({report.batches} 批)  "
+          f"阶段耗时(ms): {report.timings_ms}")
+    print(f"加速 {legacy_elapsed / elapsed:.1f}x")
+
+    # 重新造一批待清理房间，验证重新检查
+    with engine.begin() as conn:
+        conn.execute(models.SyncRoom.__table__.update().values(updated_at=datetime.utcnow() - timedelta(hours=1)))
+        conn.execute(models.SyncRoomMember.__table__.update().values(is_online=False))
+    check_recheck(url)
+    print("✅ dry_run 与实际删除一致，保留在线 / 最近更新的房间，选出后上线的房间不会被删除")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+房间事件日志测试
+
+一个房间 20 个成员，房主交替发送播放控制和聊天消息，期间部分成员断线后重连，对比重连时的补齐方式:
+- 旧方式: join_success 只带当前状态，客户端再调用 GET /api/sync-rooms/{id}/messages 拉取最近 50 条消息
+- 新方式: join_room 带上 last_seq / epoch，join_success 中只下发错过的事件
+统计每次重连的下行字节数和 SQL 条数。
+
+同时验证: 首次加入收到整个缓冲；带 seq 重连只收到之后的事件且顺序连续；
+epoch 不符或 seq 已滚出缓冲时 reset=True；request_sync 带 last_seq 时同样补发。
+
+数据包不经过真实传输，只编码后记录。使用临时 SQLite 数据库运行:
+    python scripts/tests/test_room_events.py
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+TEMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEMP_DIR, 'bench_room_events.db')}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from engineio.async_socket import AsyncSocket
+from sqlalchemy import event
+
+from backend import models, schemas, security, sync_room_crud, websocket_server
+from backend.chat_pipeline import chat_pipeline
+from backend.database import SessionLocal, async_engine, engine
+from backend.rate_limiter import rate_limiter
+from backend.room_events import room_events
+from backend.websocket_server import sio
+
+MEMBERS = 20
+RECONNECTS = 10
+MISSED = 15  # 断线期间错过的事件数
+HISTORY_LIMIT = 50  # 旧方式重连后拉取的消息条数（前端默认分页）
+
+
+def seed():
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    users = [models.User(username=f"replay{i}", email=f"replay{i}@example.com", hashed_password="x")
+             for i in range(MEMBERS)]
+    db.add_all(users)
+    db.flush()
+    room = models.SyncRoom(room_code="REPLAY", room_name="事件日志测试", host_user_id=users[0].id)
+    db.add(room)
+    db.flush()
+    db.add_all(models.SyncRoomMember(room_id=room.id, user_id=user.id) for user in users)
+    db.commit()
+    clients = [{"room_id": room.id, "user_id": user.id, "username": user.username} for user in users]
+    db.close()
+    return clients
+
+
+async def connect_client(eio_sid, username, auth=None, query=""):
+    """以 username 的 token 走 Socket.IO 握手建立连接（不经过真实传输），返回 sid"""
+    sio.eio.sockets[eio_sid] = AsyncSocket(sio.eio, eio_sid)
+    sio.environ[eio_sid] = {"QUERY_STRING": query}
+    token = security.create_access_token(data={"sub": username})
+    await sio._handle_connect(eio_sid, "/", {"token": token, **(auth or {})})
+    return sio.manager.sid_from_eio_sid(eio_sid, "/")
+
+
+class Wire:
+    """记录发给每个连接的数据包"""
+
+    def __init__(self):
+        self.packets = {}
+
+    async def send(self, eio_sid, eio_pkt):
+        encoded = eio_pkt.encode()
+        self.packets.setdefault(eio_sid, []).append(encoded)
+
+    def take(self, sid, name):
+        """取出发给 sid 的 name 事件（最后一个），返回 (数据, 字节数)"""
+        eio_sid = sio.manager.eio_sid_from_sid(sid, "/")
+        for encoded in reversed(self.packets.pop(eio_sid, [])):
+            event_name, data = json.loads(encoded[encoded.index("["):])
+            if event_name == name:
+                return data, len(encoded.encode())
+        raise AssertionError(f"{sid} 未收到 {name}")
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+        for target in (engine, async_engine.sync_engine):
+            event.listen(target, "before_cursor_execute", self)
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+async def host_activity(host, n):
+    """房主交替 seek 和发消息"""
+    for i in range(n):
+        if i % 2:
+            await websocket_server.playback_control(host["sid"], {**host, "action": "seek", "time": float(i)})
+        else:
+            await websocket_server.send_message(host["sid"], {**host, "message": f"第 {i} 条消息"})
+
+
+def legacy_history(room_id):
+    """旧方式: 重连后通过接口拉取最近的聊天记录"""
+    db = SessionLocal()
+    messages = sync_room_crud.get_room_messages(db, room_id, limit=HISTORY_LIMIT)
+    db.close()
+    body = json.dumps([schemas.SyncRoomMessage.model_validate(m).model_dump(mode="json") for m in messages])
+    return len(body.encode())
+
+
+async def main():
+    logging.disable(logging.INFO)
+    rate_limiter.limits = {}  # 房主连续发送大量事件，测试中不限流
+    clients = seed()
+    room_id = clients[0]["room_id"]
+    sio.manager.initialize()
+    chat_pipeline.start()
+    wire = Wire()
+    sio._send_eio_packet = wire.send
+    counter = StatementCounter()
+
+    print("=" * 72)
+    print(f"房间事件日志测试 ({MEMBERS} 个成员, 缓冲 {room_events.capacity} 条事件, "
+          f"{RECONNECTS} 次断线重连各错过 {MISSED} 条)")
+    print("=" * 72)
+
+    for client in clients:
+        client["sid"] = await connect_client(f"eio-{client['user_id']}", client["username"])
+        await websocket_server.join_room(client["sid"], client)
+        first = wire.take(client["sid"], "join_success")[0]["events"]
+        client["epoch"], client["last_seq"] = first["epoch"], first["seq"]
+    host, others = clients[0], clients[1:]
+
+    # 首次加入: 下发整个缓冲（房主先产生一些事件，再让一个新成员加入）
+    await host_activity(host, 30)
+    late = others[0]
+    await websocket_server.disconnect(late["sid"])
+    late["sid"] = await connect_client("eio-late", late["username"])
+    await websocket_server.join_room(late["sid"], {k: late[k] for k in ("room_id", "user_id", "username")})
+    replay = wire.take(late["sid"], "join_success")[0]["events"]
+    assert not replay["reset"] and len(replay["events"]) == 30
+    assert [e["seq"] for e in replay["events"]] == list(range(1, 31))
+    print(f"首次加入: 收到整个缓冲 {len(replay['events'])} 条事件")
+
+    # 断线重连: 只补发错过的事件
+    legacy_bytes = legacy_statements = new_bytes = new_statements = 0
+    for client in others[:RECONNECTS]:
+        client["last_seq"] = room_events.since(room_id)["seq"]
+        await websocket_server.disconnect(client["sid"])
+        await sio.manager.disconnect(client["sid"], "/")
+        await host_activity(host, MISSED)
+        while chat_pipeline.metrics.persisted < chat_pipeline.metrics.enqueued:  # 等待消息落库，旧方式才能拉取到
+            await asyncio.sleep(0.01)
+
+        # 旧方式: join_success（不含事件）+ 拉取聊天记录
+        client["sid"] = await connect_client(f"eio-{client['user_id']}-legacy", client["username"])
+        before = counter.count
+        await websocket_server.join_room(client["sid"], {k: client[k] for k in ("room_id", "user_id", "username")})
+        data, size = wire.take(client["sid"], "join_success")
+        size -= len(json.dumps(data["events"], separators=(",", ":")))  # 与 Socket.IO 编码方式一致
+        legacy_bytes += size + legacy_history(room_id)
+        legacy_statements += counter.count - before
+        await websocket_server.disconnect(client["sid"])
+        await sio.manager.disconnect(client["sid"], "/")
+
+        # 新方式: join_success 中带上错过的事件
+        client["sid"] = await connect_client(f"eio-{client['user_id']}-resume", client["username"])
+        before = counter.count
+        await websocket_server.join_room(client["sid"], client)
+        data, size = wire.take(client["sid"], "join_success")
+        new_statements += counter.count - before
+        new_bytes += size
+        events = data["events"]
+        assert not events["reset"] and len(events["events"]) == MISSED, events
+        assert [e["seq"] for e in events["events"]] == list(range(client["last_seq"] + 1, events["seq"] + 1))
+        assert {e["event"] for e in events["events"]} == {"playback_sync", "new_message"}
+
+    # 基线的 SQL 包含 join_room 本身，拉取聊天记录的 SQL 用同步 Session 单独计数
+    before = counter.count
+    legacy_history(room_id)
+    legacy_statements += (counter.count - before) * RECONNECTS
+    print(f"旧方式: 每次重连 {legacy_bytes / RECONNECTS:8.0f} 字节, {legacy_statements / RECONNECTS:4.1f} 条 SQL "
+          f"(join_success + 拉取 {HISTORY_LIMIT} 条消息)")
+    print(f"新方式: 每次重连 {new_bytes / RECONNECTS:8.0f} 字节, {new_statements / RECONNECTS:4.1f} 条 SQL "
+          f"(join_success 带 {MISSED} 条错过的事件)")
+
+    # request_sync 带 last_seq 时补发
+    client = others[1]
+    await host_activity(host, 4)
+    await websocket_server.request_sync(client["sid"], client)
+    data, _ = wire.take(client["sid"], "playback_sync")
+    assert data["events"]["events"] and not data["events"]["reset"]
+    await websocket_server.request_sync(client["sid"], {k: client[k] for k in ("room_id", "user_id")})
+    assert wire.take(client["sid"], "playback_sync")[0]["events"] is None
+
+    # epoch 不符 / seq 已滚出缓冲: reset
+    stale = room_events.since(room_id, last_seq=1, epoch="stale")
+    assert stale["reset"] and len(stale["events"]) == len(room_events.since(room_id)["events"])
+    await host_activity(host, room_events.capacity)
+    current = room_events.since(room_id)
+    rolled = room_events.since(room_id, last_seq=current["seq"] - room_events.capacity - 1, epoch=current["epoch"])
+    assert rolled["reset"] and len(rolled["events"]) == room_events.capacity
+    edge = room_events.since(room_id, last_seq=current["seq"] - room_events.capacity, epoch=current["epoch"])
+    assert not edge["reset"] and len(edge["events"]) == room_events.capacity
+    assert room_events.since(room_id, last_seq=current["seq"], epoch=current["epoch"])["events"] == []
+    print(f"统计: {room_events.stats()}")
+
+    await chat_pipeline.shutdown()
+    await async_engine.dispose()
+    print("✅ 首次加入收到整个缓冲，重连只补发错过的事件，epoch 不符或 seq 滚出缓冲时 reset")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
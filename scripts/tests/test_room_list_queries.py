@@ -0,0 +1,107 @@
+"""
+房间列表查询次数基准测试
+
+验证 sync_room_crud.get_user_rooms / get_all_rooms_admin 的 SQL 次数
+不随分页大小增长（修复前为每个房间 2~3 次额外查询）
+
+使用临时 SQLite 数据库运行，无需 MySQL:
+    python scripts/tests/test_room_list_queries.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench_rooms.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from sqlalchemy import event
+
+from backend import models, sync_room_crud
+from backend.database import SessionLocal, engine
+
+PAGE_SIZES = [10, 50, 100]
+MEMBERS_PER_ROOM = 5
+
+
+def seed(db, room_count: int):
+    """生成用户、房间和成员数据"""
+    users = [
+        models.User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x")
+        for i in range(MEMBERS_PER_ROOM)
+    ]
+    db.add_all(users)
+    db.flush()
+
+    for i in range(room_count):
+        room = models.SyncRoom(
+            room_code=f"R{i:05d}",
+            room_name=f"房间 {i}",
+            host_user_id=users[i % len(users)].id,
+        )
+        db.add(room)
+        db.flush()
+        for j, user in enumerate(users):
+            db.add(models.SyncRoomMember(room_id=room.id, user_id=user.id, is_online=(j % 2 == 0)))
+    db.commit()
+    return users[0].id
+
+
+class QueryCounter:
+    """统计 engine 上执行的 SQL 语句数"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def measure(fn):
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    start = time.perf_counter()
+    result = fn()
+    elapsed = (time.perf_counter() - start) * 1000
+    event.remove(engine, "before_cursor_execute", counter)
+    return counter.count, elapsed, result
+
+
+def main():
+    print("=" * 60)
+    print("房间列表查询次数基准测试")
+    print("=" * 60)
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user_id = seed(db, max(PAGE_SIZES))
+
+    counts = {}
+    for limit in PAGE_SIZES:
+        q_user, t_user, rooms = measure(lambda: sync_room_crud.get_user_rooms(db, user_id, 0, limit))
+        q_admin, t_admin, admin_rooms = measure(lambda: sync_room_crud.get_all_rooms_admin(db, 0, limit))
+
+        assert len(rooms) == limit and len(admin_rooms) == limit
+        assert all(r['total_members'] == MEMBERS_PER_ROOM for r in rooms)
+        assert all(r['online_members'] == (MEMBERS_PER_ROOM + 1) // 2 for r in admin_rooms)
+
+        counts[limit] = (q_user, q_admin)
+        print(f"limit={limit:>4} | get_user_rooms: {q_user} 次查询 {t_user:6.1f}ms"
+              f" | get_all_rooms_admin: {q_admin} 次查询 {t_admin:6.1f}ms")
+
+    db.close()
+
+    if len(set(counts.values())) == 1:
+        print("\n✅ 查询次数与分页大小无关")
+    else:
+        print("\n❌ 查询次数随分页大小变化")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
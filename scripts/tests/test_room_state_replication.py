@@ -0,0 +1,158 @@
+"""
+多 worker 房间状态同步测试
+
+两个 worker（各自的 AsyncServer + RoomStateEngine，通过进程内 broker 的 AsyncLocalManager 相连）
+都持有同一房间的状态。worker A 的房主连续 seek / 播放 / 暂停，对比 worker B 上的成员请求同步时拿到的进度:
+- 不同步（改造前）: worker B 的内存状态停留在加入时从数据库读到的值
+- 同步: 每次修改后 worker A 把最新状态发给 worker B
+
+同时验证: 没有该房间的 worker 收到后保存一份副本，期间加入的成员拿到最新状态，无人访问则写回轮次中清理；
+REST 接口（线程池中）使状态失效后，其他 worker 同样丢弃副本；被撤销的用户同样通知到其他 worker。
+
+使用临时 SQLite 数据库运行:
+    python scripts/tests/test_room_state_replication.py
+"""
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+TEMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEMP_DIR, 'bench_replication.db')}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+import socketio
+
+from backend import models
+from backend.database import SessionLocal, engine
+from backend.room_state import RoomStateEngine
+from backend.socket_manager import AsyncLocalManager
+
+ACTIONS = 200
+
+
+def seed():
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    host = models.User(username="replica-host", email="replica@example.com", hashed_password="x")
+    db.add(host)
+    db.flush()
+    room = models.SyncRoom(room_code="REPL01", room_name="同步测试", host_user_id=host.id)
+    db.add(room)
+    db.commit()
+    room_id = room.id
+    db.close()
+    return room_id
+
+
+async def start_worker(replicate=True):
+    """一个 worker: AsyncServer 的 client manager + 独立的房间状态引擎"""
+    server = socketio.AsyncServer(async_mode="asgi", client_manager=AsyncLocalManager(channel="replication-test"))
+    states = RoomStateEngine(flush_interval=3600)
+    if replicate:
+        server.manager.room_state_handler = states.apply_replica
+        states.set_publisher(server.manager.publish_room_state)
+        server.manager.initialize()
+    states.start()
+    await asyncio.sleep(0.01)  # 等待监听任务订阅频道
+    return states
+
+
+async def wait_for(predicate, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise AssertionError("timed out waiting for replication")
+        await asyncio.sleep(0)
+
+
+async def run(room_id, replicate):
+    """worker A 上的房主操作 ACTIONS 次，每次后在 worker B 上读取进度，返回 (偏差列表, 同步延迟列表)"""
+    a, b = await start_worker(replicate), await start_worker(replicate)
+    a.get_or_load(room_id)
+    b.get_or_load(room_id)  # worker B 上也有成员，已持有状态
+    drifts, delays = [], []
+    for i in range(ACTIONS):
+        state = a.get(room_id)
+        state.apply_action(("seek", "play", "pause")[i % 3], float(i * 7 % 600))
+        start = time.perf_counter()
+        await a.publish(room_id)
+        if replicate:
+            await wait_for(lambda: b.get(room_id).version == state.version)
+            delays.append((time.perf_counter() - start) * 1000)
+        else:
+            await asyncio.sleep(0)
+        drifts.append(abs(b.get(room_id).current_position() - state.current_position()))
+    await a.shutdown()
+    await b.shutdown()
+    return drifts, delays
+
+
+async def check_untracked_and_invalidate(room_id):
+    a, b = await start_worker(), await start_worker()
+    state = a.get_or_load(room_id)
+    state.apply_action("play", 300.0)
+    await a.publish(room_id)
+
+    # worker B 没有该房间: 保存已释放的副本
+    await wait_for(lambda: b.get(room_id) is not None)
+    replica = b.get(room_id)
+    assert replica.released and replica.is_playing and abs(replica.current_position() - state.current_position()) < 0.5
+    joined = b.get_or_load(room_id)  # 期间加入的成员拿到最新状态而不是数据库中的 0
+    assert joined is replica and not joined.released
+    b.release(room_id)
+    await b.flush()
+    assert b.get(room_id) is None  # 无人访问的副本在写回轮次中清理
+
+    # REST 接口在线程池中使状态失效: 其他 worker 丢弃副本
+    b.get_or_load(room_id)
+    await asyncio.to_thread(a.invalidate, room_id)
+    await wait_for(lambda: b.get(room_id) is None)
+    await a.shutdown()
+    await b.shutdown()
+    print("✅ 未持有房间的 worker 保存副本并按时清理；REST 失效通知到其他 worker")
+
+
+async def check_user_revoked():
+    """被禁用 / 删除的用户: 通知其他 worker 断开连接，不发给客户端"""
+    managers = [AsyncLocalManager(channel="revoke-test") for _ in range(2)]
+    revoked = []
+    for manager in managers:
+        socketio.AsyncServer(async_mode="asgi", client_manager=manager)
+        manager.user_revoked_handler = revoked.append
+        manager.initialize()
+    await asyncio.sleep(0.01)
+    await managers[0].publish_user_revoked(42)
+    await wait_for(lambda: revoked)
+    await asyncio.sleep(0.01)
+    assert revoked == [42]  # 只有其他 worker 处理
+    print("✅ 被撤销的用户通知到其他 worker")
+
+
+async def main():
+    logging.disable(logging.INFO)
+    room_id = seed()
+
+    print("=" * 72)
+    print(f"多 worker 房间状态同步测试 (房主操作 {ACTIONS} 次)")
+    print("=" * 72)
+    stale, _ = await run(room_id, replicate=False)
+    synced, delays = await run(room_id, replicate=True)
+    print(f"不同步: worker B 进度偏差 p50 {statistics.median(stale):7.1f}s  最大 {max(stale):7.1f}s")
+    print(f"同步  : worker B 进度偏差 p50 {statistics.median(synced):7.3f}s  最大 {max(synced):7.3f}s"
+          f" | 同步延迟 p50 {statistics.median(delays):.2f}ms")
+    assert max(synced) < 0.05 and statistics.median(stale) > 10
+
+    await check_untracked_and_invalidate(room_id)
+    await check_user_revoked()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,324 @@
+"""
+Socket.IO 连接认证测试
+
+验证:
+- 没有 token、token 无效、用户不存在或已禁用时拒绝连接
+- 事件以连接身份为准，数据中伪造的 user_id / username 不起作用
+- 通过接口加入房间后，已建立的连接（包括同一用户的多个标签页）无需重连即可发送消息；
+  房间被删除后立即拒绝（包括在其他 worker 上删除）；在其他 worker 上加入的房间由 join_room 查询一次补上
+- 隐身模式管理员可以旁观，但不能以成员身份发送消息
+- 用户被禁用后已建立的连接立即失去房间并被断开
+
+并统计每个聊天消息 / 同步请求事件的 SQL 条数和处理耗时，对比改造前（每个事件查询一次成员关系）。
+
+数据包不经过真实传输，只编码后记录。使用临时 SQLite 数据库运行:
+    python scripts/tests/test_socket_auth.py
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+TEMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEMP_DIR, 'bench_socket_auth.db')}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+import httpx
+from engineio.async_socket import AsyncSocket
+from sqlalchemy import event
+
+from backend import models, security, sync_room_crud_async, websocket_server
+from backend.chat_pipeline import chat_pipeline
+from backend.database import SessionLocal, async_engine, engine
+from backend.main import app
+from backend.rate_limiter import rate_limiter
+from backend.room_state import state_engine
+from backend.socket_auth import memberships
+from backend.websocket_server import get_db, sio
+
+EVENTS = 500
+
+
+def seed():
+    """alice 是房主，bob、erin 是成员，carol 不是成员，dave 已禁用，admin 是管理员"""
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    users = {name: models.User(username=name, email=f"{name}@example.com", hashed_password="x",
+                               role="admin" if name == "admin" else "user", is_active=name != "dave")
+             for name in ("alice", "bob", "carol", "dave", "erin", "admin")}
+    db.add_all(users.values())
+    db.flush()
+    room = models.SyncRoom(room_code="AUTH01", room_name="认证测试", host_user_id=users["alice"].id)
+    db.add(room)
+    db.flush()
+    db.add_all(models.SyncRoomMember(room_id=room.id, user_id=users[name].id) for name in ("alice", "bob", "erin"))
+    db.commit()
+    ids = {name: user.id for name, user in users.items()}
+    room_id = room.id
+    db.close()
+    return ids, room_id
+
+
+def token(username):
+    return security.create_access_token(data={"sub": username})
+
+
+class Wire:
+    """记录发给每个连接的数据包"""
+
+    def __init__(self):
+        self.packets = {}
+
+    async def send(self, eio_sid, eio_pkt):
+        self.packets.setdefault(eio_sid, []).append(eio_pkt.encode())
+
+    async def send_raw(self, eio_sid, data):
+        """握手结果（CONNECT / CONNECT_ERROR）直接经 Engine.IO 发送"""
+        self.packets.setdefault(eio_sid, []).append("4" + data)
+
+    def take(self, eio_sid, name):
+        """取出发给该连接的 name 事件的数据"""
+        result = []
+        for encoded in self.packets.pop(eio_sid, []):
+            if encoded.startswith("42"):
+                event_name, data = json.loads(encoded[2:])
+                if event_name == name:
+                    result.append(data)
+        return result
+
+    def refused(self, eio_sid):
+        """CONNECT_ERROR 数据包中的原因"""
+        for encoded in self.packets.get(eio_sid, []):
+            if encoded.startswith("44"):
+                return json.loads(encoded[2:])["message"]
+        return None
+
+
+class StatementCounter:
+    """只统计查询语句，聊天消息后台批量写入的 INSERT 两种方式相同，不计入"""
+
+    def __init__(self):
+        self.count = 0
+        for target in (engine, async_engine.sync_engine):
+            event.listen(target, "before_cursor_execute", self)
+
+    def __call__(self, conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.count += 1
+
+
+async def connect(eio_sid, auth=None, query="", headers=None):
+    """走 Socket.IO 握手建立连接，被拒绝时返回 None"""
+    sio.eio.sockets[eio_sid] = AsyncSocket(sio.eio, eio_sid)
+    sio.environ[eio_sid] = {"QUERY_STRING": query, **(headers or {})}
+    await sio._handle_connect(eio_sid, "/", auth)
+    return sio.manager.sid_from_eio_sid(eio_sid, "/")
+
+
+async def close(sid):
+    await websocket_server.disconnect(sid)
+    await sio.manager.disconnect(sid, "/")
+
+
+# ---- 改造前的处理方式: 信任数据中的 user_id，每个事件查询一次成员关系 ----
+
+async def legacy_send_message(sid, data):
+    db = get_db()
+    try:
+        if not await sync_room_crud_async.is_room_member(db, data["room_id"], data["user_id"]):
+            return
+    finally:
+        await db.close()
+    record = await chat_pipeline.submit(data["room_id"], data["user_id"], data["message"])
+    await sio.emit("new_message", {"id": record["provisional_id"], "user_id": data["user_id"],
+                                   "username": data["username"], "message": data["message"]},
+                   room=f"room_{data['room_id']}")
+
+
+async def legacy_request_sync(sid, data):
+    db = get_db()
+    try:
+        state = await state_engine.get_or_load_async(data["room_id"], db)
+        if not state or not await sync_room_crud_async.is_room_member(db, data["room_id"], data["user_id"]):
+            return
+    finally:
+        await db.close()
+    await sio.emit("playback_sync", {"action": "sync", "time": state.current_position()}, room=sid)
+
+
+async def check_refusals(wire):
+    cases = {
+        "no-token": ({}, "", None),
+        "bad-token": ({"token": "not-a-jwt"}, "", None),
+        "unknown-user": ({"token": token("nobody")}, "", None),
+        "disabled": ({"token": token("dave")}, "", None),
+    }
+    for eio_sid, (auth, query, headers) in cases.items():
+        assert await connect(eio_sid, auth, query, headers) is None, eio_sid
+        assert wire.refused(eio_sid), eio_sid
+        print(f"拒绝连接 {eio_sid:<13}: {wire.refused(eio_sid)}")
+
+    # token 也可以放在 URL 参数或 Authorization 头中
+    for eio_sid, query, headers in (("query", f"token={token('bob')}", None),
+                                    ("header", "", {"HTTP_AUTHORIZATION": f"Bearer {token('bob')}"})):
+        sid = await connect(eio_sid, None, query, headers)
+        assert sid is not None
+        (connected,) = wire.take(eio_sid, "connected")
+        await close(sid)
+
+
+async def check_identity(wire, ids, room_id):
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver")
+    bob = await connect("bob", {"token": token("bob")})
+    await websocket_server.join_room(bob, {"room_id": room_id})
+    assert wire.take("bob", "join_success")
+
+    # 伪造的 user_id / username 不起作用
+    await websocket_server.send_message(bob, {"room_id": room_id, "user_id": ids["alice"],
+                                              "username": "alice", "message": "我是房主"})
+    (message,) = wire.take("bob", "new_message")
+    assert message["user_id"] == ids["bob"] and message["username"] == "bob", message
+    await websocket_server.playback_control(bob, {"room_id": room_id, "user_id": ids["alice"], "action": "play"})
+    assert wire.take("bob", "error") and not wire.take("bob", "playback_sync")  # bob 不是房主
+
+    # carol 不是成员；通过接口加入后两个标签页都能直接发送
+    carol_tabs = [await connect(f"carol-{i}", {"token": token("carol")}) for i in range(2)]
+    await websocket_server.send_message(carol_tabs[0], {"room_id": room_id, "message": "hi"})
+    assert wire.take("carol-0", "error")
+    resp = await client.post(f"/api/sync-rooms/{room_id}/join", headers={"Authorization": f"Bearer {token('carol')}"})
+    assert resp.status_code == 200, resp.text
+    for i, sid in enumerate(carol_tabs):
+        await websocket_server.send_message(sid, {"room_id": room_id, "message": f"tab {i}"})
+        assert not wire.take(f"carol-{i}", "error")
+        await websocket_server.request_sync(sid, {"room_id": room_id})
+        assert wire.take(f"carol-{i}", "playback_sync")
+
+    # 在其他 worker 上加入（只写数据库）: 消息被拒绝，join_room 查询一次后补上
+    other_room = await client.post("/api/sync-rooms", json={"room_name": "另一个房间"},
+                                   headers={"Authorization": f"Bearer {token('alice')}"})
+    other_id = other_room.json()["id"]
+    db = SessionLocal()
+    db.add(models.SyncRoomMember(room_id=other_id, user_id=ids["bob"]))
+    db.commit()
+    db.close()
+    await websocket_server.send_message(bob, {"room_id": other_id, "message": "hi"})
+    assert wire.take("bob", "error")
+    await websocket_server.join_room(bob, {"room_id": other_id})
+    assert wire.take("bob", "join_success")
+    await websocket_server.send_message(bob, {"room_id": other_id, "message": "hi"})
+    assert not wire.take("bob", "error")
+
+    # 隐身模式管理员可以旁观，但不是成员
+    admin = await connect("admin", {"token": token("admin")})
+    await websocket_server.join_room(admin, {"room_id": room_id, "stealth": True})
+    assert wire.take("admin", "join_success")
+    await websocket_server.send_message(admin, {"room_id": room_id, "message": "hi"})
+    assert wire.take("admin", "error")
+
+    # 房间被删除后立即拒绝
+    resp = await client.delete(f"/api/admin/sync-rooms/{other_id}", headers={"Authorization": f"Bearer {token('admin')}"})
+    assert resp.status_code == 200, resp.text
+    await websocket_server.send_message(bob, {"room_id": other_id, "message": "hi"})
+    assert wire.take("bob", "error")
+
+    # 在其他 worker 上删除（本进程的成员缓存未更新，只收到房间状态失效通知）: 同样拒绝
+    third = await client.post("/api/sync-rooms", json={"room_name": "第三个房间"},
+                              headers={"Authorization": f"Bearer {token('alice')}"})
+    third_id = third.json()["id"]
+    await client.post(f"/api/sync-rooms/{third_id}/join", headers={"Authorization": f"Bearer {token('bob')}"})
+    await websocket_server.join_room(bob, {"room_id": third_id})
+    db = SessionLocal()
+    db.query(models.SyncRoom).filter_by(id=third_id).update({"is_active": False})
+    db.commit()
+    db.close()
+    state_engine.apply_replica(third_id, None)
+    wire.take("bob", "error")
+    await websocket_server.send_message(bob, {"room_id": third_id, "message": "hi"})
+    assert [e["message"] for e in wire.take("bob", "error")] == ["房间不存在"]
+
+    for sid in carol_tabs + [bob, admin]:
+        await close(sid)
+    await client.aclose()
+    assert len(memberships) == 0
+    print("✅ 事件以连接身份为准；接口加入 / 删除房间后缓存即时更新；断开后缓存清除")
+
+
+async def check_revocation(wire, ids, room_id):
+    """管理员禁用用户: 两个标签页立即失去房间并被断开"""
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver")
+    tabs = [await connect(f"erin-{i}", {"token": token("erin")}) for i in range(2)]
+    for sid in tabs:
+        await websocket_server.join_room(sid, {"room_id": room_id})
+    _, rooms = await websocket_server.identity(tabs[0])
+    resp = await client.put(f"/api/admin/users/{ids['erin']}", json={"is_active": False},
+                            headers={"Authorization": f"Bearer {token('admin')}"})
+    assert resp.status_code == 200, resp.text
+    assert not rooms  # 接口返回时连接引用的房间集合已清空
+    for _ in range(100):
+        if not any(sio.manager.is_connected(sid, "/") for sid in tabs):
+            break
+        await asyncio.sleep(0.01)
+    assert not any(sio.manager.is_connected(sid, "/") for sid in tabs)
+    assert len(memberships) == 0
+    await client.aclose()
+    print("✅ 禁用用户后其连接失去房间并被断开")
+
+
+async def benchmark(wire, ids, room_id, counter):
+    results = []
+    for label, send_message, request_sync in (
+        ("改造前", legacy_send_message, legacy_request_sync),
+        ("连接时认证", websocket_server.send_message, websocket_server.request_sync),
+    ):
+        sid = await connect(f"bench-{label}", {"token": token("bob")})
+        await websocket_server.join_room(sid, {"room_id": room_id})
+        data = {"room_id": room_id, "user_id": ids["bob"], "username": "bob"}
+        row = [label]
+        for handler, extra in ((send_message, {"message": "bench"}), (request_sync, {})):
+            before = counter.count
+            start = time.perf_counter()
+            for _ in range(EVENTS):
+                await handler(sid, {**data, **extra})
+            row.append(((counter.count - before) / EVENTS, (time.perf_counter() - start) / EVENTS * 1e6))
+        wire.packets.clear()
+        await close(sid)
+        results.append(row)
+
+    for label, (message_sql, message_us), (sync_sql, sync_us) in results:
+        print(f"{label:<6} send_message {message_sql:3.1f} 条 SQL {message_us:7.1f}µs/事件 | "
+              f"request_sync {sync_sql:3.1f} 条 SQL {sync_us:7.1f}µs/事件")
+    assert results[1][1][0] == 0 and results[1][2][0] == 0
+
+
+async def main():
+    logging.disable(logging.INFO)
+    rate_limiter.limits = {}  # 基准测试连续发送大量事件，不限流
+    ids, room_id = seed()
+    sio.manager.initialize()
+    chat_pipeline.start()
+    wire = Wire()
+    sio._send_eio_packet = wire.send
+    sio.eio.send = wire.send_raw
+    counter = StatementCounter()
+
+    print("=" * 72)
+    print(f"Socket.IO 连接认证测试 (每种事件 {EVENTS} 次)")
+    print("=" * 72)
+    await check_refusals(wire)
+    await check_identity(wire, ids, room_id)
+    await check_revocation(wire, ids, room_id)
+    await benchmark(wire, ids, room_id, counter)
+
+    await chat_pipeline.shutdown()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,235 @@
+"""
+Socket.IO 事件限流压力测试
+
+20 个房间 × 10 个成员正常使用: 每个成员约每秒发一条聊天消息，房主每 0.8 秒上报一次进度。
+另一个房间里有一个刷屏的连接，每毫秒发出 5 条聊天消息和 5 次 join_room（每秒 10,000 个事件，
+join_room 每次都要查询房间和成员列表）。
+对比三种情况下正常成员的聊天消息处理耗时和失败数:
+- 无刷屏
+- 刷屏，不限流（改造前）: 每次 join_room 都打开数据库会话，占满连接池
+- 刷屏，限流: 超出令牌桶的事件在处理前丢弃 / 合并
+
+同时验证: 刷屏连接在持续超限期间每种事件只收到一次 throttled 通知；
+连续 seek 被合并，令牌补充后落地最后一个位置；断开连接后令牌桶被清除。
+
+使用临时 SQLite 数据库运行:
+    python scripts/tests/test_socket_rate_limit.py
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+TEMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEMP_DIR, 'bench_rate_limit.db')}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from engineio.async_socket import AsyncSocket
+
+from backend import models, security, websocket_server
+from backend.chat_pipeline import chat_pipeline
+from backend.database import SessionLocal, async_engine, engine
+from backend.rate_limiter import rate_limiter
+from backend.room_state import state_engine
+from backend.websocket_server import sio
+
+ROOMS = 20
+MEMBERS_PER_ROOM = 10
+DURATION = 3.0
+MESSAGE_INTERVAL = 1.0
+TIME_UPDATE_INTERVAL = 0.8
+FLOOD_PER_TICK = 5  # 每毫秒每种事件的数量
+
+
+def seed():
+    """最后一个房间只有刷屏用户一个成员"""
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    users = [models.User(username=f"flood{i}", email=f"flood{i}@example.com", hashed_password="x")
+             for i in range(ROOMS * MEMBERS_PER_ROOM + 1)]
+    db.add_all(users)
+    db.flush()
+    rooms = [models.SyncRoom(room_code=f"RL{i:04d}", room_name=f"限流测试{i}", host_user_id=users[i * MEMBERS_PER_ROOM].id)
+             for i in range(ROOMS + 1)]
+    db.add_all(rooms)
+    db.flush()
+    clients = []
+    for user in users:
+        room = rooms[min(len(clients) // MEMBERS_PER_ROOM, ROOMS)]
+        db.add(models.SyncRoomMember(room_id=room.id, user_id=user.id))
+        clients.append({"room_id": room.id, "user_id": user.id, "username": user.username,
+                        "host": room.host_user_id == user.id})
+    db.commit()
+    db.close()
+    return clients[:-1], clients[-1]
+
+
+async def connect_client(eio_sid, username, auth=None, query=""):
+    """以 username 的 token 走 Socket.IO 握手建立连接（不经过真实传输），返回 sid"""
+    sio.eio.sockets[eio_sid] = AsyncSocket(sio.eio, eio_sid)
+    sio.environ[eio_sid] = {"QUERY_STRING": query}
+    token = security.create_access_token(data={"sub": username})
+    await sio._handle_connect(eio_sid, "/", {"token": token, **(auth or {})})
+    return sio.manager.sid_from_eio_sid(eio_sid, "/")
+
+
+class Wire:
+    """只解析发给关注的连接的数据包，按事件名计数"""
+
+    def __init__(self):
+        self.watched = set()
+        self.counts = {}
+
+    async def send(self, eio_sid, eio_pkt):
+        if eio_sid in self.watched:
+            encoded = eio_pkt.encode()
+            if encoded.startswith("42"):
+                name = json.loads(encoded[2:])[0]
+                self.counts[(eio_sid, name)] = self.counts.get((eio_sid, name), 0) + 1
+
+    def count(self, sid, name):
+        return self.counts.get((sio.manager.eio_sid_from_sid(sid, "/"), name), 0)
+
+
+async def well_behaved(client, stop, latencies):
+    """正常成员: 聊天消息，房主另外上报进度"""
+    sid, data = client["sid"], {k: client[k] for k in ("room_id", "user_id", "username")}
+    await asyncio.sleep(random.random() * MESSAGE_INTERVAL)
+    next_message = next_update = time.perf_counter()
+    position = 0.0
+    while not stop.is_set():
+        now = time.perf_counter()
+        if now >= next_message:
+            await websocket_server.send_message(sid, {**data, "message": f"hi {position:.1f}"})
+            latencies.append(time.perf_counter() - now)
+            next_message += MESSAGE_INTERVAL
+        if client["host"] and now >= next_update:
+            position += TIME_UPDATE_INTERVAL
+            await websocket_server.time_update(sid, {**data, "time": position})
+            next_update += TIME_UPDATE_INTERVAL
+        await asyncio.sleep(min(next_message, next_update if client["host"] else next_message) - time.perf_counter())
+
+
+async def flood(client, stop):
+    """刷屏连接: 每毫秒派发一批事件，每个事件一个任务（与 Socket.IO 异步处理事件的方式一致）"""
+    sid, data = client["sid"], {k: client[k] for k in ("room_id", "user_id", "username")}
+    tasks = set()
+    sent = 0
+    while not stop.is_set():
+        for _ in range(FLOOD_PER_TICK):
+            for task in (websocket_server.send_message(sid, {**data, "message": "spam"}),
+                         websocket_server.join_room(sid, data)):
+                task = asyncio.create_task(task)
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                sent += 1
+        await asyncio.sleep(0.001)
+    for task in list(tasks):
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return sent
+
+
+async def run(members, flooder, label, limits, flooding):
+    rate_limiter.limits = limits
+    wire = Wire()
+    sio._send_eio_packet = wire.send
+    for client in members + [flooder]:
+        client["sid"] = await connect_client(f"{label}-{client['user_id']}", client["username"])
+        await websocket_server.join_room(client["sid"], client)
+        wire.watched.add(sio.manager.eio_sid_from_sid(client["sid"], "/"))
+
+    stop = asyncio.Event()
+    latencies = []
+    workers = [asyncio.create_task(well_behaved(client, stop, latencies)) for client in members]
+    flood_task = asyncio.create_task(flood(flooder, stop)) if flooding else None
+    await asyncio.sleep(DURATION)
+    stop.set()
+    await asyncio.gather(*workers)
+    sent = await flood_task if flood_task else 0
+    while chat_pipeline.backlog:  # 等待积压的消息写完，不影响下一轮
+        await asyncio.sleep(0.05)
+
+    errors = sum(wire.count(client["sid"], "error") for client in members)
+    throttled = wire.count(flooder["sid"], "throttled")
+    for client in members + [flooder]:
+        await websocket_server.disconnect(client["sid"])
+        await sio.manager.disconnect(client["sid"], "/")
+    latencies.sort()
+    return {
+        "messages": len(latencies),
+        "errors": errors,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "flood_sent": sent,
+        "throttled": throttled,
+    }
+
+
+async def check_coalesce(host):
+    """连续 seek 合并为最后一个位置；断开连接后令牌桶被清除"""
+    rate_limiter.limits = {"playback_control": (5, 2)}
+    wire = Wire()
+    sio._send_eio_packet = wire.send
+    sid = await connect_client("coalesce-host", host["username"])
+    await websocket_server.join_room(sid, host)
+    wire.watched.add(sio.manager.eio_sid_from_sid(sid, "/"))
+    for i in range(30):
+        await websocket_server.playback_control(sid, {**host, "action": "seek", "time": float(i)})
+    await asyncio.sleep(0.5)
+    state = await state_engine.get_or_load_async(host["room_id"])
+    assert state.current_position() == 29.0, state.current_position()
+    assert wire.count(sid, "playback_sync") == 3  # 桶容量 2 + 合并后补执行 1
+    assert wire.count(sid, "throttled") == 0
+    await websocket_server.disconnect(sid)
+    await sio.manager.disconnect(sid, "/")
+    assert rate_limiter.stats()["tracked_sids"] == 0 and rate_limiter.stats()["pending"] == 0
+
+
+async def main():
+    logging.disable(logging.INFO)
+    random.seed(7)
+    members, flooder = seed()
+    sio.manager.initialize()
+    chat_pipeline.start()
+    limits = dict(rate_limiter.limits)
+
+    print("=" * 72)
+    print(f"Socket.IO 限流压力测试 ({ROOMS} 个房间 × {MEMBERS_PER_ROOM} 个成员, {DURATION:.0f}s, "
+          f"刷屏 {FLOOD_PER_TICK * 2 * 1000:,} 个事件/秒)")
+    print("=" * 72)
+
+    results = [
+        ("无刷屏", await run(members, flooder, "calm", limits, flooding=False)),
+        ("刷屏，不限流", await run(members, flooder, "open", {}, flooding=True)),
+        ("刷屏，限流", await run(members, flooder, "limited", limits, flooding=True)),
+    ]
+    stats = rate_limiter.stats()
+    await check_coalesce(members[0])
+    await chat_pipeline.shutdown()
+    await async_engine.dispose()
+
+    for label, r in results:
+        flood_info = f" | 刷屏 {r['flood_sent']:6d} 个事件, throttled 通知 {r['throttled']}" if r["flood_sent"] else ""
+        print(f"{label:<8} 正常成员 {r['messages']:4d} 条消息, 失败 {r['errors']:4d} | "
+              f"处理耗时 p50 {r['p50']:7.1f}ms p99 {r['p99']:7.1f}ms{flood_info}")
+    print(f"限流统计: {stats}")
+
+    calm, limited = results[0][1], results[2][1]
+    assert limited["errors"] == 0 and limited["messages"] >= calm["messages"] * 0.95
+    assert limited["throttled"] == 2  # 刷屏期间一直被限流，两种事件各通知一次
+    assert stats["dropped_by_event"]["send_message"] > limited["flood_sent"] / 2 * 0.9
+    print("✅ 刷屏连接被限流，正常成员的消息全部送达；连续 seek 合并为最后一个位置")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,203 @@
+"""
+Socket.IO 事件处理的事件循环延迟测试
+
+1,000 个模拟客户端（50 个房间 × 20 个成员）同时加入房间，然后各自请求同步、发送聊天消息，
+期间一个探测任务每 5ms 醒来一次，统计实际醒来时间比预期晚多少（事件循环延迟）。
+
+对比两种数据库访问方式:
+- 同步 Session: 旧处理方式，事件处理中直接调用 SessionLocal() 和 sync_room_crud，查询期间阻塞事件循环
+- 异步 Session: 现在的 websocket_server 事件处理（AsyncSessionLocal + sync_room_crud_async）
+
+数据包不经过真实传输，只编码后计数。使用临时 SQLite 数据库运行:
+    python scripts/tests/test_socketio_event_loop.py
+"""
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+TEMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEMP_DIR, 'bench_event_loop.db')}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from engineio.async_socket import AsyncSocket
+
+from backend import crud, models, security, sync_room_crud, websocket_server
+from backend.chat_pipeline import chat_pipeline
+from backend.database import SessionLocal, async_engine, engine
+from backend.room_state import state_engine
+from backend.websocket_server import connection_registry, sio
+
+ROOMS = 50
+MEMBERS_PER_ROOM = 20
+SYNC_REQUESTS = 3
+PROBE_INTERVAL = 0.005
+
+
+def seed():
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    users = [models.User(username=f"sock{i}", email=f"sock{i}@example.com", hashed_password="x")
+             for i in range(ROOMS * MEMBERS_PER_ROOM)]
+    db.add_all(users)
+    db.flush()
+    rooms = [models.SyncRoom(room_code=f"LOOP{i:02d}", room_name=f"延迟测试{i}", host_user_id=users[i * MEMBERS_PER_ROOM].id)
+             for i in range(ROOMS)]
+    db.add_all(rooms)
+    db.flush()
+    clients = []
+    for i, room in enumerate(rooms):
+        for user in users[i * MEMBERS_PER_ROOM:(i + 1) * MEMBERS_PER_ROOM]:
+            db.add(models.SyncRoomMember(room_id=room.id, user_id=user.id))
+            clients.append({"room_id": room.id, "user_id": user.id, "username": user.username})
+    db.commit()
+    db.close()
+    return clients
+
+
+async def connect_client(eio_sid, username, auth=None, query=""):
+    """以 username 的 token 走 Socket.IO 握手建立连接（不经过真实传输），返回 sid"""
+    sio.eio.sockets[eio_sid] = AsyncSocket(sio.eio, eio_sid)
+    sio.environ[eio_sid] = {"QUERY_STRING": query}
+    token = security.create_access_token(data={"sub": username})
+    await sio._handle_connect(eio_sid, "/", {"token": token, **(auth or {})})
+    return sio.manager.sid_from_eio_sid(eio_sid, "/")
+
+
+# ---- 旧处理方式（同步 Session），数据库访问顺序与改造前的事件处理一致 ----
+# 改造前的事件处理在整个处理过程中持有 Session，并发超过连接池容量时，事件循环会阻塞在
+# 连接池的 checkout 上（其他处理无法继续运行、归还连接），直到 pool_timeout 超时。
+# 这里让旧方式在 await 之前就归还连接，以便测试能跑完，结果是旧方式的最好情况
+
+async def legacy_join_room(sid, data):
+    room_id, user_id = data["room_id"], data["user_id"]
+    db = SessionLocal()
+    try:
+        room = sync_room_crud.get_room_by_id(db, room_id)
+        user = crud.get_user_by_id(db, user_id)
+        if not room or not user or not sync_room_crud.is_room_member(db, room_id, user_id):
+            return
+        members = sync_room_crud.get_room_members(db, room_id)
+        state = state_engine.track(room)
+    finally:
+        db.close()
+    await sio.enter_room(sid, f"room_{room_id}")
+    await connection_registry.add(room_id, user_id, sid)
+    await sio.emit("join_success", {"room_id": room_id, "members": members,
+                                    "current_time": state.current_position()}, room=sid)
+    await sio.emit("member_joined", {"user_id": user_id, "room_id": room_id},
+                   room=f"room_{room_id}", skip_sid=sid)
+
+
+async def legacy_request_sync(sid, data):
+    db = SessionLocal()
+    try:
+        state = state_engine.get_or_load(data["room_id"], db)
+        is_member = state is not None and sync_room_crud.is_room_member(db, data["room_id"], data["user_id"])
+    finally:
+        db.close()
+    if is_member:
+        await sio.emit("playback_sync", {"action": "sync", "time": state.current_position()}, room=sid)
+
+
+async def legacy_send_message(sid, data):
+    db = SessionLocal()
+    try:
+        is_member = sync_room_crud.is_room_member(db, data["room_id"], data["user_id"])
+    finally:
+        db.close()
+    if not is_member:
+        return
+    record = await chat_pipeline.submit(data["room_id"], data["user_id"], data["message"])
+    await sio.emit("new_message", {"id": record["provisional_id"], "message": data["message"]},
+                   room=f"room_{data['room_id']}")
+
+
+LEGACY = (legacy_join_room, legacy_request_sync, legacy_send_message)
+CURRENT = (websocket_server.join_room, websocket_server.request_sync, websocket_server.send_message)
+
+
+async def probe(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(loop.time() - expected)
+
+
+async def run(clients, handlers, label):
+    join, request_sync, send_message = handlers
+    for state in state_engine.active_states():
+        state_engine.release(state.room_id)
+    await state_engine.flush()
+
+    packets = 0
+
+    async def send_eio_packet(eio_sid, eio_pkt):
+        nonlocal packets
+        eio_pkt.encode()
+        packets += 1
+
+    sio._send_eio_packet = send_eio_packet
+    sids = [await connect_client(f"{label}-{i}", data["username"]) for i, data in enumerate(clients)]
+
+    async def client(sid, data):
+        await join(sid, data)
+        for _ in range(SYNC_REQUESTS):
+            await request_sync(sid, data)
+        await send_message(sid, {**data, "message": f"hello from {data['user_id']}"})
+
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+    start = time.perf_counter()
+    await asyncio.gather(*(client(sid, data) for sid, data in zip(sids, clients)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+
+    for sid in sids:
+        await websocket_server.disconnect(sid)
+        await sio.manager.disconnect(sid, "/")
+    lags.sort()
+    return {
+        "elapsed": elapsed,
+        "packets": packets,
+        "p50": statistics.median(lags) * 1000,
+        "p99": lags[int(len(lags) * 0.99) - 1] * 1000,
+        "max": lags[-1] * 1000,
+    }
+
+
+async def main():
+    logging.disable(logging.INFO)
+    clients = seed()
+    sio.manager.initialize()
+    chat_pipeline.start()
+
+    print("=" * 72)
+    print(f"Socket.IO 事件循环延迟测试 ({len(clients)} 个客户端: 加入 + {SYNC_REQUESTS} 次同步请求 + 1 条消息)")
+    print("=" * 72)
+
+    results = [
+        ("同步 Session", await run(clients, LEGACY, "legacy")),
+        ("异步 Session", await run(clients, CURRENT, "async")),
+    ]
+    await chat_pipeline.shutdown()
+    await async_engine.dispose()
+
+    for label, r in results:
+        print(f"{label}: 总耗时 {r['elapsed']:6.2f}s | 事件循环延迟 p50 {r['p50']:7.1f}ms"
+              f" p99 {r['p99']:7.1f}ms max {r['max']:7.1f}ms | {r['packets']} 个数据包")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
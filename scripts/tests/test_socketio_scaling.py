@@ -0,0 +1,135 @@
+"""
+Socket.IO 多 worker 广播吞吐量测试
+
+启动一个 Unix socket broker 和 N 个 worker 进程，每个 worker 上挂
+CLIENTS_PER_WORKER 个模拟客户端（都在同一个房间）。主进程通过 broker
+发布 BROADCASTS 条 playback_sync 广播，统计所有 worker 投递完成的总耗时。
+
+每条广播在每个 worker 上独立编码和投递，worker 之间没有共享状态，
+所以总投递吞吐量应随 worker 数（在 CPU 核数以内）线性增长。
+
+    python scripts/tests/test_socketio_scaling.py [--workers 1,2,4]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+import socketio
+
+from backend.socket_manager import AsyncUnixSocketManager, UnixSocketBroker
+
+CLIENTS_PER_WORKER = 100
+BROADCASTS = 500
+ROOM = "room_1"
+
+
+def run_broker(path, ready):
+    async def main():
+        broker = UnixSocketBroker(path)
+        await broker.start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+def run_worker(path, ready, results):
+    async def main():
+        sio = socketio.AsyncServer(async_mode="asgi", client_manager=AsyncUnixSocketManager(path))
+        expected = BROADCASTS * CLIENTS_PER_WORKER
+        delivered = 0
+        done = asyncio.Event()
+
+        async def send_eio_packet(eio_sid, eio_pkt):
+            # 代替真实传输：编码数据帧并计数
+            nonlocal delivered
+            eio_pkt.encode()
+            delivered += 1
+            if delivered == expected:
+                done.set()
+
+        sio._send_eio_packet = send_eio_packet
+        sio.manager.initialize()
+
+        for i in range(CLIENTS_PER_WORKER):
+            sid = await sio.manager.connect(f"eio-{os.getpid()}-{i}", "/")
+            await sio.manager.enter_room(sid, "/", ROOM)
+
+        await sio.manager._connect()
+        await asyncio.sleep(0.2)  # 等待监听任务订阅完成
+        ready.set()
+        await done.wait()
+        results.put(time.time())
+
+    asyncio.run(main())
+
+
+async def publish(path):
+    manager = AsyncUnixSocketManager(path, write_only=True)
+    for i in range(BROADCASTS):
+        await manager.emit("playback_sync", {
+            "action": "seek", "time": i, "rate": 1.0, "is_playing": True, "user_id": 1,
+        }, namespace="/", room=ROOM)
+
+
+def measure(worker_count: int) -> float:
+    ctx = multiprocessing.get_context("spawn")
+    path = os.path.join(tempfile.mkdtemp(), "sio.sock")
+
+    broker_ready = ctx.Event()
+    broker = ctx.Process(target=run_broker, args=(path, broker_ready), daemon=True)
+    broker.start()
+    broker_ready.wait(10)
+
+    results = ctx.Queue()
+    workers = []
+    for _ in range(worker_count):
+        ready = ctx.Event()
+        proc = ctx.Process(target=run_worker, args=(path, ready, results), daemon=True)
+        proc.start()
+        ready.wait(30)
+        workers.append(proc)
+
+    start = time.time()
+    asyncio.run(publish(path))
+    finished = [results.get(timeout=300) for _ in workers]
+    elapsed = max(finished) - start
+
+    for proc in workers + [broker]:
+        proc.terminate()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket.IO 多 worker 广播吞吐量测试")
+    parser.add_argument("--workers", default="1,2,4", help="逗号分隔的 worker 数量")
+    args = parser.parse_args()
+    counts = [int(n) for n in args.workers.split(",")]
+
+    print("=" * 60)
+    print("Socket.IO 多 worker 广播吞吐量测试")
+    print(f"CPU 核数: {os.cpu_count()} | 每 worker 客户端: {CLIENTS_PER_WORKER} | 广播条数: {BROADCASTS}")
+    print("=" * 60)
+
+    baseline = None
+    for n in counts:
+        elapsed = measure(n)
+        throughput = BROADCASTS * CLIENTS_PER_WORKER * n / elapsed
+        baseline = baseline or throughput / n
+        efficiency = throughput / (baseline * n) * 100
+        print(f"workers={n:>2} | 耗时 {elapsed:6.2f}s | 投递 {throughput:>10,.0f} 帧/秒 | 线性扩展效率 {efficiency:5.1f}%")
+
+    if os.cpu_count() and max(counts) > os.cpu_count():
+        print("\n⚠️  worker 数超过 CPU 核数，超出部分无法线性扩展")
+
+
+if __name__ == "__main__":
+    main()
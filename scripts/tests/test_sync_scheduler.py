@@ -0,0 +1,123 @@
+"""
+播放进度同步调度仿真测试
+
+模拟一个 10 人房间播放 10 分钟：房主每 0.8 秒上报一次进度（与前端节流一致），
+房主播放速率有轻微抖动并偶发缓冲卡顿，成员本地时钟也有误差。
+成员收到 time_sync 后，偏差超过 0.5 秒即对齐（与前端策略一致）。
+
+对比两种方式的出站帧率和成员与房主之间的偏差:
+    直接转发  - 每次 time_update 都转发给所有成员（旧实现）
+    调度器    - 只在偏差超过阈值时校正，外加低频心跳
+
+    python scripts/tests/test_sync_scheduler.py
+"""
+import os
+import random
+import sys
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.room_state import RoomState
+from backend.sync_scheduler import SyncScheduler
+
+DURATION = 600.0  # 秒
+TICK = 0.1
+REPORT_INTERVAL = 0.8
+MEMBERS = 10
+MEMBER_TOLERANCE = 0.5  # 前端忽略小于该值的偏差
+
+
+class Member:
+    def __init__(self, rng):
+        self.position = 0.0
+        self.rate = 1.0 + rng.uniform(-0.003, 0.003)
+
+    def advance(self, dt):
+        self.position += self.rate * dt
+
+    def on_time_sync(self, time):
+        if abs(self.position - time) > MEMBER_TOLERANCE:
+            self.position = time
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def simulate(scheduler=None, seed=7):
+    rng = random.Random(seed)
+    members = [Member(rng) for _ in range(MEMBERS - 1)]  # 房主之外的成员
+    host_position = 0.0
+    host_rate = 1.0
+    stall_left = 0.0
+    frames = 0
+    drifts = []
+
+    state = RoomState(room_id=1, host_user_id=1, is_playing=True, anchor=0.0)
+
+    def broadcast(time):
+        nonlocal frames
+        frames += len(members)
+        for member in members:
+            member.on_time_sync(time)
+
+    steps = int(DURATION / TICK)
+    report_every = int(round(REPORT_INTERVAL / TICK))
+    for step in range(1, steps + 1):
+        now = step * TICK
+
+        # 房主：速率抖动 + 偶发缓冲卡顿
+        if stall_left > 0:
+            stall_left -= TICK
+        else:
+            if rng.random() < 0.002:
+                stall_left = rng.uniform(0.5, 2.0)
+            host_rate = 1.0 + rng.uniform(-0.005, 0.005)
+            host_position += host_rate * TICK
+        for member in members:
+            member.advance(TICK)
+
+        if step % report_every == 0:
+            if scheduler is None:
+                broadcast(host_position)
+            elif scheduler.on_host_time(state, host_position, now) is not None:
+                broadcast(host_position)
+
+        if scheduler is not None:
+            for due in scheduler.due_heartbeats([state], now):
+                broadcast(due.current_position(now))
+
+        drifts.extend(abs(m.position - host_position) for m in members)
+
+    return {
+        "frames_per_sec": frames / DURATION,
+        "mean": sum(drifts) / len(drifts),
+        "p95": percentile(drifts, 0.95),
+        "max": max(drifts),
+    }
+
+
+def main():
+    print("=" * 72)
+    print(f"播放进度同步仿真 ({MEMBERS} 人房间, {DURATION:.0f} 秒)")
+    print("=" * 72)
+    print(f"{'策略':<30}{'出站帧/秒':>10}{'平均偏差':>10}{'P95偏差':>10}{'最大偏差':>10}")
+
+    baseline = simulate()
+    print(f"{'直接转发':<30}{baseline['frames_per_sec']:>12.2f}{baseline['mean']:>12.3f}"
+          f"{baseline['p95']:>11.3f}{baseline['max']:>12.3f}")
+
+    for threshold, heartbeat in ((0.5, 5.0), (0.25, 15.0), (0.5, 15.0), (1.0, 15.0)):
+        result = simulate(SyncScheduler(drift_threshold=threshold, heartbeat_interval=heartbeat))
+        name = f"调度器 阈值={threshold}s 心跳={heartbeat:.0f}s"
+        print(f"{name:<30}{result['frames_per_sec']:>12.2f}{result['mean']:>12.3f}"
+              f"{result['p95']:>11.3f}{result['max']:>12.3f}"
+              f"   帧数减少 {baseline['frames_per_sec'] / result['frames_per_sec']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+本地模式视频校验基准测试
+
+房主用 1GB / 4GB 的视频文件创建本地模式房间（提交大小、抽样指纹和完整 SHA-256），
+成员加入后分别用两种方式校验同一个文件，统计加入时的校验延迟（客户端计算 + 校验请求）:
+- 抽样指纹: 读取约 1MB
+- 完整 SHA-256 回退: 读取整个文件
+每种方式分别测量页缓存命中（刚读过的文件）和冷读（posix_fadvise 丢弃页缓存后）。
+
+同时验证: 被改动的文件、大小不同的文件校验失败；房间只有完整哈希时要求回退；
+房主更换视频后成员需重新校验；Socket.IO 事件 verify_video 与 REST 接口结果一致。
+
+使用临时 SQLite 数据库和临时目录运行（需要约 5GB 磁盘空间）:
+    python scripts/tests/test_video_fingerprint.py
+"""
+import asyncio
+import hashlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+TEMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEMP_DIR, 'bench_fingerprint.db')}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+import httpx
+from engineio.async_socket import AsyncSocket
+
+from backend import models, security, websocket_server
+from backend.database import SessionLocal
+from backend.main import app
+from backend.websocket_server import sio
+from backend.video_fingerprint import fingerprint_file, sample_offsets
+
+SIZES = [1024 ** 3, 4 * 1024 ** 3]
+ROUNDS = 3
+
+
+def make_file(path, size):
+    block = os.urandom(16 * 1024 * 1024)
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            n = min(len(block), size - written)
+            f.write(block[:n] if n < len(block) else block)
+            # 每块略作变化，避免内容重复
+            block = block[1:] + block[:1]
+            written += n
+
+
+def drop_cache(path):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def full_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def seed():
+    db = SessionLocal()
+    users = [models.User(username=f"local{i}", email=f"local{i}@example.com", hashed_password="x") for i in range(2)]
+    db.add_all(users)
+    db.commit()
+    db.close()
+    return [{"Authorization": f"Bearer {security.create_access_token(data={'sub': f'local{i}'})}"} for i in range(2)]
+
+
+async def connect_client(eio_sid, username):
+    """以 username 的 token 走 Socket.IO 握手建立连接（不经过真实传输），返回 sid 和发给它的事件"""
+    sent = []
+
+    async def send(_, eio_pkt):
+        sent.append(eio_pkt.encode())
+
+    sio._send_eio_packet = send
+    sio.eio.sockets[eio_sid] = AsyncSocket(sio.eio, eio_sid)
+    sio.environ[eio_sid] = {"QUERY_STRING": ""}
+    token = security.create_access_token(data={"sub": username})
+    await sio._handle_connect(eio_sid, "/", {"token": token})
+    return sio.manager.sid_from_eio_sid(eio_sid, "/"), sent
+
+
+async def create_room(client, host, path, with_fingerprint=True):
+    size, fingerprint = fingerprint_file(path)
+    body = {"room_name": "本地模式", "mode": "local", "video_size": size, "video_hash": full_hash(path)}
+    if with_fingerprint:
+        body["video_fingerprint"] = fingerprint
+    resp = await client.post("/api/sync-rooms", headers=host, json=body)
+    assert resp.status_code == 200, resp.text
+    return resp.json()["id"]
+
+
+async def measure(client, member, room_id, path, method, cold):
+    """一次加入校验的耗时: 客户端计算 + 提交"""
+    if cold:
+        drop_cache(path)
+    start = time.perf_counter()
+    if method == "fingerprint":
+        size, fingerprint = fingerprint_file(path)
+        body = {"size": size, "fingerprint": fingerprint}
+    else:
+        body = {"size": os.path.getsize(path), "sha256": full_hash(path)}
+    resp = await client.post(f"/api/sync-rooms/{room_id}/verify-video", headers=member, json=body)
+    elapsed = time.perf_counter() - start
+    assert resp.status_code == 200 and resp.json()["verified"], resp.text
+    return elapsed
+
+
+async def check_semantics(client, host, member, path):
+    room_id = await create_room(client, host, path)
+    resp = await client.post(f"/api/sync-rooms/{room_id}/join", headers=member)
+    assert resp.json()["is_verified"] is False
+    url = f"/api/sync-rooms/{room_id}/verify-video"
+
+    # 改动抽样区间内的一个字节
+    size = os.path.getsize(path)
+    offset, _ = sample_offsets(size)[5]
+    with open(path, "r+b") as f:
+        original = os.pread(f.fileno(), 1, offset)
+        os.pwrite(f.fileno(), bytes([original[0] ^ 0xFF]), offset)
+        _, tampered = fingerprint_file(path)
+        os.pwrite(f.fileno(), original, offset)
+    resp = await client.post(url, headers=member, json={"size": size, "fingerprint": tampered})
+    assert resp.json()["verified"] is False and resp.json()["method"] == "fingerprint"
+    resp = await client.post(url, headers=member, json={"size": size + 1, "fingerprint": tampered})
+    assert resp.json()["verified"] is False and resp.json()["method"] == "size"
+
+    # Socket.IO 事件与 REST 走同一校验逻辑
+    _, fingerprint = fingerprint_file(path)
+    member_id = 2
+    sid, sent = await connect_client("verify-eio", "local1")
+    await websocket_server.verify_video(sid, {"room_id": room_id, "size": size, "fingerprint": fingerprint})
+    assert any(packet.startswith('42["video_verified"') for packet in sent), sent
+    await websocket_server.disconnect(sid)
+    await sio.manager.disconnect(sid, "/")
+    db = SessionLocal()
+    assert db.query(models.SyncRoomMember).filter_by(room_id=room_id, user_id=member_id).one().is_verified
+    db.close()
+
+    # 房主更换视频后需重新校验
+    resp = await client.put(f"/api/sync-rooms/{room_id}", headers=host, json={"video_fingerprint": "0" * 64})
+    assert resp.status_code == 200, resp.text
+    resp = await client.get(f"/api/sync-rooms/{room_id}/members", headers=member)
+    assert [m["is_verified"] for m in resp.json() if m["user_id"] == member_id] == [False]
+
+    # 只有完整哈希的房间要求回退
+    legacy_id = await create_room(client, host, path, with_fingerprint=False)
+    await client.post(f"/api/sync-rooms/{legacy_id}/join", headers=member)
+    url = f"/api/sync-rooms/{legacy_id}/verify-video"
+    resp = await client.post(url, headers=member, json={"size": size, "fingerprint": fingerprint})
+    assert resp.json()["fallback_required"] is True and resp.json()["verified"] is False
+    resp = await client.post(url, headers=member, json={"size": size, "sha256": full_hash(path)})
+    assert resp.json()["verified"] is True and resp.json()["method"] == "sha256"
+
+    resp = await client.post("/api/sync-rooms", headers=host,
+                             json={"room_name": "外链", "mode": "link", "video_fingerprint": fingerprint})
+    assert resp.status_code == 400
+    print("✅ 篡改 / 大小不符被拒绝，Socket.IO 校验生效，更换视频后重置，仅完整哈希时要求回退")
+
+
+async def main():
+    host, member = seed()
+    sio.manager.initialize()
+    transport = httpx.ASGITransport(app=app)
+
+    print("=" * 72)
+    print("本地模式视频校验基准测试")
+    print("=" * 72)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=600) as client:
+        results = []
+        for size in SIZES:
+            path = os.path.join(TEMP_DIR, f"movie_{size}.mkv")
+            make_file(path, size)
+            if size == SIZES[0]:
+                await check_semantics(client, host, member, path)
+
+            room_id = await create_room(client, host, path)
+            await client.post(f"/api/sync-rooms/{room_id}/join", headers=member)
+            row = {"size": size}
+            for method in ("fingerprint", "sha256"):
+                for cold in (False, True):
+                    rounds = 1 if method == "sha256" and cold else ROUNDS
+                    times = [await measure(client, member, room_id, path, method, cold) for _ in range(rounds)]
+                    row[(method, cold)] = statistics.median(times) * 1000
+            results.append(row)
+            os.unlink(path)
+
+    print(f"{'文件':>6} | {'指纹(缓存)':>10} | {'指纹(冷读)':>10} | {'完整哈希(缓存)':>14} | {'完整哈希(冷读)':>14}")
+    for row in results:
+        print(f"{row['size'] / 1024 ** 3:5.0f}G | {row[('fingerprint', False)]:8.1f}ms | {row[('fingerprint', True)]:8.1f}ms"
+              f" | {row[('sha256', False)]:12.0f}ms | {row[('sha256', True)]:12.0f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,193 @@
+"""
+内容寻址视频存储测试
+
+验证:
+- 上传前按 SHA-256 预检，已有相同视频时直接关联到房间，跳过上传（对比完整上传的耗时）
+- 两个房间共用同一份文件；最后一个引用的房间关闭后，闲置超时由后台回收
+- 超出配额时按 LRU 淘汰未被引用的视频，被引用的视频不会被淘汰
+- 被引用的视频已占满配额时，新上传返回 507
+- 并发上传按预留计入配额，不会一起超出；取消后释放预留
+- 刚入库、尚未写入房间的视频不会被回收；写入房间前统计的引用计数也不会导致它被回收
+- 并发上传按预留计入配额，不会一起超出；取消后释放预留
+- 刚入库、尚未写入房间的视频不会被回收；写入房间前统计的引用计数也不会导致它被回收
+
+使用临时 SQLite 数据库和临时上传目录运行:
+    python scripts/tests/test_video_store.py
+"""
+import asyncio
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+TEMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEMP_DIR, 'bench_store.db')}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+import httpx
+
+from backend import models, security, sync_room_crud
+from backend.database import SessionLocal
+from backend.main import app
+from backend.video_store import video_store
+from backend.video_upload import upload_manager
+
+FILE_SIZE = 16 * 1024 * 1024
+CHUNK = 4 * 1024 * 1024
+
+
+def seed(rooms):
+    db = SessionLocal()
+    host = models.User(username="store_host", email="store_host@example.com", hashed_password="x")
+    db.add(host)
+    db.flush()
+    room_list = [models.SyncRoom(room_code=f"STORE{i}", room_name=f"存储测试{i}", host_user_id=host.id, mode="upload")
+                 for i in range(rooms)]
+    db.add_all(room_list)
+    db.commit()
+    room_ids = [room.id for room in room_list]
+    db.close()
+    token = security.create_access_token(data={"sub": "store_host"})
+    return room_ids, {"Authorization": f"Bearer {token}"}
+
+
+def reset_store(root, quota_bytes=0, idle_ttl=3600):
+    video_store.__init__(root=root, quota_bytes=quota_bytes, idle_ttl=idle_ttl)
+    upload_manager.__init__(root=root, chunk_size=CHUNK, max_size=FILE_SIZE, session_ttl=3600, store=video_store)
+
+
+def refcounts():
+    db = SessionLocal()
+    try:
+        return sync_room_crud.get_video_refcounts(db)
+    finally:
+        db.close()
+
+
+def set_active(room_id, active):
+    db = SessionLocal()
+    db.query(models.SyncRoom).filter(models.SyncRoom.id == room_id).update({"is_active": active})
+    db.commit()
+    db.close()
+
+
+async def upload(client, headers, room_id, data):
+    """完整上传流程，返回 (响应 json, 耗时)"""
+    start = time.perf_counter()
+    video_hash = hashlib.sha256(data).hexdigest()
+    resp = await client.post(f"/api/sync-rooms/{room_id}/uploads", headers=headers,
+                             json={"filename": "movie.mp4", "size": len(data), "sha256": video_hash})
+    if resp.status_code != 201:
+        return resp, time.perf_counter() - start
+    base = f"/api/sync-rooms/{room_id}/uploads/{resp.json()['upload_id']}"
+    for offset in range(0, len(data), CHUNK):
+        chunk = await client.put(base, params={"offset": offset}, headers=headers, content=data[offset:offset + CHUNK])
+        assert chunk.status_code == 200, chunk.text
+    resp = await client.post(f"{base}/complete", headers=headers, json={"sha256": video_hash})
+    return resp, time.perf_counter() - start
+
+
+async def main():
+    room_ids, headers = seed(6)
+    upload_root = os.path.join(TEMP_DIR, "uploads")
+    reset_store(upload_root)
+    videos = [random.randbytes(FILE_SIZE) for _ in range(4)]
+    hashes = [hashlib.sha256(data).hexdigest() for data in videos]
+
+    print("=" * 60)
+    print(f"内容寻址视频存储测试 ({FILE_SIZE // 1024 // 1024}MB 视频)")
+    print("=" * 60)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        # 1. 预检 + 去重
+        resp = await client.get(f"/api/videos/{hashes[0]}", headers=headers)
+        assert resp.json() == {"exists": False, "size": None}
+        resp, upload_s = await upload(client, headers, room_ids[0], videos[0])
+        assert resp.status_code == 200, resp.text
+
+        resp = await client.get(f"/api/videos/{hashes[0]}", headers=headers, params={"size": FILE_SIZE})
+        assert resp.json() == {"exists": True, "size": FILE_SIZE}
+        resp, dedup_s = await upload(client, headers, room_ids[1], videos[0])
+        assert resp.status_code == 200 and resp.json()["deduplicated"], resp.text
+        assert resp.json()["video_source"] == f"videos/{hashes[0]}.mp4"
+        assert len(os.listdir(os.path.join(upload_root, "videos"))) == 1
+        assert video_store.metrics.dedup_hits == 1
+        print(f"✅ 预检命中跳过上传: 完整上传 {upload_s * 1000:.0f}ms, 去重关联 {dedup_s * 1000:.1f}ms")
+
+        # 2. 引用计数与回收
+        video_store.idle_ttl = 0
+        assert refcounts() == {hashes[0]: 2}
+        assert video_store.collect(refcounts()) == (0, 0)
+        set_active(room_ids[0], False)
+        assert video_store.collect(refcounts()) == (0, 0)  # 另一个房间仍在使用
+        set_active(room_ids[1], False)
+        assert refcounts() == {}
+        assert video_store.collect(refcounts()) == (1, 0)
+        assert not os.listdir(os.path.join(upload_root, "videos"))
+        print("✅ 最后一个引用的房间关闭后视频被回收")
+
+        # 3. 配额 LRU 淘汰: 配额放得下 3 个视频
+        reset_store(upload_root, quota_bytes=3 * FILE_SIZE)
+        for i in range(3):
+            resp, _ = await upload(client, headers, room_ids[2 + i], videos[i])
+            assert resp.status_code == 200, resp.text
+            time.sleep(0.01)
+        # 房间 2 的视频被引用；房间 3、4 关闭，视频 1 比视频 2 更早使用
+        set_active(room_ids[3], False)
+        set_active(room_ids[4], False)
+        resp, _ = await upload(client, headers, room_ids[5], videos[3])
+        assert resp.status_code == 200, resp.text
+        remaining = {name.split(".")[0] for name in os.listdir(os.path.join(upload_root, "videos"))}
+        assert remaining == {hashes[0], hashes[2], hashes[3]}, remaining
+        assert video_store.metrics.evicted == 1
+        print("✅ 超出配额时淘汰最久未使用且未被引用的视频，被引用的视频保留")
+
+        # 4. 被引用的视频已占满配额
+        video_store.quota_bytes = 2 * FILE_SIZE
+        resp = await client.post(f"/api/sync-rooms/{room_ids[5]}/uploads", headers=headers,
+                                 json={"filename": "big.mp4", "size": FILE_SIZE})
+        assert resp.status_code == 507, resp.text
+        print("✅ 被引用的视频占满配额时拒绝新上传 (507)")
+
+        resp = await client.get("/api/videos/" + hashes[1], headers=headers)
+        assert resp.json()["exists"] is False
+
+        # 5. 并发上传的预留: 配额放得下 2 个视频，第 3 个同时进行的上传被拒绝
+        reset_store(os.path.join(TEMP_DIR, "uploads-reserve"), quota_bytes=2 * FILE_SIZE)
+        created = []
+        for _ in range(3):
+            created.append(await client.post(f"/api/sync-rooms/{room_ids[5]}/uploads", headers=headers,
+                                             json={"filename": "parallel.mp4", "size": FILE_SIZE}))
+        assert [resp.status_code for resp in created] == [201, 201, 507], [resp.text for resp in created]
+        assert video_store.metrics.reserved_bytes == 2 * FILE_SIZE
+        resp = await client.delete(f"/api/sync-rooms/{room_ids[5]}/uploads/{created[0].json()['upload_id']}",
+                                   headers=headers)
+        assert resp.status_code == 200 and video_store.metrics.reserved_bytes == FILE_SIZE
+        print("✅ 并发上传按预留计入配额，超出的上传返回 507；取消后释放预留")
+
+        # 6. 入库后、写入房间前不会被回收
+        video_store.idle_ttl = 0
+        temp_path = video_store.temp_path("pinned")
+        temp_path.write_bytes(videos[1])
+        video_store.ingest(temp_path, hashes[1], ".mp4")
+        assert video_store.collect({}, counted_at=time.time()) == (0, 0)  # 已固定
+        counted_at = time.time()  # 回收任务统计引用计数时，房间还没有写入该视频
+        time.sleep(0.01)
+        video_store.unpin(hashes[1])  # 房间提交
+        assert video_store.collect({}, counted_at=counted_at) == (0, 0)
+        assert video_store.lookup(hashes[1]) is not None
+        assert video_store.collect({}, counted_at=time.time() + 1) == (1, 0)  # 之后确实无人引用才回收
+        print("✅ 入库后写入房间前的视频不会被回收或淘汰")
+
+    print(f"存储统计: {video_store.metrics.as_dict()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
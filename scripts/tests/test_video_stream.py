@@ -0,0 +1,200 @@
+"""
+上传视频 Range 播放基准测试
+
+在子进程中用 uvicorn 启动应用，房间里放一个 64MB 的视频，先验证 Range 语义:
+    单区间 / 后缀区间 / 多区间 multipart / 416 / If-Range / If-None-Match / HEAD / 非成员 403
+再让 32 个成员并发模拟拖动进度（随机位置读取 512KB），统计吞吐量和单次 seek 延迟，
+并对比关闭授权缓存（每次 seek 都查库鉴权）时的表现。
+
+使用临时 SQLite 数据库和临时上传目录运行:
+    python scripts/tests/test_video_stream.py
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+TEMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEMP_DIR, 'bench_video.db')}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+
+import httpx
+
+from backend import models, security
+from backend.config import config
+from backend.database import SessionLocal, engine
+
+VIDEO_SIZE = 64 * 1024 * 1024
+READERS = 32
+SEEKS_PER_READER = 20
+SEEK_BYTES = 512 * 1024
+
+
+def seed(video_dir):
+    data = random.randbytes(VIDEO_SIZE)
+    video_hash = hashlib.sha256(data).hexdigest()
+    os.makedirs(video_dir, exist_ok=True)
+    with open(os.path.join(video_dir, f"{video_hash}.mp4"), "wb") as f:
+        f.write(data)
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    users = [models.User(username=f"viewer{i}", email=f"viewer{i}@example.com", hashed_password="x",
+                         role="admin" if i == 0 else "user")
+             for i in range(READERS + 1)]
+    db.add_all(users)
+    db.flush()
+    room = models.SyncRoom(room_code="VIDEO1", room_name="播放测试", host_user_id=users[0].id, mode="upload",
+                           video_source=f"videos/{video_hash}.mp4", video_hash=video_hash)
+    db.add(room)
+    db.flush()
+    # 最后一个用户不是成员
+    db.add_all([models.SyncRoomMember(room_id=room.id, user_id=user.id) for user in users[:READERS]])
+    db.commit()
+    room_id = room.id
+    tokens = [security.create_access_token(data={"sub": user.username}) for user in users]
+    db.close()
+    engine.dispose()
+    return data, video_hash, room_id, tokens
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_server(port, upload_dir, grant_ttl):
+    import uvicorn
+    config.UPLOAD_DIR = upload_dir
+    from backend.main import app
+    from backend.video_stream import video_grants
+    video_grants._cache.ttl = grant_ttl
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_server(upload_dir, grant_ttl):
+    port = free_port()
+    process = multiprocessing.Process(target=run_server, args=(port, upload_dir, grant_ttl), daemon=True)
+    process.start()
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(base + "/")
+            return process, base
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def check_semantics(base, url, data, video_hash, tokens):
+    auth = {"Authorization": f"Bearer {tokens[1]}"}
+    with httpx.Client(base_url=base, headers=auth) as client:
+        resp = client.get(url, headers={"Range": "bytes=1000-1999"})
+        assert resp.status_code == 206 and resp.content == data[1000:2000]
+        assert resp.headers["content-range"] == f"bytes 1000-1999/{VIDEO_SIZE}"
+
+        resp = client.get(url, headers={"Range": "bytes=-100"})
+        assert resp.status_code == 206 and resp.content == data[-100:]
+
+        resp = client.get(url, headers={"Range": "bytes=0-9, 100-109, 5-14"})
+        assert resp.status_code == 206 and resp.headers["content-type"].startswith("multipart/byteranges")
+        assert int(resp.headers["content-length"]) == len(resp.content)
+        assert data[0:15] in resp.content and data[100:110] in resp.content
+
+        resp = client.get(url, headers={"Range": f"bytes={VIDEO_SIZE}-"})
+        assert resp.status_code == 416 and resp.headers["content-range"] == f"bytes */{VIDEO_SIZE}"
+
+        assert resp.headers["etag"] == f'"{video_hash}"'
+        resp = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"changed"'})
+        assert resp.status_code == 200 and len(resp.content) == VIDEO_SIZE
+        resp = client.get(url, headers={"Range": "bytes=0-9", "If-Range": f'"{video_hash}"'})
+        assert resp.status_code == 206 and resp.content == data[:10]
+
+        assert client.get(url, headers={"If-None-Match": f'"{video_hash}"'}).status_code == 304
+        resp = client.head(url)
+        assert resp.status_code == 200 and resp.headers["content-length"] == str(VIDEO_SIZE) and not resp.content
+
+    # <video> 标签通过查询参数携带 token
+    resp = httpx.get(f"{base}{url}?token={tokens[2]}", headers={"Range": "bytes=0-99"})
+    assert resp.status_code == 206 and resp.content == data[:100]
+    assert httpx.get(f"{base}{url}?token={tokens[-1]}").status_code == 403
+    assert httpx.get(f"{base}{url}").status_code == 401
+    print("✅ 单区间 / 后缀 / multipart / 416 / If-Range / 304 / HEAD / 鉴权 均正确")
+
+
+async def seek_storm(base, url, data, tokens):
+    latencies = []
+    limits = httpx.Limits(max_connections=READERS)
+
+    async def reader(token):
+        rng = random.Random(token)
+        async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+            for _ in range(SEEKS_PER_READER):
+                offset = rng.randrange(0, VIDEO_SIZE - SEEK_BYTES)
+                start = time.perf_counter()
+                resp = await client.get(url, params={"token": token},
+                                        headers={"Range": f"bytes={offset}-{offset + SEEK_BYTES - 1}"})
+                latencies.append(time.perf_counter() - start)
+                assert resp.status_code == 206 and resp.content == data[offset:offset + SEEK_BYTES]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(reader(token) for token in tokens[:READERS]))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    total = READERS * SEEKS_PER_READER * SEEK_BYTES
+    return {
+        "throughput": total / elapsed / 1024 / 1024,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    upload_dir = os.path.join(TEMP_DIR, "uploads")
+    data, video_hash, room_id, tokens = seed(os.path.join(upload_dir, "videos"))
+    url = f"/api/sync-rooms/{room_id}/video"
+
+    print("=" * 64)
+    print(f"视频 Range 播放测试 ({VIDEO_SIZE // 1024 // 1024}MB, {READERS} 个并发成员 × {SEEKS_PER_READER} 次"
+          f" seek, 每次 {SEEK_BYTES // 1024}KB)")
+    print("=" * 64)
+
+    process, base = start_server(upload_dir, grant_ttl=config.VIDEO_GRANT_TTL)
+    try:
+        check_semantics(base, url, data, video_hash, tokens)
+        cached = asyncio.run(seek_storm(base, url, data, tokens))
+        admin = httpx.get(f"{base}/api/admin/metrics", headers={"Authorization": f"Bearer {tokens[0]}"})
+    finally:
+        process.terminate()
+        process.join()
+
+    process, base = start_server(upload_dir, grant_ttl=0)
+    try:
+        uncached = asyncio.run(seek_storm(base, url, data, tokens))
+    finally:
+        process.terminate()
+        process.join()
+
+    for label, result in [("授权缓存", cached), ("每次查库", uncached)]:
+        print(f"{label}: {result['throughput']:7.1f} MB/s | seek p50 {result['p50']:6.1f}ms"
+              f" | p99 {result['p99']:6.1f}ms")
+    if admin.status_code == 200:
+        stream = admin.json()["video_stream"]
+        print(f"授权缓存命中 {stream['grant_hits']} 次, 查库 {stream['grant_misses']} 次,"
+              f" zerocopysend 响应 {stream['zerocopy']} 次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+视频分片上传测试
+
+上传一个 48MB 的随机文件到上传模式房间（1MB 分片），验证:
+- 分片乱序、4 路并行上传，合并结果与原文件一致
+- video_hash 等于原文件 SHA-256，且在上传过程中增量计算，完成时无需再读一遍文件
+- 服务端内存峰值远小于文件大小（分片流式写入磁盘）
+- 中断的分片不计为已收到，按 offset 续传
+- 进程重启后从磁盘恢复会话继续上传
+- 多 worker 共享上传目录时，其他 worker 写入的分片计入进度，可在任一 worker 上完成
+
+使用临时 SQLite 数据库和临时上传目录运行:
+    python scripts/tests/test_video_upload.py
+"""
+import asyncio
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+TEMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEMP_DIR, 'bench_upload.db')}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+import httpx
+
+from backend import models, security, sync_room_crud
+from backend.database import SessionLocal
+from backend.main import app
+from backend.video_upload import UploadError, VideoUploadManager, upload_manager
+
+FILE_SIZE = 48 * 1024 * 1024 + 12345  # 最后一个分片不满
+CHUNK = 1024 * 1024
+PARALLEL = 4
+PIECE = 256 * 1024
+
+
+def seed():
+    db = SessionLocal()
+    host = models.User(username="uploader", email="uploader@example.com", hashed_password="x")
+    db.add(host)
+    db.flush()
+    room = models.SyncRoom(room_code="UPLD01", room_name="上传测试", host_user_id=host.id, mode="upload")
+    db.add(room)
+    db.commit()
+    room_id = room.id
+    db.close()
+    token = security.create_access_token(data={"sub": "uploader"})
+    return room_id, {"Authorization": f"Bearer {token}"}
+
+
+def reset_manager(root):
+    """模拟进程重启：同一上传目录上的新管理器（内存中的会话和哈希进度都丢失）"""
+    upload_manager.__init__(root=root, chunk_size=CHUNK, max_size=100 * 1024 * 1024, session_ttl=3600)
+
+
+async def put_chunk(client, url, headers, path, offset, length):
+    async def body():
+        with open(path, "rb") as f:
+            f.seek(offset)
+            remaining = length
+            while remaining:
+                data = f.read(min(PIECE, remaining))
+                remaining -= len(data)
+                yield data
+
+    resp = await client.put(url, params={"offset": offset}, content=body(),
+                            headers={**headers, "Content-Length": str(length)})
+    return resp
+
+
+async def upload(client, base, headers, path, offsets):
+    semaphore = asyncio.Semaphore(PARALLEL)
+
+    async def one(offset):
+        async with semaphore:
+            resp = await put_chunk(client, base, headers, path, offset, min(CHUNK, FILE_SIZE - offset))
+            assert resp.status_code == 200, resp.text
+
+    await asyncio.gather(*(one(offset) for offset in offsets))
+
+
+async def main():
+    room_id, headers = seed()
+    upload_root = os.path.join(TEMP_DIR, "uploads")
+    reset_manager(upload_root)
+
+    source = os.path.join(TEMP_DIR, "movie.mp4")
+    with open(source, "wb") as f:
+        f.write(random.randbytes(FILE_SIZE))
+    with open(source, "rb") as f:
+        expected_hash = hashlib.file_digest(f, "sha256").hexdigest()
+
+    print("=" * 60)
+    print(f"视频分片上传测试 ({FILE_SIZE / 1024 / 1024:.1f}MB, {CHUNK // 1024}KB 分片, {PARALLEL} 路并行)")
+    print("=" * 60)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        resp = await client.post(f"/api/sync-rooms/{room_id}/uploads", headers=headers,
+                                 json={"filename": "movie.mp4", "size": FILE_SIZE})
+        assert resp.status_code == 201, resp.text
+        status = resp.json()
+        base = f"/api/sync-rooms/{room_id}/uploads/{status['upload_id']}"
+        offsets = list(range(0, FILE_SIZE, CHUNK))
+
+        # 前 1/3 按顺序，其余大致有序但并行、局部乱序
+        head, tail = offsets[:len(offsets) // 3], offsets[len(offsets) // 3:]
+        for i in range(0, len(tail) - 1, 3):
+            tail[i], tail[i + 1] = tail[i + 1], tail[i]
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        await upload(client, base, headers, source, head)
+
+        # 中断的分片不计为已收到
+        resp = await client.put(base, params={"offset": tail[0]}, headers=headers, content=b"x" * 1000)
+        assert resp.status_code == 400
+        status = (await client.get(base, headers=headers)).json()
+        assert status["offset"] == len(head) * CHUNK and tail[0] // CHUNK in status["missing"]
+        print(f"✅ 中断的分片不计入，续传点 offset={status['offset']:,}")
+
+        # 模拟重启，从续传点继续
+        reset_manager(upload_root)
+        status = (await client.get(base, headers=headers)).json()
+        assert status["offset"] == len(head) * CHUNK
+        await upload(client, base, headers, source, [o for o in tail if o // CHUNK in status["missing"]])
+        upload_s = time.perf_counter() - start
+
+        resp = await client.post(f"{base}/complete", headers=headers, json={"sha256": expected_hash})
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert resp.status_code == 200, resp.text
+        result = resp.json()
+
+    metrics = upload_manager.metrics
+    print("✅ 重启后恢复会话继续上传")
+    print(f"上传 {upload_s:.2f}s ({FILE_SIZE / upload_s / 1024 / 1024:.0f}MB/s) | 合并 {metrics.last_assemble_ms}ms"
+          f" | 内存峰值 {peak / 1024 / 1024:.1f}MB")
+    print(f"哈希: 边写边算 {metrics.bytes_hashed_inline / 1024 / 1024:.1f}MB"
+          f", 上传中从页缓存补算 {metrics.bytes_hashed_catchup / 1024 / 1024:.1f}MB"
+          f", 完成时补算 {metrics.bytes_hashed_on_complete / 1024 / 1024:.1f}MB")
+
+    assert result["video_hash"] == expected_hash
+    with open(os.path.join(upload_root, result["video_source"]), "rb") as f:
+        assert hashlib.file_digest(f, "sha256").hexdigest() == expected_hash
+    assert peak < FILE_SIZE / 4
+    assert metrics.bytes_hashed_on_complete == 0
+    assert not os.listdir(os.path.join(upload_root, "sessions"))
+
+    db = SessionLocal()
+    room = sync_room_crud.get_room_by_id(db, room_id)
+    assert room.video_hash == expected_hash and room.video_source == result["video_source"]
+    db.close()
+    print("✅ 合并文件与原文件一致，video_hash 已写入房间")
+
+    # 逐个乱序上传：乱序的分片在空缺补齐后补算，其余边写边算
+    manager = VideoUploadManager(upload_root, chunk_size=CHUNK, max_size=FILE_SIZE, session_ttl=3600)
+    session = manager.create(room_id, 1, "again.mp4", FILE_SIZE)
+
+    async def stream(offset, length):
+        with open(source, "rb") as f:
+            f.seek(offset)
+            yield f.read(length)
+
+    order = list(range(0, FILE_SIZE, CHUNK))
+    for i in range(0, len(order) - 1, 4):
+        order[i], order[i + 1] = order[i + 1], order[i]
+    for offset in order:
+        await manager.write_chunk(session, offset, stream(offset, min(CHUNK, FILE_SIZE - offset)))
+    source_path, digest = await manager.complete(session)
+    assert digest == expected_hash
+    hashed = manager.metrics
+    assert hashed.bytes_hashed_inline + hashed.bytes_hashed_catchup + hashed.bytes_hashed_on_complete == FILE_SIZE
+    print(f"✅ 乱序上传: 边写边算 {manager.metrics.bytes_hashed_inline / FILE_SIZE:.0%}"
+          f", 补算 {manager.metrics.bytes_hashed_catchup / FILE_SIZE:.0%}")
+
+    # 两个 worker 共享上传目录，分片交替落在不同 worker 上
+    workers = [VideoUploadManager(upload_root, chunk_size=CHUNK, max_size=FILE_SIZE, session_ttl=3600)
+               for _ in range(2)]
+    upload_id = workers[0].create(room_id, 1, "shared.mp4", FILE_SIZE).upload_id
+    for i, offset in enumerate(range(0, FILE_SIZE, CHUNK)):
+        worker = workers[i % 2]
+        session = worker.get(upload_id, room_id, 1)
+        await worker.write_chunk(session, offset, stream(offset, min(CHUNK, FILE_SIZE - offset)))
+    for worker in workers:
+        status = worker.refresh(worker.get(upload_id, room_id, 1)).status()
+        assert status["missing"] == [] and status["offset"] == FILE_SIZE, status
+    _, digest = await workers[1].complete(workers[1].get(upload_id, room_id, 1))
+    assert digest == expected_hash
+    try:
+        workers[0].refresh(workers[0].get(upload_id, room_id, 1))
+        raise AssertionError("completed upload should be gone on the other worker")
+    except UploadError as e:
+        assert e.status_code == 404
+    print("✅ 多 worker: 其他 worker 写入的分片计入进度，完成后其他 worker 上返回 404")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+"""
+浏览次数并发基准测试
+
+32 个线程同时浏览同一篇热门文章，每个线程 200 次，对比:
+    旧实现  - SELECT 后在 Python 中 views += 1 再提交（读改写）
+    缓冲    - view_counter 内存累加，后台线程定期 UPDATE views = views + n
+检查最终写入数据库的浏览次数是否等于实际浏览次数（无丢失），
+并验证去重窗口和响应中的“数据库值 + 未写回次数”。
+
+使用临时 SQLite 数据库运行，无需 MySQL:
+    python scripts/tests/test_view_counter.py
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench_views.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from sqlalchemy.exc import OperationalError
+
+from backend import models
+from backend.database import SessionLocal, engine
+from backend.view_counter import ViewCounter
+
+THREADS = 32
+VIEWS_PER_THREAD = 200
+EXPECTED = THREADS * VIEWS_PER_THREAD
+
+
+def create_post():
+    db = SessionLocal()
+    post = models.Post(title="热门文章", content="...", views=0)
+    db.add(post)
+    db.commit()
+    post_id = post.id
+    db.close()
+    return post_id
+
+
+def db_views(post_id):
+    db = SessionLocal()
+    views = db.query(models.Post.views).filter(models.Post.id == post_id).scalar()
+    db.close()
+    return views
+
+
+def legacy_view(post_id, errors):
+    """旧实现 increment_post_views：读改写"""
+    db = SessionLocal()
+    try:
+        post = db.query(models.Post).filter(models.Post.id == post_id).first()
+        post.views += 1
+        db.commit()
+    except OperationalError:
+        db.rollback()
+        errors.append(1)
+    finally:
+        db.close()
+
+
+def run_threads(target):
+    threads = [threading.Thread(target=target) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    models.Base.metadata.create_all(bind=engine)
+
+    print("=" * 64)
+    print(f"浏览次数并发测试 ({THREADS} 线程 × {VIEWS_PER_THREAD} 次 = {EXPECTED:,} 次浏览)")
+    print("=" * 64)
+
+    # 旧实现
+    post_id = create_post()
+    errors = []
+
+    def legacy_worker():
+        for _ in range(VIEWS_PER_THREAD):
+            legacy_view(post_id, errors)
+
+    elapsed = run_threads(legacy_worker)
+    views = db_views(post_id)
+    print(f"旧实现: {elapsed:6.2f}s | 数据库 {views:,} 次 | 丢失 {EXPECTED - views:,} 次"
+          f"（其中锁超时 {len(errors)} 次）")
+
+    # 缓冲计数 + 并发写回线程
+    post_id = create_post()
+    counter = ViewCounter(flush_interval=0.05)
+    stop = threading.Event()
+
+    def flusher():
+        while not stop.is_set():
+            counter.flush_sync()
+            time.sleep(counter.flush_interval)
+
+    flush_thread = threading.Thread(target=flusher)
+    flush_thread.start()
+
+    shown = []
+
+    def buffered_worker():
+        for _ in range(VIEWS_PER_THREAD):
+            counter.record(post_id)
+        # 接口返回的值 = 数据库值 + 未写回次数
+        shown.append(db_views(post_id) + counter.pending(post_id))
+
+    elapsed = run_threads(buffered_worker)
+    stop.set()
+    flush_thread.join()
+    counter.flush_sync()
+    views = db_views(post_id)
+    print(f"缓冲:   {elapsed:6.2f}s | 数据库 {views:,} 次 | 丢失 {EXPECTED - views:,} 次"
+          f" | 写回 {counter.metrics.flushes} 次")
+    assert views == EXPECTED
+    assert max(shown) <= EXPECTED
+    print("✅ 缓冲计数无丢失")
+
+    # 去重窗口：同一客户端重复浏览只计一次
+    post_id = create_post()
+    counter = ViewCounter(dedup_window=60)
+    for _ in range(10):
+        counter.record(post_id, client=("10.0.0.1", "Firefox"))
+    counter.record(post_id, client=("10.0.0.2", "Chrome"))
+    assert counter.pending(post_id) == 2 and counter.metrics.deduplicated == 9
+    counter.flush_sync()
+    assert db_views(post_id) == 2
+    print("✅ 去重窗口内重复浏览只计一次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+播放帧紧凑编码基准测试
+
+一个 50 人房间，房主连续发送播放控制（play / pause / seek 交替），同时调度任务发送进度心跳，对比:
+- 旧方式: 一次 emit 发给 room_{id}，JSON 对象
+- JSON 客户端: 现在的 emit_frame，全部成员未选择紧凑编码
+- 紧凑客户端: 全部成员在连接时选择紧凑编码，收到数组
+统计每帧字节数和每次广播的服务端 CPU 时间（含 Engine.IO 为每个连接编码数据包）。
+
+同时验证: 混合房间中 JSON 客户端收到对象、紧凑客户端收到数组，两者内容一致；
+auth 和 URL 参数两种协商方式；聊天消息对两种客户端都保持 JSON 对象。
+
+数据包不经过真实传输，只编码后记录。使用临时 SQLite 数据库运行:
+    python scripts/tests/test_wire_format.py
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径以允许导入 backend 包
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+TEMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEMP_DIR, 'bench_wire_format.db')}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from engineio.async_socket import AsyncSocket
+
+from backend import models, security, websocket_server, wire_format
+from backend.chat_pipeline import chat_pipeline
+from backend.database import SessionLocal, async_engine, engine
+from backend.rate_limiter import rate_limiter
+from backend.room_state import state_engine
+from backend.websocket_server import sio
+
+MEMBERS = 50
+FRAMES = 2000
+ACTIONS = ("play", "seek", "pause", "seek")
+
+
+def seed():
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    users = [models.User(username=f"wire{i}", email=f"wire{i}@example.com", hashed_password="x")
+             for i in range(MEMBERS)]
+    db.add_all(users)
+    db.flush()
+    room = models.SyncRoom(room_code="WIRE01", room_name="编码测试", host_user_id=users[0].id)
+    db.add(room)
+    db.flush()
+    db.add_all(models.SyncRoomMember(room_id=room.id, user_id=user.id) for user in users)
+    db.commit()
+    clients = [{"room_id": room.id, "user_id": user.id, "username": user.username} for user in users]
+    db.close()
+    return clients
+
+
+async def connect_client(eio_sid, username, auth=None, query=""):
+    """以 username 的 token 走 Socket.IO 握手建立连接（不经过真实传输），返回 sid"""
+    sio.eio.sockets[eio_sid] = AsyncSocket(sio.eio, eio_sid)
+    sio.environ[eio_sid] = {"QUERY_STRING": query}
+    token = security.create_access_token(data={"sub": username})
+    await sio._handle_connect(eio_sid, "/", {"token": token, **(auth or {})})
+    return sio.manager.sid_from_eio_sid(eio_sid, "/")
+
+
+class Wire:
+    """为每个连接编码数据包（Engine.IO 发送时的工作），按连接记录"""
+
+    def __init__(self):
+        self.packets = {}
+
+    async def send(self, eio_sid, eio_pkt):
+        self.packets.setdefault(eio_sid, []).append(eio_pkt.encode())
+
+    def events(self, sid, name):
+        """发给 sid 的 name 事件 [(数据, 字节数), ...]"""
+        eio_sid = sio.manager.eio_sid_from_sid(sid, "/")
+        result = []
+        for encoded in self.packets.get(eio_sid, []):
+            if encoded.startswith("42"):
+                event_name, data = json.loads(encoded[2:])
+                if event_name == name:
+                    result.append((data, len(encoded.encode())))
+        return result
+
+
+async def legacy_playback_control(sid, data):
+    """旧方式: 与 playback_control 相同的处理，一次 emit 发给整个房间"""
+    room_id, user_id = data["room_id"], data["user_id"]
+    state = await state_engine.get_or_load_async(room_id)
+    if not state or not state.can_control(user_id):
+        return
+    state.apply_action(data["action"], data["time"], 1.0)
+    await sio.emit("playback_sync", websocket_server.room_events.append(room_id, "playback_sync", {
+        "action": data["action"], "time": data["time"], "rate": 1.0, "is_playing": state.is_playing,
+        "user_id": user_id, "version": state.version,
+    }), room=f"room_{room_id}")
+
+
+async def legacy_heartbeat(state):
+    await sio.emit("time_sync", {"time": state.current_position(), "user_id": state.host_user_id,
+                                 "heartbeat": True}, room=f"room_{state.room_id}")
+
+
+async def run(clients, label, compact, legacy=False):
+    wire = Wire()
+    sio._send_eio_packet = wire.send
+    auth = {"compact": True} if compact else None
+    sids = []
+    for client in clients:
+        sid = await connect_client(f"{label}-{client['user_id']}", client["username"], auth=auth)
+        await websocket_server.join_room(sid, client)
+        sids.append(sid)
+    host = clients[0]
+    state = await state_engine.get_or_load_async(host["room_id"])
+    control = legacy_playback_control if legacy else websocket_server.playback_control
+    heartbeat = legacy_heartbeat if legacy else websocket_server.emit_time_heartbeat
+
+    start = time.process_time()
+    for i in range(FRAMES):
+        await control(sids[0], {**host, "action": ACTIONS[i % len(ACTIONS)], "time": i * 0.731 + 0.123456})
+    playback_cpu = time.process_time() - start
+    start = time.process_time()
+    for _ in range(FRAMES):
+        await heartbeat(state)
+    heartbeat_cpu = time.process_time() - start
+
+    member = sids[-1]
+    playback = wire.events(member, "playback_sync")
+    heartbeats = wire.events(member, "time_sync")
+    assert len(playback) == len(heartbeats) == FRAMES
+    assert isinstance(playback[0][0], list) == compact and isinstance(heartbeats[0][0], list) == compact
+
+    for sid in sids:
+        await websocket_server.disconnect(sid)
+        await sio.manager.disconnect(sid, "/")
+    state_engine.release(host["room_id"])
+    return {
+        "playback_bytes": sum(size for _, size in playback) / FRAMES,
+        "heartbeat_bytes": sum(size for _, size in heartbeats) / FRAMES,
+        "playback_us": playback_cpu / FRAMES * 1e6,
+        "heartbeat_us": heartbeat_cpu / FRAMES * 1e6,
+    }
+
+
+async def check_mixed(clients):
+    """混合房间: 两种客户端收到的播放帧内容一致，聊天消息都是 JSON 对象"""
+    wire = Wire()
+    sio._send_eio_packet = wire.send
+    host, json_client, compact_client, query_client = clients[:4]
+    sids = {
+        "host": await connect_client("mixed-host", host["username"]),
+        "json": await connect_client("mixed-json", json_client["username"], auth={"compact": False}, query="compact=1"),
+        "compact": await connect_client("mixed-compact", compact_client["username"], auth={"compact": True}),
+        "query": await connect_client("mixed-query", query_client["username"], query="EIO=4&transport=websocket&compact=1"),
+    }
+    for key, client in zip(sids, (host, json_client, compact_client, query_client)):
+        await websocket_server.join_room(sids[key], client)
+
+    await websocket_server.playback_control(sids["host"], {**host, "action": "seek", "time": 12.3456789})
+    await websocket_server.time_update(sids["host"], {**host, "time": 99.0})
+    await websocket_server.send_message(sids["host"], {**host, "message": "hello"})
+
+    (as_json, _), = wire.events(sids["json"], "playback_sync")
+    for key in ("compact", "query"):
+        (packed, _), = wire.events(sids[key], "playback_sync")
+        assert packed == wire_format.pack_playback_sync(as_json), (packed, as_json)
+        assert packed[0] == wire_format.PLAYBACK_ACTIONS["seek"] and packed[1] == 12.346
+        (packed_time, _), = wire.events(sids[key], "time_sync")
+        assert packed_time == [99.0, host["user_id"], 0]
+        (message, _), = wire.events(sids[key], "new_message")
+        assert isinstance(message, dict) and message["message"] == "hello"
+    assert isinstance(wire.events(sids["json"], "time_sync")[0][0], dict)
+    assert not wire.events(sids["host"], "time_sync")  # 房主自己不收到校正
+
+    for sid in sids.values():
+        await websocket_server.disconnect(sid)
+        await sio.manager.disconnect(sid, "/")
+    state_engine.release(host["room_id"])
+
+
+async def main():
+    logging.disable(logging.INFO)
+    rate_limiter.limits = {}  # 房主连续发送大量事件，测试中不限流
+    clients = seed()
+    sio.manager.initialize()
+    chat_pipeline.start()
+
+    print("=" * 72)
+    print(f"播放帧编码基准测试 ({MEMBERS} 人房间, playback_sync / time_sync 各 {FRAMES} 帧)")
+    print("=" * 72)
+
+    results = [
+        ("旧方式（单次 emit）", await run(clients, "legacy", compact=False, legacy=True)),
+        ("JSON 客户端", await run(clients, "json", compact=False)),
+        ("紧凑客户端", await run(clients, "compact", compact=True)),
+    ]
+    await check_mixed(clients)
+    metrics = wire_format.metrics.as_dict()
+    await chat_pipeline.shutdown()
+    await async_engine.dispose()
+
+    for label, r in results:
+        print(f"{label:<12} playback_sync {r['playback_bytes']:5.0f} 字节/帧 {r['playback_us']:7.1f}µs/广播 | "
+              f"time_sync {r['heartbeat_bytes']:5.0f} 字节/帧 {r['heartbeat_us']:7.1f}µs/广播")
+    base, compact = results[1][1], results[2][1]
+    print(f"紧凑编码: playback_sync 字节 -{1 - compact['playback_bytes'] / base['playback_bytes']:.0%}, "
+          f"time_sync 字节 -{1 - compact['heartbeat_bytes'] / base['heartbeat_bytes']:.0%}")
+    print(f"统计: {metrics}")
+    print("✅ 两种客户端收到的播放帧内容一致，聊天消息保持 JSON")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())